@@ -46,6 +46,7 @@ class DatasetKline(Dataset):
                 low_price=bar['low_price'],
                 close_price=bar['close_price'],
                 volume=bar['volume'],
+                open_interest=bar.get('open_interest', 0),
             )
             return bardata
         else:
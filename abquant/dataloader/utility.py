@@ -120,6 +120,10 @@ def make_columns(headers: list) -> Tuple[List, List]:
     elif "v" in headers:
         select_hs.append('v')
         rename_hs.append('volume')
+    # optional
+    if "open_interest" in headers:
+        select_hs.append('open_interest')
+        rename_hs.append('open_interest')
     # if len(select_hs) != 7:
     #     return None, None
     return select_hs, rename_hs
@@ -134,11 +138,13 @@ def regular_df(df_01: DataFrame, exchange: str, symbol: str, interval: str,
     headers = df_01.columns.values.tolist()
     select_hs, rename_hs = make_columns(headers)
     if select_hs is not None:
-        if len(select_hs) == 6 and 'symbol' not in select_hs:
+        required = len(select_hs) - ('open_interest' in select_hs)
+        if required == 6 and 'symbol' not in select_hs:
             df_01.loc[:, 'symbol'] = symbol
             select_hs.append('symbol')
             rename_hs.append('symbol')
-        if len(select_hs) != 7:
+            required += 1
+        if required != 7:
             print("Error: data headers not correct, cannot load")
             return None
     df_02 = df_01[select_hs]
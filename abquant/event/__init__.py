@@ -1,2 +1,4 @@
 from .dispatcher import EventDispatcher, Event
 from .event import EventType
+from .shardeddispatcher import ShardedEventDispatcher
+from .timerwheel import TimerWheel, TimerHandle
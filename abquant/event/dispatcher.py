@@ -1,16 +1,19 @@
 
 from collections import defaultdict
 from queue import Empty, Queue
-from threading import Thread
+from threading import Event as ThreadingEvent, Lock, Thread
 import time
 import sys
 import traceback
-from typing import Any, Callable, List
+from typing import Any, Callable, Dict, List, Tuple
 from logging import ERROR
 
 from abquant.trader.object import LogData
+from abquant.monitor.latency import STAGE_ENQUEUE_TO_DEQUEUE, STAGE_EXCHANGE_TO_RECEIVE, STAGE_RECEIVE_TO_ENQUEUE
 
 from .event import EventType
+from .eventqueue import event_queue_factory
+from .timerwheel import TimerHandle, TimerWheel
 from abquant.trader.exception import CongestionException
 
 
@@ -28,54 +31,161 @@ HandlerType = Callable[[Event], None]
 
 class EventDispatcher:
 
-    def __init__(self, event_threshold: int = 100, interval: int = 1):
+    def __init__(self, event_threshold: int = 100, interval: int = 1, queue_mode: str = 'Fifo', batch_size: int = 256,
+                 timer_resolution: float = 0.01):
+        """
+        interval: seconds between EVENT_TIMER.
+        timer_resolution: tick of the timer wheel driving EVENT_TIMER and timers added by schedule, in seconds.
+
+        queue_mode:
+        Fifo, plain FIFO queue.
+        Conflate, newer tick/depth of a ab_symbol replaces the stale one still in queue, see ConflatingQueue.
+        Priority, order/trade events bypass queued market data, see PriorityEventQueue.
+        ConflatePriority, both of above.
+        Ring, lock-light queue drained up to batch_size events per wakeup, see RingBufferQueue.
+        """
         from ..ordermanager import OrderManager
         self._interval: int = interval
         self._event_threshold = event_threshold
-        self._queue: Queue = Queue()
+        self._queue_mode: str = queue_mode
+        self._queue: Queue = event_queue_factory(queue_mode)
+        self._batch_size: int = batch_size
         self._active: bool = False
         self._thread: Thread = Thread(target=self._run)
         self._timer: Thread = Thread(target=self._run_timer)
         self._handlers: defaultdict = defaultdict(list)
         self._general_handlers: List = []
+        # handlers of each event type followed by general handlers, rebuilt when any handler registered or unregistered.
+        self._dispatch_table: Dict[EventType, Tuple[HandlerType, ...]] = {}
+        self._general_table: Tuple[HandlerType, ...] = ()
+        # LatencyTracer, None for tracing disabled.
+        self._tracer = None
+        # advanced by self._timer with time.monotonic(), expired timers are put as EVENT_SCHEDULED.
+        self._timer_wheel: TimerWheel = TimerWheel(resolution=timer_resolution, now=time.monotonic())
+        self._timer_lock: Lock = Lock()
+        # set by schedule and stop to wake self._timer sleeping while the wheel is empty.
+        self._timer_wakeup: ThreadingEvent = ThreadingEvent()
+        self.register(EventType.EVENT_SCHEDULED, self._process_scheduled)
         self.order_manager = OrderManager(self)
 
         # TODO  warning. start before all handler registered may cause race condition in self._randlers
         self.start()
 
     def _run(self) -> None:
+        self._drain(self._queue)
+
+    def _drain(self, queue: Queue) -> None:
+        if hasattr(queue, "get_batch"):
+            self._drain_batch(queue)
+            return
+
         while self._active:
             try:
-                event = self._queue.get(block=True, timeout=1)
+                event = queue.get(block=True, timeout=1)
+                if self._tracer is not None:
+                    self._trace_dequeue(event)
                 self._process(event)
             except Empty:
                 pass
 
+    def _drain_batch(self, queue: Queue) -> None:
+        batch_size = self._batch_size
+        process = self._process
+        while self._active:
+            try:
+                events = queue.get_batch(batch_size, block=True, timeout=1)
+            except Empty:
+                continue
+            for event in events:
+                if self._tracer is not None:
+                    self._trace_dequeue(event)
+                process(event)
+
+    def _on_handler_exception(self, event: Event) -> None:
+        tb = traceback.format_exc()
+        exception_detail = "When dealing with event {}, exception occurred.\n{}".format(event, tb)
+        sys.stderr.write(exception_detail)
+        self.put(Event(type=EventType.EVENT_LOG, data=LogData(msg=exception_detail, level=ERROR, gateway_name="EventDispatcher")))
+
     def exception_wrap(self, func):
         def wrapper(event):
             try:
                 func(event)
             except Exception as e:
-                tb = traceback.format_exc()
-                exception_detail = "When dealing with event {}, exception occurred.\n{}".format(event, tb)
-                sys.stderr.write(exception_detail)
-                self.put(Event(type=EventType.EVENT_LOG, data=LogData(msg=exception_detail, level=ERROR, gateway_name="EventDispatcher")))
+                self._on_handler_exception(event)
         return wrapper
 
-
     def _process(self, event: Event) -> None:
-        if event.type in self._handlers:
-            [self.exception_wrap(handler)(event) for handler in self._handlers[event.type]]
+        for handler in self._dispatch_table.get(event.type, self._general_table):
+            try:
+                handler(event)
+            except Exception:
+                self._on_handler_exception(event)
 
-        if self._general_handlers:
-            [self.exception_wrap(handler)(event) for handler in self._general_handlers]
+    def _compile_handlers(self) -> None:
+        general_table = tuple(self._general_handlers)
+        self._dispatch_table = {
+            type: tuple(handlers) + general_table for type, handlers in self._handlers.items()
+        }
+        self._general_table = general_table
 
     def _run_timer(self) -> None:
+        # sleep to absolute deadlines, so EVENT_TIMER does not drift by the time spent in put and congestion check.
+        # ticks every timer_resolution only while timers are pending, otherwise sleeps until the next EVENT_TIMER
+        # or until woken up by schedule.
+        resolution = self._timer_wheel.resolution
+        next_tick = time.monotonic()
+        next_timer_event = next_tick + self._interval
         while self._active:
-            time.sleep(self._interval)
-            event = Event(type=EventType.EVENT_TIMER, data=self._interval)
-            self.put(event)
-            self.check_event_congestion()
+            with self._timer_lock:
+                idle = not len(self._timer_wheel)
+                if idle:
+                    self._timer_wakeup.clear()
+            if idle:
+                self._timer_wakeup.wait(max(next_timer_event - time.monotonic(), 0))
+                next_tick = time.monotonic()
+            else:
+                next_tick += resolution
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            now = time.monotonic()
+            if now - next_tick > resolution:
+                # fell behind, e.g. machine suspended, do not catch up tick by tick.
+                next_tick = now
+
+            with self._timer_lock:
+                expired = self._timer_wheel.advance(now)
+            for handle in expired:
+                self.put(Event(type=EventType.EVENT_SCHEDULED, data=handle))
+
+            if now >= next_timer_event:
+                event = Event(type=EventType.EVENT_TIMER, data=self._interval)
+                self.put(event)
+                self.check_event_congestion()
+                next_timer_event += self._interval
+                if next_timer_event <= now:
+                    next_timer_event = now + self._interval
+
+    def _process_scheduled(self, event: Event) -> None:
+        handle: TimerHandle = event.data
+        # cancelled after expired but before processed.
+        if not handle.cancelled:
+            handle.callback()
+
+    def schedule(self, callback: Callable[[], None], delay: float, interval: float = 0) -> TimerHandle:
+        """
+        call callback in the dispatcher thread after delay seconds, then every interval seconds if interval > 0.
+        precision is bounded by timer_resolution and the queue latency. thread-safe.
+        return TimerHandle, call its cancel() or self.cancel_timer to cancel.
+        """
+        with self._timer_lock:
+            handle = self._timer_wheel.add(time.monotonic() + delay, callback, interval)
+        self._timer_wakeup.set()
+        return handle
+
+    def cancel_timer(self, handle: TimerHandle) -> None:
+        handle.cancel()
 
     def start(self) -> None:
         self._active = True
@@ -84,16 +194,48 @@ class EventDispatcher:
 
     def stop(self) -> None:
         self._active = False
+        self._timer_wakeup.set()
         self._timer.join()
         self._thread.join()
 
     def put(self, event: Event) -> None:
+        if self._tracer is not None:
+            self._trace_enqueue(event)
         self._queue.put(event)
 
+    def set_tracer(self, tracer) -> None:
+        """
+        tracer: abquant.monitor.latency.LatencyTracer, None to disable tracing.
+        """
+        self._tracer = tracer
+
+    def _trace_enqueue(self, event: Event) -> None:
+        now = time.time()
+        event.enqueue_time = now
+        data = event.data
+        localtime = getattr(data, "localtime", None)
+        if localtime is None:
+            return
+        received = localtime.timestamp()
+        source = getattr(data, "gateway_name", None) or "-"
+        kind = event.type.name
+        exchange_time = getattr(data, "datetime", None)
+        if exchange_time is not None:
+            self._tracer.record(STAGE_EXCHANGE_TO_RECEIVE, source, kind, received - exchange_time.timestamp())
+        self._tracer.record(STAGE_RECEIVE_TO_ENQUEUE, source, kind, now - received)
+
+    def _trace_dequeue(self, event: Event) -> None:
+        enqueue_time = getattr(event, "enqueue_time", None)
+        if enqueue_time is None:
+            return
+        source = getattr(event.data, "gateway_name", None) or "-"
+        self._tracer.record(STAGE_ENQUEUE_TO_DEQUEUE, source, event.type.name, time.time() - enqueue_time)
+
     def register(self, type: str, handler: HandlerType) -> None:
         handler_list = self._handlers[type]
         if handler not in handler_list:
             handler_list.append(handler)
+        self._compile_handlers()
 
     def unregister(self, type: str, handler: HandlerType) -> None:
         handler_list = self._handlers[type]
@@ -103,14 +245,40 @@ class EventDispatcher:
 
         if not handler_list:
             self._handlers.pop(type)
+        self._compile_handlers()
 
     def register_general(self, handler: HandlerType) -> None:
         if handler not in self._general_handlers:
             self._general_handlers.append(handler)
+        self._compile_handlers()
 
     def unregister_general(self, handler: HandlerType) -> None:
         if handler in self._general_handlers:
             self._general_handlers.remove(handler)
+        self._compile_handlers()
+
+    def conflation_stats(self) -> Dict[str, int]:
+        """
+        number of market data events conflated per ab_symbol, empty unless queue_mode is Conflate.
+        """
+        if hasattr(self._queue, "conflation_stats"):
+            return self._queue.conflation_stats()
+        return {}
+
+    def queue_stats(self) -> Dict[str, Dict]:
+        """
+        per priority queue depth and wait time, empty unless queue_mode is Priority or ConflatePriority.
+        """
+        if hasattr(self._queue, "queue_stats"):
+            return self._queue.queue_stats()
+        return {}
+
+    def pin_symbols(self, ab_symbols: List[str]) -> None:
+        """
+        hint that events of those ab_symbols should be processed by the same thread, in order.
+        single queue dispatcher processes everything in one thread, so nothing to do here.
+        """
+        pass
 
     def check_event_congestion(self) -> bool:
         congested_event = self._queue.qsize()
@@ -16,3 +16,4 @@ class EventType(IntEnum):
     EVENT_EXCEPTION = auto()
     EVENT_GATEWAY = auto()
     EVENT_RAW = auto()
+    EVENT_SCHEDULED = auto()
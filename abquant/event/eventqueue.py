@@ -0,0 +1,347 @@
+from collections import defaultdict, deque
+from enum import IntEnum
+from queue import Empty, Queue
+from threading import Condition, Lock
+from time import monotonic
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from .event import EventType
+
+
+def compact(entries: Deque[List]) -> Deque[List]:
+    """
+    entries without the ones dropped by conflation.
+    """
+    return deque(entry for entry in entries if entry[0] is not None)
+
+
+class ConflatingQueue:
+    """
+    Queue.Queue compatible FIFO queue, with latest-value conflation of market data.
+
+    A market data event replaces the same-keyed one which is still waiting in the queue,
+    the stale one is dropped and the new one is enqueued at the tail, so that the order of what is delivered is kept.
+    Dropped entries are left in place and skipped by get, the queue is compacted once they outnumber the live ones,
+    so memory is bounded by the live events however long the backlog of a symbol is.
+    Keys are:
+    EVENT_TICK: (type, ab_symbol), only ticks without trade information, ticks carrying trade_price/trade_volume are never dropped.
+    EVENT_DEPTH: (type, ab_symbol, direction, price), depth update is the newest volume of a price level.
+    Other events, (order, trade, position, account, transaction...) are never dropped nor reordered.
+    """
+
+    def __init__(self):
+        # entry: [event, key], event set to None when conflated.
+        self._entries: Deque[List] = deque()
+        self._latest: Dict[Hashable, List] = {}
+        self._size: int = 0
+        self._dropped: int = 0
+        self._mutex: Lock = Lock()
+        self._not_empty: Condition = Condition(self._mutex)
+        self.conflated_counts: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def conflation_key(event: Any) -> Optional[Hashable]:
+        if event.type == EventType.EVENT_TICK:
+            tick = event.data
+            if tick.trade_volume:
+                return None
+            return (event.type, tick.ab_symbol)
+        elif event.type == EventType.EVENT_DEPTH:
+            depth = event.data
+            return (event.type, depth.ab_symbol, depth.direction, depth.price)
+        return None
+
+    def put(self, event: Any, block: bool = True, timeout: float = None) -> None:
+        key = self.conflation_key(event)
+        entry = [event, key]
+        with self._not_empty:
+            if key is not None:
+                stale = self._latest.get(key, None)
+                if stale is not None:
+                    stale[0] = None
+                    self._size -= 1
+                    self._dropped += 1
+                    self.conflated_counts[event.data.ab_symbol] += 1
+                self._latest[key] = entry
+            self._entries.append(entry)
+            self._size += 1
+            if self._dropped > self._size:
+                self._entries = compact(self._entries)
+                self._dropped = 0
+            self._not_empty.notify()
+
+    def put_nowait(self, event: Any) -> None:
+        self.put(event, block=False)
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        with self._not_empty:
+            if not block:
+                if not self._size:
+                    raise Empty
+            elif timeout is None:
+                while not self._size:
+                    self._not_empty.wait()
+            else:
+                endtime = monotonic() + timeout
+                while not self._size:
+                    remaining = endtime - monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self._not_empty.wait(remaining)
+
+            entry = self._entries.popleft()
+            while entry[0] is None:
+                self._dropped -= 1
+                entry = self._entries.popleft()
+            event, key = entry
+            if key is not None and self._latest.get(key, None) is entry:
+                self._latest.pop(key)
+            self._size -= 1
+            return event
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def conflation_stats(self) -> Dict[str, int]:
+        with self._mutex:
+            return dict(self.conflated_counts)
+
+
+class EventPriority(IntEnum):
+    """
+    smaller value is dequeued first.
+    """
+    EXECUTION = 0
+    CONTROL = 1
+    MARKET = 2
+    BACKGROUND = 3
+
+
+EVENT_PRIORITIES: Dict[EventType, EventPriority] = {
+    EventType.EVENT_ORDER: EventPriority.EXECUTION,
+    EventType.EVENT_TRADE: EventPriority.EXECUTION,
+    EventType.EVENT_POSITION: EventPriority.EXECUTION,
+    EventType.EVENT_ACCOUNT: EventPriority.EXECUTION,
+    EventType.EVENT_TIMER: EventPriority.CONTROL,
+    EventType.EVENT_EXCEPTION: EventPriority.CONTROL,
+    EventType.EVENT_CONTRACT: EventPriority.CONTROL,
+    EventType.EVENT_GATEWAY: EventPriority.CONTROL,
+    EventType.EVENT_SCHEDULED: EventPriority.CONTROL,
+    EventType.EVENT_TICK: EventPriority.MARKET,
+    EventType.EVENT_DEPTH: EventPriority.MARKET,
+    EventType.EVENT_TRANSACTION: EventPriority.MARKET,
+    EventType.EVENT_ENTRUST: EventPriority.MARKET,
+    EventType.EVENT_LOG: EventPriority.BACKGROUND,
+    EventType.EVENT_RAW: EventPriority.BACKGROUND,
+}
+
+
+class PriorityEventQueue:
+    """
+    Queue.Queue compatible queue with one FIFO lane per EventPriority.
+    get always takes the oldest event of the highest non-empty priority, so that
+    private execution events (order, trade, position, account) bypass queued market data,
+    then timer/exception/contract/gateway, then market data, then log and raw events.
+    Events within the same priority keep their order.
+
+    Notice: lower priorities can be starved under sustained load of higher ones, logs first.
+
+    conflate: market data lane conflates as ConflatingQueue does.
+    """
+
+    def __init__(self, conflate: bool = False):
+        self._conflate: bool = conflate
+        # entry: [event, key, enqueue monotonic time], event set to None when conflated.
+        self._lanes: List[Deque[List]] = [deque() for _ in EventPriority]
+        self._sizes: List[int] = [0] * len(EventPriority)
+        self._size: int = 0
+        self._dropped: List[int] = [0] * len(EventPriority)
+        self._latest: Dict[Hashable, List] = {}
+        self._mutex: Lock = Lock()
+        self._not_empty: Condition = Condition(self._mutex)
+        self.conflated_counts: Dict[str, int] = defaultdict(int)
+
+        self._max_sizes: List[int] = [0] * len(EventPriority)
+        self._get_counts: List[int] = [0] * len(EventPriority)
+        self._total_waits: List[float] = [0.0] * len(EventPriority)
+        self._max_waits: List[float] = [0.0] * len(EventPriority)
+
+    def put(self, event: Any, block: bool = True, timeout: float = None) -> None:
+        priority = EVENT_PRIORITIES.get(event.type, EventPriority.BACKGROUND)
+        key = ConflatingQueue.conflation_key(event) if self._conflate else None
+        entry = [event, key, monotonic()]
+        with self._not_empty:
+            if key is not None:
+                stale = self._latest.get(key, None)
+                if stale is not None:
+                    stale[0] = None
+                    self._sizes[priority] -= 1
+                    self._size -= 1
+                    self._dropped[priority] += 1
+                    self.conflated_counts[event.data.ab_symbol] += 1
+                self._latest[key] = entry
+            self._lanes[priority].append(entry)
+            self._sizes[priority] += 1
+            self._size += 1
+            if self._dropped[priority] > self._sizes[priority]:
+                self._lanes[priority] = compact(self._lanes[priority])
+                self._dropped[priority] = 0
+            if self._sizes[priority] > self._max_sizes[priority]:
+                self._max_sizes[priority] = self._sizes[priority]
+            self._not_empty.notify()
+
+    def put_nowait(self, event: Any) -> None:
+        self.put(event, block=False)
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        with self._not_empty:
+            if not block:
+                if not self._size:
+                    raise Empty
+            elif timeout is None:
+                while not self._size:
+                    self._not_empty.wait()
+            else:
+                endtime = monotonic() + timeout
+                while not self._size:
+                    remaining = endtime - monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self._not_empty.wait(remaining)
+
+            for priority, size in enumerate(self._sizes):
+                if size:
+                    break
+            lane = self._lanes[priority]
+            entry = lane.popleft()
+            while entry[0] is None:
+                self._dropped[priority] -= 1
+                entry = lane.popleft()
+            event, key, enqueue_time = entry
+            if key is not None and self._latest.get(key, None) is entry:
+                self._latest.pop(key)
+            self._sizes[priority] -= 1
+            self._size -= 1
+
+            wait = monotonic() - enqueue_time
+            self._get_counts[priority] += 1
+            self._total_waits[priority] += wait
+            if wait > self._max_waits[priority]:
+                self._max_waits[priority] = wait
+            return event
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def conflation_stats(self) -> Dict[str, int]:
+        with self._mutex:
+            return dict(self.conflated_counts)
+
+    def queue_stats(self) -> Dict[str, Dict]:
+        """
+        per priority: current/max queue depth, number of events dequeued, mean/max wait time in seconds.
+        """
+        with self._mutex:
+            stats = {}
+            for priority in EventPriority:
+                count = self._get_counts[priority]
+                stats[priority.name] = {
+                    "qsize": self._sizes[priority],
+                    "max_qsize": self._max_sizes[priority],
+                    "count": count,
+                    "mean_wait": self._total_waits[priority] / count if count else 0.0,
+                    "max_wait": self._max_waits[priority],
+                }
+            return stats
+
+
+class RingBufferQueue:
+    """
+    lock-light multi-producer single-consumer queue for EventDispatcher.
+
+    put is a lock free deque.append, the condition variable is only touched when the consumer is parked,
+    get_batch drains up to max_items events per wakeup, so the dispatcher pays the wakeup and locking cost once per batch
+    instead of once per event as Queue.get does.
+    """
+
+    def __init__(self):
+        self._events: Deque[Any] = deque()
+        self._mutex: Lock = Lock()
+        self._not_empty: Condition = Condition(self._mutex)
+        self._parked: bool = False
+
+    def put(self, event: Any, block: bool = True, timeout: float = None) -> None:
+        self._events.append(event)
+        if self._parked:
+            with self._not_empty:
+                self._not_empty.notify()
+
+    def put_nowait(self, event: Any) -> None:
+        self.put(event, block=False)
+
+    def _wait(self, timeout: Optional[float]) -> None:
+        with self._not_empty:
+            # parked flag is set before checking again, so a producer appending after the check always notifies.
+            self._parked = True
+            try:
+                if not self._events:
+                    self._not_empty.wait(timeout)
+            finally:
+                self._parked = False
+
+    def get_batch(self, max_items: int, block: bool = True, timeout: float = None) -> List[Any]:
+        events = self._events
+        if not events:
+            if not block:
+                raise Empty
+            elif timeout is None:
+                while not events:
+                    self._wait(None)
+            else:
+                endtime = monotonic() + timeout
+                while not events:
+                    remaining = endtime - monotonic()
+                    if remaining <= 0.0:
+                        raise Empty
+                    self._wait(remaining)
+        popleft = events.popleft
+        return [popleft() for _ in range(min(len(events), max_items))]
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        return self.get_batch(1, block, timeout)[0]
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return len(self._events)
+
+    def empty(self) -> bool:
+        return not self._events
+
+
+def event_queue_factory(mode: str):
+    if mode == 'Fifo':
+        return Queue()
+    elif mode == 'Conflate':
+        return ConflatingQueue()
+    elif mode == 'Priority':
+        return PriorityEventQueue()
+    elif mode == 'ConflatePriority':
+        return PriorityEventQueue(conflate=True)
+    elif mode == 'Ring':
+        return RingBufferQueue()
+    else:
+        raise ValueError("event queue mode {} is not supported, use one of Fifo, Conflate, Priority, ConflatePriority, Ring.".format(mode))
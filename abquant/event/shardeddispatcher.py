@@ -0,0 +1,171 @@
+from collections import defaultdict
+from queue import Queue
+from threading import Lock, Thread
+from typing import Dict, List
+
+from .dispatcher import Event, EventDispatcher
+from .event import EventType
+from .eventqueue import event_queue_factory
+from abquant.trader.exception import CongestionException
+
+
+class ShardedEventDispatcher(EventDispatcher):
+    """
+    EventDispatcher with several worker lanes, each of them is a queue drained by its own thread.
+
+    Events carrying an ab_symbol (tick, depth, transaction, entrust, order, trade, position, contract)
+    are routed by ab_symbol, so events of one symbol always land in the same lane and are processed in order.
+    Events without ab_symbol (timer, log, exception, account, gateway, raw) go to lane 0.
+
+    Notice:
+    1. handlers are called from several threads. Strategies subscribing more than one ab_symbol
+    should have their symbols pinned together (LiveStrategyRunner.add_strategy does it),
+    otherwise on_tick of different symbols may run concurrently.
+    2. on_timer/on_exception and callbacks of schedule are processed by lane 0, which may run concurrently with market data of other lanes.
+    3. pure python handlers are still bounded by GIL, sharding pays off when handlers do IO or release GIL (numpy, talib).
+    """
+
+    def __init__(self, event_threshold: int = 100, interval: int = 1, lanes: int = 4, queue_mode: str = 'Fifo', batch_size: int = 256,
+                 timer_resolution: float = 0.01):
+        if lanes < 1:
+            raise ValueError("lanes of ShardedEventDispatcher must be at least 1, got {}".format(lanes))
+        self._lanes: List[Queue] = [event_queue_factory(queue_mode) for _ in range(lanes)]
+        self._lane_threads: List[Thread] = []
+        self._symbol_lanes: Dict[str, int] = {}
+        self._lane_symbols: Dict[int, List[str]] = defaultdict(list)
+        self._next_lane: int = 0
+        self._route_lock: Lock = Lock()
+        self._congestion_counts: List[int] = [0] * lanes
+
+        super(ShardedEventDispatcher, self).__init__(event_threshold, interval, queue_mode, batch_size, timer_resolution)
+
+    @property
+    def lanes(self) -> int:
+        return len(self._lanes)
+
+    def start(self) -> None:
+        # lane 0 is the queue drained by EventDispatcher._thread
+        self._queue = self._lanes[0]
+        self._lane_threads = [
+            Thread(target=self._drain, args=(lane,), name="EventLane-{}".format(i))
+            for i, lane in enumerate(self._lanes[1:], start=1)
+        ]
+        super(ShardedEventDispatcher, self).start()
+        for thread in self._lane_threads:
+            thread.start()
+
+    def stop(self) -> None:
+        super(ShardedEventDispatcher, self).stop()
+        for thread in self._lane_threads:
+            thread.join()
+
+    def put(self, event: Event) -> None:
+        if self._tracer is not None:
+            self._trace_enqueue(event)
+        ab_symbol = getattr(event.data, "ab_symbol", None)
+        if ab_symbol is None:
+            self._lanes[0].put(event)
+            return
+
+        lane = self._symbol_lanes.get(ab_symbol, None)
+        if lane is None:
+            lane = self._assign_lane(ab_symbol)
+        self._lanes[lane].put(event)
+
+    def _assign_lane(self, ab_symbol: str) -> int:
+        with self._route_lock:
+            lane = self._symbol_lanes.get(ab_symbol, None)
+            if lane is None:
+                lane = self._next_lane
+                self._next_lane = (self._next_lane + 1) % len(self._lanes)
+                self._symbol_lanes[ab_symbol] = lane
+                self._lane_symbols[lane].append(ab_symbol)
+            return lane
+
+    def lane_of(self, ab_symbol: str) -> int:
+        lane = self._symbol_lanes.get(ab_symbol, None)
+        if lane is None:
+            lane = self._assign_lane(ab_symbol)
+        return lane
+
+    def pin_symbols(self, ab_symbols: List[str]) -> None:
+        """
+        route all ab_symbols to the same lane.
+        symbols already routed are moved to the lane of the first routed one,
+        call it before market data of those symbols subscribed, otherwise events already queued in the old lane may be processed out of order.
+        """
+        if not ab_symbols:
+            return
+        with self._route_lock:
+            routed = [self._symbol_lanes[ab_symbol] for ab_symbol in ab_symbols if ab_symbol in self._symbol_lanes]
+            if routed:
+                lane = routed[0]
+            else:
+                lane = self._next_lane
+                self._next_lane = (self._next_lane + 1) % len(self._lanes)
+
+            for ab_symbol in ab_symbols:
+                old_lane = self._symbol_lanes.get(ab_symbol, None)
+                if old_lane == lane:
+                    continue
+                if old_lane is not None:
+                    self._lane_symbols[old_lane].remove(ab_symbol)
+                self._symbol_lanes[ab_symbol] = lane
+                self._lane_symbols[lane].append(ab_symbol)
+
+    def check_event_congestion(self) -> bool:
+        congested = False
+        for i, lane in enumerate(self._lanes):
+            congested_event = lane.qsize()
+            if congested_event > self._event_threshold:
+                congested = True
+                self._congestion_counts[i] += 1
+                self._lanes[0].put(Event(type=EventType.EVENT_EXCEPTION, data=CongestionException(
+                    threshold=self._event_threshold, congested_event=congested_event)))
+        return congested
+
+    def conflation_stats(self) -> Dict[str, int]:
+        stats = defaultdict(int)
+        for lane in self._lanes:
+            if hasattr(lane, "conflation_stats"):
+                for ab_symbol, count in lane.conflation_stats().items():
+                    stats[ab_symbol] += count
+        return dict(stats)
+
+    def queue_stats(self) -> Dict[str, Dict]:
+        """
+        per priority stats merged over all lanes, see lane_stats for stats of each lane.
+        """
+        merged = {}
+        for lane in self._lanes:
+            if not hasattr(lane, "queue_stats"):
+                continue
+            for name, stats in lane.queue_stats().items():
+                total = merged.get(name, None)
+                if total is None:
+                    merged[name] = dict(stats)
+                    continue
+                count = total["count"] + stats["count"]
+                if count:
+                    total["mean_wait"] = (total["mean_wait"] * total["count"] + stats["mean_wait"] * stats["count"]) / count
+                total["count"] = count
+                total["qsize"] += stats["qsize"]
+                total["max_qsize"] = max(total["max_qsize"], stats["max_qsize"])
+                total["max_wait"] = max(total["max_wait"], stats["max_wait"])
+        return merged
+
+    def lane_stats(self) -> List[Dict]:
+        """
+        runtime statistics of every lane: queue size, times of congestion detected, ab_symbols routed to it
+        and per priority stats if queue_mode is Priority or ConflatePriority.
+        """
+        return [
+            {
+                "lane": i,
+                "qsize": lane.qsize(),
+                "congestion_count": self._congestion_counts[i],
+                "ab_symbols": list(self._lane_symbols[i]),
+                "queue_stats": lane.queue_stats() if hasattr(lane, "queue_stats") else {},
+            }
+            for i, lane in enumerate(self._lanes)
+        ]
@@ -0,0 +1,116 @@
+from multiprocessing import shared_memory
+import struct
+from typing import Optional, Tuple
+
+
+HEADER = struct.Struct("<QII")
+SLOT_HEADER = struct.Struct("<QI")
+SEQ = struct.Struct("<Q")
+# header is padded to a cache line.
+HEADER_SIZE = 64
+
+
+class SharedMemoryRing:
+    """
+    single producer, multiple consumers broadcast ring buffer in shared memory.
+    every consumer has its own cursor, a consumer too slow to keep up is overrun and skips the oldest messages
+    instead of blocking the producer.
+
+    layout: header (published sequence, slots, slot_size), then slots of (sequence + 1, length, payload).
+    sequence of a slot is set to 0 while written, consumers validate it before and after copying the payload (seqlock),
+    a mismatch means the slot was overwritten.
+
+    message is (key, payload), key is a short str (ab_symbol) readable without decoding the payload,
+    so that consumers may filter messages cheaply.
+    """
+
+    def __init__(self, name: str = None, slots: int = 8192, slot_size: int = 2048, create: bool = True):
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * (SLOT_HEADER.size + slot_size))
+            HEADER.pack_into(self.shm.buf, 0, 0, slots, slot_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            _, slots, slot_size = HEADER.unpack_from(self.shm.buf, 0)
+        self.name: str = self.shm.name
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        self.stride: int = SLOT_HEADER.size + slot_size
+        self.owner: bool = create
+        self._sequence: int = SEQ.unpack_from(self.shm.buf, 0)[0]
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedMemoryRing":
+        return cls(name=name, create=False)
+
+    @property
+    def max_message_size(self) -> int:
+        return self.slot_size
+
+    def put(self, key: str, payload: bytes) -> None:
+        """
+        only one process (thread) may put.
+        """
+        raw_key = key.encode("utf8")
+        length = 1 + len(raw_key) + len(payload)
+        if length > self.slot_size or len(raw_key) > 255:
+            raise ValueError("message of {} is {} bytes, larger than slot_size {} of the ring.".format(key, length, self.slot_size))
+
+        buf = self.shm.buf
+        sequence = self._sequence
+        offset = HEADER_SIZE + (sequence % self.slots) * self.stride
+        SEQ.pack_into(buf, offset, 0)
+        start = offset + SLOT_HEADER.size
+        buf[start] = len(raw_key)
+        buf[start + 1: start + 1 + len(raw_key)] = raw_key
+        buf[start + 1 + len(raw_key): start + length] = payload
+        SLOT_HEADER.pack_into(buf, offset, sequence + 1, length)
+        self._sequence = sequence + 1
+        SEQ.pack_into(buf, 0, self._sequence)
+
+    def reader(self) -> "SharedMemoryRingReader":
+        return SharedMemoryRingReader(self)
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedMemoryRingReader:
+    """
+    cursor of a consumer, starts from messages put after it is created.
+    """
+
+    def __init__(self, ring: SharedMemoryRing):
+        self.ring: SharedMemoryRing = ring
+        self.cursor: int = SEQ.unpack_from(ring.shm.buf, 0)[0]
+        # number of messages overrun
+        self.lost: int = 0
+
+    def get(self) -> Optional[Tuple[str, memoryview]]:
+        """
+        next (key, payload), None if nothing new. payload is a copy owned by the caller.
+        """
+        ring = self.ring
+        buf = ring.shm.buf
+        while True:
+            published = SEQ.unpack_from(buf, 0)[0]
+            cursor = self.cursor
+            if cursor >= published:
+                return None
+            if published - cursor > ring.slots:
+                self.lost += published - ring.slots - cursor
+                cursor = self.cursor = published - ring.slots
+
+            offset = HEADER_SIZE + (cursor % ring.slots) * ring.stride
+            sequence, length = SLOT_HEADER.unpack_from(buf, offset)
+            if sequence == cursor + 1 and length <= ring.slot_size:
+                start = offset + SLOT_HEADER.size
+                message = bytes(buf[start: start + length])
+                if SEQ.unpack_from(buf, offset)[0] == cursor + 1:
+                    self.cursor = cursor + 1
+                    key_length = message[0]
+                    return message[1: 1 + key_length].decode("utf8"), memoryview(message)[1 + key_length:]
+            # overwritten while reading, skip it.
+            self.lost += 1
+            self.cursor = cursor + 1
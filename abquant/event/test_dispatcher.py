@@ -0,0 +1,226 @@
+from datetime import datetime
+from queue import Empty
+from threading import Event as ThreadingEvent, current_thread
+import time
+
+import pytest
+
+from abquant.event import Event, EventDispatcher, EventType, ShardedEventDispatcher
+from abquant.event.eventqueue import RingBufferQueue
+from abquant.trader.common import Exchange
+from abquant.trader.msg import OrderData, TickData
+from abquant.trader.object import LogData
+
+
+NOW = datetime(2022, 1, 1)
+
+
+def tick(symbol: str, price: float) -> Event:
+    return Event(EventType.EVENT_TICK, TickData(
+        gateway_name="TEST", symbol=symbol, exchange=Exchange.BINANCE, datetime=NOW, trade_price=price))
+
+
+def order(orderid: str) -> Event:
+    return Event(EventType.EVENT_ORDER, OrderData(
+        gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=orderid))
+
+
+def wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def stopped():
+    """
+    dispatcher with its threads stopped, events processed synchronously by the test.
+    """
+    event_dispatcher = EventDispatcher()
+    event_dispatcher.stop()
+    return event_dispatcher
+
+
+def test_dispatch_table_rebuilt_on_register_and_unregister(stopped):
+    calls = []
+
+    def on_tick(event):
+        calls.append(("tick", event.type))
+
+    def on_any(event):
+        calls.append(("any", event.type))
+
+    stopped.register(EventType.EVENT_TICK, on_tick)
+    stopped.register(EventType.EVENT_TICK, on_tick)
+    assert stopped._dispatch_table[EventType.EVENT_TICK][-1] is on_tick
+    assert stopped._dispatch_table[EventType.EVENT_TICK].count(on_tick) == 1
+
+    stopped.register_general(on_any)
+    assert stopped._dispatch_table[EventType.EVENT_TICK][-2:] == (on_tick, on_any)
+    assert stopped._general_table == (on_any,)
+    stopped._process(tick("BTCUSDT", 1))
+    stopped._process(Event("eCustom."))
+    assert calls == [("tick", EventType.EVENT_TICK), ("any", EventType.EVENT_TICK), ("any", "eCustom.")]
+
+    calls.clear()
+    stopped.unregister(EventType.EVENT_TICK, on_tick)
+    stopped.unregister_general(on_any)
+    stopped._process(tick("BTCUSDT", 2))
+    assert calls == []
+    assert on_tick not in stopped._dispatch_table[EventType.EVENT_TICK]
+
+    stopped.register(EventType.EVENT_LOG, on_tick)
+    stopped.unregister(EventType.EVENT_LOG, on_tick)
+    assert EventType.EVENT_LOG not in stopped._dispatch_table
+
+
+def test_handler_exception_does_not_stop_others(stopped):
+    calls = []
+
+    def failing(event):
+        raise RuntimeError("handler failed")
+
+    stopped.register(EventType.EVENT_TIMER, failing)
+    stopped.register(EventType.EVENT_TIMER, calls.append)
+    timer = Event(EventType.EVENT_TIMER, 1)
+    stopped._process(timer)
+    assert calls == [timer]
+    log = stopped._queue.get_nowait()
+    assert log.type == EventType.EVENT_LOG and "handler failed" in log.data.msg
+
+
+class RecordingQueue(RingBufferQueue):
+    """
+    batches handed out are recorded, the dispatcher is stopped once drained.
+    """
+
+    def __init__(self, event_dispatcher: EventDispatcher):
+        super().__init__()
+        self.event_dispatcher = event_dispatcher
+        self.batches = []
+
+    def get_batch(self, max_items: int, block: bool = True, timeout: float = None):
+        try:
+            batch = super().get_batch(max_items, block=False)
+        except Empty:
+            self.event_dispatcher._active = False
+            raise
+        self.batches.append(len(batch))
+        return batch
+
+
+def test_drain_batch(stopped):
+    processed = []
+    stopped.register(EventType.EVENT_TICK, lambda event: processed.append(event.data.trade_price))
+    stopped._batch_size = 4
+    queue = RecordingQueue(stopped)
+    for i in range(10):
+        queue.put(tick("BTCUSDT", i + 1))
+
+    stopped._active = True
+    stopped._drain(queue)
+    assert queue.batches == [4, 4, 2]
+    assert processed == list(range(1, 11))
+
+
+def test_ring_dispatcher_keeps_order():
+    event_dispatcher = EventDispatcher(queue_mode="Ring", batch_size=16)
+    processed = []
+    try:
+        event_dispatcher.register(EventType.EVENT_TICK, lambda event: processed.append(event.data.trade_price))
+        for i in range(1000):
+            event_dispatcher.put(tick("BTCUSDT", i + 1))
+        wait_until(lambda: len(processed) == 1000)
+    finally:
+        event_dispatcher.stop()
+    assert processed == list(range(1, 1001))
+
+
+def test_timer_thread_idle_while_no_timer_scheduled():
+    event_dispatcher = EventDispatcher(interval=1)
+    wheel = event_dispatcher._timer_wheel
+    advance = wheel.advance
+    advanced = []
+    wheel.advance = lambda now: advanced.append(now) or advance(now)
+    timer_events = []
+    fired = ThreadingEvent()
+    try:
+        event_dispatcher.register(EventType.EVENT_TIMER, timer_events.append)
+        time.sleep(0.5)
+        # asleep until the EVENT_TIMER 1 second after start, instead of a wakeup every 10ms.
+        assert len(advanced) <= 1
+
+        scheduled = time.monotonic()
+        event_dispatcher.schedule(fired.set, 0.05)
+        assert fired.wait(1)
+        assert time.monotonic() - scheduled < 0.5
+        wait_until(lambda: timer_events, timeout=2)
+    finally:
+        event_dispatcher.stop()
+
+
+@pytest.mark.parametrize("queue_mode", ["Priority", "ConflatePriority"])
+def test_orders_bypass_queued_ticks(queue_mode):
+    event_dispatcher = EventDispatcher(queue_mode=queue_mode)
+    blocked = ThreadingEvent()
+    processed = []
+
+    def on_tick(event):
+        if not processed:
+            blocked.wait(5)
+        processed.append(event.data.trade_price)
+
+    try:
+        event_dispatcher.register(EventType.EVENT_TICK, on_tick)
+        event_dispatcher.register(EventType.EVENT_ORDER, lambda event: processed.append(event.data.orderid))
+        event_dispatcher.put(tick("BTCUSDT", 1))
+        wait_until(lambda: event_dispatcher._queue.empty())
+        # the dispatcher thread is busy with the first tick.
+        for event in (tick("ETHUSDT", 2), tick("BNBUSDT", 3), order("a"), tick("SOLUSDT", 4), order("b")):
+            event_dispatcher.put(event)
+        blocked.set()
+        wait_until(lambda: len(processed) == 6)
+    finally:
+        event_dispatcher.stop()
+    assert processed == [1, "a", "b", 2, 3, 4]
+
+
+@pytest.mark.parametrize("queue_mode", ["Fifo", "Ring"])
+def test_sharded_keeps_order_of_each_symbol(queue_mode):
+    event_dispatcher = ShardedEventDispatcher(lanes=3, queue_mode=queue_mode)
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT"]
+    event_dispatcher.pin_symbols(["SOLUSDT.BINANCE", "XRPUSDT.BINANCE"])
+    ticks = []
+    logs = []
+
+    def on_tick(event):
+        ticks.append((current_thread().name, event.data.ab_symbol, event.data.trade_price))
+
+    def on_log(event):
+        logs.append((current_thread().name, event.data.msg))
+
+    try:
+        event_dispatcher.register(EventType.EVENT_TICK, on_tick)
+        event_dispatcher.register(EventType.EVENT_LOG, on_log)
+        for i in range(2000):
+            event_dispatcher.put(tick(symbols[i % len(symbols)], i))
+            if i % 100 == 0:
+                event_dispatcher.put(Event(EventType.EVENT_LOG, LogData(msg=str(i), gateway_name="TEST")))
+        wait_until(lambda: len(ticks) == 2000 and len(logs) == 20)
+        lane_threads = [event_dispatcher._thread.name] + [thread.name for thread in event_dispatcher._lane_threads]
+        lanes = {symbol: event_dispatcher.lane_of(symbol + ".BINANCE") for symbol in symbols}
+    finally:
+        event_dispatcher.stop()
+
+    assert len(set(lanes.values())) == 3
+    assert lanes["SOLUSDT"] == lanes["XRPUSDT"]
+    for n, symbol in enumerate(symbols):
+        handled = [(thread, price) for thread, ab_symbol, price in ticks if ab_symbol == symbol + ".BINANCE"]
+        # one lane per symbol, in order of put.
+        assert {thread for thread, _ in handled} == {lane_threads[lanes[symbol]]}
+        assert [price for _, price in handled] == list(range(n, 2000, len(symbols)))
+    # events without ab_symbol go to lane 0.
+    assert [log for _, log in logs] == [str(i) for i in range(0, 2000, 100)]
+    assert {thread for thread, _ in logs} == {lane_threads[0]}
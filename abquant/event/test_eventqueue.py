@@ -0,0 +1,172 @@
+from datetime import datetime
+from queue import Empty
+from threading import Thread
+
+import pytest
+
+from abquant.event import Event, EventType
+from abquant.event.eventqueue import ConflatingQueue, PriorityEventQueue, RingBufferQueue, event_queue_factory
+from abquant.trader.common import Direction, Exchange
+from abquant.trader.msg import DepthData, OrderData, TickData, TradeData
+
+
+NOW = datetime(2022, 1, 1)
+
+
+def tick(symbol: str, price: float, trade_volume: float = 0) -> Event:
+    return Event(EventType.EVENT_TICK, TickData(
+        gateway_name="TEST", symbol=symbol, exchange=Exchange.BINANCE, datetime=NOW,
+        best_bid_price=price, trade_price=price if trade_volume else 0, trade_volume=trade_volume))
+
+
+def depth(price: float, volume: float) -> Event:
+    return Event(EventType.EVENT_DEPTH, DepthData(
+        gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+        price=price, volume=volume, direction=Direction.LONG))
+
+
+def order(orderid: str) -> Event:
+    return Event(EventType.EVENT_ORDER, OrderData(
+        gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=orderid))
+
+
+def trade(tradeid: str) -> Event:
+    return Event(EventType.EVENT_TRADE, TradeData(
+        gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=tradeid, tradeid=tradeid))
+
+
+def drain(queue) -> list:
+    events = []
+    while True:
+        try:
+            events.append(queue.get_nowait())
+        except Empty:
+            return events
+
+
+@pytest.fixture(params=[ConflatingQueue, lambda: PriorityEventQueue(conflate=True)], ids=["Conflate", "ConflatePriority"])
+def queue(request):
+    return request.param()
+
+
+def test_latest_tick_of_each_symbol_delivered_in_order(queue):
+    events = [tick("BTCUSDT", 1), tick("ETHUSDT", 10), tick("BTCUSDT", 2), tick("BTCUSDT", 3), tick("ETHUSDT", 11)]
+    for event in events:
+        queue.put(event)
+    assert queue.qsize() == 2
+    assert drain(queue) == [events[3], events[4]]
+    assert queue.conflation_stats() == {"BTCUSDT.BINANCE": 2, "ETHUSDT.BINANCE": 1}
+
+
+def test_execution_events_never_dropped_nor_reordered():
+    queue = ConflatingQueue()
+    events = []
+    for i in range(50):
+        events.append(tick("BTCUSDT", i))
+        events.append(order(str(i)))
+    for event in events:
+        queue.put(event)
+    delivered = drain(queue)
+    assert [event for event in delivered if event.type == EventType.EVENT_ORDER] == events[1::2]
+    # the only tick left is the latest, after the order put before it.
+    assert delivered[-2:] == events[-2:]
+    assert queue.conflation_stats() == {"BTCUSDT.BINANCE": 49}
+
+
+def test_ticks_with_trades_are_kept(queue):
+    events = [tick("BTCUSDT", 1, trade_volume=1), tick("BTCUSDT", 2), tick("BTCUSDT", 3, trade_volume=2),
+              tick("BTCUSDT", 4)]
+    for event in events:
+        queue.put(event)
+    assert drain(queue) == [events[0], events[2], events[3]]
+
+
+def test_depth_conflated_by_price_level(queue):
+    events = [depth(100, 1), depth(99, 1), depth(100, 2)]
+    for event in events:
+        queue.put(event)
+    assert drain(queue) == [events[1], events[2]]
+
+
+def test_backlog_of_one_symbol_does_not_grow(queue):
+    for i in range(100000):
+        queue.put(tick("BTCUSDT", i))
+        queue.put(tick("ETHUSDT", i))
+    assert queue.qsize() == 2
+    entries = queue._entries if isinstance(queue, ConflatingQueue) else queue._lanes[2]
+    assert len(entries) <= 2 * queue.qsize() + 1
+    assert [event.data.best_bid_price for event in drain(queue)] == [99999, 99999]
+    assert queue.empty()
+
+
+def test_execution_events_ahead_of_market_data():
+    queue = PriorityEventQueue()
+    log, timer = Event(EventType.EVENT_LOG, "log"), Event(EventType.EVENT_TIMER, 1)
+    events = [tick("BTCUSDT", 1), log, order("1"), tick("BTCUSDT", 2), timer, trade("1"), tick("ETHUSDT", 3),
+              order("2"), Event("eUnknown.", None)]
+    for event in events:
+        queue.put(event)
+    assert queue.qsize() == len(events)
+    # execution, control, market data and then background, FIFO within each.
+    assert drain(queue) == [events[2], events[5], events[7], timer, events[0], events[3], events[6], log, events[8]]
+
+    stats = queue.queue_stats()
+    assert stats["EXECUTION"]["count"] == 3 and stats["EXECUTION"]["max_qsize"] == 3
+    assert stats["MARKET"]["count"] == 3 and stats["BACKGROUND"]["count"] == 2
+    assert all(lane["qsize"] == 0 for lane in stats.values())
+
+
+def test_priority_order_interleaved_with_get():
+    queue = PriorityEventQueue()
+    queue.put(tick("BTCUSDT", 1))
+    queue.put(tick("BTCUSDT", 2))
+    assert queue.get_nowait().data.best_bid_price == 1
+    queue.put(order("1"))
+    assert queue.get_nowait().type == EventType.EVENT_ORDER
+    assert queue.get_nowait().data.best_bid_price == 2
+    with pytest.raises(Empty):
+        queue.get(timeout=0.01)
+
+
+def test_ring_batches_in_order():
+    queue = RingBufferQueue()
+    with pytest.raises(Empty):
+        queue.get_batch(4, block=False)
+    with pytest.raises(Empty):
+        queue.get_batch(4, timeout=0.01)
+    for i in range(10):
+        queue.put(i)
+    assert queue.qsize() == 10
+    assert queue.get_batch(4) == [0, 1, 2, 3]
+    assert queue.get_batch(4) == [4, 5, 6, 7]
+    assert queue.get() == 8
+    assert queue.get_batch(4) == [9]
+    assert queue.empty()
+
+
+def test_ring_wakes_parked_consumer():
+    queue = RingBufferQueue()
+    received = []
+    producers = [Thread(target=lambda n=n: [queue.put((n, i)) for i in range(10000)]) for n in range(4)]
+
+    def consume():
+        while len(received) < 40000:
+            received.extend(queue.get_batch(256, timeout=5))
+
+    consumer = Thread(target=consume)
+    consumer.start()
+    for producer in producers:
+        producer.start()
+    for thread in producers + [consumer]:
+        thread.join(10)
+    assert len(received) == 40000
+    # FIFO for each producer.
+    for n in range(4):
+        assert [i for producer, i in received if producer == n] == list(range(10000))
+
+
+def test_event_queue_factory():
+    assert isinstance(event_queue_factory("Ring"), RingBufferQueue)
+    assert isinstance(event_queue_factory("Priority"), PriorityEventQueue)
+    with pytest.raises(ValueError):
+        event_queue_factory("Lifo")
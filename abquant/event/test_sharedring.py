@@ -0,0 +1,74 @@
+import pytest
+
+from abquant.event.sharedring import SharedMemoryRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedMemoryRing(slots=8, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def drain(reader):
+    messages = []
+    while True:
+        message = reader.get()
+        if message is None:
+            return messages
+        key, payload = message
+        messages.append((key, bytes(payload)))
+
+
+def test_put_get(ring):
+    reader = ring.reader()
+    assert reader.get() is None
+    ring.put("BTCUSDT.BINANCE", b"1")
+    ring.put("ETHUSDT.BINANCE", b"")
+    assert drain(reader) == [("BTCUSDT.BINANCE", b"1"), ("ETHUSDT.BINANCE", b"")]
+    assert reader.lost == 0
+
+
+def test_reader_starts_after_creation(ring):
+    ring.put("BTCUSDT.BINANCE", b"old")
+    reader = ring.reader()
+    ring.put("BTCUSDT.BINANCE", b"new")
+    assert drain(reader) == [("BTCUSDT.BINANCE", b"new")]
+
+
+def test_every_reader_gets_every_message(ring):
+    attached = SharedMemoryRing.attach(ring.name)
+    try:
+        readers = [ring.reader(), attached.reader()]
+        for i in range(5):
+            ring.put("BTCUSDT.BINANCE", bytes([i]))
+        for reader in readers:
+            assert [payload for _, payload in drain(reader)] == [bytes([i]) for i in range(5)]
+    finally:
+        attached.close()
+
+
+def test_slow_reader_is_overrun(ring):
+    reader = ring.reader()
+    for i in range(20):
+        ring.put("BTCUSDT.BINANCE", bytes([i]))
+    # the oldest 12 are overwritten, the producer never blocks.
+    assert [payload for _, payload in drain(reader)] == [bytes([i]) for i in range(12, 20)]
+    assert reader.lost == 12
+
+    ring.put("BTCUSDT.BINANCE", b"next")
+    assert drain(reader) == [("BTCUSDT.BINANCE", b"next")]
+    assert reader.lost == 12
+
+
+def test_key_filters_without_payload(ring):
+    reader = ring.reader()
+    wanted = {"ETHUSDT.BINANCE"}
+    for i in range(6):
+        ring.put("ETHUSDT.BINANCE" if i % 3 == 0 else "BTCUSDT.BINANCE", bytes([i]))
+    assert [payload for key, payload in drain(reader) if key in wanted] == [b"\x00", b"\x03"]
+
+
+def test_message_larger_than_slot(ring):
+    with pytest.raises(ValueError):
+        ring.put("BTCUSDT.BINANCE", bytes(64))
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from abquant.event.timerwheel import TimerWheel
+
+
+def fired_deadlines(wheel: TimerWheel, now: float) -> list:
+    return [handle.deadline for handle in wheel.advance(now)]
+
+
+@pytest.mark.parametrize("start", [0, 1001])
+def test_cascading_across_levels(start):
+    # 3 levels of 4 slots, timers up to 64 ticks ahead.
+    wheel = TimerWheel(resolution=1, slot_bits=2, levels=3, now=start)
+    deadlines = [start + offset for offset in range(1, 64)]
+    random.Random(0).shuffle(deadlines)
+    for deadline in deadlines:
+        wheel.add(deadline, lambda: None)
+    assert len(wheel) == 63
+
+    for offset in range(1, 64):
+        assert fired_deadlines(wheel, start + offset) == [start + offset]
+    assert len(wheel) == 0
+
+    with pytest.raises(ValueError):
+        wheel.add(wheel.now + 64, lambda: None)
+
+
+def test_expired_in_order_of_deadline_when_advanced_in_one_step():
+    wheel = TimerWheel(resolution=1, slot_bits=2, levels=3)
+    deadlines = [50, 3, 17, 3, 0.5, 63, 16]
+    handles = [wheel.add(deadline, lambda: None) for deadline in deadlines]
+    fired = wheel.advance(63)
+    assert [handle.deadline for handle in fired] == sorted(deadlines)
+    # the same deadline in order of add.
+    assert fired[1:3] == [handles[1], handles[3]]
+
+
+def test_deadline_rounded_up_to_resolution():
+    wheel = TimerWheel(resolution=0.01)
+    wheel.add(0.015, lambda: None)
+    assert fired_deadlines(wheel, 0.01) == []
+    assert fired_deadlines(wheel, 0.02) == [0.015]
+    # deadline in the past fires at the next advance.
+    wheel.add(0.001, lambda: None)
+    assert fired_deadlines(wheel, 0.02) == [0.001]
+
+
+def test_periodic_rescheduled_without_drift():
+    wheel = TimerWheel(resolution=1)
+    handle = wheel.add(2.5, lambda: None, interval=2.5)
+    fired_at = []
+    for now in range(1, 21):
+        if wheel.advance(now):
+            fired_at.append((now, handle.deadline))
+    # deadline + interval, not now + interval: fired at the ticks of 2.5, 5, 7.5, ...
+    assert [now for now, _ in fired_at] == [3, 5, 8, 10, 13, 15, 18, 20]
+    assert [deadline for _, deadline in fired_at] == [5, 7.5, 10, 12.5, 15, 17.5, 20, 22.5]
+    assert len(wheel) == 1
+
+
+def test_missed_periods_skipped():
+    wheel = TimerWheel(resolution=1)
+    handle = wheel.add(2.5, lambda: None, interval=2.5)
+    # 2.5, 5, 7.5 and 10 missed, fired once.
+    assert wheel.advance(11) == [handle]
+    assert handle.deadline == 12.5
+    assert wheel.advance(12) == []
+    assert wheel.advance(13) == [handle]
+
+
+def test_cancel():
+    wheel = TimerWheel(resolution=1, slot_bits=2, levels=3)
+    near = wheel.add(2, lambda: None)
+    far = wheel.add(40, lambda: None)
+    periodic = wheel.add(3, lambda: None, interval=3)
+    kept = wheel.add(41, lambda: None)
+    near.cancel()
+    far.cancel()
+    assert len(wheel) == 4
+
+    assert wheel.advance(3) == [periodic]
+    # near dropped when expired.
+    assert len(wheel) == 3
+    periodic.cancel()
+    assert wheel.advance(41) == [kept]
+    assert len(wheel) == 0
+
+
+def test_cancel_within_callback_of_same_advance():
+    wheel = TimerWheel(resolution=1)
+    second = wheel.add(2, lambda: None)
+    first = wheel.add(1, second.cancel)
+    fired = wheel.advance(1)
+    for handle in fired:
+        handle.callback()
+    assert fired == [first]
+    assert wheel.advance(2) == []
+    assert len(wheel) == 0
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        TimerWheel().add(1, lambda: None, interval=-1)
@@ -0,0 +1,156 @@
+from itertools import count
+from math import ceil
+from typing import Callable, List
+
+
+class TimerHandle:
+    """
+    returned by TimerWheel.add, call cancel() to cancel the timer. cancel is O(1), the cancelled timer is dropped when expired.
+    """
+    __slots__ = ("timer_id", "deadline", "interval", "callback", "cancelled", "expire_tick")
+
+    def __init__(self, timer_id: int, deadline: float, interval: float, callback: Callable[[], None]):
+        self.timer_id: int = timer_id
+        self.deadline: float = deadline
+        self.interval: float = interval
+        self.callback: Callable[[], None] = callback
+        self.cancelled: bool = False
+        self.expire_tick: int = 0
+
+    @property
+    def periodic(self) -> bool:
+        return self.interval > 0
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def __repr__(self) -> str:
+        return "TimerHandle(timer_id={}, deadline={}, interval={}, cancelled={})".format(
+            self.timer_id, self.deadline, self.interval, self.cancelled)
+
+
+class TimerWheel:
+    """
+    hierarchical timer wheel, the clock is driven by the caller through advance(now),
+    so the same wheel serves live trading (time.monotonic) and backtest (bar timestamp).
+
+    levels of 2 ** slot_bits slots each, slot of level n spans resolution * 2 ** (slot_bits * n) seconds.
+    add and cancel are O(1), advance is O(1) per tick plus the timers expired or cascaded to a lower level.
+    with default arguments timers up to resolution * 2 ** 32 seconds (~497 days at 10ms) ahead are supported.
+
+    periodic timers are rescheduled at deadline + interval, rather than now + interval, so that they never drift,
+    missed periods (advance called too late) are skipped instead of fired in a burst.
+    not thread-safe.
+    """
+
+    def __init__(self, resolution: float = 0.01, slot_bits: int = 8, levels: int = 4, now: float = 0.0):
+        self.resolution: float = resolution
+        self._bits: int = slot_bits
+        self._size: int = 1 << slot_bits
+        self._mask: int = self._size - 1
+        self._wheels: List[List[List[TimerHandle]]] = [[[] for _ in range(self._size)] for _ in range(levels)]
+        # every timer expiring at or before current tick is fired.
+        self._tick: int = int(now / resolution)
+        self._due: List[TimerHandle] = []
+        self._count: int = 0
+        self._ids = count(1)
+
+    def __len__(self) -> int:
+        """
+        number of pending timers, including cancelled ones not yet dropped.
+        """
+        return self._count
+
+    @property
+    def now(self) -> float:
+        return self._tick * self.resolution
+
+    def add(self, deadline: float, callback: Callable[[], None], interval: float = 0) -> TimerHandle:
+        """
+        deadline: absolute time in the clock of advance.
+        interval: > 0 for periodic timer fired at deadline, deadline + interval, ...
+        """
+        if interval < 0:
+            raise ValueError("interval of timer must not be negative, got {}".format(interval))
+        handle = TimerHandle(next(self._ids), deadline, interval, callback)
+        self._insert(handle)
+        self._count += 1
+        return handle
+
+    def _insert(self, handle: TimerHandle) -> None:
+        expire = ceil(handle.deadline / self.resolution)
+        handle.expire_tick = expire
+        diff = expire - self._tick
+        if diff <= 0:
+            self._due.append(handle)
+            return
+
+        bits = self._bits
+        for level, wheel in enumerate(self._wheels):
+            if diff < 1 << (bits * (level + 1)):
+                wheel[(expire >> (bits * level)) & self._mask].append(handle)
+                return
+        raise ValueError("deadline {} is too far from now {} for the timer wheel.".format(handle.deadline, self.now))
+
+    def _cascade(self, tick: int) -> None:
+        bits = self._bits
+        level = 1
+        while level < len(self._wheels) - 1 and not (tick >> (bits * level)) & self._mask:
+            level += 1
+        for n in range(level, 0, -1):
+            wheel = self._wheels[n]
+            index = (tick >> (bits * n)) & self._mask
+            handles = wheel[index]
+            if handles:
+                wheel[index] = []
+                for handle in handles:
+                    if handle.cancelled:
+                        self._count -= 1
+                    else:
+                        self._insert(handle)
+
+    def advance(self, now: float) -> List[TimerHandle]:
+        """
+        move the clock to now, return timers expired in order of deadline, cancelled ones are dropped.
+        the caller is responsible to call handle.callback.
+        """
+        target = int(now / self.resolution)
+        expired = self._due
+        self._due = []
+
+        wheel = self._wheels[0]
+        mask = self._mask
+        while self._tick < target:
+            if self._count == len(expired):
+                # nothing pending in the wheels, jump directly.
+                self._tick = target
+                break
+            self._tick += 1
+            tick = self._tick
+            if not tick & mask:
+                self._cascade(tick)
+                if self._due:
+                    expired.extend(self._due)
+                    self._due = []
+            handles = wheel[tick & mask]
+            if handles:
+                wheel[tick & mask] = []
+                expired.extend(handles)
+
+        if len(expired) > 1:
+            expired.sort(key=lambda handle: (handle.expire_tick, handle.timer_id))
+        fired = []
+        for handle in expired:
+            if handle.cancelled:
+                self._count -= 1
+                continue
+            fired.append(handle)
+            if handle.interval > 0:
+                handle.deadline += handle.interval
+                if handle.deadline <= now:
+                    missed = int((now - handle.deadline) / handle.interval) + 1
+                    handle.deadline += missed * handle.interval
+                self._insert(handle)
+            else:
+                self._count -= 1
+        return fired
@@ -0,0 +1,2 @@
+from .writer import JournalWriter
+from .reader import JournalReader, iter_journal, journal_files
@@ -0,0 +1,236 @@
+"""
+journal file layout:
+
+    FILE_MAGIC
+    record, record, ...
+
+record is RECORD_HEADER (record_type: u8, payload length: u32, timestamp: i64 ns of the time recorded) followed by payload.
+RECORD_STRING payload is u32 id + utf8 bytes, it defines an interned string (symbol, gateway_name, enum value ...)
+before the first record referring to it. id 0 is None.
+other payloads are fixed struct of the schema of the type, followed by utf8 bytes of variable length strings (orderid, tradeid ...).
+
+datetime fields are stored as microseconds since epoch, decoded as naive local datetime like what gateways produce.
+"""
+
+from datetime import datetime
+from enum import Enum
+from operator import attrgetter
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+from abquant.trader.common import Direction, Exchange, Offset, OrderType, Status
+from abquant.trader.msg import DepthData, OrderData, TickData, TradeData, TransactionData
+from abquant.trader.object import AccountData, PositionData
+from abquant.trader.slottedmsg import SlottedDepthData, SlottedOrderData, SlottedTickData, SlottedTradeData, SlottedTransactionData
+
+
+FILE_MAGIC = b"ABQJ\x01\x00\x00\x00"
+RECORD_HEADER = struct.Struct("<BIq")
+STRING_HEADER = struct.Struct("<I")
+NONE_ID = 0
+NONE_TIME = -(1 << 63)
+
+RECORD_STRING = 0
+
+# kind of field: s, interned str. e, enum stored as interned value. t, datetime. f, float. i, int. v, variable length str.
+FIELD_FORMATS = {"s": "I", "e": "I", "t": "q", "f": "d", "i": "q", "v": "H"}
+
+TICK_FLOATS = [
+    "trade_price", "trade_volume",
+    "best_ask_price", "best_ask_volume", "best_bid_price", "best_bid_volume",
+] + ["{}_{}_{}".format(side, kind, i) for side, kind in (("bid", "price"), ("ask", "price"), ("bid", "volume"), ("ask", "volume")) for i in range(1, 6)]
+
+
+class RecordSchema:
+    """
+    fixed schema of a message type, see module doc for layout.
+    """
+
+    def __init__(self, record_type: int, cls: type, fields: List[Tuple[str, str, Optional[type]]]):
+        self.record_type: int = record_type
+        self.cls: type = cls
+        self.fields: List[Tuple[str, str, Optional[type]]] = fields
+        self.names: List[str] = [name for name, _, _ in fields]
+        self.getter: Callable = attrgetter(*self.names)
+        self.struct: struct.Struct = struct.Struct("<" + "".join(FIELD_FORMATS[kind] for _, kind, _ in fields))
+
+
+SCHEMAS: List[RecordSchema] = [
+    RecordSchema(1, TickData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("datetime", "t", None), ("localtime", "t", None),
+    ] + [(name, "f", None) for name in TICK_FLOATS]),
+    RecordSchema(2, DepthData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("datetime", "t", None), ("localtime", "t", None),
+        ("volume", "f", None), ("price", "f", None), ("direction", "e", Direction),
+    ]),
+    RecordSchema(3, TransactionData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("datetime", "t", None), ("localtime", "t", None),
+        ("volume", "f", None), ("price", "f", None),
+        ("bid_no", "i", None), ("ask_no", "i", None), ("times", "i", None), ("direction", "e", Direction),
+    ]),
+    RecordSchema(4, OrderData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("type", "e", OrderType), ("direction", "e", Direction), ("offset", "e", Offset),
+        ("price", "f", None), ("volume", "f", None), ("traded", "f", None),
+        ("status", "e", Status), ("datetime", "t", None),
+        ("orderid", "v", None), ("reference", "v", None),
+    ]),
+    RecordSchema(5, TradeData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("direction", "e", Direction), ("offset", "e", Offset),
+        ("price", "f", None), ("volume", "f", None), ("datetime", "t", None),
+        ("orderid", "v", None), ("tradeid", "v", None),
+    ]),
+    RecordSchema(6, PositionData, [
+        ("gateway_name", "s", None), ("symbol", "s", None), ("exchange", "e", Exchange),
+        ("direction", "e", Direction),
+        ("volume", "f", None), ("frozen", "f", None), ("price", "f", None), ("liq_price", "f", None),
+        ("bust_price", "f", None), ("pnl", "f", None), ("yd_volume", "f", None),
+    ]),
+    RecordSchema(7, AccountData, [
+        ("gateway_name", "s", None), ("accountid", "s", None),
+        ("balance", "f", None), ("frozen", "f", None),
+    ]),
+]
+SCHEMA_OF_CLASS: Dict[type, RecordSchema] = {schema.cls: schema for schema in SCHEMAS}
+# slotted variants are journaled as their dataclass.
+for slotted_cls in (SlottedTickData, SlottedDepthData, SlottedTransactionData, SlottedOrderData, SlottedTradeData):
+    SCHEMA_OF_CLASS[slotted_cls] = SCHEMA_OF_CLASS[slotted_cls.data_class]
+SCHEMA_OF_TYPE: Dict[int, RecordSchema] = {schema.record_type: schema for schema in SCHEMAS}
+
+
+def encode_datetime(dt: datetime) -> int:
+    if dt is None:
+        return NONE_TIME
+    return round(dt.timestamp() * 1000000)
+
+
+def decode_datetime(us: int) -> datetime:
+    if us == NONE_TIME:
+        return None
+    seconds, microsecond = divmod(us, 1000000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=microsecond)
+
+
+class JournalEncoder:
+    """
+    encode message into records, interning strings. one encoder per journal file.
+    """
+
+    def __init__(self):
+        self.strings: Dict[str, int] = {}
+        # strings defined since last call of pop_new_strings, (id, value)
+        self.new_strings: List[Tuple[int, str]] = []
+
+    def intern(self, value: str, buffer: bytearray, timestamp: int) -> int:
+        if value is None:
+            return NONE_ID
+        string_id = self.strings.get(value, None)
+        if string_id is None:
+            string_id = len(self.strings) + 1
+            self.strings[value] = string_id
+            self.new_strings.append((string_id, value))
+            payload = value.encode("utf8")
+            buffer += RECORD_HEADER.pack(RECORD_STRING, STRING_HEADER.size + len(payload), timestamp)
+            buffer += STRING_HEADER.pack(string_id)
+            buffer += payload
+        return string_id
+
+    def pop_new_strings(self) -> List[Tuple[int, str]]:
+        new_strings, self.new_strings = self.new_strings, []
+        return new_strings
+
+    def encode(self, data, timestamp: int, buffer: bytearray) -> bool:
+        """
+        append records of data to buffer, return False if type of data is not journaled.
+        """
+        schema = SCHEMA_OF_CLASS.get(data.__class__, None)
+        if schema is None:
+            return False
+
+        values = list(schema.getter(data))
+        variables = []
+        for i, (_, kind, _) in enumerate(schema.fields):
+            value = values[i]
+            if kind == "f":
+                continue
+            elif kind == "s":
+                values[i] = self.intern(value, buffer, timestamp)
+            elif kind == "e":
+                values[i] = self.intern(value.value if value is not None else None, buffer, timestamp)
+            elif kind == "t":
+                values[i] = encode_datetime(value)
+            elif kind == "i":
+                values[i] = value or 0
+            else:
+                raw = (value or "").encode("utf8")
+                variables.append(raw)
+                values[i] = len(raw)
+
+        fixed = schema.struct.pack(*values)
+        length = len(fixed) + sum(len(raw) for raw in variables)
+        buffer += RECORD_HEADER.pack(schema.record_type, length, timestamp)
+        buffer += fixed
+        for raw in variables:
+            buffer += raw
+        return True
+
+
+class JournalDecoder:
+    """
+    decode records into message, strings interned are learnt from RECORD_STRING or given by the index.
+    """
+
+    def __init__(self):
+        self.strings: List[Optional[str]] = [None]
+        self._enums: Dict[Tuple[type, int], Enum] = {}
+
+    def define(self, string_id: int, value: str) -> None:
+        if string_id >= len(self.strings):
+            self.strings.extend([None] * (string_id + 1 - len(self.strings)))
+        self.strings[string_id] = value
+
+    def decode_string(self, payload: bytes) -> None:
+        string_id, = STRING_HEADER.unpack_from(payload)
+        self.define(string_id, payload[STRING_HEADER.size:].decode("utf8"))
+
+    def decode(self, record_type: int, payload: bytes):
+        schema = SCHEMA_OF_TYPE.get(record_type, None)
+        if schema is None:
+            raise ValueError("unknown record type {} in journal.".format(record_type))
+
+        values = list(schema.struct.unpack_from(payload))
+        position = schema.struct.size
+        strings = self.strings
+        for i, (_, kind, enum_cls) in enumerate(schema.fields):
+            if kind == "f":
+                continue
+            value = values[i]
+            if kind == "s":
+                values[i] = strings[value]
+            elif kind == "e":
+                if value == NONE_ID:
+                    values[i] = None
+                else:
+                    key = (enum_cls, value)
+                    member = self._enums.get(key, None)
+                    if member is None:
+                        member = enum_cls(strings[value])
+                        self._enums[key] = member
+                    values[i] = member
+            elif kind == "t":
+                values[i] = decode_datetime(value)
+            elif kind == "v":
+                values[i] = payload[position: position + value].decode("utf8")
+                position += value
+        return schema.cls(**dict(zip(schema.names, values)))
+
+
+# sidecar index file: entries of INDEX_ENTRY (tag, timestamp / string id, offset / string length),
+# string entries are followed by utf8 bytes. strings are duplicated here so that a reader can seek without scanning the journal.
+INDEX_ENTRY = struct.Struct("<BqQ")
+INDEX_POINT = 1
+INDEX_STRING = 2
@@ -0,0 +1,141 @@
+from bisect import bisect_left
+from datetime import datetime
+import glob
+import os
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from .codec import FILE_MAGIC, INDEX_ENTRY, INDEX_POINT, INDEX_STRING, RECORD_HEADER, RECORD_STRING, JournalDecoder
+from .writer import INDEX_SUFFIX, JOURNAL_SUFFIX
+
+
+Timestamp = Union[int, datetime]
+
+
+def to_timestamp(timestamp: Timestamp) -> int:
+    """
+    int is nanoseconds since epoch, naive datetime is local time.
+    """
+    if isinstance(timestamp, datetime):
+        return round(timestamp.timestamp() * 1000000) * 1000
+    return timestamp
+
+
+class JournalReader:
+    """
+    iterate (timestamp in nanoseconds, message) of a journal file written by JournalWriter in order.
+    seek(timestamp) does binary search over the sidecar index then scans at most index_every records,
+    it falls back to scanning from the beginning if the index is missing.
+    a record truncated by crash at the end of file is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self._file = open(path, "rb")
+        if self._file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            self._file.close()
+            raise ValueError("{} is not a journal file.".format(path))
+        self._decoder: JournalDecoder = JournalDecoder()
+        # record read ahead by seek
+        self._peeked: Optional[Tuple[int, Any]] = None
+
+        self.timestamps: List[int] = []
+        self.offsets: List[int] = []
+        index_path = os.path.splitext(path)[0] + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            self._load_index(index_path)
+
+    def _load_index(self, index_path: str) -> None:
+        with open(index_path, "rb") as f:
+            content = f.read()
+        position = 0
+        while position + INDEX_ENTRY.size <= len(content):
+            tag, key, value = INDEX_ENTRY.unpack_from(content, position)
+            position += INDEX_ENTRY.size
+            if tag == INDEX_POINT:
+                self.timestamps.append(key)
+                self.offsets.append(value)
+            elif tag == INDEX_STRING:
+                if position + value > len(content):
+                    break
+                self._decoder.define(key, content[position: position + value].decode("utf8"))
+                position += value
+            else:
+                raise ValueError("corrupted index {} at {}".format(index_path, position))
+
+    def read(self) -> Optional[Tuple[int, Any]]:
+        """
+        next (timestamp, message), None at the end of file.
+        """
+        if self._peeked is not None:
+            record, self._peeked = self._peeked, None
+            return record
+
+        f = self._file
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return None
+            record_type, length, timestamp = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return None
+            if record_type == RECORD_STRING:
+                self._decoder.decode_string(payload)
+                continue
+            return timestamp, self._decoder.decode(record_type, payload)
+
+    def __iter__(self) -> Iterator[Tuple[int, Any]]:
+        while True:
+            record = self.read()
+            if record is None:
+                return
+            yield record
+
+    def seek(self, timestamp: Timestamp) -> None:
+        """
+        position at the first record recorded at or after timestamp.
+        """
+        target = to_timestamp(timestamp)
+        self._peeked = None
+        # index points are at record boundaries, the last one before target is a safe start.
+        i = bisect_left(self.timestamps, target) - 1
+        self._file.seek(self.offsets[i] if i >= 0 else len(FILE_MAGIC))
+        while True:
+            record = self.read()
+            if record is None or record[0] >= target:
+                self._peeked = record
+                return
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "JournalReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def journal_files(directory: str, prefix: str = "journal") -> List[str]:
+    """
+    journal files of prefix under directory, in order of written.
+    """
+    pattern = os.path.join(os.path.expanduser(directory), "{}-*{}".format(prefix, JOURNAL_SUFFIX))
+    return sorted(glob.glob(pattern))
+
+
+def iter_journal(directory: str, prefix: str = "journal",
+                 start: Timestamp = None, end: Timestamp = None) -> Iterator[Tuple[int, Any]]:
+    """
+    iterate (timestamp in nanoseconds, message) over rotated journal files, start inclusive and end exclusive.
+    """
+    start = to_timestamp(start) if start is not None else None
+    end = to_timestamp(end) if end is not None else None
+    for path in journal_files(directory, prefix):
+        with JournalReader(path) as reader:
+            if start is not None:
+                reader.seek(start)
+            for timestamp, data in reader:
+                if end is not None and timestamp >= end:
+                    return
+                yield timestamp, data
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+import os
+
+import pytest
+
+from abquant.event import Event, EventType
+from abquant.journal import JournalReader, JournalWriter, iter_journal, journal_files
+from abquant.journal.writer import INDEX_SUFFIX
+from abquant.trader.common import Direction, Exchange, Offset, OrderType, Status
+from abquant.trader.msg import DepthData, OrderData, TickData, TradeData
+from abquant.trader.slottedmsg import SlottedOrderData, SlottedTickData, SlottedTradeData
+
+
+NOW = datetime(2022, 1, 1, 8, 30, 0, 123456)
+
+
+def tick(i: int, cls: type = TickData):
+    return cls(gateway_name="BINANCEUBC", symbol="BTCUSDT" if i % 2 else "ETHUSDT", exchange=Exchange.BINANCE,
+               datetime=NOW + timedelta(milliseconds=i), trade_price=100 + i, trade_volume=0.5,
+               best_bid_price=99.5 + i, best_ask_price=100.5 + i, bid_price_1=99.5 + i, ask_volume_5=i,
+               localtime=NOW + timedelta(milliseconds=i, microseconds=7))
+
+
+def order(i: int, cls: type = OrderData):
+    return cls(gateway_name="BINANCEUBC", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid="x-{}".format(i),
+               type=OrderType.LIMIT, direction=Direction.SHORT, offset=Offset.NONE, price=101.5, volume=2, traded=1,
+               status=Status.PARTTRADED, datetime=NOW, reference="订单")
+
+
+def trade(i: int, cls: type = TradeData):
+    return cls(gateway_name="BINANCEUBC", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid="x-{}".format(i),
+               tradeid=str(i), direction=Direction.LONG, offset=Offset.NONE, price=101.5, volume=1, datetime=NOW)
+
+
+EVENT_TYPES = {TickData: EventType.EVENT_TICK, SlottedTickData: EventType.EVENT_TICK,
+               OrderData: EventType.EVENT_ORDER, SlottedOrderData: EventType.EVENT_ORDER,
+               TradeData: EventType.EVENT_TRADE, SlottedTradeData: EventType.EVENT_TRADE,
+               DepthData: EventType.EVENT_DEPTH}
+
+
+def write(directory: str, messages: list, **kwargs) -> JournalWriter:
+    writer = JournalWriter(directory, **kwargs)
+    writer.start()
+    for i, message in enumerate(messages):
+        writer.on_event(Event(EVENT_TYPES[message.__class__], message))
+        if i % 10 == 9:
+            writer.flush()
+    writer.stop()
+    return writer
+
+
+def as_data(message):
+    return message.to_data() if hasattr(message, "to_data") else message
+
+
+def test_round_trip(tmp_path):
+    messages = [
+        tick(1), SlottedTickData.from_data(tick(2)), order(3), SlottedOrderData.from_data(order(4)),
+        trade(5), SlottedTradeData.from_data(trade(6)),
+        DepthData(gateway_name="BINANCEUBC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                  volume=3, price=99, direction=None),
+        OrderData(gateway_name="BINANCEUBC", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid="empty"),
+    ]
+    writer = write(str(tmp_path), messages)
+    assert writer.record_count == len(messages)
+
+    records = list(iter_journal(str(tmp_path)))
+    timestamps = [timestamp for timestamp, _ in records]
+    assert timestamps == sorted(timestamps)
+    # slotted messages are read back as their dataclass.
+    assert [data for _, data in records] == [as_data(message) for message in messages]
+    assert records[1][1].ab_symbol == "ETHUSDT.BINANCE"
+    assert records[3][1].ab_orderid == "BINANCEUBC.x-4"
+
+
+def test_unjournaled_message_skipped(tmp_path):
+    writer = JournalWriter(str(tmp_path))
+    writer.start()
+    writer.on_event(Event(EventType.EVENT_TICK, tick(1)))
+    writer.on_event(Event(EventType.EVENT_LOG, "log"))
+    writer.stop()
+    assert [data for _, data in iter_journal(str(tmp_path))] == [tick(1)]
+
+
+@pytest.fixture
+def rotated(tmp_path):
+    """
+    journal of 200 ticks rotated every ~10 records.
+    """
+    messages = [tick(i) for i in range(200)]
+    write(str(tmp_path), messages, max_bytes=4096, index_every=4)
+    return str(tmp_path), messages
+
+
+def test_rotation(rotated):
+    directory, messages = rotated
+    paths = journal_files(directory)
+    assert len(paths) > 5
+    for path in paths:
+        assert os.path.getsize(path) < 4096 + 1024
+        assert os.path.exists(os.path.splitext(path)[0] + INDEX_SUFFIX)
+    assert [data for _, data in iter_journal(directory)] == messages
+
+    # every file is self contained, strings interned again.
+    with JournalReader(paths[-1]) as reader:
+        assert all(data.symbol in ("BTCUSDT", "ETHUSDT") for _, data in reader)
+
+
+def test_start_and_end(rotated):
+    directory, messages = rotated
+    records = list(iter_journal(directory))
+    timestamps = [timestamp for timestamp, _ in records]
+
+    def expected(start, end):
+        return [record for record in records if start <= record[0] < end]
+
+    for start, end in [(timestamps[0], timestamps[-1] + 1), (timestamps[37], timestamps[151]),
+                       (timestamps[37] + 1, timestamps[37] + 2), (timestamps[0] - 10 ** 9, timestamps[3]),
+                       (timestamps[150], timestamps[120]), (timestamps[-1] + 1, timestamps[-1] + 2)]:
+        assert list(iter_journal(directory, start=start, end=end)) == expected(start, end)
+    assert list(iter_journal(directory, start=timestamps[100])) == expected(timestamps[100], timestamps[-1] + 1)
+    assert list(iter_journal(directory, end=timestamps[100])) == expected(0, timestamps[100])
+
+    # naive datetime is local time, in microseconds.
+    start = datetime.fromtimestamp(timestamps[42] // 1000 / 1000000)
+    assert list(iter_journal(directory, start=start)) == expected(timestamps[42] // 1000 * 1000, timestamps[-1] + 1)
+
+
+def test_seek_without_index(rotated):
+    directory, messages = rotated
+    path = journal_files(directory)[2]
+    with JournalReader(path) as reader:
+        records = list(reader)
+    os.remove(os.path.splitext(path)[0] + INDEX_SUFFIX)
+    with JournalReader(path) as reader:
+        assert not reader.timestamps
+        reader.seek(records[5][0])
+        assert list(reader) == [record for record in records if record[0] >= records[5][0]]
+
+
+def test_truncated_record_ignored(rotated):
+    directory, messages = rotated
+    path = journal_files(directory)[-1]
+    with JournalReader(path) as reader:
+        records = list(reader)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+    with JournalReader(path) as reader:
+        assert list(reader) == records[:-1]
+
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path / "journal-x.abj"
+    path.write_bytes(b"not a journal")
+    with pytest.raises(ValueError):
+        JournalReader(str(path))
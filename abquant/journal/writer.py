@@ -0,0 +1,191 @@
+from collections import deque
+from datetime import datetime
+import os
+from threading import Event as ThreadingEvent, Thread
+import time
+from typing import Dict, Optional
+
+from abquant.event import Event, EventDispatcher, EventType
+
+from .codec import FILE_MAGIC, INDEX_ENTRY, INDEX_POINT, INDEX_STRING, JournalEncoder
+
+
+JOURNAL_SUFFIX = ".abj"
+INDEX_SUFFIX = ".idx"
+
+
+class JournalWriter:
+    """
+    append-only binary journal of what a live EventDispatcher sees, for incident reproducing and tick level backtest.
+
+    the handler registered on the dispatcher only appends (timestamp, data) to a deque, encoding and file IO are done by
+    the writer thread every flush_interval seconds, so journaling costs the dispatcher thread a deque append per event.
+    messages are assumed not mutated after put into the dispatcher, as gateways create a new one for every packet.
+
+    files are named {prefix}-{%Y%m%d-%H%M%S}-{seq}.abj under directory, each with a sidecar .idx holding
+    a (timestamp, offset) point every index_every records and the interned strings, see codec.py for layout.
+    rotated when larger than max_bytes or older than rotate_interval seconds, every file is self contained.
+
+    usage:
+        journal = JournalWriter("~/.abquant/journal")
+        journal.register(event_dispatcher)
+        ...
+        journal.unregister(event_dispatcher)
+        journal.stop()
+    """
+
+    EVENT_TYPES = (
+        EventType.EVENT_TICK,
+        EventType.EVENT_DEPTH,
+        EventType.EVENT_TRANSACTION,
+        EventType.EVENT_ORDER,
+        EventType.EVENT_TRADE,
+        EventType.EVENT_POSITION,
+        EventType.EVENT_ACCOUNT,
+    )
+
+    def __init__(self, directory: str, prefix: str = "journal", max_bytes: int = 512 * 1024 * 1024,
+                 rotate_interval: int = 24 * 3600, flush_interval: float = 0.5, index_every: int = 64):
+        self.directory: str = os.path.expanduser(directory)
+        self.prefix: str = prefix
+        self.max_bytes: int = max_bytes
+        self.rotate_interval: int = rotate_interval
+        self.flush_interval: float = flush_interval
+        self.index_every: int = index_every
+
+        self._pending: deque = deque()
+        self._wakeup: ThreadingEvent = ThreadingEvent()
+        self._active: bool = False
+        self._thread: Thread = None
+
+        self.path: Optional[str] = None
+        self._file = None
+        self._index_file = None
+        self._file_size: int = 0
+        self._file_opened: float = 0
+        self._sequence: int = 0
+        self._encoder: JournalEncoder = None
+        self._index_countdown: int = 0
+        self._last_timestamp: int = 0
+
+        self.record_count: int = 0
+        self.byte_count: int = 0
+
+    def register(self, event_dispatcher: EventDispatcher) -> None:
+        if not self._active:
+            self.start()
+        for event_type in self.EVENT_TYPES:
+            event_dispatcher.register(event_type, self.on_event)
+
+    def unregister(self, event_dispatcher: EventDispatcher) -> None:
+        for event_type in self.EVENT_TYPES:
+            event_dispatcher.unregister(event_type, self.on_event)
+
+    def on_event(self, event: Event) -> None:
+        self._pending.append((time.time_ns(), event.data))
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._active = True
+        self._thread = Thread(target=self._run, name="JournalWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        write everything pending and close the files.
+        """
+        if not self._active:
+            return
+        self._active = False
+        self._wakeup.set()
+        self._thread.join()
+
+    def flush(self) -> None:
+        """
+        ask the writer thread to write pending records now.
+        """
+        self._wakeup.set()
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "pending": len(self._pending),
+            "record_count": self.record_count,
+            "byte_count": self.byte_count,
+        }
+
+    def _run(self) -> None:
+        while self._active:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_pending()
+        self._write_pending()
+        self._close()
+
+    def _write_pending(self) -> None:
+        pending = self._pending
+        if not pending:
+            if self._file is not None and time.time() - self._file_opened >= self.rotate_interval:
+                self._close()
+            return
+
+        buffer = bytearray()
+        index = bytearray()
+        while pending:
+            timestamp, data = pending.popleft()
+            # wall clock may step backwards, keep timestamps monotonic for the index.
+            if timestamp < self._last_timestamp:
+                timestamp = self._last_timestamp
+            self._last_timestamp = timestamp
+
+            if self._file is None or self._file_size + len(buffer) >= self.max_bytes \
+                    or time.time() - self._file_opened >= self.rotate_interval:
+                self._write(buffer, index)
+                buffer = bytearray()
+                index = bytearray()
+                self._rotate()
+
+            offset = self._file_size + len(buffer)
+            if not self._encoder.encode(data, timestamp, buffer):
+                continue
+            for string_id, value in self._encoder.pop_new_strings():
+                raw = value.encode("utf8")
+                index += INDEX_ENTRY.pack(INDEX_STRING, string_id, len(raw))
+                index += raw
+            if not self._index_countdown:
+                index += INDEX_ENTRY.pack(INDEX_POINT, timestamp, offset)
+                self._index_countdown = self.index_every
+            self._index_countdown -= 1
+            self.record_count += 1
+        self._write(buffer, index)
+
+    def _write(self, buffer: bytearray, index: bytearray) -> None:
+        if self._file is None or not buffer:
+            return
+        self._file.write(buffer)
+        self._file.flush()
+        self._index_file.write(index)
+        self._index_file.flush()
+        self._file_size += len(buffer)
+        self.byte_count += len(buffer)
+
+    def _rotate(self) -> None:
+        self._close()
+        self._sequence += 1
+        name = "{}-{}-{:04d}".format(self.prefix, datetime.now().strftime("%Y%m%d-%H%M%S"), self._sequence)
+        self.path = os.path.join(self.directory, name + JOURNAL_SUFFIX)
+        self._file = open(self.path, "wb")
+        self._file.write(FILE_MAGIC)
+        self._index_file = open(os.path.join(self.directory, name + INDEX_SUFFIX), "wb")
+        self._file_size = len(FILE_MAGIC)
+        self._file_opened = time.time()
+        self._encoder = JournalEncoder()
+        self._index_countdown = 0
+
+    def _close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._index_file.close()
+        self._file = None
+        self._index_file = None
@@ -1,3 +1,4 @@
 from .monitor import Monitor
 from .dummymonitor import DummyMonitor
 
+from .latency import LatencyHistogram, LatencyTracer
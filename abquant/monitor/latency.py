@@ -0,0 +1,155 @@
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+
+# stages of an event, from exchange to strategy.
+STAGE_EXCHANGE_TO_RECEIVE = "exchange_to_receive"
+STAGE_RECEIVE_TO_ENQUEUE = "receive_to_enqueue"
+STAGE_ENQUEUE_TO_DEQUEUE = "enqueue_to_dequeue"
+STAGE_HANDLER = "handler"
+
+
+class LatencyHistogram:
+    """
+    HDR style log-linear histogram of latency in microseconds.
+    values under 2 ** sub_bits are counted exactly, larger ones with relative error under 2 ** (1 - sub_bits).
+    record is O(1) and allocation free, memory is fixed to a few thousand counters.
+    """
+
+    def __init__(self, sub_bits: int = 7, max_bits: int = 40):
+        self.sub_bits: int = sub_bits
+        self.sub_count: int = 1 << sub_bits
+        self.half_count: int = self.sub_count >> 1
+        self.max_value: int = (1 << max_bits) - 1
+        self.counts: List[int] = [0] * (self.sub_count + (max_bits - sub_bits) * self.half_count)
+        self.count: int = 0
+        self.total: int = 0
+        self.min: int = 0
+        self.max: int = 0
+        # clock skew between exchange and local machine may produce negative latency.
+        self.negative: int = 0
+
+    def index_of(self, value: int) -> int:
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+    def value_of(self, index: int) -> int:
+        """
+        lowest value counted by the bucket of index.
+        """
+        if index < self.sub_count:
+            return index
+        shift, offset = divmod(index - self.sub_count, self.half_count)
+        return (offset + self.half_count) << (shift + 1)
+
+    def record_us(self, value: int) -> None:
+        if value < 0:
+            self.negative += 1
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+        self.counts[self.index_of(value)] += 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def record(self, seconds: float) -> None:
+        self.record_us(int(seconds * 1000000))
+
+    def percentile(self, q: float) -> int:
+        """
+        q in [0, 100], return latency in microseconds,
+        the highest value of the bucket reached as hdr histogram does, bounded by min and max recorded.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(self.count * q / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return max(self.min, min(self.value_of(index + 1) - 1, self.max))
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.sub_bits != self.sub_bits or len(other.counts) != len(self.counts):
+            raise ValueError("histograms of different precision can not be merged.")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        if other.count and (not self.count or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+        self.negative += other.negative
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.min = self.max = self.negative = 0
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_us": round(self.mean(), 1),
+            "min_us": self.min,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p999_us": self.percentile(99.9),
+            "max_us": self.max,
+            "negative": self.negative,
+        }
+
+
+class LatencyTracer:
+    """
+    histograms keyed by (stage, gateway_name / strategy_name, event_type / callback).
+    EventDispatcher records exchange_to_receive, receive_to_enqueue and enqueue_to_dequeue,
+    LiveStrategyRunner records handler, the time spent in strategy callbacks.
+
+    record is lock free, counts may be slightly lost when recorded concurrently by several threads (ShardedEventDispatcher),
+    which is acceptable for monitoring purpose.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self._lock: Lock = Lock()
+
+    def histogram(self, stage: str, source: str, kind: str) -> LatencyHistogram:
+        key = (stage, source, kind)
+        histogram = self.histograms.get(key, None)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.get(key, None)
+                if histogram is None:
+                    histogram = LatencyHistogram()
+                    self.histograms[key] = histogram
+        return histogram
+
+    def record(self, stage: str, source: str, kind: str, seconds: float) -> None:
+        self.histogram(stage, source, kind).record(seconds)
+
+    def items(self) -> Iterable[Tuple[Tuple[str, str, str], LatencyHistogram]]:
+        return list(self.histograms.items())
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Dict]]]:
+        """
+        {stage: {source: {kind: summary}}}
+        """
+        snapshot = {}
+        for (stage, source, kind), histogram in self.items():
+            snapshot.setdefault(stage, {}).setdefault(source, {})[kind] = histogram.summary()
+        return snapshot
+
+    def reset(self) -> None:
+        for _, histogram in self.items():
+            histogram.reset()
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+from threading import Event as ThreadingEvent
+
+import numpy as np
+import pytest
+
+from abquant.event import Event, EventDispatcher, EventType
+from abquant.monitor.latency import (
+    LatencyHistogram, LatencyTracer, STAGE_ENQUEUE_TO_DEQUEUE, STAGE_EXCHANGE_TO_RECEIVE, STAGE_HANDLER,
+    STAGE_RECEIVE_TO_ENQUEUE)
+from abquant.strategytrading import LiveStrategyRunner, StrategyTemplate
+from abquant.trader.common import Exchange
+from abquant.trader.msg import TickData
+
+
+def latencies(seed: int, size: int = 20000) -> np.ndarray:
+    # tens of microseconds to a few seconds.
+    return np.random.default_rng(seed).lognormal(mean=6, sigma=2, size=size).astype(np.int64)
+
+
+def test_bucket_indexes():
+    histogram = LatencyHistogram(sub_bits=7)
+    # exact under 2 ** sub_bits, then every bucket starts where the previous ended.
+    assert [histogram.index_of(value) for value in range(128)] == list(range(128))
+    for index in range(1, len(histogram.counts)):
+        low = histogram.value_of(index)
+        assert histogram.index_of(low) == index
+        assert histogram.index_of(low - 1) == index - 1
+        # bucket width bounded by the relative error.
+        assert histogram.value_of(index + 1) - low <= max(1, low * 2 ** (1 - histogram.sub_bits))
+
+
+def test_percentiles_within_relative_error():
+    values = latencies(0)
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record_us(int(value))
+
+    relative_error = 2 ** (1 - histogram.sub_bits)
+    for q in (1, 10, 50, 90, 99, 99.9, 100):
+        expected = np.percentile(values, q, method="inverted_cdf")
+        assert abs(histogram.percentile(q) - expected) <= expected * relative_error + 1
+    assert histogram.count == len(values)
+    assert histogram.min == values.min() and histogram.max == values.max()
+    assert histogram.mean() == pytest.approx(values.mean())
+
+
+def test_negative_and_overflow_clamped():
+    histogram = LatencyHistogram(max_bits=20)
+    histogram.record(-0.001)
+    histogram.record(10)
+    assert histogram.negative == 1
+    assert histogram.min == 0 and histogram.max == 2 ** 20 - 1
+    assert histogram.percentile(100) == 2 ** 20 - 1
+
+
+def test_merge_equals_recording_union():
+    first, second = latencies(1), latencies(2, size=5000)
+    merged, other, union = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for value in first:
+        merged.record_us(int(value))
+        union.record_us(int(value))
+    for value in second:
+        other.record_us(int(value))
+        union.record_us(int(value))
+    merged.merge(other)
+    assert merged.counts == union.counts
+    assert merged.summary() == union.summary()
+
+    with pytest.raises(ValueError):
+        merged.merge(LatencyHistogram(sub_bits=5))
+
+
+def test_tracer_keeps_histogram_per_stage():
+    tracer = LatencyTracer()
+    tracer.record(STAGE_HANDLER, "first", "on_tick", 0.000010)
+    tracer.record(STAGE_HANDLER, "first", "on_tick", 0.000020)
+    tracer.record(STAGE_HANDLER, "second", "on_bars", 0.001)
+    snapshot = tracer.snapshot()
+    assert snapshot[STAGE_HANDLER]["first"]["on_tick"]["count"] == 2
+    assert snapshot[STAGE_HANDLER]["first"]["on_tick"]["max_us"] == 20
+    assert snapshot[STAGE_HANDLER]["second"]["on_bars"]["p50_us"] == 1000
+    tracer.reset()
+    assert tracer.snapshot()[STAGE_HANDLER]["first"]["on_tick"]["count"] == 0
+
+
+class TickStrategy(StrategyTemplate):
+    def __init__(self, strategy_runner, strategy_name, ab_symbols, setting):
+        super().__init__(strategy_runner, strategy_name, ab_symbols, setting)
+        self.received = ThreadingEvent()
+
+    def on_init(self):
+        pass
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+    def on_tick(self, tick):
+        self.received.set()
+
+    def on_bars(self, bars):
+        pass
+
+    def on_exception(self, exception):
+        pass
+
+    def update_order(self, order):
+        super().update_order(order)
+
+    def update_trade(self, trade):
+        super().update_trade(trade)
+
+
+class RecordingMonitor:
+    def __init__(self):
+        self.structs = []
+
+    def send_struct(self, run_id, full_type: str, content: str, **kwargs):
+        self.structs.append((full_type, kwargs))
+
+
+def test_traced_tick_through_dispatcher_to_strategy():
+    event_dispatcher = EventDispatcher()
+    try:
+        runner = LiveStrategyRunner(event_dispatcher)
+        assert runner.get_latency_stats() == {}
+        runner.enable_latency_tracing(report_interval=0)
+        runner.add_strategy(TickStrategy, "latency", ["BTCUSDT.BINANCE"], {})
+        strategy = runner.get_strategy("latency")
+        strategy.inited = strategy.trading = True
+
+        received = datetime.now()
+        event_dispatcher.put(Event(EventType.EVENT_TICK, TickData(
+            gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE,
+            datetime=received - timedelta(milliseconds=5), localtime=received)))
+        assert strategy.received.wait(5)
+
+        stats = runner.get_latency_stats()
+        # 5ms from exchange to local machine, truncated to microseconds.
+        assert stats[STAGE_EXCHANGE_TO_RECEIVE]["TEST"]["EVENT_TICK"]["p50_us"] in (4999, 5000)
+        for stage in (STAGE_RECEIVE_TO_ENQUEUE, STAGE_ENQUEUE_TO_DEQUEUE):
+            assert stats[stage]["TEST"]["EVENT_TICK"]["count"] == 1
+        assert stats[STAGE_HANDLER]["latency"]["on_tick"]["count"] == 1
+
+        monitor = RecordingMonitor()
+        runner.set_monitor(monitor)
+        runner.report_latency()
+        assert ("latency_" + STAGE_HANDLER, {"source": "latency", "kind": "on_tick"}) in monitor.structs
+
+        runner.disable_latency_tracing()
+        assert runner.get_latency_stats() == {}
+    finally:
+        event_dispatcher.stop()
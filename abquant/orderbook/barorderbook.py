@@ -1,89 +1,170 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
+from heapq import heappop, heappush
 from itertools import chain
-from typing import Dict, Iterable, Optional, Tuple, overload
+from typing import Dict, Iterable, List, Optional, Tuple, overload
 
 from abquant.trader.common import Direction, Interval, OrderType, Status
 from abquant.trader.msg import BarData, TickData, TradeData
 from abquant.trader.object import OrderData
+from abquant.trader.utility import SymbolTable
 from .orderbook import OrderBook
 
 
 class BarOrderBook(OrderBook):
+    """
+    resting orders are indexed per symbol in heaps of (price, sequence of insertion): long limits by max price,
+    short limits by min price, long stops by min trigger and short stops by max trigger, so that a bar only pops
+    the orders whose price lies inside [low, high] of it. orders cancelled are removed from heaps lazily.
+    crossed orders are yielded in order of insertion, limits then stops, same as scanning every order.
+    """
+    # heaps are rebuilt when stale entries outnumber live orders by this.
+    COMPACT_THRESHOLD = 1024
+
     def __init__(self):
         super(BarOrderBook, self).__init__()
-        self.bars: Dict[str, BarData] = {}
+        # newest bar of each symbol indexed by symbol_id, and by ab_symbol for strategies.
+        self.bars: SymbolTable = SymbolTable()
+        self.newest: Dict[str, BarData] = {}
         # self.datetime: datetime = None
         self.interval = Interval.MINUTE
         self.trade_count = 0
 
+        # number of newest bars of each datetime, for check_datetime in O(1)
+        self.bar_datetimes: Dict[datetime, int] = defaultdict(int)
+        # symbol_id -> (long limits, short limits, long stops, short stops)
+        self.heaps: Dict[int, Tuple[List, List, List, List]] = {}
+        self.sequence = 0
+        self.stale_count = 0
+        self.submitting_limit_orders: Dict[str, OrderData] = {}
+        self.submitting_stop_orders: Dict[str, OrderData] = {}
+
     def newest_bars(self) -> Dict[str, BarData]:
-        return self.bars
+        return self.newest
 
     def update_bar(self, bar: BarData) -> None:
-        last_bar = self.bars.get(bar.ab_symbol, None)
+        last_bar = self.bars[bar.symbol_id]
         if last_bar and bar.datetime - last_bar.datetime != timedelta(minutes=1):
             print(
                 "Warning: bar.datetime - self.bars[bar.ab_symbol] != timedelta(minutes=1)")
             print("last_bar: {}".format(last_bar))
             print("bar: {}".format(bar))
 
-        self.bars[bar.ab_symbol] = bar
+        if last_bar:
+            datetimes = self.bar_datetimes
+            datetimes[last_bar.datetime] -= 1
+            if not datetimes[last_bar.datetime]:
+                del datetimes[last_bar.datetime]
+        self.bar_datetimes[bar.datetime] += 1
+        self.bars[bar.symbol_id] = bar
+        self.newest[bar.ab_symbol] = bar
+
+    def _push(self, order: OrderData) -> None:
+        heaps = self.heaps.get(order.symbol_id, None)
+        if heaps is None:
+            heaps = self.heaps[order.symbol_id] = ([], [], [], [])
+        self.sequence += 1
+        long = order.direction == Direction.LONG
+        if order.type == OrderType.LIMIT:
+            if long:
+                heappush(heaps[0], (-order.price, self.sequence, order))
+            else:
+                heappush(heaps[1], (order.price, self.sequence, order))
+        else:
+            if long:
+                heappush(heaps[2], (order.price, self.sequence, order))
+            else:
+                heappush(heaps[3], (-order.price, self.sequence, order))
 
     def insert_order(self, order: OrderData) -> str:
-        return super().insert_order(order)
+        ab_orderid = super().insert_order(order)
+        self._push(order)
+        if order.type == OrderType.LIMIT:
+            self.submitting_limit_orders[ab_orderid] = order
+        else:
+            self.submitting_stop_orders[ab_orderid] = order
+        return ab_orderid
 
     def cancel_order(self, ab_orderid: str) -> Optional[OrderData]:
-        return super().cancel_order(ab_orderid)
+        order = super().cancel_order(ab_orderid)
+        if order is not None:
+            self.submitting_limit_orders.pop(ab_orderid, None)
+            self.submitting_stop_orders.pop(ab_orderid, None)
+            self.stale_count += 1
+            if self.stale_count > len(self.active_limit_orders) + len(self.stop_market_orders) + self.COMPACT_THRESHOLD:
+                self._compact()
+        return order
+
+    def _compact(self) -> None:
+        self.heaps.clear()
+        self.stale_count = 0
+        for order in chain(self.active_limit_orders.values(), self.stop_market_orders.values()):
+            self._push(order)
+
+    def submitting_orders(self) -> Iterable[OrderData]:
+        return (
+            order for order in chain(self.submitting_limit_orders.values(), self.submitting_stop_orders.values())
+            if order.status == Status.SUBMITTING
+        )
+
+    def accept_submitting_orders(self) -> Iterable[OrderData]:
+        orders = list(self.submitting_orders())
+        self.submitting_limit_orders.clear()
+        self.submitting_stop_orders.clear()
+        for order in orders:
+            order.status = Status.NOTTRADED
+            yield order
 
     def check_datetime(self) -> None:
-        iterator = iter(self.bars.values())
-        try:
-            first = next(iterator)
-        except StopIteration:
-            return True
-        return all(first.datetime == x.datetime for x in iterator)
+        return len(self.bar_datetimes) <= 1
+
+    def _pop_crossed(self, heap: List, orders: Dict[str, OrderData], bound: float, entries: List) -> None:
+        """
+        pop entries of key <= bound, into entries if the order is still resting.
+        """
+        while heap and heap[0][0] <= bound:
+            entry = heappop(heap)
+            order = entry[2]
+            if orders.get(order.ab_orderid, None) is order:
+                entries.append(entry)
+            else:
+                # entries of orders filled after a _compact within match_orders were never counted.
+                self.stale_count = max(self.stale_count - 1, 0)
 
     def match_orders(self) -> Iterable[Tuple[OrderData, TradeData]]:
         if not self.check_datetime():
             raise RuntimeError(
-                "BarOrderBook.match_orders: bars not all in the same minute, bars, {}".format(self.bars))
-
-        for order in list(self.active_limit_orders.values()):
-            if order.type not in self.SUPPORTED_ORDERTYPE:
-                raise ValueError(
-                    "ordertype other than {} are not supported yet.".format(self.SUPPORTED_ORDERTYPE))
-            bar = self.bars[order.ab_symbol]
-
-            long_cross_price = bar.low_price
-            short_cross_price = bar.high_price
-            long_best_price = bar.open_price
-            short_best_price = bar.open_price
-
-            long_cross = (
-                order.direction == Direction.LONG
-                and order.price >= long_cross_price
-                and long_cross_price > 0
-            )
-
-            short_cross = (
-                order.direction == Direction.SHORT
-                and order.price <= short_cross_price
-                and short_cross_price > 0
-            )
+                "BarOrderBook.match_orders: bars not all in the same minute, bars, {}".format(self.newest))
 
-            if not long_cross and not short_cross:
+        entries = []
+        for symbol_id, heaps in self.heaps.items():
+            bar = self.bars[symbol_id]
+            if bar is None:
+                continue
+            # long crosses if price >= low, short if price <= high.
+            if bar.low_price > 0:
+                self._pop_crossed(heaps[0], self.active_limit_orders, -bar.low_price, entries)
+            if bar.high_price > 0:
+                self._pop_crossed(heaps[1], self.active_limit_orders, bar.high_price, entries)
+        entries.sort(key=lambda entry: entry[1])
+
+        for _, _, order in entries:
+            # cancelled by callbacks of orders yielded before.
+            if order.ab_orderid not in self.active_limit_orders:
                 continue
+            bar = self.bars[order.symbol_id]
 
             # Push order update with status "all traded" (filled).
             order.traded = order.volume
             order.status = Status.ALLTRADED
 
             self.active_limit_orders.pop(order.ab_orderid)
+            self.submitting_limit_orders.pop(order.ab_orderid, None)
 
-            if long_cross:
-                trade_price = min(order.price, long_best_price)
+            if order.direction == Direction.LONG:
+                trade_price = min(order.price, bar.open_price)
             else:
-                trade_price = max(order.price, short_best_price)
+                trade_price = max(order.price, bar.open_price)
 
             self.trade_count += 1
             trade = TradeData(
@@ -99,45 +180,35 @@ class BarOrderBook(OrderBook):
                 gateway_name=order.gateway_name,
             )
             yield (order, trade)
-        
-
-        for order in list(self.stop_market_orders.values()):
-            if order.type not in self.SUPPORTED_ORDERTYPE:
-                raise ValueError(
-                    "ordertype other than {} are not supported yet.".format(self.SUPPORTED_ORDERTYPE))
-            bar = self.bars[order.ab_symbol]
-
-            long_cross_price = bar.high_price
-            short_cross_price = bar.low_price
-            long_worst_price = bar.open_price
-            short_worst_price = bar.open_price
-
-            long_cross = (
-                order.direction == Direction.LONG
-                and order.price <= long_cross_price
-                and long_cross_price > 0
-            )
 
-            short_cross = (
-                order.direction == Direction.SHORT
-                and order.price >= short_cross_price
-                and short_cross_price > 0
-            )
-
-            if not long_cross and not short_cross:
+        entries = []
+        for symbol_id, heaps in self.heaps.items():
+            bar = self.bars[symbol_id]
+            if bar is None:
+                continue
+            # long triggers if price <= high, short if price >= low.
+            if bar.high_price > 0:
+                self._pop_crossed(heaps[2], self.stop_market_orders, bar.high_price, entries)
+            if bar.low_price > 0:
+                self._pop_crossed(heaps[3], self.stop_market_orders, -bar.low_price, entries)
+        entries.sort(key=lambda entry: entry[1])
+
+        for _, _, order in entries:
+            if order.ab_orderid not in self.stop_market_orders:
                 continue
+            bar = self.bars[order.symbol_id]
 
             # Push order update with status "all traded" (filled).
             order.traded = order.volume
             order.status = Status.ALLTRADED
 
-            if long_cross:
-                trade_price = long_worst_price if order.price < long_worst_price else order.price
+            if order.direction == Direction.LONG:
+                trade_price = bar.open_price if order.price < bar.open_price else order.price
             else:
-                trade_price = short_worst_price if order.price > short_worst_price else order.price
+                trade_price = bar.open_price if order.price > bar.open_price else order.price
 
             self.stop_market_orders.pop(order.ab_orderid)
-
+            self.submitting_stop_orders.pop(order.ab_orderid, None)
 
             self.trade_count += 1
             trade = TradeData(
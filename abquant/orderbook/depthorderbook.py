@@ -0,0 +1,462 @@
+from heapq import heappop, heappush
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from abquant.trader.common import Direction, OrderType, Status
+from abquant.trader.msg import DepthData, OrderData, TradeData, TransactionData
+from .orderbook import OrderBook
+from .tickorderbook import PriceLevels
+
+
+class PriceLadder:
+    """
+    sizes of one side of a L2 book in a numpy array indexed by integer price ticks, grown and re-centered as needed.
+    """
+
+    def __init__(self, is_bid: bool, capacity: int = 4096):
+        self.is_bid: bool = is_bid
+        self.sizes: np.ndarray = np.zeros(capacity)
+        # tick of sizes[0]
+        self.offset: Optional[int] = None
+        # index of the best level with size, -1 if empty
+        self.best: int = -1
+
+    def _reserve(self, low: int, high: int) -> None:
+        """
+        make ticks in [low, high] addressable.
+        """
+        if self.offset is None:
+            self.offset = low - (len(self.sizes) - (high - low)) // 2
+        start = min(self.offset, low)
+        end = max(self.offset + len(self.sizes), high + 1)
+        if start == self.offset and end == self.offset + len(self.sizes):
+            return
+        capacity = len(self.sizes)
+        while capacity < end - start:
+            capacity *= 2
+        # leave room on both sides
+        start -= (capacity - (end - start)) // 2
+        sizes = np.zeros(capacity)
+        shift = self.offset - start
+        sizes[shift: shift + len(self.sizes)] = self.sizes
+        if self.best >= 0:
+            self.best += shift
+        self.sizes = sizes
+        self.offset = start
+
+    def size(self, tick: int) -> float:
+        index = tick - self.offset if self.offset is not None else -1
+        if 0 <= index < len(self.sizes):
+            return float(self.sizes[index])
+        return 0.0
+
+    def best_tick(self) -> Optional[int]:
+        return self.best + self.offset if self.best >= 0 else None
+
+    def set(self, tick: int, size: float) -> float:
+        """
+        :return: size before.
+        """
+        index = tick - self.offset if self.offset is not None else -1
+        if not 0 <= index < len(self.sizes):
+            self._reserve(tick, tick)
+            index = tick - self.offset
+        old = float(self.sizes[index])
+        self.sizes[index] = size
+        best = self.best
+        if size > 0:
+            if best < 0 or (index > best if self.is_bid else index < best):
+                self.best = index
+        elif index == best:
+            self._find_best()
+        return old
+
+    def set_many(self, ticks: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+        """
+        vectorized set, one size for each tick. :return: sizes before.
+        """
+        self._reserve(int(ticks.min()), int(ticks.max()))
+        indexes = ticks - self.offset
+        old = self.sizes[indexes]
+        self.sizes[indexes] = sizes
+        added = indexes[sizes > 0]
+        if len(added):
+            candidate = int(added.max() if self.is_bid else added.min())
+            if self.best < 0 or (candidate > self.best if self.is_bid else candidate < self.best):
+                self.best = candidate
+        if self.best >= 0 and self.sizes[self.best] <= 0:
+            self._find_best()
+        return old
+
+    def _find_best(self) -> None:
+        sizes = self.sizes
+        if self.is_bid:
+            levels = np.flatnonzero(sizes[:max(self.best, 0)] > 0)
+            self.best = int(levels[-1]) if len(levels) else -1
+        else:
+            levels = np.flatnonzero(sizes[self.best + 1:] > 0) if self.best >= 0 else np.flatnonzero(sizes > 0)
+            self.best = int(levels[0]) + self.best + 1 if len(levels) else -1
+
+    def clear(self) -> None:
+        self.sizes[:] = 0
+        self.best = -1
+
+    def levels(self, depth: int = 5) -> List[Tuple[int, float]]:
+        """
+        (tick, size) of the best levels.
+        """
+        if self.best < 0:
+            return []
+        if self.is_bid:
+            indexes = np.flatnonzero(self.sizes[:self.best + 1] > 0)[::-1][:depth]
+        else:
+            indexes = np.flatnonzero(self.sizes[self.best:] > 0)[:depth] + self.best
+        return [(int(index) + self.offset, float(self.sizes[index])) for index in indexes]
+
+
+class QueueEntry:
+    __slots__ = ("order", "ahead")
+
+    def __init__(self, order: OrderData, ahead: float):
+        self.order: OrderData = order
+        # market volume estimated ahead of the order in the queue of its level, orders of our own excluded.
+        self.ahead: float = ahead
+
+
+class LevelQueue:
+    """
+    our orders resting at one price level, FIFO.
+    """
+    __slots__ = ("entries", "traded")
+
+    def __init__(self):
+        self.entries: List[QueueEntry] = []
+        # volume traded at the level since its last depth update, not to be counted as cancel again.
+        self.traded: float = 0
+
+
+class SideQueues:
+    """
+    LevelQueue of one side by tick, with a heap of ticks for the best (highest bid, lowest ask) first.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.sign: int = -1 if is_bid else 1
+        self.heap: List[int] = []
+        self.levels: Dict[int, LevelQueue] = {}
+
+    def get(self, tick: int) -> Optional[LevelQueue]:
+        return self.levels.get(tick, None)
+
+    def add(self, tick: int, entry: QueueEntry) -> None:
+        queue = self.levels.get(tick, None)
+        if queue is None:
+            queue = self.levels[tick] = LevelQueue()
+            heappush(self.heap, self.sign * tick)
+        queue.entries.append(entry)
+
+    def best(self) -> Optional[Tuple[int, LevelQueue]]:
+        heap = self.heap
+        while heap:
+            tick = self.sign * heap[0]
+            queue = self.levels[tick]
+            if queue.entries:
+                return tick, queue
+            heappop(heap)
+            del self.levels[tick]
+        return None
+
+
+class SymbolDepthBook:
+
+    def __init__(self, tick_size: float):
+        self.tick_size: float = tick_size
+        self.bids: PriceLadder = PriceLadder(is_bid=True)
+        self.asks: PriceLadder = PriceLadder(is_bid=False)
+        self.bid_queues: SideQueues = SideQueues(is_bid=True)
+        self.ask_queues: SideQueues = SideQueues(is_bid=False)
+        self.long_stops: PriceLevels = PriceLevels(descending=False)
+        self.short_stops: PriceLevels = PriceLevels(descending=True)
+        self.last_price: float = 0
+
+    def tick_of(self, price: float) -> int:
+        return int(round(price / self.tick_size))
+
+
+class DepthOrderBook(OrderBook):
+    """
+    L2 depth replay matching with queue position.
+
+    the L2 book of each symbol is rebuilt from depth deltas: DepthData of (price, absolute size, direction),
+    LONG for bids and SHORT for asks, size 0 removes the level. prices are integer ticks of tick_size,
+    each side is a numpy PriceLadder. update_levels applies a batch of deltas of one side vectorized.
+
+    our orders are simulated and never added to the book:
+    1. a limit order crossing the opposite side takes its levels up to its price at their prices, the rest rests.
+    2. a resting order joins the back of its level, queue ahead = size of the level then.
+       trades (TransactionData, direction is the aggressor side) at the level consume the queue ahead first,
+       volume beyond fills the order. a decrease of size at the level not explained by trades is taken as cancels,
+       applied to the queue ahead in proportion to it, and queue ahead never exceeds the size of the level.
+       fills only happen when queue ahead reaches zero.
+    3. an order is filled in full at its price when the market trades through it,
+       or the opposite best quote reaches its price.
+    4. stop market orders are triggered by trade price and take the opposite side as market orders.
+    orders are queued at the next match_orders after insert. fills are collected while updating
+    and yielded by match_orders.
+    """
+
+    def __init__(self, tick_size: Union[float, Dict[str, float]] = 0.01):
+        super(DepthOrderBook, self).__init__()
+        self.tick_size: Union[float, Dict[str, float]] = tick_size
+        self.books: Dict[str, SymbolDepthBook] = {}
+        self.fills: List[Tuple[OrderData, TradeData]] = []
+        self.entries: Dict[str, Tuple[SideQueues, int, QueueEntry]] = {}
+        self.inserting: Dict[str, OrderData] = {}
+        self.datetime = None
+        self.trade_count = 0
+
+    def book(self, ab_symbol: str) -> SymbolDepthBook:
+        book = self.books.get(ab_symbol, None)
+        if book is None:
+            tick_size = self.tick_size.get(ab_symbol) if isinstance(self.tick_size, dict) else self.tick_size
+            book = self.books[ab_symbol] = SymbolDepthBook(tick_size)
+        return book
+
+    def reset(self, ab_symbol: str) -> None:
+        """
+        clear the book of ab_symbol before a snapshot. queues of our orders are kept.
+        """
+        book = self.book(ab_symbol)
+        book.bids.clear()
+        book.asks.clear()
+
+    def update_depth(self, depth: DepthData) -> None:
+        book = self.book(depth.ab_symbol)
+        if depth.datetime is not None:
+            self.datetime = depth.datetime
+        is_bid = depth.direction == Direction.LONG
+        tick = book.tick_of(depth.price)
+        ladder = book.bids if is_bid else book.asks
+        old = ladder.set(tick, depth.volume)
+
+        queues = book.bid_queues if is_bid else book.ask_queues
+        queue = queues.get(tick)
+        if queue is not None and queue.entries:
+            self._apply_cancels(queue, old, depth.volume)
+        self._check_crossed(book, is_bid)
+
+    def update_levels(self, ab_symbol: str, direction: Direction, prices: np.ndarray, volumes: np.ndarray) -> None:
+        """
+        batch of depth deltas of one side, at most one delta per price.
+        """
+        book = self.book(ab_symbol)
+        is_bid = direction == Direction.LONG
+        ticks = np.rint(np.asarray(prices) / book.tick_size).astype(np.int64)
+        volumes = np.asarray(volumes, dtype=float)
+        ladder = book.bids if is_bid else book.asks
+        old = ladder.set_many(ticks, volumes)
+
+        queues = book.bid_queues if is_bid else book.ask_queues
+        if queues.levels:
+            for tick, queue in queues.levels.items():
+                if not queue.entries:
+                    continue
+                matched = np.flatnonzero(ticks == tick)
+                if len(matched):
+                    i = matched[-1]
+                    self._apply_cancels(queue, float(old[i]), float(volumes[i]))
+        self._check_crossed(book, is_bid)
+
+    def _apply_cancels(self, queue: LevelQueue, old: float, new: float) -> None:
+        before = old - queue.traded
+        queue.traded = 0
+        cancelled = before - new
+        for entry in queue.entries:
+            if cancelled > 0 and before > 0:
+                entry.ahead -= cancelled * min(entry.ahead / before, 1)
+            if entry.ahead > new:
+                entry.ahead = new
+            if entry.ahead < 0:
+                entry.ahead = 0
+
+    def _check_crossed(self, book: SymbolDepthBook, bids_updated: bool) -> None:
+        """
+        our orders reached by the opposite best quote are filled.
+        """
+        if bids_updated:
+            best = book.bids.best_tick()
+            if best is not None:
+                self._fill_through(book, book.ask_queues, lambda tick: tick <= best)
+        else:
+            best = book.asks.best_tick()
+            if best is not None:
+                self._fill_through(book, book.bid_queues, lambda tick: tick >= best)
+
+    def _fill_through(self, book: SymbolDepthBook, queues: SideQueues, crossed) -> None:
+        while True:
+            best = queues.best()
+            if best is None or not crossed(best[0]):
+                return
+            for entry in best[1].entries:
+                order = entry.order
+                self._fill(order, order.price, order.volume - order.traded)
+            best[1].entries.clear()
+
+    def update_transaction(self, transaction: TransactionData) -> None:
+        book = self.book(transaction.ab_symbol)
+        if transaction.datetime is not None:
+            self.datetime = transaction.datetime
+        tick = book.tick_of(transaction.price)
+        book.last_price = transaction.price
+        direction = transaction.direction
+
+        if direction != Direction.LONG:
+            # sellers hit bids
+            self._fill_through(book, book.bid_queues, lambda level: level > tick)
+            self._consume(book.bid_queues.get(tick), transaction.volume)
+        if direction != Direction.SHORT:
+            self._fill_through(book, book.ask_queues, lambda level: level < tick)
+            self._consume(book.ask_queues.get(tick), transaction.volume)
+
+        self._trigger_stops(book, transaction.price)
+
+    def _consume(self, queue: Optional[LevelQueue], traded: float) -> None:
+        """
+        a trade at the level of queue, market volume ahead first, in FIFO.
+        """
+        if queue is None or not queue.entries:
+            return
+        queue.traded += traded
+        remaining = traded
+        # market volume consumed so far
+        consumed = 0
+        filled = 0
+        for entry in queue.entries:
+            take = min(max(entry.ahead - consumed, 0), remaining)
+            consumed += take
+            remaining -= take
+            if remaining <= 0:
+                break
+            order = entry.order
+            volume = min(order.volume - order.traded, remaining)
+            remaining -= volume
+            self._fill(order, order.price, volume)
+            if order.status == Status.ALLTRADED:
+                filled += 1
+            if remaining <= 0:
+                break
+        for entry in queue.entries:
+            entry.ahead = max(entry.ahead - consumed, 0)
+        if filled:
+            queue.entries = [entry for entry in queue.entries if entry.order.status != Status.ALLTRADED]
+
+    def _trigger_stops(self, book: SymbolDepthBook, price: float) -> None:
+        for levels, triggered in (
+            (book.long_stops, lambda stop: stop <= price),
+            (book.short_stops, lambda stop: stop >= price),
+        ):
+            while True:
+                best = levels.best()
+                if best is None or not triggered(best[0]):
+                    break
+                for order in list(best[1].values()):
+                    del best[1][order.ab_orderid]
+                    self._take(book, order, None)
+
+    def _take(self, book: SymbolDepthBook, order: OrderData, limit_tick: Optional[int]) -> None:
+        """
+        fill order against the opposite side of the book, up to limit_tick, or all of it for market orders.
+        liquidity taken is removed from the book until the next depth update of the level.
+        """
+        long = order.direction == Direction.LONG
+        ladder = book.asks if long else book.bids
+        while order.traded < order.volume:
+            best = ladder.best_tick()
+            if best is None or (limit_tick is not None and (best > limit_tick if long else best < limit_tick)):
+                break
+            size = ladder.size(best)
+            volume = min(size, order.volume - order.traded)
+            ladder.set(best, size - volume)
+            self._fill(order, best * book.tick_size, volume)
+        if limit_tick is None and order.traded < order.volume:
+            # nothing left in the book, at the last price.
+            self._fill(order, book.last_price or order.price, order.volume - order.traded)
+
+    def _fill(self, order: OrderData, price: float, volume: float) -> None:
+        if volume <= 0:
+            return
+        order.traded += volume
+        if order.traded >= order.volume:
+            order.status = Status.ALLTRADED
+            self.active_limit_orders.pop(order.ab_orderid, None)
+            self.stop_market_orders.pop(order.ab_orderid, None)
+            self.entries.pop(order.ab_orderid, None)
+        else:
+            order.status = Status.PARTTRADED
+        self.trade_count += 1
+        trade = TradeData(
+            symbol=order.symbol,
+            exchange=order.exchange,
+            orderid=order.orderid,
+            tradeid=str(self.trade_count),
+            direction=order.direction,
+            offset=order.offset,
+            price=price,
+            volume=volume,
+            datetime=self.datetime,
+            gateway_name=order.gateway_name,
+        )
+        self.fills.append((order, trade))
+
+    def insert_order(self, order: OrderData) -> str:
+        ab_orderid = super().insert_order(order)
+        # queued on the next match_orders, after the order is accepted.
+        self.inserting[ab_orderid] = order
+        return ab_orderid
+
+    def _queue(self, order: OrderData) -> None:
+        book = self.book(order.ab_symbol)
+        if order.type == OrderType.STOP_MARKET:
+            (book.long_stops if order.direction == Direction.LONG else book.short_stops).add(order)
+            return
+
+        tick = book.tick_of(order.price)
+        self._take(book, order, tick)
+        if order.traded < order.volume:
+            long = order.direction == Direction.LONG
+            queues = book.bid_queues if long else book.ask_queues
+            entry = QueueEntry(order, (book.bids if long else book.asks).size(tick))
+            queues.add(tick, entry)
+            self.entries[order.ab_orderid] = (queues, tick, entry)
+
+    def cancel_order(self, ab_orderid: str) -> Optional[OrderData]:
+        order = super().cancel_order(ab_orderid)
+        if order is None:
+            return None
+        if self.inserting.pop(ab_orderid, None) is not None:
+            return order
+        if order.type == OrderType.STOP_MARKET:
+            book = self.book(order.ab_symbol)
+            (book.long_stops if order.direction == Direction.LONG else book.short_stops).remove(order)
+        else:
+            queues, tick, entry = self.entries.pop(ab_orderid)
+            queue = queues.get(tick)
+            if queue is not None:
+                queue.entries.remove(entry)
+        return order
+
+    def queue_position(self, ab_orderid: str) -> Optional[float]:
+        """
+        estimated market volume ahead of a resting order.
+        """
+        item = self.entries.get(ab_orderid, None)
+        return item[2].ahead if item else None
+
+    def match_orders(self) -> Iterable[Tuple[OrderData, TradeData]]:
+        if self.inserting:
+            inserting, self.inserting = self.inserting, {}
+            for order in inserting.values():
+                self._queue(order)
+        fills, self.fills = self.fills, []
+        return iter(fills)
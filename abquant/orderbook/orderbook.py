@@ -16,9 +16,13 @@ class OrderBook(ABC):
             from .barorderbook import BarOrderBook
             return BarOrderBook()
         elif mode == 'Tick':
-            pass
+            from .tickorderbook import TickOrderBook
+            return TickOrderBook()
+        elif mode == 'Depth':
+            from .depthorderbook import DepthOrderBook
+            return DepthOrderBook()
         else:
-            raise ValueError("order bokk other than tick level or bar level are not going to support.")
+            raise ValueError("order bokk other than tick, bar or depth level are not going to support.")
 
     # type not specified
     @abstractmethod
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+import random
+from typing import Iterable, Optional, Tuple
+
+import pytest
+
+from abquant.orderbook.barorderbook import BarOrderBook
+from abquant.orderbook.orderbook import OrderBook
+from abquant.trader.common import Direction, Exchange, Offset, OrderType, Status
+from abquant.trader.msg import BarData, OrderData, TradeData
+from abquant.trader.utility import symbol_registry
+
+
+class ScanBarOrderBook(OrderBook):
+    """
+    BarOrderBook before indexing: every resting order is checked on every bar. reference of fill semantics.
+    """
+
+    def __init__(self):
+        super(ScanBarOrderBook, self).__init__()
+        self.bars = {}
+        self.trade_count = 0
+
+    def newest_bars(self):
+        return self.bars
+
+    def update_bar(self, bar: BarData) -> None:
+        self.bars[bar.ab_symbol] = bar
+
+    def insert_order(self, order: OrderData) -> str:
+        return super().insert_order(order)
+
+    def cancel_order(self, ab_orderid: str) -> Optional[OrderData]:
+        return super().cancel_order(ab_orderid)
+
+    def _trade(self, order: OrderData, price: float, bar: BarData) -> TradeData:
+        self.trade_count += 1
+        return TradeData(symbol=order.symbol, exchange=order.exchange, orderid=order.orderid,
+                         tradeid=str(self.trade_count), direction=order.direction, offset=order.offset,
+                         price=price, volume=order.volume, datetime=bar.datetime, gateway_name=order.gateway_name)
+
+    def match_orders(self) -> Iterable[Tuple[OrderData, TradeData]]:
+        for order in list(self.active_limit_orders.values()):
+            bar = self.bars[order.ab_symbol]
+            long_cross = order.direction == Direction.LONG and order.price >= bar.low_price and bar.low_price > 0
+            short_cross = order.direction == Direction.SHORT and order.price <= bar.high_price and bar.high_price > 0
+            if not long_cross and not short_cross:
+                continue
+            order.traded = order.volume
+            order.status = Status.ALLTRADED
+            self.active_limit_orders.pop(order.ab_orderid)
+            if long_cross:
+                trade_price = min(order.price, bar.open_price)
+            else:
+                trade_price = max(order.price, bar.open_price)
+            yield order, self._trade(order, trade_price, bar)
+
+        for order in list(self.stop_market_orders.values()):
+            bar = self.bars[order.ab_symbol]
+            long_cross = order.direction == Direction.LONG and order.price <= bar.high_price and bar.high_price > 0
+            short_cross = order.direction == Direction.SHORT and order.price >= bar.low_price and bar.low_price > 0
+            if not long_cross and not short_cross:
+                continue
+            order.traded = order.volume
+            order.status = Status.ALLTRADED
+            if long_cross:
+                trade_price = bar.open_price if order.price < bar.open_price else order.price
+            else:
+                trade_price = bar.open_price if order.price > bar.open_price else order.price
+            self.stop_market_orders.pop(order.ab_orderid)
+            yield order, self._trade(order, trade_price, bar)
+
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+
+
+def run(book: OrderBook, seed: int, steps: int = 400):
+    """
+    a grid-like order flow: new orders around the price, random cancels, orders sent from fills.
+    """
+    rng = random.Random(seed)
+    prices = {symbol: 100.0 for symbol in SYMBOLS}
+    orders = {}
+    count = 0
+    log = []
+    start = datetime(2022, 1, 1)
+
+    def send(symbol: str) -> None:
+        nonlocal count
+        count += 1
+        order_type = OrderType.LIMIT if rng.random() < 0.7 else OrderType.STOP_MARKET
+        direction = rng.choice((Direction.LONG, Direction.SHORT))
+        order = OrderData(gateway_name="BACKTESTING", symbol=symbol, exchange=Exchange.BINANCE, orderid=str(count),
+                          type=order_type, direction=direction, offset=Offset.NONE,
+                          price=round(prices[symbol] + rng.randint(-8, 8) * 0.5, 1), volume=rng.randint(1, 3))
+        orders[order.ab_orderid] = order
+        book.insert_order(order)
+
+    for step in range(steps):
+        dt = start + timedelta(minutes=step)
+        for symbol in SYMBOLS:
+            open_price = prices[symbol]
+            close_price = round(open_price + rng.randint(-4, 4) * 0.5, 1)
+            high_price = max(open_price, close_price) + rng.randint(0, 3) * 0.5
+            low_price = min(open_price, close_price) - rng.randint(0, 3) * 0.5
+            prices[symbol] = close_price
+            book.update_bar(BarData(gateway_name="BACKTESTING", symbol=symbol, exchange=Exchange.BINANCE, datetime=dt,
+                                    open_price=open_price, high_price=high_price, low_price=low_price,
+                                    close_price=close_price))
+
+        log.append(("accepted", step, [order.ab_orderid for order in book.accept_submitting_orders()]))
+        for order, trade in book.match_orders():
+            log.append((order.ab_orderid, order.status, order.traded, trade.tradeid, trade.price, trade.volume,
+                        trade.datetime))
+            # strategies react to fills in callbacks, while the book is being matched.
+            if rng.random() < 0.3:
+                send(order.symbol)
+
+        for _ in range(rng.randint(0, 6)):
+            send(rng.choice(SYMBOLS))
+        for ab_orderid in rng.sample(sorted(orders), min(len(orders), rng.randint(0, 4))):
+            cancelled = book.cancel_order(ab_orderid)
+            log.append(("cancel", ab_orderid, cancelled.ab_orderid if cancelled else None))
+            orders.pop(ab_orderid)
+        log.append(("submitting", step, [order.ab_orderid for order in book.submitting_orders()]))
+    return log
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_scanning_every_order(seed):
+    expected = run(ScanBarOrderBook(), seed)
+    book = BarOrderBook()
+    assert run(book, seed) == expected
+    assert any(entry[0] not in ("accepted", "cancel", "submitting") for entry in expected)
+
+
+def test_compacts_cancelled_orders():
+    book = BarOrderBook()
+    book.COMPACT_THRESHOLD = 10
+    for i in range(100):
+        order = OrderData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=str(i),
+                          type=OrderType.LIMIT, direction=Direction.LONG, price=float(i), volume=1)
+        book.insert_order(order)
+        if i % 4:
+            book.cancel_order(order.ab_orderid)
+    assert sum(len(heap) for heap in book.heaps[symbol_registry.id_of("BTCUSDT.BINANCE")]) < 100
+    assert {entry[2].ab_orderid for entry in book.heaps[symbol_registry.id_of("BTCUSDT.BINANCE")][0]} >= set(book.active_limit_orders)
+
+
+def test_compacted_while_matching():
+    book = BarOrderBook()
+    book.COMPACT_THRESHOLD = 0
+    orders = [OrderData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=str(i),
+                        type=OrderType.LIMIT, direction=Direction.LONG, price=100.0 if i < 10 else 50.0, volume=1)
+              for i in range(20)]
+    for order in orders:
+        book.insert_order(order)
+    list(book.accept_submitting_orders())
+
+    start = datetime(2022, 1, 1)
+    for minute in range(2):
+        book.update_bar(BarData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE,
+                                datetime=start + timedelta(minutes=minute),
+                                open_price=101, high_price=101, low_price=99, close_price=100))
+        filled = []
+        for order, _ in book.match_orders():
+            filled.append(order.orderid)
+            # cancelling the orders far below compacts the heaps, while the orders crossed are not all filled yet.
+            if len(filled) == 1:
+                for far in orders[10:]:
+                    book.cancel_order(far.ab_orderid)
+        assert filled == ([str(i) for i in range(10)] if not minute else [])
+        assert book.stale_count >= 0
+    assert not book.active_limit_orders
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from abquant.orderbook.depthorderbook import DepthOrderBook, PriceLadder
+from abquant.trader.common import Direction, Exchange, OrderType, Status
+from abquant.trader.msg import DepthData, OrderData, TransactionData
+
+
+NOW = datetime(2022, 1, 1)
+
+
+def depth(price: float, volume: float, direction: Direction) -> DepthData:
+    return DepthData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                     price=price, volume=volume, direction=direction)
+
+
+def trade(price: float, volume: float, direction: Direction) -> TransactionData:
+    return TransactionData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                           price=price, volume=volume, direction=direction)
+
+
+def order(orderid: str, direction: Direction, price: float, volume: float,
+          order_type: OrderType = OrderType.LIMIT) -> OrderData:
+    return OrderData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=orderid,
+                     type=order_type, direction=direction, price=price, volume=volume)
+
+
+@pytest.fixture
+def book():
+    book = DepthOrderBook(tick_size=0.5)
+    for i in range(5):
+        book.update_depth(depth(100 - i * 0.5, 10, Direction.LONG))
+        book.update_depth(depth(100.5 + i * 0.5, 10, Direction.SHORT))
+    return book
+
+
+def test_ladder_best_follows_updates():
+    ladder = PriceLadder(is_bid=True, capacity=8)
+    for tick in (100, 90, 120):
+        ladder.set(tick, 1)
+    assert ladder.best_tick() == 120
+    ladder.set(120, 0)
+    assert ladder.best_tick() == 100
+    ladder.set_many(np.array([100, 95, 130]), np.array([0.0, 2.0, 0.0]))
+    assert ladder.best_tick() == 95
+    assert ladder.levels() == [(95, 2.0), (90, 1.0)]
+
+
+def test_fills_only_when_queue_ahead_is_consumed(book):
+    long = order("1", Direction.LONG, 100, 2)
+    book.insert_order(long)
+    assert list(book.match_orders()) == []
+    assert book.queue_position(long.ab_orderid) == 10
+
+    book.update_transaction(trade(100, 4, Direction.SHORT))
+    book.update_depth(depth(100, 6, Direction.LONG))
+    assert book.queue_position(long.ab_orderid) == 6
+    assert list(book.match_orders()) == []
+
+    # 3 of the 6 ahead cancelled, size added after us does not count.
+    book.update_depth(depth(100, 3, Direction.LONG))
+    book.update_depth(depth(100, 8, Direction.LONG))
+    assert book.queue_position(long.ab_orderid) == 3
+
+    book.update_transaction(trade(100, 4, Direction.SHORT))
+    fills = list(book.match_orders())
+    assert [(trade.price, trade.volume) for _, trade in fills] == [(100, 1)]
+    assert long.status == Status.PARTTRADED
+
+    book.update_transaction(trade(100, 5, Direction.SHORT))
+    fills = list(book.match_orders())
+    assert [(trade.price, trade.volume) for _, trade in fills] == [(100, 1)]
+    assert long.status == Status.ALLTRADED
+    assert book.queue_position(long.ab_orderid) is None
+
+
+def test_trade_through_and_quote_cross_fill_in_full(book):
+    short = order("1", Direction.SHORT, 101, 3)
+    long = order("2", Direction.LONG, 99, 3)
+    book.insert_order(short)
+    book.insert_order(long)
+    list(book.match_orders())
+
+    book.update_transaction(trade(101.5, 1, Direction.LONG))
+    book.update_depth(depth(99, 5, Direction.SHORT))
+    fills = [(order.ab_orderid, trade.price, trade.volume) for order, trade in book.match_orders()]
+    assert fills == [(short.ab_orderid, 101, 3), (long.ab_orderid, 99, 3)]
+
+
+def test_marketable_order_takes_the_book(book):
+    long = order("1", Direction.LONG, 101, 15)
+    book.insert_order(long)
+    fills = [(trade.price, trade.volume) for _, trade in book.match_orders()]
+    assert fills == [(100.5, 10), (101, 5)]
+    assert long.status == Status.ALLTRADED
+
+
+def test_stop_triggers_on_trade_and_cancel(book):
+    stop = order("1", Direction.SHORT, 99.5, 12, OrderType.STOP_MARKET)
+    cancelled = order("2", Direction.LONG, 99, 1)
+    book.insert_order(stop)
+    book.insert_order(cancelled)
+    list(book.match_orders())
+    assert book.cancel_order(cancelled.ab_orderid) is cancelled
+
+    book.update_transaction(trade(99.5, 1, Direction.SHORT))
+    fills = [(trade.price, trade.volume) for _, trade in book.match_orders()]
+    assert fills == [(100, 10), (99.5, 2)]
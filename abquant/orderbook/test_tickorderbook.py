@@ -0,0 +1,111 @@
+from datetime import datetime
+
+from abquant.orderbook.tickorderbook import TickOrderBook
+from abquant.trader.common import Direction, Exchange, OrderType, Status
+from abquant.trader.msg import OrderData, TickData
+
+
+NOW = datetime(2022, 1, 1)
+
+
+def tick(bid: float, ask: float, bid_volume: float = 0, ask_volume: float = 0,
+         trade_price: float = 0, trade_volume: float = 0) -> TickData:
+    return TickData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                    best_bid_price=bid, best_ask_price=ask, best_bid_volume=bid_volume, best_ask_volume=ask_volume,
+                    trade_price=trade_price, trade_volume=trade_volume)
+
+
+def order(orderid: str, direction: Direction, price: float, volume: float,
+          order_type: OrderType = OrderType.LIMIT) -> OrderData:
+    return OrderData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid=orderid,
+                     type=order_type, direction=direction, price=price, volume=volume)
+
+
+def fills(book: TickOrderBook, *ticks: TickData):
+    result = []
+    for t in ticks:
+        book.update_tick(t)
+        result.extend((order.orderid, trade.price, trade.volume) for order, trade in book.match_orders())
+    return result
+
+
+def test_quote_cross_fills_at_quote_in_price_priority():
+    book = TickOrderBook()
+    low, high = order("1", Direction.LONG, 100, 2), order("2", Direction.LONG, 101, 2)
+    for o in (low, high, order("3", Direction.SHORT, 99, 1)):
+        book.insert_order(o)
+    assert fills(book, tick(98, 100, bid_volume=5, ask_volume=3)) == [("2", 100, 2), ("1", 100, 1)]
+    assert low.status == Status.PARTTRADED
+    assert high.ab_orderid not in book.active_limit_orders
+
+    # no volume on the quote is unlimited
+    assert fills(book, tick(99.5, 100)) == [("1", 100, 1), ("3", 99.5, 1)]
+    assert not book.active_limit_orders
+
+
+def test_trade_through_fills_at_order_price():
+    book = TickOrderBook()
+    long = order("1", Direction.LONG, 100, 5)
+    short = order("2", Direction.SHORT, 102, 5)
+    book.insert_order(long)
+    book.insert_order(short)
+    assert fills(book, tick(99, 103, trade_price=100, trade_volume=10)) == []
+    assert fills(book, tick(99, 103, trade_price=99.5, trade_volume=3)) == [("1", 100, 3)]
+    assert long.status == Status.PARTTRADED
+    assert fills(book, tick(99, 103, trade_price=102.5, trade_volume=8)) == [("2", 102, 5)]
+    assert short.status == Status.ALLTRADED
+
+
+def test_partial_fill_rests_then_completes():
+    book = TickOrderBook()
+    long = order("1", Direction.LONG, 100, 10)
+    book.insert_order(long)
+    assert fills(book, tick(99, 100, ask_volume=4)) == [("1", 100, 4)]
+    assert long.traded == 4 and long.status == Status.PARTTRADED
+    assert fills(book, tick(99, 100, ask_volume=4)) == [("1", 100, 4)]
+    assert fills(book, tick(99, 99.5, ask_volume=4)) == [("1", 99.5, 2)]
+    assert long.status == Status.ALLTRADED
+    assert not book.active_limit_orders
+
+
+def test_quote_crossed_order_is_not_traded_through_again():
+    book = TickOrderBook()
+    long = order("1", Direction.LONG, 101, 20)
+    book.insert_order(long)
+    assert fills(book, tick(99, 100, ask_volume=5, trade_price=99.5, trade_volume=10)) == [("1", 100, 5)]
+    assert long.traded == 5
+
+
+def test_trade_stage_budget_excludes_quote_fills():
+    book = TickOrderBook()
+    crossed = order("1", Direction.LONG, 101, 4)
+    inside = order("2", Direction.LONG, 99.5, 10)
+    book.insert_order(crossed)
+    book.insert_order(inside)
+    assert fills(book, tick(98, 100, ask_volume=4, trade_price=99, trade_volume=6)) == [
+        ("1", 100, 4), ("2", 99.5, 2)]
+    assert inside.status == Status.PARTTRADED
+
+
+def test_stop_triggers_by_trade_or_quote():
+    book = TickOrderBook()
+    long_stop = order("1", Direction.LONG, 101, 2, OrderType.STOP_MARKET)
+    short_stop = order("2", Direction.SHORT, 98, 3, OrderType.STOP_MARKET)
+    book.insert_order(long_stop)
+    book.insert_order(short_stop)
+    assert fills(book, tick(99, 100, trade_price=100.5, trade_volume=1)) == []
+    assert fills(book, tick(101, 102, trade_price=101.5, trade_volume=1)) == [("1", 101.5, 2)]
+    # no trade in the tick, triggered by the bid
+    assert fills(book, tick(97.5, 98.5)) == [("2", 97.5, 3)]
+    assert not book.stop_market_orders
+
+
+def test_cancel_removes_from_level():
+    book = TickOrderBook()
+    first = order("1", Direction.LONG, 100, 1)
+    second = order("2", Direction.LONG, 100, 1)
+    book.insert_order(first)
+    book.insert_order(second)
+    assert book.cancel_order(first.ab_orderid) is first
+    assert first.status == Status.CANCELLED
+    assert fills(book, tick(99, 100)) == [("2", 100, 1)]
@@ -1,13 +1,226 @@
+from heapq import heappop, heappush
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Set, Tuple
+
+from abquant.trader.common import Direction, OrderType, Status
+from abquant.trader.msg import TickData, OrderData, TradeData
+from .orderbook import OrderBook
+
+
+INFINITY = float("inf")
+
+
+class PriceLevels:
+    """
+    orders of one symbol and one side resting at price levels, best level first, FIFO within a level.
+    levels are kept in a heap, a level emptied by cancel is dropped lazily when it comes to the top.
+    """
+
+    def __init__(self, descending: bool):
+        self.sign: int = -1 if descending else 1
+        self.heap: List[float] = []
+        self.levels: Dict[float, Dict[str, OrderData]] = {}
+
+    def add(self, order: OrderData) -> None:
+        level = self.levels.get(order.price, None)
+        if level is None:
+            level = self.levels[order.price] = {}
+            heappush(self.heap, self.sign * order.price)
+        level[order.ab_orderid] = order
+
+    def remove(self, order: OrderData) -> None:
+        level = self.levels.get(order.price, None)
+        if level is not None:
+            level.pop(order.ab_orderid, None)
+
+    def best(self) -> Optional[Tuple[float, Dict[str, OrderData]]]:
+        heap = self.heap
+        while heap:
+            price = self.sign * heap[0]
+            level = self.levels[price]
+            if level:
+                return price, level
+            heappop(heap)
+            del self.levels[price]
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(level) for level in self.levels.values())
+
+
+class SymbolBook:
+    """
+    resting orders of one symbol.
+    """
+
+    def __init__(self):
+        self.long_limits: PriceLevels = PriceLevels(descending=True)
+        self.short_limits: PriceLevels = PriceLevels(descending=False)
+        # long stop triggers when price rises to it, the lowest first.
+        self.long_stops: PriceLevels = PriceLevels(descending=False)
+        self.short_stops: PriceLevels = PriceLevels(descending=True)
+
+    def levels_of(self, order: OrderData) -> PriceLevels:
+        if order.type == OrderType.LIMIT:
+            return self.long_limits if order.direction == Direction.LONG else self.short_limits
+        return self.long_stops if order.direction == Direction.LONG else self.short_stops
 
-from typing import overload
-from .import OrderBook
-from abquant.trader.msg import TickData, OrderData
 
 class TickOrderBook(OrderBook):
-    
-    # TODO
-    def update_bar(self, bar: TickData) -> None:
-        return super().update_bar(bar)
-    
-    def insert_order(self, order: OrderData) -> OrderData:
-        return super().insert_order(order)
+    """
+    tick level simulated matching. resting orders are indexed by symbol, side and price level, a tick only touches
+    the levels it crosses: O(log n + matched) per tick instead of scanning every order.
+
+    matching of a tick, in price-time priority:
+    1. limit orders crossed by the opposite best quote are filled at the quote price (or their price if better),
+       up to best_ask_volume / best_bid_volume, unlimited if the volume is 0.
+    2. limit orders not crossed by the quote and priced strictly better than trade_price are filled at their price,
+       up to trade_volume less the volume of their side filled in 1.
+       a trade at exactly the order price fills nothing, as queue position is unknown at tick level.
+    3. stop market orders are triggered by trade_price (the best quote if no trade in the tick),
+       filled in full at the trigger price or their price if worse.
+    partially filled orders stay in the book with status PARTTRADED.
+    """
+
+    def __init__(self):
+        super(TickOrderBook, self).__init__()
+        self.books: Dict[str, SymbolBook] = {}
+        self.ticks: Dict[str, TickData] = {}
+        # symbols of ticks not matched yet
+        self.updated: Set[str] = set()
+        self.trade_count = 0
+
+    def newest_ticks(self) -> Dict[str, TickData]:
+        return self.ticks
+
+    def update_tick(self, tick: TickData) -> None:
+        self.ticks[tick.ab_symbol] = tick
+        self.updated.add(tick.ab_symbol)
+
+    def _book(self, ab_symbol: str) -> SymbolBook:
+        book = self.books.get(ab_symbol, None)
+        if book is None:
+            book = self.books[ab_symbol] = SymbolBook()
+        return book
+
+    def insert_order(self, order: OrderData) -> str:
+        ab_orderid = super().insert_order(order)
+        self._book(order.ab_symbol).levels_of(order).add(order)
+        # a marketable order is matched by the latest tick on the next match_orders.
+        if order.ab_symbol in self.ticks:
+            self.updated.add(order.ab_symbol)
+        return ab_orderid
+
+    def cancel_order(self, ab_orderid: str) -> Optional[OrderData]:
+        order = super().cancel_order(ab_orderid)
+        if order is not None:
+            self._book(order.ab_symbol).levels_of(order).remove(order)
+        return order
+
+    def match_orders(self) -> Iterable[Tuple[OrderData, TradeData]]:
+        updated = self.updated
+        while updated:
+            tick = self.ticks[updated.pop()]
+            book = self.books.get(tick.ab_symbol, None)
+            if book is None:
+                continue
+            yield from self.match_tick(book, tick)
+
+    def match_tick(self, book: SymbolBook, tick: TickData) -> Iterable[Tuple[OrderData, TradeData]]:
+        ask = tick.best_ask_price
+        bid = tick.best_bid_price
+        # the quote stage fills the orders at or through the quote, the trade stage only the ones inside it.
+        long_bound = ask if ask > 0 else INFINITY
+        short_bound = bid if bid > 0 else -INFINITY
+        long_filled = short_filled = 0
+        if ask > 0:
+            long_filled = yield from self._match_limits(
+                book.long_limits, tick, lambda price: price >= ask, lambda order: min(order.price, ask),
+                tick.best_ask_volume or INFINITY)
+        if bid > 0:
+            short_filled = yield from self._match_limits(
+                book.short_limits, tick, lambda price: price <= bid, lambda order: max(order.price, bid),
+                tick.best_bid_volume or INFINITY)
+
+        trade_price = tick.trade_price
+        if trade_price > 0 and tick.trade_volume > 0:
+            yield from self._match_limits(
+                book.long_limits, tick, lambda price: trade_price < price < long_bound,
+                lambda order: min(order.price, long_bound), tick.trade_volume - long_filled)
+            yield from self._match_limits(
+                book.short_limits, tick, lambda price: short_bound < price < trade_price,
+                lambda order: max(order.price, short_bound), tick.trade_volume - short_filled)
+
+        long_trigger = trade_price or ask
+        if long_trigger > 0:
+            yield from self._match_stops(
+                book.long_stops, tick, lambda price: price <= long_trigger, lambda order: max(order.price, long_trigger))
+        short_trigger = trade_price or bid
+        if short_trigger > 0:
+            yield from self._match_stops(
+                book.short_stops, tick, lambda price: price >= short_trigger, lambda order: min(order.price, short_trigger))
+
+    def _match_limits(
+            self,
+            levels: PriceLevels,
+            tick: TickData,
+            crossed: Callable[[float], bool],
+            fill_price: Callable[[OrderData], float],
+            available: float) -> Generator[Tuple[OrderData, TradeData], None, float]:
+        """
+        :return: the volume filled.
+        """
+        filled = 0
+        while available > 0:
+            best = levels.best()
+            if best is None or not crossed(best[0]):
+                break
+            level = best[1]
+            for order in list(level.values()):
+                volume = min(order.volume - order.traded, available)
+                available -= volume
+                filled += volume
+                order.traded += volume
+                if order.traded >= order.volume:
+                    order.status = Status.ALLTRADED
+                    del level[order.ab_orderid]
+                    self.active_limit_orders.pop(order.ab_orderid, None)
+                else:
+                    order.status = Status.PARTTRADED
+                yield order, self._trade(order, fill_price(order), volume, tick)
+                if available <= 0:
+                    break
+        return filled
+
+    def _match_stops(
+            self,
+            levels: PriceLevels,
+            tick: TickData,
+            triggered: Callable[[float], bool],
+            fill_price: Callable[[OrderData], float]) -> Iterable[Tuple[OrderData, TradeData]]:
+        while True:
+            best = levels.best()
+            if best is None or not triggered(best[0]):
+                return
+            level = best[1]
+            for order in list(level.values()):
+                volume = order.volume - order.traded
+                order.traded = order.volume
+                order.status = Status.ALLTRADED
+                del level[order.ab_orderid]
+                self.stop_market_orders.pop(order.ab_orderid, None)
+                yield order, self._trade(order, fill_price(order), volume, tick)
+
+    def _trade(self, order: OrderData, price: float, volume: float, tick: TickData) -> TradeData:
+        self.trade_count += 1
+        return TradeData(
+            symbol=order.symbol,
+            exchange=order.exchange,
+            orderid=order.orderid,
+            tradeid=str(self.trade_count),
+            direction=order.direction,
+            offset=order.offset,
+            price=price,
+            volume=volume,
+            datetime=tick.datetime,
+            gateway_name=order.gateway_name,
+        )
@@ -2,6 +2,7 @@ from abquant.gateway.basegateway import Gateway
 from typing import Dict, Optional
 from abquant.trader.msg import EntrustData, TickData, DepthData, TransactionData, OrderData, TradeData
 from abquant.trader.object import PositionData, AccountData, ContractData
+from abquant.trader.utility import SymbolTable
 from abquant.event import Event
 from abquant.event import EventType
 from abquant.event import EventDispatcher
@@ -12,10 +13,11 @@ class OrderManager:
         """"""
         self.event_dispatcher = event_dispatcher
 
-        self.ticks: Dict[str, TickData] = {}
-        self.depths: Dict[str, DepthData] = {}
-        self.entrusts: Dict[str, EntrustData] = {}
-        self.transactions: Dict[str, TransactionData] = {}
+        # latest market data indexed by symbol_id.
+        self.ticks: SymbolTable = SymbolTable()
+        self.depths: SymbolTable = SymbolTable()
+        self.entrusts: SymbolTable = SymbolTable()
+        self.transactions: SymbolTable = SymbolTable()
         self.orders: Dict[str, OrderData] = {}
         self.trades: Dict[str, TradeData] = {}
         self.positions: Dict[str, PositionData] = {}
@@ -53,19 +55,19 @@ class OrderManager:
     def process_tick_event(self, event: Event) -> None:
         """"""
         tick = event.data
-        self.ticks[tick.ab_symbol] = tick
+        self.ticks[tick.symbol_id] = tick
 
     def process_depth_event(self, event: Event) -> None:
         depth = event.data
-        self.depths[depth.ab_symbol] = depth
+        self.depths[depth.symbol_id] = depth
 
     def process_transaction_event(self, event: Event) -> None:
         transaction = event.data
-        self.transactions[transaction.ab_symbol] = transaction
+        self.transactions[transaction.symbol_id] = transaction
 
     def process_entrust_event(self, event: Event) -> None:
         entrust = event.data
-        self.entrusts[entrust.ab_symbol] = entrust
+        self.entrusts[entrust.symbol_id] = entrust
 
     def process_order_event(self, event: Event) -> None:
         """"""
@@ -105,16 +107,16 @@ class OrderManager:
         self.gateways[gateway.gateway_name] = gateway
 
     def get_tick(self, ab_symbol: str) -> Optional[TickData]:
-        return self.ticks.get(ab_symbol, None)
+        return self.ticks.get(ab_symbol)
 
     def get_depth(self, ab_symbol: str) -> Optional[DepthData]:
-        return self.depths.get(ab_symbol, None)
+        return self.depths.get(ab_symbol)
 
     def get_transaction(self, ab_symbol: str) -> Optional[TransactionData]:
-        return self.transactions.get(ab_symbol, None)
+        return self.transactions.get(ab_symbol)
 
     def get_entrust(self, ab_symbol: str) -> Optional[EntrustData]:
-        return self.entrusts.get(ab_symbol, None)
+        return self.entrusts.get(ab_symbol)
 
     def get_order(self, ab_orderid: str) -> Optional[OrderData]:
         return self.orders.get(ab_orderid, None)
@@ -7,6 +7,7 @@ from abquant.trader.common import Interval
 
 from .template import StrategyTemplate
 from .livestrategyrunner import LiveStrategyRunner
+from .multiprocessrunner import MultiProcessStrategyRunner
 
 
 class BacktestingMode(Enum):
@@ -29,6 +30,8 @@ class BacktestParameter:
         inverses: DefaultDict[str, bool] = defaultdict(lambda: False),
         mode: BacktestingMode = BacktestingMode.BAR,
         annual_days: int = 365,
+        streaming: bool = False,
+        minute_equity: bool = False,
     ):
         self.ab_symbols: List[str] = ab_symbols
         self.interval: Interval = interval
@@ -44,6 +47,10 @@ class BacktestParameter:
 
         self.mode: BacktestingMode = mode
         self.annual_days: int = annual_days
+        # replay day chunks merged on the fly instead of loading the whole history first.
+        self.streaming: bool = streaming
+        # balance of every minute recorded in the replay, for intraday drawdown statistics.
+        self.minute_equity: bool = minute_equity
 
     # TODO checkout inverse 
     # def 
@@ -64,7 +71,34 @@ class BacktestParameter:
             capital=self.capital,
             inverses=self.inverse,
             annual_days=self.annual_days,
-            mode=self.mode
+            mode=self.mode,
+            streaming=self.streaming,
+            minute_equity=self.minute_equity,
         )
 
-from .backteststrategyrunner import BacktestStrategyRunner
\ No newline at end of file
+    def runner_kwargs(self, ab_symbols: List[str]) -> Dict:
+        """
+        keyword arguments of a ReplayRunner of some symbols, picklable to a worker process.
+        """
+        sub_parameter = self.sub_parameter(ab_symbols)
+        return dict(
+            ab_symbols=ab_symbols,
+            interval=sub_parameter.interval,
+            rates=sub_parameter.rates,
+            slippages=sub_parameter.slippages,
+            sizes=sub_parameter.sizes,
+            priceticks=sub_parameter.priceticks,
+            capital=sub_parameter.capital,
+            # a plain dict, the default defaultdict of inverses is not picklable.
+            inverse={ab_symbol: sub_parameter.inverse[ab_symbol] for ab_symbol in ab_symbols},
+            annual_days=sub_parameter.annual_days,
+            mode=sub_parameter.mode,
+            streaming=sub_parameter.streaming,
+            minute_equity=sub_parameter.minute_equity,
+        )
+
+from .backteststrategyrunner import BacktestStrategyRunner
+from .history import BarArrays
+from .vectorrunner import VectorReplayRunner, VectorStrategyTemplate, signals_to_positions
+from .optimizer import OptimizationSetting, StrategyOptimizer
+from .walkforward import WalkForwardRunner
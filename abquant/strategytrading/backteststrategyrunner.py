@@ -1,4 +1,6 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 from typing import Dict, Iterable, List, OrderedDict, Text, Tuple, Type
 from datetime import datetime
 from collections import OrderedDict as OrderedDictionary
@@ -12,7 +14,9 @@ from abquant.dataloader import DataLoader
 from . import BacktestParameter, BacktestingMode
 from .template import DummyStrategy, StrategyTemplate
 from .strategyrunner import StrategyManager, StrategyRunner, LOG_LEVEL
+from .history import BarArrays, SharedBarArrays, attached_bars
 from .replayrunner import ReplayRunner
+from .vectorrunner import VectorReplayRunner, VectorStrategyTemplate
 from .result import ContractsDailyResult
 
 
@@ -35,22 +39,9 @@ class BacktestStrategyRunner(StrategyManager):
         if strategy_name.lower() == 'portofolio':
             raise ValueError("strategy_name: {} is reserved, use another strategy name.".format(strategy_name))
 
-        try:
-            sub_parameter = self.parameter.sub_parameter(ab_symbols)
-        except KeyError as e:
-            raise KeyError(f"{e} is not in backtest parameter")
-        replay_runner = ReplayRunner(
-            ab_symbols=ab_symbols,
-            interval=sub_parameter.interval,
-            rates=sub_parameter.rates,
-            slippages=sub_parameter.slippages,
-            sizes=sub_parameter.sizes,
-            priceticks=sub_parameter.priceticks,
-            capital=sub_parameter.capital,
-            inverse=sub_parameter.inverse,
-            annual_days=sub_parameter.annual_days,
-            mode=sub_parameter.mode,
-        )
+        # strategies of target positions are backtested vectorized.
+        runner_class = VectorReplayRunner if issubclass(strategy_class, VectorStrategyTemplate) else ReplayRunner
+        replay_runner = runner_class(**self._runner_kwargs(ab_symbols))
         strategy = strategy_class(
             replay_runner, strategy_name, ab_symbols, setting)
         self.strategies[strategy_name] = strategy
@@ -71,21 +62,30 @@ class BacktestStrategyRunner(StrategyManager):
 
     def run_backtest(
         self, start_dt: datetime, end_dt: datetime,
-        interval: Interval = Interval.MINUTE, output_log: bool = False
+        interval: Interval = Interval.MINUTE, output_log: bool = False,
+        processes: int = 0, start_method: str = "spawn"
     ) -> Tuple[OrderedDict[Text, Iterable[TradeData]], OrderedDict[Text, Iterable[ContractsDailyResult]], OrderedDict[Text, Dict]]:
+        """
+        processes > 0 replays strategies in a pool of as many worker processes.
+        the history of all symbols is then loaded once, into shared memory attached read-only by the workers,
+        and reused by the portofolio pass. strategy classes must be importable by workers.
+        """
         assert interval == Interval.MINUTE, "for now, only Minute interval backtest are supported. Tick level may supported later."
         if self.data_loader is None:
             raise AttributeError("data_loader is not set")
         trade_datas, daily_results, statistics = OrderedDictionary(), OrderedDictionary(), OrderedDictionary()
 
-        portofolio_ab_symbols = set()
         start_dt = datetime.fromordinal(start_dt.date().toordinal())
         end_dt = datetime.fromordinal(end_dt.date().toordinal())
-        
+
+        if processes:
+            return self._run_parallel(start_dt, end_dt, output_log, processes, start_method)
+
+        portofolio_ab_symbols = []
         while self.strategies:
             strategy_name, strategy = self.strategies.popitem(last=False)
             ab_symbols = strategy.ab_symbols
-            portofolio_ab_symbols.update(ab_symbols)
+            portofolio_ab_symbols.extend(ab_symbol for ab_symbol in ab_symbols if ab_symbol not in portofolio_ab_symbols)
 
             replay_runner = self.replay_runners.pop(strategy_name)
             replay_runner.set_data_loader(self.data_loader)
@@ -106,37 +106,37 @@ class BacktestStrategyRunner(StrategyManager):
             daily_results[strategy_name] = replay_runner.sorted_daily_results()
             statistics[strategy_name] = statistic
             print(f"{strategy_name} calculate static done========================")
-        
-        if len(statistics) <=1:
-            return trade_datas, daily_results, statistics
 
-        strategy_name = 'portofolio'
+        if len(statistics) > 1:
+            self._run_portofolio(portofolio_ab_symbols, start_dt, end_dt, output_log,
+                                 trade_datas, daily_results, statistics)
+        return trade_datas, daily_results, statistics
+
+    def _runner_kwargs(self, ab_symbols: List[str]) -> Dict:
         try:
-            sub_parameter = self.parameter.sub_parameter(portofolio_ab_symbols)
+            return self.parameter.runner_kwargs(ab_symbols)
         except KeyError as e:
             raise KeyError(f"{e} is not in backtest parameter")
-        replay_runner = ReplayRunner(
-            ab_symbols=list(portofolio_ab_symbols),
-            interval=sub_parameter.interval,
-            rates=sub_parameter.rates,
-            slippages=sub_parameter.slippages,
-            sizes=sub_parameter.sizes,
-            priceticks=sub_parameter.priceticks,
-            capital=sub_parameter.capital,
-            inverse=sub_parameter.inverse,
-            annual_days=sub_parameter.annual_days,
-            mode=sub_parameter.mode,
-        )
+
+    def _run_portofolio(
+            self, ab_symbols: List[str], start_dt: datetime, end_dt: datetime, output_log: bool,
+            trade_datas: OrderedDict, daily_results: OrderedDict, statistics: OrderedDict,
+            history: BarArrays = None) -> None:
+        strategy_name = 'portofolio'
+        replay_runner = ReplayRunner(**self._runner_kwargs(ab_symbols))
 
         replay_runner.set_data_loader(self.data_loader)
-        strategy = DummyStrategy(replay_runner, strategy_name, list(portofolio_ab_symbols), {})
+        strategy = DummyStrategy(replay_runner, strategy_name, ab_symbols, {})
 
         replay_runner.set_strategy(strategy)
-        replay_runner.load_data(start_dt, end_dt)
+        if history is None:
+            replay_runner.load_data(start_dt, end_dt)
+        else:
+            replay_runner.set_history(history, start_dt, end_dt)
 
         for strategy_name_, trades in trade_datas.items():
             replay_runner.load_trades(strategy_name_, trades)
-        
+
         print(f"{strategy_name}, load data done========================")
         replay_runner.run_backtesting(output_log)
         print(f"{strategy_name} simulate matching done========================")
@@ -148,5 +148,68 @@ class BacktestStrategyRunner(StrategyManager):
         daily_results[strategy_name] = replay_runner.sorted_daily_results()
         statistics[strategy_name] = statistic
         print(f"{strategy_name} calculate static done========================")
-        
+
+    def _run_parallel(
+        self, start_dt: datetime, end_dt: datetime, output_log: bool, processes: int, start_method: str
+    ) -> Tuple[OrderedDict[Text, Iterable[TradeData]], OrderedDict[Text, Iterable[ContractsDailyResult]], OrderedDict[Text, Dict]]:
+        if self.parameter.streaming:
+            raise ValueError("parallel backtest shares the loaded history, streaming replay is not supported.")
+        trade_datas, daily_results, statistics = OrderedDictionary(), OrderedDictionary(), OrderedDictionary()
+
+        tasks = []
+        portofolio_ab_symbols = []
+        while self.strategies:
+            strategy_name, strategy = self.strategies.popitem(last=False)
+            self.replay_runners.pop(strategy_name)
+            ab_symbols = strategy.ab_symbols
+            portofolio_ab_symbols.extend(ab_symbol for ab_symbol in ab_symbols if ab_symbol not in portofolio_ab_symbols)
+            tasks.append((strategy.__class__, strategy_name, ab_symbols, strategy.get_parameters(),
+                          self._runner_kwargs(ab_symbols)))
+        if not tasks:
+            return trade_datas, daily_results, statistics
+
+        loader = ReplayRunner(**self._runner_kwargs(portofolio_ab_symbols))
+        loader.set_data_loader(self.data_loader)
+        loader.load_data(start_dt, end_dt)
+        shared = SharedBarArrays.create(loader.history)
+        loader.history = None
+        print("history of {} symbols shared, {:.1f} MB========================".format(
+            len(portofolio_ab_symbols), shared.shm.size / 2 ** 20))
+
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(start_method)) as pool:
+                futures = [
+                    pool.submit(replay_strategy, task + (shared.spec, start_dt, end_dt, output_log)) for task in tasks
+                ]
+                for future in futures:
+                    strategy_name, trades, results, statistic = future.result()
+                    trade_datas[strategy_name] = trades
+                    daily_results[strategy_name] = results
+                    statistics[strategy_name] = statistic
+                    print(f"{strategy_name} calculate static done========================")
+
+            if len(statistics) > 1:
+                self._run_portofolio(portofolio_ab_symbols, start_dt, end_dt, output_log,
+                                     trade_datas, daily_results, statistics,
+                                     history=shared.bars.select(portofolio_ab_symbols))
+        finally:
+            shared.close()
         return trade_datas, daily_results, statistics
+
+
+def replay_strategy(task: tuple) -> Tuple[str, List[TradeData], List[ContractsDailyResult], Dict]:
+    """
+    replay of one strategy in a worker process of BacktestStrategyRunner, on the shared history.
+    """
+    strategy_class, strategy_name, ab_symbols, setting, runner_kwargs, spec, start_dt, end_dt, output_log = task
+
+    runner_class = VectorReplayRunner if issubclass(strategy_class, VectorStrategyTemplate) else ReplayRunner
+    replay_runner = runner_class(**runner_kwargs)
+    strategy = strategy_class(replay_runner, strategy_name, ab_symbols, setting)
+    replay_runner.set_strategy(strategy)
+    replay_runner.set_history(attached_bars(spec).select(ab_symbols), start_dt, end_dt)
+
+    replay_runner.run_backtesting(output_log)
+    df = replay_runner.calculate_result()
+    statistic = replay_runner.calculate_statistics(df)
+    return strategy_name, replay_runner.sorted_trades(), replay_runner.sorted_daily_results(), statistic
@@ -0,0 +1,264 @@
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from abquant.trader.common import Interval
+from abquant.trader.msg import BarData
+from abquant.trader.utility import extract_ab_symbol
+
+
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+DAY_MINUTES = 24 * 60
+
+
+def to_minute(dt: datetime) -> int:
+    """
+    minutes since epoch of a naive datetime, as the data loaders give.
+    """
+    return (dt - EPOCH) // MINUTE
+
+
+def from_minute(minute: int) -> datetime:
+    return EPOCH + timedelta(minutes=int(minute))
+
+
+class BarColumns:
+    """
+    minute bars of one symbol being loaded, gathered chunk by chunk into numpy arrays.
+    """
+
+    def __init__(self):
+        self.chunks: List[np.ndarray] = []
+        self.gateway_name: str = ""
+
+    def extend(self, bars: Iterable[BarData]) -> int:
+        rows = []
+        for bar in bars:
+            rows.append((to_minute(bar.datetime), bar.open_price, bar.high_price, bar.low_price, bar.close_price,
+                         bar.volume))
+        if rows:
+            self.gateway_name = bar.gateway_name
+            self.chunks.append(np.array(rows, dtype=float))
+        return len(rows)
+
+    def array(self) -> np.ndarray:
+        """
+        (n, 6) of minute, open, high, low, close, volume, sorted by minute, last one kept of a duplicated minute.
+        """
+        if not self.chunks:
+            return np.empty((0, 6))
+        array = np.concatenate(self.chunks)
+        array = array[np.argsort(array[:, 0], kind="stable")]
+        if len(array) > 1:
+            last = np.append(array[1:, 0] != array[:-1, 0], True)
+            array = array[last]
+        return array
+
+
+class BarArrays:
+    """
+    minute bars of a backtest as columns: an int64 grid of minutes since epoch over all symbols,
+    (minutes, symbols) float64 arrays of each field aligned to it.
+    a bar missed after the first bar of its symbol is forward filled by the last close_price with volume 0,
+    before it the fields are nan. present marks the bars loaded.
+    arrays may be given, e.g. views of shared memory, instead of allocated.
+    """
+    FIELDS = ("open", "high", "low", "close", "volume")
+
+    def __init__(
+            self,
+            ab_symbols: List[str],
+            minutes: np.ndarray,
+            gateway_names: List[str] = None,
+            fields: Dict[str, np.ndarray] = None,
+            present: np.ndarray = None):
+        self.ab_symbols: List[str] = list(ab_symbols)
+        self.minutes: np.ndarray = np.asarray(minutes, dtype=np.int64)
+        self.gateway_names: List[str] = gateway_names or [""] * len(self.ab_symbols)
+        shape = (len(self.minutes), len(self.ab_symbols))
+        if fields is None:
+            fields = {field: np.full(shape, np.nan) for field in self.FIELDS}
+            fields["volume"][:] = 0
+        self.open: np.ndarray = fields["open"]
+        self.high: np.ndarray = fields["high"]
+        self.low: np.ndarray = fields["low"]
+        self.close: np.ndarray = fields["close"]
+        self.volume: np.ndarray = fields["volume"]
+        self.present: np.ndarray = present if present is not None else np.zeros(shape, dtype=bool)
+        self.symbols: List[Tuple[str, object]] = [extract_ab_symbol(ab_symbol) for ab_symbol in self.ab_symbols]
+        self.templates: List[dict] = None
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, BarColumns]) -> "BarArrays":
+        arrays = {ab_symbol: column.array() for ab_symbol, column in columns.items()}
+        minutes = np.unique(np.concatenate([array[:, 0] for array in arrays.values()])) \
+            if arrays else np.empty(0)
+        bars = cls(list(arrays), minutes.astype(np.int64), [column.gateway_name for column in columns.values()])
+        for index, array in enumerate(arrays.values()):
+            rows = np.searchsorted(bars.minutes, array[:, 0].astype(np.int64))
+            for field, values in zip((bars.open, bars.high, bars.low, bars.close, bars.volume), array[:, 1:].T):
+                field[rows, index] = values
+            bars.present[rows, index] = True
+        return bars
+
+    def select(self, ab_symbols: List[str]) -> "BarArrays":
+        """
+        bars of some symbols on their own grid, the minutes where any of them has a bar.
+        arrays are views when the symbols are adjacent columns in order and cover the whole grid, copies otherwise.
+        """
+        columns = [self.column(ab_symbol) for ab_symbol in ab_symbols]
+        if columns == list(range(columns[0], columns[0] + len(columns))):
+            columns = slice(columns[0], columns[0] + len(columns))
+        rows = self.present[:, columns].any(axis=1)
+        rows = slice(None) if rows.all() else np.flatnonzero(rows)
+        fields = {field: getattr(self, field)[rows][:, columns] for field in self.FIELDS}
+        gateway_names = [self.gateway_names[self.column(ab_symbol)] for ab_symbol in ab_symbols]
+        return BarArrays(ab_symbols, self.minutes[rows], gateway_names, fields, self.present[rows][:, columns])
+
+    def slice(self, start: int, stop: int) -> "BarArrays":
+        """
+        bars of rows [start, stop), views of the arrays.
+        """
+        fields = {field: getattr(self, field)[start:stop] for field in self.FIELDS}
+        return BarArrays(self.ab_symbols, self.minutes[start:stop], self.gateway_names, fields,
+                         self.present[start:stop])
+
+    def __len__(self) -> int:
+        return len(self.minutes)
+
+    def column(self, ab_symbol: str) -> int:
+        return self.ab_symbols.index(ab_symbol)
+
+    @property
+    def datetimes(self) -> np.ndarray:
+        return self.minutes.astype("datetime64[m]")
+
+    @property
+    def days(self) -> np.ndarray:
+        """
+        days since epoch of each minute.
+        """
+        return self.minutes // DAY_MINUTES
+
+    def datetime(self, row: int) -> datetime:
+        return from_minute(self.minutes[row])
+
+    def forward_fill(self) -> np.ndarray:
+        """
+        :return: number of bars filled of each symbol.
+        """
+        missed = np.isnan(self.close)
+        if not missed.any():
+            return np.zeros(len(self.ab_symbols), dtype=int)
+        rows = np.where(missed, 0, np.arange(len(self.minutes))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        last_close = np.take_along_axis(self.close, rows, axis=0)
+        filled = missed & ~np.isnan(last_close)
+        for field in (self.open, self.high, self.low, self.close):
+            field[filled] = last_close[filled]
+        self.volume[filled] = 0
+        return filled.sum(axis=0)
+
+    def bars(self, row: int, dt: datetime = None) -> List[BarData]:
+        """
+        BarData of the symbols at row, symbols not started yet are left out.
+        created on demand, only the bars being dispatched exist as objects.
+        """
+        templates = self.templates
+        if templates is None:
+            templates = self.templates = [
+                BarData(gateway_name=gateway_name, symbol=symbol, exchange=exchange, datetime=EPOCH,
+                        interval=Interval.MINUTE).__dict__
+                for (symbol, exchange), gateway_name in zip(self.symbols, self.gateway_names)
+            ]
+        dt = dt or self.datetime(row)
+        bars = []
+        new = BarData.__new__
+        # fields of a template copied instead of __init__, symbols are resolved once per column.
+        for template, open_price, high_price, low_price, close_price, volume in zip(
+                templates, self.open[row].tolist(), self.high[row].tolist(), self.low[row].tolist(),
+                self.close[row].tolist(), self.volume[row].tolist()):
+            if close_price != close_price:
+                continue
+            bar = new(BarData)
+            fields = bar.__dict__
+            fields.update(template)
+            fields["datetime"] = dt
+            fields["volume"] = volume
+            fields["open_price"] = open_price
+            fields["high_price"] = high_price
+            fields["low_price"] = low_price
+            fields["close_price"] = close_price
+            bars.append(bar)
+        return bars
+
+
+class SharedBarArrays:
+    """
+    BarArrays copied into one shared memory block, attached read-only by other processes by spec.
+    layout: minutes int64 (n), then open, high, low, close, volume float64 (n, k), then present bool (n, k).
+    the creating process owns the block, close() unlinks it there.
+    """
+
+    def __init__(self, spec: dict, create_from: BarArrays = None):
+        rows, columns = spec["rows"], len(spec["ab_symbols"])
+        size = max(rows * 8 * (1 + len(BarArrays.FIELDS) * columns) + rows * columns, 1)
+        if create_from is not None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            spec["name"] = self.shm.name
+        else:
+            self.shm = shared_memory.SharedMemory(name=spec["name"])
+        self.spec: dict = spec
+        self.owner: bool = create_from is not None
+
+        offset = rows * 8
+        minutes = np.ndarray((rows,), dtype=np.int64, buffer=self.shm.buf)
+        fields = {}
+        for field in BarArrays.FIELDS:
+            fields[field] = np.ndarray((rows, columns), dtype=np.float64, buffer=self.shm.buf, offset=offset)
+            offset += rows * columns * 8
+        present = np.ndarray((rows, columns), dtype=bool, buffer=self.shm.buf, offset=offset)
+
+        if create_from is not None:
+            minutes[:] = create_from.minutes
+            for field, array in fields.items():
+                array[:] = getattr(create_from, field)
+            present[:] = create_from.present
+        for array in (minutes, present, *fields.values()):
+            array.flags.writeable = False
+        self.bars: BarArrays = BarArrays(spec["ab_symbols"], minutes, spec["gateway_names"], fields, present)
+
+    @classmethod
+    def create(cls, bars: BarArrays) -> "SharedBarArrays":
+        spec = {"rows": len(bars), "ab_symbols": bars.ab_symbols, "gateway_names": bars.gateway_names}
+        return cls(spec, bars)
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedBarArrays":
+        return cls(spec)
+
+    def close(self) -> None:
+        """
+        views of the block must be released before.
+        """
+        self.bars = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# blocks attached by this process, e.g. a pool worker, by name of the shared memory.
+_attached: Dict[str, SharedBarArrays] = {}
+
+
+def attached_bars(spec: dict) -> BarArrays:
+    """
+    bars of a shared block, attached once per process and kept until it exits.
+    """
+    shared = _attached.get(spec["name"], None)
+    if shared is None:
+        shared = _attached[spec["name"]] = SharedBarArrays.attach(spec)
+    return shared.bars
@@ -1,6 +1,8 @@
 import ast
 from dataclasses import dataclass
 import inspect
+import json
+import time
 from copy import Error
 from datetime import datetime, timedelta
 from types import TracebackType
@@ -13,12 +15,13 @@ from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
 from logging import ERROR, INFO, WARNING
 
 from abquant.ordermanager import OrderManager
+from abquant.monitor.latency import LatencyTracer, STAGE_HANDLER
 from abquant.trader.common import Direction, Interval, Offset, OrderType
 from abquant.trader.exception import MarketException
-from abquant.event import EventType, Event, EventDispatcher
+from abquant.event import EventType, Event, EventDispatcher, TimerHandle
 from abquant.trader.object import CancelRequest, ContractData, HistoryRequest, LogData, OrderRequest, PositionData, SubscribeRequest
 from abquant.trader.msg import BarData, DepthData, EntrustData, OrderData, TickData, TradeData, TransactionData
-from abquant.trader.utility import OrderGrouper, extract_ab_symbol, round_to
+from abquant.trader.utility import OrderGrouper, SymbolTable, extract_ab_symbol, round_to, symbol_registry
 from .template import StrategyTemplate
 from .strategyrunner import StrategyManager, StrategyRunner, LOG_LEVEL
 
@@ -36,9 +39,16 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
 
         self.symbol_strategys_map: Dict[str,
                                         List[StrategyTemplate]] = defaultdict(list)
+        # the same lists as symbol_strategys_map indexed by symbol_id, for market data dispatching.
+        self.symbol_strategys_table: SymbolTable = SymbolTable(default=())
         self.orderid_strategy_map: Dict[str, StrategyTemplate] = {}
         self.ab_tradeids: Set[str] = set()
 
+        self.latency_tracer: LatencyTracer = None
+        self.latency_report_interval: int = 0
+
+        self.strategy_timers: Dict[str, List[TimerHandle]] = defaultdict(list)
+
         # maybe it is not the best place to call init.
         self.init()
 
@@ -57,9 +67,15 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         strategy = strategy_class(self, strategy_name, ab_symbols, setting)
         self.strategies[strategy_name] = strategy
 
+        self.map_symbols(strategy, ab_symbols)
+        # callbacks of one strategy must not run concurrently in a sharded dispatcher.
+        self.event_dispatcher.pin_symbols(ab_symbols)
+
+    def map_symbols(self, strategy: StrategyTemplate, ab_symbols: Iterable[str]) -> None:
         for ab_symbol in ab_symbols:
             strategies = self.symbol_strategys_map[ab_symbol]
             strategies.append(strategy)
+            self.symbol_strategys_table[symbol_registry.id_of(ab_symbol)] = strategies
 
     def edit_strategy(self, strategy_name: str, setting: dict):
         strategy = self.strategies[strategy_name]
@@ -89,6 +105,8 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
             if ab_orderid in self.orderid_strategy_map:
                 self.orderid_strategy_map.pop(ab_orderid)
 
+        self.cancel_strategy_timers(strategy)
+
         # Remove from strategies
         self.strategies.pop(strategy_name)
 
@@ -170,6 +188,7 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         self.monitor.send_struct(strategy.run_id, "strategy_status", "stop")
         strategy.trading = False
         strategy.cancel_all()
+        self.cancel_strategy_timers(strategy)
 
 
     def init_all_strategies(self):
@@ -227,6 +246,35 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         self.event_dispatcher.register(
             EventType.EVENT_RAW, self.process_raw_event)
 
+    def enable_latency_tracing(self, report_interval: int = 60) -> LatencyTracer:
+        """
+        trace latency of events from exchange to strategy callbacks as histograms, see abquant.monitor.latency.
+        every report_interval seconds the summary of histograms are sent by monitor.send_struct, 0 for never.
+        """
+        if self.latency_tracer is None:
+            self.latency_tracer = LatencyTracer()
+            self.event_dispatcher.set_tracer(self.latency_tracer)
+        self.latency_report_interval = report_interval
+        return self.latency_tracer
+
+    def disable_latency_tracing(self) -> None:
+        self.event_dispatcher.set_tracer(None)
+        self.latency_tracer = None
+
+    def get_latency_stats(self) -> Dict:
+        """
+        {stage: {gateway_name or strategy_name: {event type or callback: summary}}}
+        """
+        if self.latency_tracer is None:
+            return {}
+        return self.latency_tracer.snapshot()
+
+    def report_latency(self) -> None:
+        for (stage, source, kind), histogram in self.latency_tracer.items():
+            if not histogram.count:
+                continue
+            self.monitor.send_struct(self.MAC, "latency_" + stage, json.dumps(histogram.summary()), source=source, kind=kind)
+
     def process_timer_event(self, event: Event):
         """"""
         interval: int = event.data
@@ -236,7 +284,11 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
                 self.call_strategy_func(strategy, strategy.on_timer, interval)
                 if (new_timer_count // 10) != self.timer_count // 10:
                     self.monitor.send_status(strategy.run_id, 'heartbeat', strategy.ab_symbols)
-            
+
+        if (self.latency_tracer is not None and self.latency_report_interval and
+                (new_timer_count // self.latency_report_interval) != self.timer_count // self.latency_report_interval):
+            self.report_latency()
+
         self.timer_count = new_timer_count
                 
 
@@ -254,7 +306,7 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         """"""
         tick: TickData = event.data
 
-        strategies = self.symbol_strategys_map[tick.ab_symbol]
+        strategies = self.symbol_strategys_table[tick.symbol_id]
         if not strategies:
             return
 
@@ -266,7 +318,7 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         """"""
         depth: DepthData = event.data
 
-        strategies = self.symbol_strategys_map[depth.ab_symbol]
+        strategies = self.symbol_strategys_table[depth.symbol_id]
         if not strategies:
             return
 
@@ -278,7 +330,7 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         """"""
         entrust: EntrustData = event.data
 
-        strategies = self.symbol_strategys_map[entrust.ab_symbol]
+        strategies = self.symbol_strategys_table[entrust.symbol_id]
         if not strategies:
             return
 
@@ -290,7 +342,7 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         """"""
         transaction: TransactionData = event.data
 
-        strategies = self.symbol_strategys_map[transaction.ab_symbol]
+        strategies = self.symbol_strategys_table[transaction.symbol_id]
         if not strategies:
             return
 
@@ -419,18 +471,46 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
     # def cancel_all(self) ->None:
     #     pass
 
+    def schedule_timer(self, strategy: StrategyTemplate, callback: Callable[[], None], delay: float, interval: float = 0) -> TimerHandle:
+        """
+        callback is called by call_strategy_func in the dispatcher thread, skipped while strategy is not inited.
+        """
+        def fire():
+            if strategy.inited:
+                self.call_strategy_func(strategy, callback)
+        fire.__name__ = getattr(callback, "__name__", "timer")
+
+        handles = self.strategy_timers[strategy.strategy_name]
+        # drop one-shot timers already expired, so that handles do not pile up.
+        now = time.monotonic()
+        handles[:] = [handle for handle in handles if not handle.cancelled and (handle.interval > 0 or handle.deadline > now)]
+        handle = self.event_dispatcher.schedule(fire, delay, interval)
+        handles.append(handle)
+        return handle
+
+    def cancel_timer(self, strategy: StrategyTemplate, handle: TimerHandle) -> None:
+        self.event_dispatcher.cancel_timer(handle)
+
+    def cancel_strategy_timers(self, strategy: StrategyTemplate) -> None:
+        for handle in self.strategy_timers.pop(strategy.strategy_name, []):
+            self.event_dispatcher.cancel_timer(handle)
+
     def call_strategy_func(
         self, strategy: StrategyTemplate, func: Callable, params: Any = None
     ) -> bool:
         """
         Call function of a strategy and catch any exception raised.
         """
-        #  timer or something monitor decorator function could be here.
+        tracer = self.latency_tracer
+        if tracer is not None:
+            start = time.perf_counter()
         try:
             if params:
                 func(params)
             else:
                 func()
+            if tracer is not None:
+                tracer.record(STAGE_HANDLER, strategy.strategy_name, func.__name__, time.perf_counter() - start)
         except Exception:
             strategy.trading = False
             strategy.inited = False
@@ -478,14 +558,15 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
         return data
 
 
-    def load_bars_warm_up(self,
-                  strategy: StrategyTemplate,
-                  start: datetime,
-                  end: datetime,
-                  interval: Interval = Interval.MINUTE, 
-                  on_interval: Callable[[Dict[str, BarData]], None]=None):
-
-        ab_symbols = strategy.ab_symbols
+    def iter_history_bars(self,
+                          ab_symbols: List[str],
+                          start: datetime,
+                          end: datetime,
+                          interval: Interval = Interval.MINUTE) -> Iterable[Dict[str, BarData]]:
+        """
+        bars of ab_symbols aligned by datetime, missing bar filled with the last close price.
+        notice the same dict is yielded every time, copy it if kept.
+        """
         dts: Set[datetime] = set()
         history_data: Dict[Tuple, BarData] = {}       
 
@@ -518,14 +599,25 @@ class LiveStrategyRunner(StrategyRunner, StrategyManager):
                         gateway_name=last_bar.gateway_name
                     )
                     bars[ab_symbol] = bar
+            yield bars
+
+    def load_bars_warm_up(self,
+                  strategy: StrategyTemplate,
+                  start: datetime,
+                  end: datetime,
+                  interval: Interval = Interval.MINUTE, 
+                  on_interval: Callable[[Dict[str, BarData]], None]=None):
+
+        for bars in self.iter_history_bars(strategy.ab_symbols, start, end, interval):
+            self.check_load_interval(strategy, interval, on_interval)
+            self.call_strategy_func(strategy, strategy.on_bars, bars)
+
+    def check_load_interval(self, strategy: StrategyTemplate, interval: Interval, on_interval: Any) -> None:
+        if on_interval and interval != Interval.MINUTE:
+            raise NotImplementedError("non-minute-interval load_bars are not supported yet.")
+        if on_interval:
+            self.write_log("call load_bar in 1 min Interval, will automatically call strategy.on_bars, the parameter on_interval will not be used.", strategy, WARNING)
 
-            if not on_interval or interval == Interval.MINUTE:
-                if on_interval:
-                    self.write_log("call load_bar in 1 min Interval, will automatically call strategy.on_bars, the parameter on_interval will not be used.", strategy, WARNING)
-                self.call_strategy_func(strategy, strategy.on_bars, bars)
-            else:
-                raise NotImplementedError("non-minute-interval load_bars are not supported yet.")
-        
  
 
 
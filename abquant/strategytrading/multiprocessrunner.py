@@ -0,0 +1,551 @@
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from itertools import count
+import multiprocessing
+import pickle
+from threading import Event as ThreadingEvent, Lock, Thread
+import time
+import traceback
+from typing import Any, Callable, Deque, Dict, Iterable, List, Tuple
+from logging import ERROR, INFO, WARNING
+
+from abquant.event import EventDispatcher, Event, TimerHandle, TimerWheel
+from abquant.event.sharedring import SharedMemoryRing
+from abquant.trader.common import Direction, Interval, Offset, OrderType
+from abquant.trader.msg import BarData, OrderData, TickData, TradeData
+from .livestrategyrunner import LiveStrategyRunner
+from .strategyrunner import StrategyRunner, LOG_LEVEL
+from .template import StrategyTemplate
+
+
+class StrategyWorker:
+    """
+    parent side handle of a worker process hosting one or several strategies.
+    messages are tuples sent over a duplex pipe:
+    parent -> worker: ("call", call_id, command, args), ("order"/"trade"/"timer"/"exception"/"edit", strategy_name, data),
+                      ("reply", request_id, ok, result)
+    worker -> parent: ("reply", call_id, ok, result), ("request", request_id, method, args), ("crashed", strategy_name, detail)
+    request_id 0 means no reply is expected.
+    """
+
+    def __init__(self, name: str, runner: "MultiProcessStrategyRunner", context):
+        self.name: str = name
+        self.runner: "MultiProcessStrategyRunner" = runner
+        self.strategies: Dict[str, "RemoteStrategy"] = {}
+
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(name, child_conn, runner.ring.name),
+                                       name="StrategyWorker-{}".format(name), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.alive: bool = True
+        self.closing: bool = False
+
+        self._send_lock: Lock = Lock()
+        self._call_ids = count(1)
+        self._calls: Dict[int, list] = {}
+        self._thread: Thread = Thread(target=self._receive, name="StrategyWorkerReceiver-{}".format(name), daemon=True)
+        self._thread.start()
+
+    def send(self, message: Tuple) -> None:
+        if not self.alive:
+            return
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                # worker died, the receiver thread deals with it.
+                pass
+
+    def call(self, command: str, *args) -> Any:
+        """
+        run command in the worker and wait for the result, exception raised in the worker is raised here.
+        """
+        call_id = next(self._call_ids)
+        waiter = [ThreadingEvent(), False, RuntimeError("worker {} exited.".format(self.name))]
+        self._calls[call_id] = waiter
+        self.send(("call", call_id, command, args))
+        while not waiter[0].wait(1):
+            if not self.alive:
+                break
+        self._calls.pop(call_id, None)
+        if not waiter[1]:
+            raise waiter[2]
+        return waiter[2]
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "reply":
+                _, call_id, ok, result = message
+                waiter = self._calls.get(call_id, None)
+                if waiter is not None:
+                    waiter[1] = ok
+                    waiter[2] = result
+                    waiter[0].set()
+            elif kind == "request":
+                _, request_id, method, args = message
+                try:
+                    result = self.runner.serve_request(method, args)
+                    ok = True
+                except Exception as e:
+                    self.runner.write_log("request {} from worker {} failed.\n{}".format(
+                        method, self.name, traceback.format_exc()), level=ERROR)
+                    result = e
+                    ok = False
+                if request_id:
+                    self.send(("reply", request_id, ok, result))
+            elif kind == "crashed":
+                _, strategy_name, detail = message
+                strategy = self.strategies.get(strategy_name, None)
+                if strategy:
+                    self.runner.on_strategy_crashed(strategy, detail)
+
+        self.alive = False
+        for waiter in list(self._calls.values()):
+            waiter[0].set()
+        self.runner.on_worker_exited(self)
+
+    def stop(self, timeout: float = 5) -> None:
+        self.closing = True
+        if self.alive:
+            self.send(("exit",))
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class RemoteStrategy(StrategyTemplate):
+    """
+    parent side proxy of a strategy hosted by a worker process.
+    it keeps orders, active_orderids and pos from order/trade events for monitor, and for cancelling orders of the strategy
+    if it crashed. callbacks are forwarded to the worker, market data goes through the shared memory ring instead.
+    """
+
+    def __init__(self, strategy_runner: "MultiProcessStrategyRunner", strategy_name: str, ab_symbols: List[str],
+                 setting: dict, strategy_class: type, worker: StrategyWorker):
+        self.strategy_class: type = strategy_class
+        self.worker: StrategyWorker = worker
+        self.parameters = list(strategy_class.parameters)
+        for name in self.parameters:
+            setattr(self, name, getattr(strategy_class, name, None))
+        super(RemoteStrategy, self).__init__(strategy_runner, strategy_name, ab_symbols, setting)
+
+    def update_setting(self, setting: dict) -> None:
+        super(RemoteStrategy, self).update_setting(setting)
+        # worker is told by add command when proxy is created.
+        if self.strategy_name in self.worker.strategies:
+            self.worker.send(("edit", self.strategy_name, setting))
+
+    def on_init(self) -> None:
+        if not self.worker.call("init", self.strategy_name):
+            raise RuntimeError("strategy {} failed to init in worker {}.".format(self.strategy_name, self.worker.name))
+
+    def on_start(self) -> None:
+        if not self.worker.call("start", self.strategy_name):
+            raise RuntimeError("strategy {} failed to start in worker {}.".format(self.strategy_name, self.worker.name))
+
+    def on_stop(self) -> None:
+        self.worker.call("stop", self.strategy_name)
+
+    def on_tick(self, tick: TickData) -> None:
+        pass
+
+    def on_bars(self, bars: Dict[str, BarData]) -> None:
+        pass
+
+    def on_timer(self, interval: int) -> None:
+        self.worker.send(("timer", self.strategy_name, interval))
+
+    def on_exception(self, exception: Exception) -> None:
+        self.worker.send(("exception", self.strategy_name, exception))
+
+    def update_order(self, order: OrderData) -> None:
+        super(RemoteStrategy, self).update_order(order)
+        self.worker.send(("order", self.strategy_name, order))
+
+    def update_trade(self, trade: TradeData) -> None:
+        super(RemoteStrategy, self).update_trade(trade)
+        self.worker.send(("trade", self.strategy_name, trade))
+
+
+class MultiProcessStrategyRunner(LiveStrategyRunner):
+    """
+    LiveStrategyRunner hosting strategies in worker processes, so that CPU heavy strategies are not bounded by one GIL.
+
+    gateways, OrderManager and monitor stay in this process. tick, depth, transaction and entrust of subscribed ab_symbols
+    are broadcast once through a shared memory ring (SharedMemoryRing) read by every worker,
+    order requests, logs and load_bars go back over a pipe per worker and are served by a thread per worker here.
+    strategies added with the same worker name share a process, by default every strategy has its own.
+
+    StrategyTemplate API is unchanged, timers of schedule_timer run in the worker.
+    a strategy raising exception is stopped as in LiveStrategyRunner, a worker process dying stops only its strategies,
+    and active orders of stopped strategies are cancelled.
+
+    notice:
+    1. workers are started by spawn by default, strategy classes must be importable, guard the script by if __name__ == '__main__'.
+    2. an idle worker polls its pipe with idle_timeout (1ms) of the worker, which bounds the extra latency of market data.
+    3. call close() to stop workers and release the shared memory.
+    """
+
+    def __init__(self, event_dispatcher: EventDispatcher, ring_slots: int = 8192, slot_size: int = 2048,
+                 start_method: str = "spawn"):
+        self.ring: SharedMemoryRing = SharedMemoryRing(slots=ring_slots, slot_size=slot_size)
+        # the ring has a single producer, handlers may be called by several lanes of ShardedEventDispatcher.
+        self._ring_lock: Lock = Lock()
+        self.context = multiprocessing.get_context(start_method)
+        self.workers: Dict[str, StrategyWorker] = {}
+        super(MultiProcessStrategyRunner, self).__init__(event_dispatcher)
+
+    def add_strategy(
+            self,
+            strategy_class: type,
+            strategy_name: str,
+            ab_symbols: list,
+            setting: dict,
+            worker_name: str = None):
+        if strategy_name in self.strategies:
+            self.write_log(
+                "there is already a strategy named {} in this strategy runner".format(strategy_name))
+            return
+        self.compile_check(strategy_class)
+
+        worker_name = worker_name or strategy_name
+        worker = self.workers.get(worker_name, None)
+        if worker is None or not worker.alive:
+            worker = StrategyWorker(worker_name, self, self.context)
+            self.workers[worker_name] = worker
+        worker.call("add", strategy_class, strategy_name, ab_symbols, setting)
+
+        strategy = RemoteStrategy(self, strategy_name, ab_symbols, setting, strategy_class, worker)
+        worker.strategies[strategy_name] = strategy
+        self.strategies[strategy_name] = strategy
+        self.map_symbols(strategy, ab_symbols)
+        return strategy
+
+    def remove_strategy(self, strategy_name: str):
+        strategy: RemoteStrategy = self.strategies[strategy_name]
+        super(MultiProcessStrategyRunner, self).remove_strategy(strategy_name)
+        if strategy_name not in self.strategies:
+            strategy.worker.strategies.pop(strategy_name, None)
+            if strategy.worker.alive:
+                strategy.worker.call("remove", strategy_name)
+
+    def close(self) -> None:
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers.clear()
+        self.ring.close()
+
+    def publish(self, method: str, data) -> None:
+        if not self.symbol_strategys_table[data.symbol_id]:
+            return
+        payload = pickle.dumps((method, data), pickle.HIGHEST_PROTOCOL)
+        try:
+            with self._ring_lock:
+                self.ring.put(data.ab_symbol, payload)
+        except ValueError as e:
+            self.write_log(str(e), level=WARNING)
+
+    def process_tick_event(self, event: Event):
+        self.publish("on_tick", event.data)
+
+    def process_depth_event(self, event: Event):
+        self.publish("on_depth", event.data)
+
+    def process_entrust_event(self, event: Event):
+        self.publish("on_entrust", event.data)
+
+    def process_transaction_event(self, event: Event):
+        self.publish("on_transaction", event.data)
+
+    def serve_request(self, method: str, args: Tuple) -> Any:
+        """
+        called by receiver thread of workers.
+        """
+        strategy_name, args = args[0], args[1:]
+        strategy = self.strategies.get(strategy_name, None) if strategy_name else None
+        if method == "write_log":
+            msg, level = args
+            self.write_log(msg, strategy, level)
+            return None
+        if strategy is None:
+            raise LookupError("strategy {} is not found.".format(strategy_name))
+
+        if method == "send_order":
+            if not strategy.trading:
+                return []
+            ab_orderids = self.send_order(strategy, *args)
+            for ab_orderid in ab_orderids or []:
+                strategy.active_orderids.add(ab_orderid)
+            return ab_orderids
+        elif method == "cancel_order":
+            self.cancel_order(strategy, *args)
+        elif method == "cancel_orders":
+            self.cancel_orders(strategy, *args)
+        elif method == "notify_lark":
+            self.notify_lark(strategy, *args)
+        elif method == "load_bars":
+            # served as LiveStrategyRunner.load_bars, on_interval is only told whether it is given.
+            days, interval, on_interval = args
+            end = datetime.now()
+            history = []
+            for start_dt, end_dt in ((end - timedelta(days=days), end), (end, datetime.now())):
+                for bars in self.iter_history_bars(strategy.ab_symbols, start_dt, end_dt, interval):
+                    self.check_load_interval(strategy, interval, on_interval)
+                    history.append(dict(bars))
+            return history
+        else:
+            raise ValueError("unknown request {}".format(method))
+
+    def on_strategy_crashed(self, strategy: "RemoteStrategy", detail: str) -> None:
+        if not strategy.inited and not strategy.trading:
+            return
+        strategy.trading = False
+        strategy.inited = False
+        self.monitor.send_status(strategy.run_id, "stop", strategy.ab_symbols)
+        self.monitor.send_struct(strategy.run_id, "strategy_status", "stop")
+        self.write_log("Exception in strategy: {} of worker {}. strategy stoped. \n{}".format(
+            strategy.strategy_name, strategy.worker.name, detail), strategy, level=ERROR)
+        if strategy.active_orderids:
+            self.cancel_orders(strategy, list(strategy.active_orderids))
+
+    def on_worker_exited(self, worker: StrategyWorker) -> None:
+        if worker.closing:
+            return
+        worker.process.join(1)
+        detail = "worker process exited with code {}.".format(worker.process.exitcode)
+        for strategy in list(worker.strategies.values()):
+            self.on_strategy_crashed(strategy, detail)
+
+
+def run_worker(name: str, conn, ring_name: str) -> None:
+    """
+    entry of worker process.
+    """
+    runner = WorkerStrategyRunner(name, conn, SharedMemoryRing.attach(ring_name))
+    try:
+        runner.run()
+    finally:
+        runner.ring.close()
+
+
+class WorkerStrategyRunner(StrategyRunner):
+    """
+    StrategyRunner inside a worker process, requests are sent to MultiProcessStrategyRunner over the pipe.
+    monitor is DummyMonitor here, monitoring is done by RemoteStrategy in the parent.
+    """
+
+    def __init__(self, name: str, conn, ring: SharedMemoryRing, batch_size: int = 256, idle_timeout: float = 0.001):
+        super(WorkerStrategyRunner, self).__init__()
+        self.name: str = name
+        self.conn = conn
+        self.ring: SharedMemoryRing = ring
+        self.reader = ring.reader()
+        self.batch_size: int = batch_size
+        self.idle_timeout: float = idle_timeout
+        self.active: bool = True
+
+        self.strategies: Dict[str, StrategyTemplate] = {}
+        self.symbol_strategies: Dict[str, List[StrategyTemplate]] = defaultdict(list)
+        self.timer_wheel: TimerWheel = TimerWheel(resolution=0.001, now=time.monotonic())
+        self.strategy_timers: Dict[str, List[TimerHandle]] = defaultdict(list)
+
+        self._request_ids = count(1)
+        self._deferred: Deque[Tuple] = deque()
+        self._lost: int = 0
+
+    def run(self) -> None:
+        while self.active:
+            busy = self.process_market_data()
+            for handle in self.timer_wheel.advance(time.monotonic()):
+                handle.callback()
+
+            while self._deferred:
+                self.handle_message(self._deferred.popleft())
+            timeout = 0 if busy else self.idle_timeout
+            try:
+                while self.active and self.conn.poll(timeout):
+                    self.handle_message(self.conn.recv())
+                    timeout = 0
+            except (EOFError, OSError):
+                # parent is gone.
+                break
+
+    def process_market_data(self) -> bool:
+        reader = self.reader
+        symbol_strategies = self.symbol_strategies
+        busy = False
+        for _ in range(self.batch_size):
+            message = reader.get()
+            if message is None:
+                break
+            busy = True
+            ab_symbol, payload = message
+            strategies = symbol_strategies.get(ab_symbol, None)
+            if not strategies:
+                continue
+            method, data = pickle.loads(payload)
+            for strategy in strategies:
+                if strategy.inited:
+                    self.call_strategy_func(strategy, getattr(strategy, method), data)
+
+        if reader.lost != self._lost:
+            self.write_log("worker {} is too slow, {} market data messages overrun.".format(self.name, reader.lost - self._lost), level=WARNING)
+            self._lost = reader.lost
+        return busy
+
+    def handle_message(self, message: Tuple) -> None:
+        kind = message[0]
+        if kind == "call":
+            _, call_id, command, args = message
+            try:
+                result = getattr(self, "command_" + command)(*args)
+                reply = ("reply", call_id, True, result)
+            except Exception as e:
+                reply = ("reply", call_id, False, e)
+            self.conn.send(reply)
+        elif kind == "exit":
+            for strategy in self.strategies.values():
+                if strategy.trading:
+                    self.command_stop(strategy.strategy_name)
+            self.active = False
+        elif kind == "reply":
+            # reply of a request given up.
+            pass
+        else:
+            _, strategy_name, data = message
+            strategy = self.strategies.get(strategy_name, None)
+            if strategy is None:
+                return
+            if kind == "order":
+                self.call_strategy_func(strategy, strategy.update_order, data)
+            elif kind == "trade":
+                self.call_strategy_func(strategy, strategy.update_trade, data)
+            elif kind == "timer":
+                if strategy.trading:
+                    self.call_strategy_func(strategy, strategy.on_timer, data)
+            elif kind == "exception":
+                if strategy.trading:
+                    self.call_strategy_func(strategy, strategy.on_exception, data)
+            elif kind == "edit":
+                strategy.update_setting(data)
+
+    def command_add(self, strategy_class: type, strategy_name: str, ab_symbols: List[str], setting: dict) -> bool:
+        strategy = strategy_class(self, strategy_name, ab_symbols, setting)
+        self.strategies[strategy_name] = strategy
+        for ab_symbol in ab_symbols:
+            self.symbol_strategies[ab_symbol].append(strategy)
+        return True
+
+    def command_init(self, strategy_name: str) -> bool:
+        strategy = self.strategies[strategy_name]
+        if not self.call_strategy_func(strategy, strategy.on_init):
+            return False
+        strategy.inited = True
+        return True
+
+    def command_start(self, strategy_name: str) -> bool:
+        strategy = self.strategies[strategy_name]
+        if not self.call_strategy_func(strategy, strategy.on_start):
+            return False
+        strategy.trading = True
+        return True
+
+    def command_stop(self, strategy_name: str) -> bool:
+        strategy = self.strategies[strategy_name]
+        self.call_strategy_func(strategy, strategy.on_stop)
+        strategy.trading = False
+        self.cancel_strategy_timers(strategy)
+        return True
+
+    def command_remove(self, strategy_name: str) -> bool:
+        strategy = self.strategies.pop(strategy_name)
+        for ab_symbol in strategy.ab_symbols:
+            self.symbol_strategies[ab_symbol].remove(strategy)
+        self.cancel_strategy_timers(strategy)
+        return True
+
+    def request(self, method: str, *args, wait: bool = True) -> Any:
+        request_id = next(self._request_ids) if wait else 0
+        self.conn.send(("request", request_id, method, args))
+        if not wait:
+            return None
+        while True:
+            message = self.conn.recv()
+            if message[0] == "reply" and message[1] == request_id:
+                _, _, ok, result = message
+                if not ok:
+                    raise result
+                return result
+            self._deferred.append(message)
+
+    def call_strategy_func(self, strategy: StrategyTemplate, func: Callable, params: Any = None) -> bool:
+        try:
+            if params:
+                func(params)
+            else:
+                func()
+        except Exception:
+            strategy.trading = False
+            strategy.inited = False
+            self.cancel_strategy_timers(strategy)
+            self.conn.send(("crashed", strategy.strategy_name, traceback.format_exc()))
+            return False
+        return True
+
+    def compile_check(self, strategy_class: type):
+        # checked by MultiProcessStrategyRunner before added.
+        pass
+
+    def load_bars(self, strategy: StrategyTemplate, days: int, interval: Interval = Interval.MINUTE,
+                  on_interval: Callable[[Dict[str, BarData]], None] = None):
+        for bars in self.request("load_bars", strategy.strategy_name, days, interval, on_interval is not None):
+            self.call_strategy_func(strategy, strategy.on_bars, bars)
+
+    def write_log(self, msg: str, strategy: StrategyTemplate = None, level: LOG_LEVEL = INFO):
+        self.request("write_log", strategy.strategy_name if strategy else None, msg, level, wait=False)
+
+    def send_order(self,
+                   strategy: StrategyTemplate,
+                   ab_symbol: str,
+                   direction: Direction,
+                   price: float,
+                   volume: float,
+                   offset: Offset,
+                   order_type: OrderType) -> Iterable[str]:
+        return self.request("send_order", strategy.strategy_name, ab_symbol, direction, price, volume, offset, order_type)
+
+    def cancel_order(self, strategy: StrategyTemplate, ab_orderid: str):
+        self.request("cancel_order", strategy.strategy_name, ab_orderid, wait=False)
+
+    def cancel_orders(self, strategy: StrategyTemplate, ab_orderids: Iterable[str]):
+        self.request("cancel_orders", strategy.strategy_name, list(ab_orderids), wait=False)
+
+    def notify_lark(self, strategy: StrategyTemplate, msg: str):
+        self.request("notify_lark", strategy.strategy_name, msg, wait=False)
+
+    def schedule_timer(self, strategy: StrategyTemplate, callback: Callable[[], None], delay: float, interval: float = 0) -> TimerHandle:
+        def fire():
+            if strategy.inited:
+                self.call_strategy_func(strategy, callback)
+
+        handles = self.strategy_timers[strategy.strategy_name]
+        now = time.monotonic()
+        handles[:] = [handle for handle in handles if not handle.cancelled and (handle.interval > 0 or handle.deadline > now)]
+        handle = self.timer_wheel.add(now + delay, fire, interval)
+        handles.append(handle)
+        return handle
+
+    def cancel_timer(self, strategy: StrategyTemplate, handle: TimerHandle) -> None:
+        handle.cancel()
+
+    def cancel_strategy_timers(self, strategy: StrategyTemplate) -> None:
+        for handle in self.strategy_timers.pop(strategy.strategy_name, []):
+            handle.cancel()
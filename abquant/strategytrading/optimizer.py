@@ -0,0 +1,393 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import hashlib
+import inspect
+import multiprocessing
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from pandas import DataFrame
+
+from abquant.dataloader import DataLoader
+from . import BacktestParameter
+from .history import BarArrays, SharedBarArrays, attached_bars
+from .replayrunner import ReplayRunner
+from .vectorrunner import VectorReplayRunner, VectorStrategyTemplate
+
+
+class OptimizationSetting:
+    """
+    parameter space of an optimization, each parameter over a list of values, and the statistic to maximize.
+    """
+
+    def __init__(self) -> None:
+        self.params: Dict[str, List] = {}
+        self.target_name: str = ""
+
+    def add_parameter(self, name: str, start, end=None, step=None) -> None:
+        """
+        values start, start + step, ... up to end included, a fixed value without end,
+        or the values of a list given as start.
+        """
+        if isinstance(start, (list, tuple)):
+            values = list(start)
+        elif end is None:
+            values = [start]
+        else:
+            if step is None or step <= 0:
+                raise ValueError("step of parameter {} must be positive".format(name))
+            if start > end:
+                raise ValueError("start of parameter {} must not be greater than end".format(name))
+            count = int(round((end - start) / step, 9)) + 1
+            values = [start + step * i for i in range(count)]
+            if all(isinstance(value, int) for value in (start, end, step)):
+                values = [int(value) for value in values]
+            else:
+                values = [round(value, 10) for value in values]
+        if not values:
+            raise ValueError("parameter {} has no value".format(name))
+        self.params[name] = values
+
+    def set_target(self, target_name: str) -> None:
+        self.target_name = target_name
+
+    @property
+    def size(self) -> int:
+        return int(np.prod([len(values) for values in self.params.values()], dtype=object))
+
+    def setting_at(self, index: int) -> dict:
+        """
+        index-th setting of the grid, the last parameter changing fastest.
+        """
+        setting = {}
+        for name, values in reversed(list(self.params.items())):
+            index, i = divmod(index, len(values))
+            setting[name] = values[i]
+        return {name: setting[name] for name in self.params}
+
+    def generate_settings(self) -> List[dict]:
+        return [self.setting_at(index) for index in range(self.size)]
+
+
+def class_source_hash(strategy_class: Type) -> str:
+    try:
+        source = inspect.getsource(strategy_class)
+    except (OSError, TypeError):
+        source = "{}.{}".format(strategy_class.__module__, strategy_class.__qualname__)
+    return hashlib.sha1(source.encode()).hexdigest()
+
+
+class StrategyOptimizer:
+    """
+    grid, random and genetic searches of the parameters of a strategy on a fixed backtest.
+    the history is loaded once and, with processes > 0, shared by a pool of workers attaching it once each.
+    results are cached by (strategy class source hash, parameters, data range) in memory and in cache_path if given,
+    so a repeated sweep only backtests the settings not seen before.
+    set_window narrows the backtest to rows of the loaded history, e.g. the in sample window of walk forward.
+    """
+
+    def __init__(
+        self,
+        strategy_class: Type,
+        ab_symbols: List[str],
+        data_loader: DataLoader,
+        parameter: BacktestParameter,
+        start_dt: datetime,
+        end_dt: datetime,
+        processes: int = 0,
+        start_method: str = "spawn",
+        cache_path: str = None,
+    ):
+        if parameter.streaming:
+            raise ValueError("optimization shares the loaded history, streaming replay is not supported.")
+        self.strategy_class: Type = strategy_class
+        self.ab_symbols: List[str] = ab_symbols
+        self.data_loader: DataLoader = data_loader
+        self.runner_kwargs: Dict = parameter.runner_kwargs(ab_symbols)
+        self.start: datetime = datetime.fromordinal(start_dt.date().toordinal())
+        self.end: datetime = datetime.fromordinal(end_dt.date().toordinal())
+        self.processes: int = processes
+        self.start_method: str = start_method
+
+        self.history: BarArrays = None
+        # rows of history backtested, None for all of them.
+        self.rows: Optional[Tuple[int, int]] = None
+        self.shared: SharedBarArrays = None
+        self.pool: ProcessPoolExecutor = None
+
+        self.cache_path: str = cache_path
+        self.cache: Dict[str, Dict] = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                self.cache = pickle.load(f)
+
+        backtest = {key: value for key, value in self.runner_kwargs.items() if key != "ab_symbols"}
+        self.class_hash: str = class_source_hash(strategy_class)
+        self.backtest_repr: str = repr(sorted(backtest.items()))
+
+    def cache_key(self, setting: dict) -> str:
+        key = (self.class_hash, tuple(self.ab_symbols), self.start, self.end, self.backtest_repr,
+               repr(sorted(setting.items())))
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def set_window(self, rows: Tuple[int, int], start_dt: datetime, end_dt: datetime) -> None:
+        """
+        backtest rows [start, stop) of the loaded history from start_dt to end_dt from now on.
+        the pool, the shared history and the cache are kept, results are cached by the dates of the window.
+        """
+        self.load_history()
+        self.rows = rows
+        self.start = start_dt
+        self.end = end_dt
+
+    def check_setting(self, optimization_setting: OptimizationSetting) -> None:
+        unknown = [name for name in optimization_setting.params if name not in self.strategy_class.parameters]
+        if unknown:
+            raise ValueError("{} are not parameters of {}".format(unknown, self.strategy_class.__name__))
+        if not optimization_setting.target_name:
+            raise ValueError("target of optimization is not set")
+
+    def run_grid_search(self, optimization_setting: OptimizationSetting) -> DataFrame:
+        """
+        :return: every setting of the grid ranked by the target.
+        """
+        self.check_setting(optimization_setting)
+        try:
+            return self.result_table(*self.grid_search(optimization_setting), optimization_setting)
+        finally:
+            self.close()
+
+    def run_random_search(
+            self, optimization_setting: OptimizationSetting, count: int, seed: int = None) -> DataFrame:
+        """
+        :return: count settings drawn from the grid without replacement, ranked by the target.
+        """
+        self.check_setting(optimization_setting)
+        try:
+            return self.result_table(*self.random_search(optimization_setting, count, seed), optimization_setting)
+        finally:
+            self.close()
+
+    def run_genetic_search(
+            self,
+            optimization_setting: OptimizationSetting,
+            population_size: int = 20,
+            generations: int = 10,
+            crossover_rate: float = 0.7,
+            mutation_rate: float = 0.2,
+            elite_size: int = 2,
+            seed: int = None) -> DataFrame:
+        """
+        :return: every setting evaluated by genetic_search ranked by the target.
+        """
+        self.check_setting(optimization_setting)
+        try:
+            return self.result_table(*self.genetic_search(
+                optimization_setting, population_size, generations, crossover_rate, mutation_rate, elite_size, seed),
+                optimization_setting)
+        finally:
+            self.close()
+
+    def grid_search(self, optimization_setting: OptimizationSetting) -> Tuple[List[dict], List[Dict]]:
+        """
+        :return: every setting of the grid and its statistics, the pool is kept open.
+        """
+        settings = optimization_setting.generate_settings()
+        return settings, self.evaluate(settings)
+
+    def random_search(
+            self, optimization_setting: OptimizationSetting, count: int,
+            seed: int = None) -> Tuple[List[dict], List[Dict]]:
+        """
+        :return: count settings drawn from the grid without replacement and their statistics, the pool is kept open.
+        """
+        rng = np.random.default_rng(seed)
+        size = optimization_setting.size
+        indexes = rng.choice(size, min(count, size), replace=False)
+        settings = [optimization_setting.setting_at(int(index)) for index in indexes]
+        return settings, self.evaluate(settings)
+
+    def genetic_search(
+            self,
+            optimization_setting: OptimizationSetting,
+            population_size: int = 20,
+            generations: int = 10,
+            crossover_rate: float = 0.7,
+            mutation_rate: float = 0.2,
+            elite_size: int = 2,
+            seed: int = None) -> Tuple[List[dict], List[Dict]]:
+        """
+        evolution of a population of settings: the elite kept, the others bred from tournament selected parents by
+        uniform crossover, each parameter then mutated to a random value of the grid.
+        a setting met again is taken from the cache.
+        :return: every distinct setting evaluated and its statistics, the pool is kept open.
+        """
+        target_name = optimization_setting.target_name
+        params = optimization_setting.params
+        rng = np.random.default_rng(seed)
+        size = optimization_setting.size
+        population = [
+            optimization_setting.setting_at(int(index))
+            for index in rng.choice(size, min(population_size, size), replace=False)
+        ]
+
+        evaluated: Dict[str, tuple] = {}
+        for generation in range(generations):
+            statistics = self.evaluate(population)
+            for setting, statistic in zip(population, statistics):
+                evaluated[self.cache_key(setting)] = (setting, statistic)
+            if generation == generations - 1:
+                break
+
+            fitness = np.array([statistic[target_name] for statistic in statistics], dtype=float)
+            ranked = np.argsort(-fitness, kind="stable")
+            offspring = [population[i] for i in ranked[:elite_size]]
+            while len(offspring) < population_size:
+                father, mother = (population[self.tournament(fitness, rng)] for _ in range(2))
+                if rng.random() < crossover_rate:
+                    child = {name: (father if rng.random() < 0.5 else mother)[name] for name in params}
+                else:
+                    child = dict(father)
+                for name, values in params.items():
+                    if rng.random() < mutation_rate:
+                        child[name] = values[rng.integers(len(values))]
+                offspring.append(child)
+            population = offspring
+
+        settings, statistics = zip(*evaluated.values()) if evaluated else ((), ())
+        return list(settings), list(statistics)
+
+    @staticmethod
+    def tournament(fitness: np.ndarray, rng: np.random.Generator, size: int = 3) -> int:
+        contenders = rng.integers(len(fitness), size=size)
+        return int(contenders[np.argmax(fitness[contenders])])
+
+    def evaluate(self, settings: List[dict]) -> List[Dict]:
+        """
+        statistics of each setting, backtested only when not cached.
+        """
+        keys = [self.cache_key(setting) for setting in settings]
+        todo = {}
+        for key, setting in zip(keys, settings):
+            if key not in self.cache and key not in todo:
+                todo[key] = setting
+        if todo:
+            history = self.load_history()
+            if self.processes:
+                spec = self.start_pool()
+                futures = [
+                    self.pool.submit(backtest_setting, self.strategy_class, self.ab_symbols, setting,
+                                     self.runner_kwargs, spec, self.start, self.end, self.rows)
+                    for setting in todo.values()
+                ]
+                results = [future.result() for future in futures]
+            else:
+                bars = history.slice(*self.rows) if self.rows else history
+                results = [
+                    run_setting(self.strategy_class, self.ab_symbols, setting, self.runner_kwargs, bars,
+                                self.start, self.end)
+                    for setting in todo.values()
+                ]
+            self.cache.update(zip(todo, results))
+            self.save_cache()
+        return [self.cache[key] for key in keys]
+
+    def start_pool(self) -> dict:
+        """
+        start the pool and share the loaded history with it if not yet.
+        :return: spec of the shared history, for attached_bars in the workers.
+        """
+        if self.pool is None:
+            self.shared = SharedBarArrays.create(self.load_history())
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context(self.start_method))
+        return self.shared.spec
+
+    def load_history(self) -> BarArrays:
+        if self.history is None:
+            self.history = load_history(self.runner_kwargs, self.data_loader, self.start, self.end)
+        return self.history
+
+    def save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(self.cache, f)
+        os.replace(temp_path, self.cache_path)
+
+    def close(self) -> None:
+        """
+        shut down the pool and release the shared history, the loaded one is kept for the next search.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    @staticmethod
+    def result_table(
+            settings: List[dict], statistics: List[Dict], optimization_setting: OptimizationSetting) -> DataFrame:
+        """
+        a row of parameters and statistics for each distinct setting, ranked by the target descending.
+        """
+        target_name = optimization_setting.target_name
+        rows = {}
+        for setting, statistic in zip(settings, statistics):
+            rows[repr(sorted(setting.items()))] = {**setting, **statistic}
+        df = DataFrame(list(rows.values()), columns=[*optimization_setting.params, target_name] + [
+            name for name in (statistics[0] if statistics else {}) if name != target_name])
+        return df.sort_values(target_name, ascending=False, kind="stable").reset_index(drop=True)
+
+
+def load_history(runner_kwargs: Dict, data_loader: DataLoader, start_dt: datetime, end_dt: datetime) -> BarArrays:
+    """
+    history of the backtest loaded as ReplayRunner does, to be shared by the backtests of many settings.
+    """
+    loader = ReplayRunner(**runner_kwargs)
+    loader.set_data_loader(data_loader)
+    loader.load_data(start_dt, end_dt)
+    return loader.history
+
+
+def replay_setting(
+        strategy_class: Type, ab_symbols: List[str], setting: dict, runner_kwargs: Dict, history: BarArrays,
+        start_dt: datetime, end_dt: datetime) -> ReplayRunner:
+    """
+    backtest of a setting on history, quietly.
+    """
+    runner_class = VectorReplayRunner if issubclass(strategy_class, VectorStrategyTemplate) else ReplayRunner
+    replay_runner = runner_class(**runner_kwargs)
+    replay_runner.output = lambda msg: None
+    strategy = strategy_class(replay_runner, "optimization", ab_symbols, setting)
+    replay_runner.set_strategy(strategy)
+    replay_runner.set_history(history, start_dt, end_dt)
+    replay_runner.run_backtesting()
+    return replay_runner
+
+
+def run_setting(
+        strategy_class: Type, ab_symbols: List[str], setting: dict, runner_kwargs: Dict, history: BarArrays,
+        start_dt: datetime, end_dt: datetime) -> Dict:
+    """
+    statistics of one backtest of a setting on history.
+    """
+    replay_runner = replay_setting(strategy_class, ab_symbols, setting, runner_kwargs, history, start_dt, end_dt)
+    df = replay_runner.calculate_result()
+    return replay_runner.calculate_statistics(df, output=False)
+
+
+def backtest_setting(
+        strategy_class: Type, ab_symbols: List[str], setting: dict, runner_kwargs: Dict, spec: dict,
+        start_dt: datetime, end_dt: datetime, rows: Tuple[int, int] = None) -> Dict:
+    """
+    run_setting in a worker process of StrategyOptimizer, on rows of the shared history.
+    """
+    history = attached_bars(spec)
+    if rows:
+        history = history.slice(*rows)
+    return run_setting(strategy_class, ab_symbols, setting, runner_kwargs, history, start_dt, end_dt)
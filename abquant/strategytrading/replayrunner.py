@@ -4,9 +4,10 @@ from enum import Enum
 from copy import copy, deepcopy
 from logging import INFO
 import traceback
+import heapq
 from pandas import DataFrame, Series
 import numpy as np
-from typing import DefaultDict, Dict, Iterable, List, Set, Tuple, Union
+from typing import Callable, DefaultDict, Dict, Iterable, Iterator, List, Set, Tuple, Union
 from datetime import date, datetime, timedelta
 import sys
 import ast
@@ -18,7 +19,7 @@ from abquant.orderbook.orderbook import OrderBook
 from abquant.ordermanager import OrderManager
 from abquant.trader.common import Direction, Interval, Offset, OrderType, Status
 from abquant.trader.exception import MarketException
-from abquant.event import EventType, Event, EventDispatcher
+from abquant.event import EventType, Event, EventDispatcher, TimerHandle, TimerWheel
 from abquant.trader.object import CancelRequest, ContractData, HistoryRequest, LogData, OrderRequest, PositionData, SubscribeRequest
 from abquant.trader.msg import BarData, DepthData, EntrustData, OrderData, TickData, TradeData, TransactionData
 from abquant.trader.utility import OrderGrouper, extract_ab_symbol, round_to
@@ -26,7 +27,9 @@ from abquant.trader.utility import OrderGrouper, extract_ab_symbol, round_to
 from . import BacktestingMode
 from .template import StrategyTemplate
 from .strategyrunner import StrategyRunner, LOG_LEVEL
-from .result import ContractDailyResult, ContractsDailyResult
+from .result import ContractsDailyResult, DailyPnl, EquityCurve
+from . import statistics as stats
+from .history import BarArrays, BarColumns, to_minute
 
 
 
@@ -55,6 +58,8 @@ class ReplayRunner(StrategyRunner):
         inverse: DefaultDict[str, bool] = defaultdict(lambda: False),
         mode: BacktestingMode = BacktestingMode.BAR,
         annual_days: int = 365,
+        streaming: bool = False,
+        minute_equity: bool = False,
         # TODO
     ) -> None:
         """"""
@@ -76,6 +81,9 @@ class ReplayRunner(StrategyRunner):
 
         self.mode: BacktestingMode = mode
         self.annual_days: int = annual_days
+        self.streaming: bool = streaming
+        # mark to market balance of every minute recorded during the replay, for intraday drawdown.
+        self.minute_equity: bool = minute_equity
 
         self.strategy: StrategyTemplate = None
         self.datetime: datetime = None
@@ -87,8 +95,7 @@ class ReplayRunner(StrategyRunner):
                 "Backtest are only supported for 1 minute interval and Bar mode for now.")
 
         self.days: int = 0
-        self.history_data: Dict[Tuple, BarData] = {}
-        self.dts: Set[datetime] = set()
+        self.history: BarArrays = BarArrays(ab_symbols, np.empty(0, dtype=np.int64))
 
         self.limit_order_count = 0
 
@@ -97,8 +104,13 @@ class ReplayRunner(StrategyRunner):
 
         self.logs = []
 
-        self.daily_results: Dict[date, ContractsDailyResult] = {}
+        self.daily_pnl: DailyPnl = DailyPnl(ab_symbols, sizes, rates, slippages, inverse)
         self.daily_df = None
+        self.equity_curve: EquityCurve = None
+        self.loaded_trades: List[TradeData] = []
+
+        # driven by timestamp of bars, reset when backtesting starts.
+        self.timer_wheel: TimerWheel = TimerWheel(resolution=1)
 
     # def set_strategy(self, strategy_class: type, setting: dict, strategy_name: str = None) -> None:
     #     """"""
@@ -174,14 +186,14 @@ class ReplayRunner(StrategyRunner):
             self.output("起始日期必须小于结束日期")
             return
 
-        # Clear previously loaded history data
-        self.history_data.clear()
-        self.dts.clear()
+        if self.streaming:
+            self.output("流式回放, 历史数据将在回放中按天加载")
+            return
 
         # Load 30 days of data each time and allow for progress update
         progress_delta = timedelta(days=1)
         total_delta = self.end - self.start
-        interval_delta = timedelta(minutes=1)
+        columns: Dict[str, BarColumns] = {}
 
         for ab_symbol in self.ab_symbols:
             start = self.start
@@ -189,6 +201,7 @@ class ReplayRunner(StrategyRunner):
             progress = 0
 
             data_count = 0
+            column = columns[ab_symbol] = BarColumns()
             while start < self.end:
                 # Make sure end time stays within set range
                 end = min(end, self.end)
@@ -200,21 +213,10 @@ class ReplayRunner(StrategyRunner):
                         start,
                         end
                     )
-                    for bar in data:
-                        self.dts.add(bar.datetime)
-                        self.history_data[(bar.datetime, ab_symbol)] = bar
-                        data_count += 1
+                    data_count += column.extend(data)
 
                 else:
                     pass
-                    # data = self.load_tick_data(ab_symbol,
-                    #                       start,
-                    #                       end
-                    #                       )
-                    # for tick in data:
-                    #     self.dts.add(tick.datetime)
-                    #     self.history_data[(tick.datetime, ab_symbol)] = tick
-                    #     data_count += 1
 
                 progress += progress_delta / total_delta
                 progress = min(progress, 1)
@@ -227,35 +229,127 @@ class ReplayRunner(StrategyRunner):
 
             self.output(f"{ab_symbol}历史数据加载完成，数据分钟数:{data_count}")
 
+        self.history = BarArrays.from_columns(columns)
+        for ab_symbol, filled in zip(self.ab_symbols, self.history.forward_fill()):
+            if filled:
+                self.output("There are {} bar data of {} missed. Use the last bar close_price instead.".format(filled, ab_symbol))
         self.output("所有历史数据加载完成")
 
+    def replay_bars(self) -> Iterator[Tuple[datetime, List[BarData]]]:
+        """
+        (datetime, bars) to replay in time order, bars forward filled.
+        """
+        if self.streaming:
+            yield from self.stream_bars()
+            return
+        history = self.history
+        for row in range(len(history)):
+            dt = history.datetime(row)
+            yield dt, history.bars(row, dt)
+
+    def _stream_symbol(self, ab_symbol: str) -> Iterator[BarData]:
+        start = self.start
+        while start < self.end:
+            end = min(start + timedelta(days=1), self.end)
+            yield from self.load_bar_data(ab_symbol, self.interval, start, end)
+            start = end
+
+    def stream_bars(self) -> Iterator[Tuple[datetime, List[BarData]]]:
+        """
+        day chunks of every symbol loaded on demand and merged by datetime in a heap,
+        at most one chunk of each symbol is held, however long the backtest is.
+        bars of each chunk are expected in time order, as data loaders give.
+        """
+        streams = [self._stream_symbol(ab_symbol) for ab_symbol in self.ab_symbols]
+        last_bars: Dict[str, BarData] = {}
+        dt = None
+        bars: Dict[str, BarData] = {}
+        for bar in heapq.merge(*streams, key=lambda bar: bar.datetime):
+            if bar.datetime != dt:
+                if bars:
+                    yield dt, self._fill_bars(dt, bars, last_bars)
+                dt = bar.datetime
+                bars = {}
+            bars[bar.ab_symbol] = bar
+        if bars:
+            yield dt, self._fill_bars(dt, bars, last_bars)
+
+    def _fill_bars(self, dt: datetime, bars: Dict[str, BarData], last_bars: Dict[str, BarData]) -> List[BarData]:
+        filled = []
+        for ab_symbol in self.ab_symbols:
+            bar = bars.get(ab_symbol, None)
+            if bar is None:
+                old_bar = last_bars.get(ab_symbol, None)
+                if old_bar is None:
+                    continue
+                bar = BarData(
+                    symbol=old_bar.symbol,
+                    exchange=old_bar.exchange,
+                    datetime=dt,
+                    interval=old_bar.interval,
+                    open_price=old_bar.close_price,
+                    high_price=old_bar.close_price,
+                    low_price=old_bar.close_price,
+                    close_price=old_bar.close_price,
+                    gateway_name=old_bar.gateway_name
+                )
+            last_bars[ab_symbol] = bar
+            filled.append(bar)
+        return filled
+
+    def set_history(self, history: BarArrays, start_dt: datetime, end_dt: datetime) -> None:
+        """
+        replay history loaded elsewhere, e.g. shared by BacktestStrategyRunner, instead of load_data.
+        """
+        self.start = start_dt
+        self.end = end_dt
+        self.history = history
+
+    def new_equity_curve(self) -> EquityCurve:
+        """
+        capacity of the minutes from start to end, the most a replay may record.
+        """
+        capacity = int((self.end - self.start).total_seconds() // 60) + 1 if self.start and self.end else len(self.history)
+        equity_curve = EquityCurve(self.ab_symbols, self.sizes, self.rates, self.slippages, self.inverse, self.capital,
+                                   capacity)
+        equity_curve.schedule_trades(self.loaded_trades)
+        return equity_curve
+
     def run_backtesting(self, log=False) -> None:
         """"""
-        self.strategy.on_init()
+        if self.minute_equity:
+            self.equity_curve = self.new_equity_curve()
+        replay = self.replay_bars()
+        try:
+            pending = next(replay, None)
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
 
-        # Generate sorted datetime list
-        dts = list(self.dts)
-        dts.sort()
+        if pending:
+            self.timer_wheel = TimerWheel(resolution=1, now=pending[0].timestamp())
+        self.strategy.on_init()
 
         # Use the first [days] of history data for initializing strategy
         day_count = 0
-        ix = 0
-
-        for ix, dt in enumerate(dts):
-            if self.datetime and dt.day != self.datetime.day:
-                day_count += 1
-                if day_count >= self.days:
-                    break
-            try:
-                if self.mode == BacktestingMode.BAR:
 
-                    self.new_bars(dt)
+        try:
+            while pending:
+                dt, bars = pending
+                if self.datetime and dt.day != self.datetime.day:
+                    day_count += 1
+                    if day_count >= self.days:
+                        break
+                if self.mode == BacktestingMode.BAR:
+                    self._dispatch_bars(dt, bars)
                 else:
                     self.new_ticks(dt)
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
+                pending = next(replay, None)
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
 
         self.strategy.inited = True
         self.output("策略初始化完成")
@@ -265,17 +359,18 @@ class ReplayRunner(StrategyRunner):
         self.output("开始回放历史数据")
 
         # Use the rest of history data for running backtesting
-        for dt in dts[ix:]:
-            try:
+        try:
+            while pending:
+                dt, bars = pending
                 if self.mode == BacktestingMode.BAR:
-                    self.new_bars(dt)
+                    self._dispatch_bars(dt, bars)
                 else:
                     self.new_ticks(dt)
-
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
+                pending = next(replay, None)
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
 
         self.strategy.on_stop()
         self.output("历史数据回放结束")
@@ -297,40 +392,29 @@ class ReplayRunner(StrategyRunner):
             for bar in bars.values():
                 close_prices[bar.ab_symbol] = bar.close_price
 
-        daily_result = self.daily_results.get(d, None)
-        # print("type", type(bars), "update dayly close", close_prices)
-        if daily_result:
-            daily_result.update_close_prices(close_prices)
-        else:
-            self.daily_results[d] = ContractsDailyResult(d, close_prices)
+        self.daily_pnl.update_close_prices(d, close_prices)
 
-    def new_bars(self, dt: datetime) -> None:
-        """"""
-        self.datetime = dt
-
-        # self.bars.clear()
-        for ab_symbol in self.ab_symbols:
-            bar = self.history_data.get((dt, ab_symbol), None)
+    def new_bars(self, dt: datetime, row: int = None) -> None:
+        """
+        replay the bars of dt, row of dt in self.history if known.
+        """
+        if row is None:
+            row = int(np.searchsorted(self.history.minutes, to_minute(dt)))
+        self._dispatch_bars(dt, self.history.bars(row, dt))
 
-            # If bar data of ab_symbol at dt exists
-            if not bar and ab_symbol in self.order_book.newest_bars():
-                old_bar = self.order_book.newest_bars()[ab_symbol]
+    def _dispatch_bars(self, dt: datetime, bars: List[BarData]) -> None:
+        """
+        bars of dt, forward filled already. a symbol without any bar so far is an error.
+        """
+        self.datetime = dt
 
-                bar = BarData(
-                    symbol=old_bar.symbol,
-                    exchange=old_bar.exchange,
-                    datetime=dt,
-                    open_price=old_bar.close_price,
-                    high_price=old_bar.close_price,
-                    low_price=old_bar.close_price,
-                    close_price=old_bar.close_price,
-                    gateway_name=old_bar.gateway_name
-                )
-                self.output("There is a bar data of {} at {} missed. Use the last bar close_price instead.".format(ab_symbol, dt))
-            # self.bars[ab_symbol] = bar
-            if bar is None:
-                raise TypeError("There is a bar data of {} at {} missed.".format(ab_symbol, dt))
+        for bar in bars:
             self.order_book.update_bar(bar)
+        if len(bars) < len(self.ab_symbols):
+            newest_bars = self.order_book.newest_bars()
+            for ab_symbol in self.ab_symbols:
+                if ab_symbol not in newest_bars:
+                    raise TypeError("There is a bar data of {} at {} missed.".format(ab_symbol, dt))
 
         for order in self.order_book.accept_submitting_orders():
             self.strategy.update_order(order)
@@ -338,12 +422,19 @@ class ReplayRunner(StrategyRunner):
             self.strategy.update_order(order)
             self.strategy.update_trade(trade)
             self.trades[trade.ab_tradeid] = trade
+            self.daily_pnl.add_trade(trade)
+            if self.equity_curve is not None:
+                self.equity_curve.add_trade(trade)
+        for handle in self.timer_wheel.advance(dt.timestamp()):
+            handle.callback()
         self.strategy.on_bars(self.order_book.newest_bars())
         # self.submiting_order()
         for order in list(self.order_book.submitting_orders()):
             self.strategy.update_order(order)
 
         self.update_daily_close(self.order_book.newest_bars(), dt)
+        if self.equity_curve is not None:
+            self.equity_curve.update(dt, bars)
 
     def new_ticks(self, dt: datetime) -> None:
         pass
@@ -374,6 +465,21 @@ class ReplayRunner(StrategyRunner):
                 "days of backtesting duration is less than days in data warm up( staregyTemplate.load_bars(days) ).")
         self.output("注意啦，数据预热使用了{}天的历史数据, 模拟撮合将在剩余的历史数据中进行。".format(self.days))
 
+    def schedule_timer(self, strategy: StrategyTemplate, callback: Callable[[], None], delay: float, interval: float = 0) -> TimerHandle:
+        """
+        timers expired are fired right before on_bars of the bar, so that precision is bounded by the interval of bars.
+        skipped while strategy is not inited, i.e. during the warm up, as LiveStrategyRunner does.
+        """
+        def fire():
+            if strategy.inited:
+                callback()
+
+        now = self.datetime.timestamp() if self.datetime else self.timer_wheel.now
+        return self.timer_wheel.add(now + delay, fire, interval)
+
+    def cancel_timer(self, strategy: StrategyTemplate, handle: TimerHandle) -> None:
+        handle.cancel()
+
     def submiting_order(self):
         """"""
         for order in list(self.order_book.submitting_orders()):
@@ -458,15 +564,18 @@ class ReplayRunner(StrategyRunner):
         print(f"{datetime.now()}\t{msg}")
     
     def load_trades(self, strategy_name: str, trades: Iterable[TradeData]):
-        for trade in trades:
-            self.trades[strategy_name + trade.ab_tradeid] = copy(trade)
+        loaded = [copy(trade) for trade in trades]
+        for trade in loaded:
+            self.trades[strategy_name + trade.ab_tradeid] = trade
+        self.daily_pnl.add_trades(loaded)
+        self.loaded_trades.extend(loaded)
 
     
     def sorted_trades(self):
         return sorted(self.trades.values(), key= lambda x: x.datetime)
     
-    def sorted_daily_results(self):
-        return sorted(self.daily_results.values(), key=lambda x: x.date)
+    def sorted_daily_results(self) -> List[ContractsDailyResult]:
+        return self.daily_pnl.daily_results()
 
     def calculate_result(self) -> DataFrame:
         """"""
@@ -476,43 +585,8 @@ class ReplayRunner(StrategyRunner):
             self.output("成交记录为空，无法计算")
             return
 
-        # Add trade data into daily reuslt.
-        for trade in self.trades.values():
-            d = trade.datetime.date()
-            daily_result = self.daily_results[d]
-            daily_result.add_trade(trade)
-
-        # Calculate daily result by iteration.
-        pre_closes = {}
-        start_poses = {}
-
-        for daily_result in self.daily_results.values():
-            daily_result.calculate_pnl(
-                pre_closes,
-                start_poses,
-                self.sizes,
-                self.rates,
-                self.slippages,
-                self.inverse
-            )
-
-            pre_closes = daily_result.close_prices
-            start_poses = daily_result.end_poses
-
-        # Generate dataframe
-        results = defaultdict(list)
-
-        for daily_result in self.daily_results.values():
-            fields = [
-                "date", "trade_count", "turnover",
-                "commission", "slippage", "trading_pnl",
-                "holding_pnl", "total_pnl", "net_pnl"
-            ]
-            for key in fields:
-                value = getattr(daily_result, key)
-                results[key].append(value)
-
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
+        # pnl accumulated by daily_pnl as trades happened
+        self.daily_df = self.daily_pnl.daily_df()
 
         self.output("逐日盯市盈亏计算完成")
         return self.daily_df
@@ -554,6 +628,8 @@ class ReplayRunner(StrategyRunner):
             daily_return = 0
             return_std = 0
             sharpe_ratio = 0
+            sortino_ratio = 0
+            calmar_ratio = 0
             return_drawdown_ratio = 0
         else:
             # Calculate balance related time series data
@@ -562,14 +638,12 @@ class ReplayRunner(StrategyRunner):
                 self.output("WARNING: balance can not be less than zero, otherwise some statistic may wrongly calculated. raise up the your initial capital")
             df["return"] = np.log(
                 df["balance"] / df["balance"].shift(1)).fillna(0)
-            df["highlevel"] = (
-                df["balance"].rolling(
-                    min_periods=1, window=len(df), center=False).max()
-            )
+            balance = df["balance"].to_numpy()
+            df["highlevel"] = np.maximum.accumulate(balance)
             df["drawdown"] = df["balance"] - df["highlevel"]
-            
+
             df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
-            df["principal_ddpercent"] = df["drawdown"] / df["balance"][0] * 100
+            df["principal_ddpercent"] = df["drawdown"] / df["balance"].iloc[0] * 100
 
             # Calculate statistics value
             start_date = df.index[0]
@@ -581,16 +655,13 @@ class ReplayRunner(StrategyRunner):
 
             end_balance = df["balance"].iloc[-1]
             max_drawdown = df["drawdown"].min()
-            highlevel_idx = Series(np.append(np.where(df["drawdown"] == 0)[0], len(df)))
-            longest_drawdown_duration = (highlevel_idx - highlevel_idx.shift(1)).fillna(0).max()
+            longest_drawdown_duration = stats.longest_drawdown_duration(balance)
             max_ddpercent = df["ddpercent"].min()
             principal_max_ddpercent = df["principal_ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
+            max_drawdown_start, max_drawdown_end = stats.max_drawdown_range(balance)
 
-            if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
-                max_drawdown_duration = (
-                    max_drawdown_end - max_drawdown_start).days
+            if isinstance(df.index[max_drawdown_end], date):
+                max_drawdown_duration = (df.index[max_drawdown_end] - df.index[max_drawdown_start]).days
             else:
                 max_drawdown_duration = 0
 
@@ -614,14 +685,17 @@ class ReplayRunner(StrategyRunner):
             daily_return = df["return"].mean() * 100
             return_std = df["return"].std() * 100
 
-            if return_std:
-                daily_risk_free = self.risk_free / np.sqrt(self.annual_days)
-                sharpe_ratio = (daily_return - daily_risk_free) / \
-                    return_std * np.sqrt(self.annual_days)
-            else:
-                sharpe_ratio = 0
+            sharpe_ratio = stats.sharpe_ratio(df["return"].to_numpy(), self.risk_free, self.annual_days)
+            sortino_ratio = stats.sortino_ratio(df["return"].to_numpy(), self.risk_free, self.annual_days)
+            calmar_ratio = stats.calmar_ratio(annual_return, max_ddpercent)
+
+            return_drawdown_ratio = stats.return_drawdown_ratio(total_net_pnl, max_drawdown)
 
-            return_drawdown_ratio = -total_net_pnl / max_drawdown
+        # drawdown of the minute balance, durations in minutes
+        intraday = {}
+        if self.equity_curve is not None and len(self.equity_curve):
+            balance = self.equity_curve.balance[:len(self.equity_curve)]
+            intraday = {"intraday_" + key: value for key, value in stats.equity_statistics(balance).items()}
 
         # Output
         if output:
@@ -659,7 +733,15 @@ class ReplayRunner(StrategyRunner):
             self.output(f"日均收益率:\t{daily_return:,.2f}%")
             self.output(f"收益标准差:\t{return_std:,.2f}%")
             self.output(f"Sharpe Ratio:\t{sharpe_ratio:,.2f}")
+            self.output(f"Sortino Ratio:\t{sortino_ratio:,.2f}")
+            self.output(f"Calmar Ratio:\t{calmar_ratio:,.2f}")
             self.output(f"收益回撤比:\t{return_drawdown_ratio:,.2f}")
+            if intraday:
+                self.output(f"分钟级最大回撤: \t{intraday['intraday_max_drawdown']:,.2f}")
+                self.output(f"分钟级百分比最大回撤: {intraday['intraday_max_ddpercent']:,.2f}%")
+                self.output(f"分钟级最大回撤分钟数: \t{intraday['intraday_max_drawdown_duration']}")
+                self.output(f"分钟级最长回撤分钟数: \t{intraday['intraday_longest_drawdown_duration']:,.2f}")
+                self.output(f"水下区间数: \t{intraday['intraday_underwater_periods']}")
 
         statistics = {
             "start_date": start_date,
@@ -688,7 +770,10 @@ class ReplayRunner(StrategyRunner):
             "daily_return": daily_return,
             "return_std": return_std,
             "sharpe_ratio": sharpe_ratio,
+            "sortino_ratio": sortino_ratio,
+            "calmar_ratio": calmar_ratio,
             "return_drawdown_ratio": return_drawdown_ratio,
+            **intraday,
         }
 
         # Filter potential error infinite value
@@ -1,10 +1,17 @@
 from collections import defaultdict
 from datetime import date, datetime
-from typing import Dict, List
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
 from abquant.trader.common import Direction
 
 from abquant.trader.msg import TradeData
 
+from .history import to_minute
+
 
 class ContractDailyResult:
     """"""
@@ -188,3 +195,309 @@ class ContractsDailyResult:
                     self.date, close_price)
 
 
+class DailyPnl:
+    """
+    daily pnl of contracts accumulated as trades happen, instead of ContractsDailyResult objects.
+    numpy arrays of (days, contracts): position change, position change by price (by 1 / price of an inverse
+    contract), turnover before size and trade count, and close prices. a day row is added by its first close or trade.
+    sums of the trades of the current day are kept in floats, flushed into the arrays when the day changes.
+    results are those of ContractDailyResult.calculate_pnl, computed for all days at once.
+    """
+    FIELDS = ("trade_count", "turnover", "commission", "slippage", "trading_pnl", "holding_pnl", "total_pnl", "net_pnl")
+
+    def __init__(
+        self,
+        ab_symbols: List[str],
+        sizes: Dict[str, float],
+        rates: Dict[str, float],
+        slippages: Dict[str, float],
+        inverses: Dict[str, bool],
+        capacity: int = 64
+    ):
+        self.ab_symbols: List[str] = list(ab_symbols)
+        self.columns: Dict[str, int] = {ab_symbol: i for i, ab_symbol in enumerate(self.ab_symbols)}
+        self.sizes: np.ndarray = np.array([sizes[ab_symbol] for ab_symbol in self.ab_symbols], dtype=float)
+        self.rates: np.ndarray = np.array([rates[ab_symbol] for ab_symbol in self.ab_symbols], dtype=float)
+        self.slippages: np.ndarray = np.array([slippages[ab_symbol] for ab_symbol in self.ab_symbols], dtype=float)
+        self.inverses: List[bool] = [bool(inverses[ab_symbol]) for ab_symbol in self.ab_symbols]
+
+        self.dates: List[date] = []
+        self.rows: Dict[date, int] = {}
+        shape = (capacity, len(self.ab_symbols))
+        self.pos_change: np.ndarray = np.zeros(shape)
+        self.pos_price: np.ndarray = np.zeros(shape)
+        self.turnover: np.ndarray = np.zeros(shape)
+        self.trade_count: np.ndarray = np.zeros(shape, dtype=np.int64)
+        self.close: np.ndarray = np.full(shape, np.nan)
+
+        self.pending_date: date = None
+        self.pending: List[List[float]] = [[0.0, 0.0, 0.0, 0] for _ in self.ab_symbols]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def row(self, d: date) -> int:
+        row = self.rows.get(d, None)
+        if row is None:
+            row = self.rows[d] = len(self.dates)
+            self.dates.append(d)
+            if row == len(self.close):
+                self._grow()
+        return row
+
+    def _grow(self) -> None:
+        for name in ("pos_change", "pos_price", "turnover", "trade_count", "close"):
+            array = getattr(self, name)
+            grown = np.zeros((len(array) * 2, array.shape[1]), dtype=array.dtype)
+            if name == "close":
+                grown[:] = np.nan
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def update_close_prices(self, d: date, close_prices: Dict[str, float]) -> None:
+        row = self.row(d)
+        columns = self.columns
+        close = self.close
+        for ab_symbol, close_price in close_prices.items():
+            close[row, columns[ab_symbol]] = close_price
+
+    def add_trade(self, trade: TradeData) -> None:
+        d = trade.datetime.date()
+        if d != self.pending_date:
+            self.flush()
+            self.pending_date = d
+        column = self.columns[trade.ab_symbol]
+        volume = trade.volume
+        price = 1 / trade.price if self.inverses[column] else trade.price
+        change = volume if trade.direction == Direction.LONG else -volume
+        pending = self.pending[column]
+        pending[0] += change
+        pending[1] += change * price
+        pending[2] += volume * price
+        pending[3] += 1
+
+    def flush(self) -> None:
+        if self.pending_date is None:
+            return
+        row = self.row(self.pending_date)
+        pending = np.array(self.pending, dtype=float)
+        self.pos_change[row] += pending[:, 0]
+        self.pos_price[row] += pending[:, 1]
+        self.turnover[row] += pending[:, 2]
+        self.trade_count[row] += pending[:, 3].astype(np.int64)
+        self.pending_date = None
+        self.pending = [[0.0, 0.0, 0.0, 0] for _ in self.ab_symbols]
+
+    def add_trades(self, trades: Iterable[TradeData]) -> None:
+        """
+        trades in any order, accumulated at once.
+        """
+        trades = list(trades)
+        if not trades:
+            return
+        rows = np.array([self.row(trade.datetime.date()) for trade in trades])
+        columns = np.array([self.columns[trade.ab_symbol] for trade in trades])
+        volumes = np.array([trade.volume for trade in trades], dtype=float)
+        prices = np.array([trade.price for trade in trades], dtype=float)
+        changes = np.where([trade.direction == Direction.LONG for trade in trades], volumes, -volumes)
+        prices = np.where(np.array(self.inverses)[columns], 1 / prices, prices)
+        np.add.at(self.pos_change, (rows, columns), changes)
+        np.add.at(self.pos_price, (rows, columns), changes * prices)
+        np.add.at(self.turnover, (rows, columns), volumes * prices)
+        np.add.at(self.trade_count, (rows, columns), 1)
+
+    def contract_results(self) -> Dict[str, np.ndarray]:
+        """
+        (days, contracts) arrays of the ContractDailyResult fields, days sorted by date.
+        a contract without close price of a day, not started yet, has no result that day.
+        """
+        if any(self.inverses) and len(self.inverses) >= 2:
+            raise NotImplementedError("multiple inverse contract will not be supported for a long time.")
+        self.flush()
+        n = len(self.dates)
+        order = np.argsort([d.toordinal() for d in self.dates], kind="stable")
+        pos_change = self.pos_change[:n][order]
+        pos_price = self.pos_price[:n][order]
+        trade_count = self.trade_count[:n][order]
+        close = self.close[:n][order]
+        valid = ~np.isnan(close)
+        if (trade_count[~valid] > 0).any():
+            raise ValueError("there is a trade of a contract on a day without its close price.")
+
+        end_pos = np.cumsum(pos_change, axis=0)
+        start_pos = end_pos - pos_change
+        pre_close = np.vstack([np.zeros((1, close.shape[1])), close[:-1]])
+        pre_close = np.where(np.isnan(pre_close) | (pre_close == 0), 1, pre_close)
+        close = np.where(valid, close, 1)
+
+        inverse = np.array(self.inverses)
+        sizes = self.sizes
+        holding_pnl = np.where(inverse, start_pos * (1 / pre_close - 1 / close) * sizes,
+                               start_pos * (close - pre_close) * sizes)
+        trading_pnl = np.where(inverse, (pos_price - pos_change / close) * sizes,
+                               (pos_change * close - pos_price) * sizes)
+        turnover = self.turnover[:n][order] * sizes
+        commission = turnover * self.rates
+        slippage = turnover * self.slippages
+        total_pnl = trading_pnl + holding_pnl
+        net_pnl = total_pnl - commission - slippage
+
+        results = {
+            "trade_count": trade_count,
+            "turnover": turnover,
+            "commission": commission,
+            "slippage": slippage,
+            "trading_pnl": trading_pnl,
+            "holding_pnl": holding_pnl,
+            "total_pnl": total_pnl,
+            "net_pnl": net_pnl,
+            "start_pos": start_pos,
+            "end_pos": end_pos,
+            "pre_close": pre_close,
+            "close_price": close,
+        }
+        return {name: np.where(valid, array, 0) for name, array in results.items()}
+
+    def daily_df(self) -> DataFrame:
+        """
+        the daily results of all contracts summed, by date.
+        """
+        results = self.contract_results()
+        df = DataFrame({name: results[name].sum(axis=1) for name in self.FIELDS},
+                       index=pd.Index(sorted(self.dates), name="date"))
+        return df
+
+    def daily_results(self) -> List[ContractsDailyResult]:
+        """
+        ContractsDailyResult of each day, sorted by date, created on demand. trades are not attached to them.
+        """
+        results = self.contract_results()
+        close = self.close[:len(self.dates)][np.argsort([d.toordinal() for d in self.dates], kind="stable")]
+        daily_results = []
+        for row, d in enumerate(sorted(self.dates)):
+            columns = np.flatnonzero(~np.isnan(close[row]))
+            daily_result = ContractsDailyResult(
+                d, {self.ab_symbols[column]: float(close[row, column]) for column in columns})
+            for column in columns:
+                ab_symbol = self.ab_symbols[column]
+                contract_result = daily_result.contract_results[ab_symbol]
+                contract_result.pre_close = float(results["pre_close"][row, column])
+                contract_result.start_pos = float(results["start_pos"][row, column])
+                contract_result.end_pos = float(results["end_pos"][row, column])
+                for name in self.FIELDS:
+                    setattr(contract_result, name, results[name][row, column].item())
+                    setattr(daily_result, name, getattr(daily_result, name) + getattr(contract_result, name))
+                daily_result.start_poses[ab_symbol] = contract_result.start_pos
+                daily_result.end_poses[ab_symbol] = contract_result.end_pos
+                if row:
+                    daily_result.pre_closes[ab_symbol] = contract_result.pre_close
+            daily_results.append(daily_result)
+        return daily_results
+
+
+class EquityCurve:
+    """
+    mark to market balance at the close of each replayed minute, in preallocated float64 arrays.
+    capital plus the cash of trades net of commission and slippage plus the value of positions at the close prices,
+    the daily balance of DailyPnl at the last minute of each day.
+    """
+
+    def __init__(
+        self,
+        ab_symbols: List[str],
+        sizes: Dict[str, float],
+        rates: Dict[str, float],
+        slippages: Dict[str, float],
+        inverses: Dict[str, bool],
+        capital: float,
+        capacity: int
+    ):
+        self.ab_symbols: List[str] = list(ab_symbols)
+        self.columns: Dict[str, int] = {ab_symbol: i for i, ab_symbol in enumerate(self.ab_symbols)}
+        self.sizes: np.ndarray = np.array([sizes[ab_symbol] for ab_symbol in self.ab_symbols], dtype=float)
+        self.costs: np.ndarray = np.array(
+            [rates[ab_symbol] + slippages[ab_symbol] for ab_symbol in self.ab_symbols], dtype=float)
+        self.inverses: np.ndarray = np.array([bool(inverses[ab_symbol]) for ab_symbol in self.ab_symbols])
+        self.capital: float = capital
+
+        self.cash: float = capital
+        self.pos: np.ndarray = np.zeros(len(self.ab_symbols))
+        self.closes: np.ndarray = np.full(len(self.ab_symbols), np.nan)
+        # trades loaded before the replay, applied at their minute
+        self.scheduled: List[TradeData] = []
+
+        self.minutes: np.ndarray = np.empty(max(capacity, 1), dtype=np.int64)
+        self.balance: np.ndarray = np.empty(max(capacity, 1), dtype=np.float64)
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add_trade(self, trade: TradeData) -> None:
+        column = self.columns[trade.ab_symbol]
+        size = self.sizes[column]
+        volume = trade.volume
+        change = volume if trade.direction == Direction.LONG else -volume
+        if self.inverses[column]:
+            self.cash += (change - volume * self.costs[column]) / trade.price * size
+        else:
+            self.cash -= (change + volume * self.costs[column]) * trade.price * size
+        self.pos[column] += change
+
+    def schedule_trades(self, trades: Iterable[TradeData]) -> None:
+        self.scheduled.extend(trades)
+        self.scheduled.sort(key=lambda trade: trade.datetime, reverse=True)
+
+    def update(self, dt: datetime, bars: Iterable) -> None:
+        """
+        close prices of the bars of dt, then the balance recorded.
+        """
+        scheduled = self.scheduled
+        while scheduled and scheduled[-1].datetime <= dt:
+            self.add_trade(scheduled.pop())
+        closes = self.closes
+        columns = self.columns
+        for bar in bars:
+            closes[columns[bar.ab_symbol]] = bar.close_price
+        self.record(to_minute(dt), self.cash + self.position_value(self.pos, closes))
+
+    def position_value(self, pos: np.ndarray, closes: np.ndarray) -> np.ndarray:
+        """
+        value of positions (..., contracts) at close prices, a position of an inverse contract valued -pos / close.
+        """
+        held = pos != 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value = np.where(self.inverses, -pos / closes, pos * closes) * self.sizes
+        return np.where(held, value, 0).sum(axis=-1)
+
+    def record(self, minute: int, balance: float) -> None:
+        if self.count == len(self.balance):
+            self.minutes = np.concatenate([self.minutes, np.empty_like(self.minutes)])
+            self.balance = np.concatenate([self.balance, np.empty_like(self.balance)])
+        self.minutes[self.count] = minute
+        self.balance[self.count] = balance
+        self.count += 1
+
+    def record_arrays(self, minutes: np.ndarray, closes: np.ndarray, changes: np.ndarray, prices: np.ndarray) -> None:
+        """
+        the whole curve at once from (minutes, contracts) arrays of close prices, position changes and their prices.
+        """
+        traded = changes != 0
+        volumes = np.abs(changes)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cash_flows = np.where(self.inverses, (changes - volumes * self.costs) / prices,
+                                  -(changes + volumes * self.costs) * prices) * self.sizes
+        cash = self.cash + np.cumsum(np.where(traded, cash_flows, 0).sum(axis=1))
+        pos = self.pos + np.cumsum(changes, axis=0)
+        self.minutes = np.asarray(minutes, dtype=np.int64).copy()
+        self.balance = cash + self.position_value(pos, closes)
+        self.count = len(self.minutes)
+        self.cash = float(cash[-1]) if self.count else self.cash
+        self.pos = pos[-1] if self.count else self.pos
+
+    def series(self) -> pd.Series:
+        """
+        balance by datetime of minute.
+        """
+        return pd.Series(self.balance[:self.count], index=self.minutes[:self.count].astype("datetime64[m]"),
+                         name="balance")
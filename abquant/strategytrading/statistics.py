@@ -0,0 +1,118 @@
+from typing import Dict
+
+import numpy as np
+
+
+def drawdown(balance: np.ndarray) -> np.ndarray:
+    """
+    balance minus its running high, <= 0.
+    """
+    balance = np.asarray(balance, dtype=float)
+    return balance - np.maximum.accumulate(balance)
+
+
+def underwater_periods(balance: np.ndarray, drawdowns: np.ndarray = None) -> np.ndarray:
+    """
+    (m, 2) of [start, end) index ranges of the balance below its running high.
+    a period still open at the end of the balance ends at len(balance).
+    """
+    if drawdowns is None:
+        drawdowns = drawdown(balance)
+    under = np.zeros(len(drawdowns) + 2, dtype=np.int8)
+    under[1:-1] = drawdowns < 0
+    edges = np.flatnonzero(np.diff(under))
+    return edges.reshape(-1, 2)
+
+
+def longest_drawdown_duration(balance: np.ndarray, drawdowns: np.ndarray = None) -> float:
+    """
+    most points between two new highs of the balance, or from the last one to the end.
+    """
+    if drawdowns is None:
+        drawdowns = drawdown(balance)
+    if not len(drawdowns):
+        return 0
+    highs = np.append(np.flatnonzero(drawdowns == 0), len(drawdowns))
+    return float(np.diff(highs).max()) if len(highs) > 1 else 0.0
+
+
+def max_drawdown_range(balance: np.ndarray, highlevel: np.ndarray = None) -> tuple:
+    """
+    indexes of the start of the max drawdown, the first point at its high, and of its bottom.
+    """
+    balance = np.asarray(balance, dtype=float)
+    if not len(balance):
+        return 0, 0
+    if highlevel is None:
+        highlevel = np.maximum.accumulate(balance)
+    end = int(np.argmin(balance - highlevel))
+    # the running high is sorted, its first point at the high of the bottom
+    start = int(np.searchsorted(highlevel, highlevel[end]))
+    return start, end
+
+
+def sharpe_ratio(returns: np.ndarray, risk_free: float, periods: int) -> float:
+    """
+    returns of each period, risk free in percent of a period scaled as ReplayRunner does.
+    """
+    returns = np.asarray(returns, dtype=float) * 100
+    if len(returns) < 2:
+        return 0
+    std = returns.std(ddof=1)
+    if not std:
+        return 0
+    return (returns.mean() - risk_free / np.sqrt(periods)) / std * np.sqrt(periods)
+
+
+def sortino_ratio(returns: np.ndarray, risk_free: float, periods: int) -> float:
+    """
+    sharpe_ratio with the deviation of the returns below the risk free only.
+    """
+    returns = np.asarray(returns, dtype=float) * 100
+    if not len(returns):
+        return 0
+    period_risk_free = risk_free / np.sqrt(periods)
+    downside = np.sqrt(np.mean(np.minimum(returns - period_risk_free, 0) ** 2))
+    if not downside:
+        return 0
+    return (returns.mean() - period_risk_free) / downside * np.sqrt(periods)
+
+
+def calmar_ratio(annual_return: float, max_ddpercent: float) -> float:
+    """
+    annual return over the max drawdown, both in percent.
+    """
+    if not max_ddpercent:
+        return 0
+    return annual_return / -max_ddpercent
+
+
+def return_drawdown_ratio(total_net_pnl: float, max_drawdown: float) -> float:
+    """
+    net pnl over the max drawdown, both in money.
+    """
+    if not max_drawdown:
+        return 0
+    return total_net_pnl / -max_drawdown
+
+
+def equity_statistics(balance: np.ndarray) -> Dict:
+    """
+    drawdown statistics of a balance curve of any resolution in one pass, durations in points.
+    """
+    balance = np.asarray(balance, dtype=float)
+    if not len(balance):
+        return {
+            "max_drawdown": 0, "max_ddpercent": 0, "max_drawdown_duration": 0,
+            "longest_drawdown_duration": 0, "underwater_periods": 0,
+        }
+    highlevel = np.maximum.accumulate(balance)
+    drawdowns = balance - highlevel
+    start, end = max_drawdown_range(balance, highlevel)
+    return {
+        "max_drawdown": drawdowns[end],
+        "max_ddpercent": (drawdowns / highlevel).min() * 100,
+        "max_drawdown_duration": end - start,
+        "longest_drawdown_duration": longest_drawdown_duration(balance, drawdowns),
+        "underwater_periods": len(underwater_periods(balance, drawdowns)),
+    }
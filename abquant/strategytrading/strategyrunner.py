@@ -2,7 +2,7 @@
 
 from abc import ABC, abstractmethod
 from logging import INFO
-from typing import Iterable
+from typing import Callable, Iterable
 from abquant.monitor import Monitor, DummyMonitor
 from abquant.trader.common import Direction, Interval, Offset, OrderType
 from typing import TYPE_CHECKING
@@ -81,3 +81,11 @@ class StrategyRunner(ABC):
     @abstractmethod
     def notify_lark(self, strategy: "StrategyTemplate", msg: str):
         pass
+
+    @abstractmethod
+    def schedule_timer(self, strategy: "StrategyTemplate", callback: Callable[[], None], delay: float, interval: float = 0):
+        pass
+
+    @abstractmethod
+    def cancel_timer(self, strategy: "StrategyTemplate", handle) -> None:
+        pass
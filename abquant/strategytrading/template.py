@@ -4,7 +4,7 @@ from logging import INFO
 from abquant import gateway
 from abquant.event.dispatcher import Event
 from copy import copy
-from typing import Dict, Set, List, TYPE_CHECKING
+from typing import Callable, Dict, Set, List, TYPE_CHECKING
 from collections import defaultdict
 
 from abquant.trader.common import Interval, Direction, Offset, OrderType
@@ -323,6 +323,18 @@ class StrategyTemplate(ABC):
 
     def notify_lark(self, msg: str):
         self.strategy_runner.notify_lark(self, msg)
+
+    def schedule_timer(self, delay: float, callback: Callable[[], None], interval: float = 0):
+        """
+        delay 秒后调用 callback, interval > 0 时此后每 interval 秒调用一次, 周期不累积漂移。
+        与 on_tick/on_bars 在同一线程中回调，策略停止时自动取消。回测中以k线时间计时。
+        返回 TimerHandle, 可用于 cancel_timer.
+        """
+        return self.strategy_runner.schedule_timer(self, callback, delay, interval)
+
+    def cancel_timer(self, handle) -> None:
+        """"""
+        self.strategy_runner.cancel_timer(self, handle)
         
     def sync_data(self):
         """
@@ -0,0 +1,35 @@
+import pytest
+
+from abquant.strategytrading import BacktestStrategyRunner
+
+from .test_history import END, START, RandomWalkLoader, backtest_parameter
+from .test_vectorrunner import EventCrossover, VectorCrossover
+
+
+def test_parallel_matches_serial():
+    ab_symbols = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE", "BNBUSDT.BINANCE"]
+    strategies = [
+        (EventCrossover, "event", ab_symbols[:2], {"fast": 5, "slow": 20}),
+        (VectorCrossover, "vector", ab_symbols[1:], {"fast": 8, "slow": 25}),
+    ]
+
+    def run(processes):
+        runner = BacktestStrategyRunner()
+        runner.set_data_loader(RandomWalkLoader(ab_symbols))
+        runner.set_parameter(backtest_parameter(ab_symbols))
+        for strategy in strategies:
+            runner.add_strategy(*strategy)
+        return runner.run_backtest(START, END, processes=processes)
+
+    serial_trades, serial_results, serial_statistics = run(0)
+    parallel_trades, parallel_results, parallel_statistics = run(2)
+
+    assert list(parallel_statistics) == list(serial_statistics) == ["event", "vector", "portofolio"]
+    for strategy_name in serial_statistics:
+        assert [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume)
+                for trade in parallel_trades[strategy_name]] \
+            == [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume)
+                for trade in serial_trades[strategy_name]]
+        assert [(result.date, result.net_pnl) for result in parallel_results[strategy_name]] \
+            == [(result.date, result.net_pnl) for result in serial_results[strategy_name]]
+        assert parallel_statistics[strategy_name] == pytest.approx(serial_statistics[strategy_name])
@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from abquant.dataloader.dataloader import DataLoader, Dataset
+from abquant.strategytrading import BacktestParameter, BarArrays
+from abquant.strategytrading.history import BarColumns, to_minute
+from abquant.strategytrading.replayrunner import ReplayRunner
+from abquant.trader.common import Exchange, Interval
+from abquant.trader.msg import BarData
+from abquant.trader.utility import extract_ab_symbol
+
+
+START = datetime(2022, 1, 1)
+END = datetime(2022, 1, 4)
+
+
+class ListDataset(Dataset):
+    def __init__(self, bars: List[BarData], start, end, ab_symbol):
+        super().__init__(start, end, ab_symbol, Interval.MINUTE)
+        self.bars = bars
+
+    def __iter__(self):
+        return iter(self.bars)
+
+    def __next__(self):
+        raise StopIteration
+
+    def __len__(self):
+        return len(self.bars)
+
+    def copy(self):
+        return ListDataset(self.bars, self.start, self.end, self.ab_symbol)
+
+
+class RandomWalkLoader(DataLoader):
+    """
+    minute bars of a random walk, some minutes of the second symbol missed.
+    """
+
+    def __init__(self, ab_symbols: List[str], seed: int = 0, start: datetime = START, end: datetime = END):
+        super().__init__({})
+        rng = np.random.default_rng(seed)
+        minutes = int((end - start).total_seconds() // 60)
+        self.bars: Dict[str, List[BarData]] = {}
+        for i, ab_symbol in enumerate(ab_symbols):
+            symbol, exchange = extract_ab_symbol(ab_symbol)
+            closes = 100 * (i + 1) * np.exp(np.cumsum(rng.normal(0, 0.002, minutes)))
+            opens = np.append(closes[0], closes[:-1]) * np.exp(rng.normal(0, 0.0005, minutes))
+            bars = []
+            for minute in range(minutes):
+                if i and minute and rng.random() < 0.02:
+                    continue
+                open_price, close_price = round(float(opens[minute]), 2), round(float(closes[minute]), 2)
+                bars.append(BarData(
+                    gateway_name="BACKTESTING", symbol=symbol, exchange=exchange, interval=Interval.MINUTE,
+                    datetime=start + timedelta(minutes=minute), volume=1,
+                    open_price=open_price, close_price=close_price,
+                    high_price=max(open_price, close_price) + 0.05, low_price=min(open_price, close_price) - 0.05))
+            self.bars[ab_symbol] = bars
+
+    def set_config(self, setting):
+        self._config = setting
+
+    def load_data(self, ab_symbol, start, end, interval=Interval.MINUTE):
+        return ListDataset([bar for bar in self.bars[ab_symbol] if start <= bar.datetime < end], start, end, ab_symbol)
+
+
+def backtest_parameter(ab_symbols: List[str], **overrides) -> BacktestParameter:
+    """
+    minute backtest of ab_symbols with the same costs for each, fields given by overrides replaced.
+    """
+    parameter = dict(
+        ab_symbols=ab_symbols,
+        interval=Interval.MINUTE,
+        rates={ab_symbol: 0.0004 for ab_symbol in ab_symbols},
+        slippages={ab_symbol: 0.0001 for ab_symbol in ab_symbols},
+        sizes={ab_symbol: 10 for ab_symbol in ab_symbols},
+        priceticks={ab_symbol: 0.01 for ab_symbol in ab_symbols},
+        capital=100000,
+    )
+    parameter.update(overrides)
+    return BacktestParameter(**parameter)
+
+
+def load_history(loader: RandomWalkLoader, ab_symbols: List[str]) -> BarArrays:
+    runner = ReplayRunner(**backtest_parameter(ab_symbols).runner_kwargs(ab_symbols))
+    runner.output = lambda msg: None
+    runner.set_data_loader(loader)
+    runner.load_data(START, END)
+    return runner.history
+
+
+def test_history_aligned_and_forward_filled():
+    ab_symbols = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"]
+    loader = RandomWalkLoader(ab_symbols)
+    history = load_history(loader, ab_symbols)
+
+    assert len(history) == (END - START) // timedelta(minutes=1)
+    assert history.datetime(0) == START
+    for column, ab_symbol in enumerate(ab_symbols):
+        bars = loader.bars[ab_symbol]
+        rows = np.searchsorted(history.minutes, [to_minute(bar.datetime) for bar in bars])
+        assert np.flatnonzero(history.present[:, column]).tolist() == rows.tolist()
+        for field, name in zip(BarArrays.FIELDS, ("open_price", "high_price", "low_price", "close_price", "volume")):
+            np.testing.assert_array_equal(getattr(history, field)[rows, column], [getattr(bar, name) for bar in bars])
+
+    # missed minutes of the second symbol filled by the last close_price, volume 0.
+    missed = np.flatnonzero(~history.present[:, 1])
+    assert len(missed)
+    for field in (history.open, history.high, history.low, history.close):
+        np.testing.assert_array_equal(field[missed, 1], history.close[missed - 1, 1])
+    assert not history.volume[missed, 1].any()
+
+
+def test_bars_of_row():
+    ab_symbols = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"]
+    loader = RandomWalkLoader(ab_symbols)
+    # the second symbol starts 10 minutes late.
+    loader.bars[ab_symbols[1]] = [bar for bar in loader.bars[ab_symbols[1]]
+                                  if bar.datetime >= START + timedelta(minutes=10)]
+    history = load_history(loader, ab_symbols)
+
+    assert np.isnan(history.close[:10, 1]).all()
+    assert [bar.ab_symbol for bar in history.bars(9)] == ab_symbols[:1]
+
+    row = np.flatnonzero(~history.present[:, 1])[-1]
+    bars = history.bars(row)
+    assert [bar.ab_symbol for bar in bars] == ab_symbols
+    loaded = loader.bars[ab_symbols[0]][row]
+    assert (bars[0].datetime, bars[0].open_price, bars[0].close_price, bars[0].volume) \
+        == (loaded.datetime, loaded.open_price, loaded.close_price, loaded.volume)
+    assert bars[1].open_price == bars[1].close_price == history.close[row - 1, 1]
+    assert bars[1].volume == 0 and bars[1].interval == Interval.MINUTE
+
+
+def test_select_and_slice():
+    ab_symbols = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE", "BNBUSDT.BINANCE"]
+    history = load_history(RandomWalkLoader(ab_symbols), ab_symbols)
+
+    # adjacent columns over the whole grid are views, others copies.
+    adjacent = history.select(ab_symbols[:2])
+    assert np.shares_memory(adjacent.close, history.close)
+    reordered = history.select([ab_symbols[2], ab_symbols[0]])
+    assert not np.shares_memory(reordered.close, history.close)
+    np.testing.assert_array_equal(reordered.close, history.close[:, [2, 0]])
+    assert reordered.ab_symbols == [ab_symbols[2], ab_symbols[0]]
+
+    sliced = history.slice(60, 120)
+    assert np.shares_memory(sliced.close, history.close)
+    assert len(sliced) == 60 and sliced.datetime(0) == START + timedelta(hours=1)
+
+
+def test_columns_sorted_last_duplicate_kept():
+    def bar(minute: int, close_price: float) -> BarData:
+        return BarData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE,
+                       datetime=START + timedelta(minutes=minute), close_price=close_price)
+
+    column = BarColumns()
+    assert column.extend([bar(2, 1), bar(0, 2)]) == 2
+    assert column.extend([]) == 0
+    column.extend([bar(2, 3), bar(1, 4)])
+    array = column.array()
+    assert (array[:, 0] - to_minute(START)).tolist() == [0, 1, 2]
+    assert array[:, 4].tolist() == [2, 4, 3]
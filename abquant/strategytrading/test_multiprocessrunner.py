@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta
+import pickle
+from threading import Lock, Thread
+import time
+from typing import List
+
+import pytest
+
+from abquant.event import Event, EventDispatcher, EventType
+from abquant.strategytrading import StrategyTemplate
+from abquant.strategytrading.multiprocessrunner import MultiProcessStrategyRunner
+from abquant.trader.common import Exchange, Interval, OrderType, Product, Status
+from abquant.trader.msg import BarData, TickData
+from abquant.trader.object import ContractData
+
+
+GATEWAY_NAME = "FAKE"
+AB_SYMBOL = "BTCUSDT.BINANCE"
+
+
+class FakeGateway:
+    """
+    orders are only recorded, their events are put by the test.
+    """
+
+    def __init__(self):
+        self.orders = []
+        self.cancelled = []
+        self.lock = Lock()
+
+    def subscribe(self, req):
+        pass
+
+    def start(self):
+        pass
+
+    def send_order(self, req):
+        with self.lock:
+            order = req.create_order_data(str(len(self.orders) + 1), GATEWAY_NAME)
+            self.orders.append(order)
+        return order.ab_orderid
+
+    def cancel_orders(self, reqs):
+        with self.lock:
+            self.cancelled.extend(reqs)
+
+
+class FakeHistoryRunner(MultiProcessStrategyRunner):
+    """
+    history of load_bars is 3 minute bars, logs of strategies are kept.
+    """
+
+    def __init__(self, event_dispatcher: EventDispatcher):
+        super(FakeHistoryRunner, self).__init__(event_dispatcher, ring_slots=256, slot_size=2048)
+        self.logs: List[str] = []
+
+    def load_bar_(self, ab_symbol: str, start: datetime, end: datetime, interval: Interval):
+        if start >= end - timedelta(minutes=1):
+            return []
+        return [BarData(gateway_name=GATEWAY_NAME, symbol="BTCUSDT", exchange=Exchange.BINANCE, interval=interval,
+                        datetime=start + timedelta(minutes=i), open_price=1, high_price=1, low_price=1, close_price=1)
+                for i in range(3)]
+
+    def write_log(self, msg: str, strategy: StrategyTemplate = None, level: int = 0):
+        self.logs.append("{}: {}".format(strategy.strategy_name if strategy else "", msg))
+
+
+class LoggingStrategy(StrategyTemplate):
+    """
+    logs the bars loaded and every tick, a limit order at the first tick and raises at the crash_at-th.
+    """
+    crash_at = 0
+    interval = "1m"
+    parameters = ["crash_at", "interval"]
+
+    def __init__(self, strategy_runner, strategy_name, ab_symbols, setting):
+        super().__init__(strategy_runner, strategy_name, ab_symbols, setting)
+        self.bars = 0
+        self.ticks = 0
+
+    def on_init(self):
+        interval = Interval(self.interval)
+        if interval == Interval.MINUTE:
+            self.load_bars(1)
+        else:
+            self.strategy_runner.load_bars(self, 1, interval, on_interval=self.on_bars)
+        self.write_log("bars {}".format(self.bars))
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+    def on_bars(self, bars):
+        self.bars += 1
+
+    def on_tick(self, tick):
+        self.ticks += 1
+        if self.ticks == self.crash_at:
+            raise RuntimeError("crash")
+        if self.ticks == 1:
+            self.buy(tick.ab_symbol, tick.trade_price, 1, OrderType.LIMIT)
+        self.write_log("tick {}".format(self.ticks))
+
+    def on_exception(self, exception):
+        pass
+
+    def update_order(self, order):
+        super().update_order(order)
+
+    def update_trade(self, trade):
+        super().update_trade(trade)
+
+
+def tick(price: float) -> TickData:
+    return TickData(gateway_name=GATEWAY_NAME, symbol="BTCUSDT", exchange=Exchange.BINANCE,
+                    datetime=datetime.now(), trade_price=price, trade_volume=1)
+
+
+def wait_until(condition, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def runner():
+    event_dispatcher = EventDispatcher()
+    gateway = FakeGateway()
+    event_dispatcher.order_manager.gateways[GATEWAY_NAME] = gateway
+    event_dispatcher.order_manager.contracts[AB_SYMBOL] = ContractData(
+        gateway_name=GATEWAY_NAME, symbol="BTCUSDT", exchange=Exchange.BINANCE, name="BTCUSDT",
+        product=Product.FUTURES, size=1, pricetick=0.1, min_volume=1)
+    runner = FakeHistoryRunner(event_dispatcher)
+    runner.gateway = gateway
+    yield runner
+    runner.close()
+    event_dispatcher.stop()
+
+
+def test_crashed_strategy_is_isolated_and_its_orders_cancelled(runner):
+    runner.add_strategy(LoggingStrategy, "crashing", [AB_SYMBOL], {"crash_at": 2}, worker_name="first")
+    runner.add_strategy(LoggingStrategy, "surviving", [AB_SYMBOL], {}, worker_name="second")
+    runner.init_all_strategies()
+    runner.start_all_strategies()
+    # load_bars served over the pipe, from now - 1 day to now.
+    assert "crashing: bars 3" in runner.logs and "surviving: bars 3" in runner.logs
+
+    runner.event_dispatcher.put(Event(EventType.EVENT_TICK, tick(100)))
+    wait_until(lambda: len(runner.gateway.orders) == 2 and "surviving: tick 1" in runner.logs)
+    for order in runner.gateway.orders:
+        order.status = Status.NOTTRADED
+        runner.event_dispatcher.put(Event(EventType.EVENT_ORDER, order))
+    crashing = runner.get_strategy("crashing")
+    wait_until(lambda: len(crashing.orders) == 1)
+    crashed_orderid = next(iter(crashing.active_orderids))
+
+    for price in (101, 102):
+        runner.event_dispatcher.put(Event(EventType.EVENT_TICK, tick(price)))
+    wait_until(lambda: "surviving: tick 3" in runner.logs)
+    wait_until(lambda: runner.gateway.cancelled)
+
+    assert not crashing.trading and not crashing.inited
+    assert runner.get_strategy("surviving").trading
+    assert [req.orderid for req in runner.gateway.cancelled] == [crashed_orderid.split(".", 1)[1]]
+    assert not any(log.startswith("crashing: tick 2") for log in runner.logs)
+    assert runner.workers["first"].alive and runner.workers["second"].alive
+
+
+def test_load_bars_of_other_interval_as_live(runner):
+    runner.add_strategy(LoggingStrategy, "hourly", [AB_SYMBOL], {"interval": "1h"})
+    runner.init_strategy("hourly")
+    # LiveStrategyRunner.load_bars raises for on_interval of non-minute interval, so does the worker.
+    assert not runner.get_strategy("hourly").inited
+    assert any("NotImplementedError: non-minute-interval" in log for log in runner.logs)
+
+
+def test_publish_from_several_threads():
+    event_dispatcher = EventDispatcher()
+    runner = MultiProcessStrategyRunner(event_dispatcher, ring_slots=8192)
+    try:
+        runner.map_symbols(LoggingStrategy, [AB_SYMBOL])
+        reader = runner.ring.reader()
+        # as lanes of ShardedEventDispatcher, every thread publishes its own ticks.
+        threads = [Thread(target=lambda n=n: [runner.publish("on_tick", tick(n * 10000 + i)) for i in range(2000)])
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        prices = []
+        while True:
+            message = reader.get()
+            if message is None:
+                break
+            key, payload = message
+            method, data = pickle.loads(payload)
+            assert key == AB_SYMBOL and method == "on_tick"
+            prices.append(data.trade_price)
+        assert reader.lost == 0
+        assert len(prices) == 8000
+        for n in range(4):
+            assert [price for price in prices if price // 10000 == n] == [n * 10000 + i for i in range(2000)]
+    finally:
+        runner.close()
+        event_dispatcher.stop()
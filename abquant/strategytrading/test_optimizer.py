@@ -0,0 +1,82 @@
+from typing import List
+
+import pytest
+
+from abquant.strategytrading import OptimizationSetting, StrategyOptimizer
+
+from .test_history import END, START, RandomWalkLoader, backtest_parameter
+from .test_vectorrunner import EventCrossover, VectorCrossover, backtest
+
+
+AB_SYMBOLS = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"]
+
+
+def optimizer(strategy_class, processes: int = 0, cache_path: str = None) -> StrategyOptimizer:
+    return StrategyOptimizer(
+        strategy_class, AB_SYMBOLS, RandomWalkLoader(AB_SYMBOLS), backtest_parameter(AB_SYMBOLS),
+        START, END, processes=processes, cache_path=cache_path)
+
+
+def crossover_setting() -> OptimizationSetting:
+    setting = OptimizationSetting()
+    setting.add_parameter("fast", 4, 10, 3)
+    setting.add_parameter("slow", [20, 30])
+    setting.set_target("total_net_pnl")
+    return setting
+
+
+def test_optimization_setting():
+    setting = OptimizationSetting()
+    setting.add_parameter("fast", 4, 10, 3)
+    setting.add_parameter("slow", 0.1, 0.3, 0.1)
+    setting.add_parameter("fixed", 7)
+    assert setting.params == {"fast": [4, 7, 10], "slow": [0.1, 0.2, 0.3], "fixed": [7]}
+    assert setting.size == 9
+    assert setting.generate_settings()[:4] == [
+        {"fast": 4, "slow": 0.1, "fixed": 7}, {"fast": 4, "slow": 0.2, "fixed": 7},
+        {"fast": 4, "slow": 0.3, "fixed": 7}, {"fast": 7, "slow": 0.1, "fixed": 7}]
+    with pytest.raises(ValueError):
+        setting.add_parameter("slow", 1, 3, 0)
+
+
+def test_grid_search_ranks_backtests():
+    df = optimizer(VectorCrossover).run_grid_search(crossover_setting())
+
+    assert len(df) == 6
+    assert list(df.columns[:3]) == ["fast", "slow", "total_net_pnl"]
+    assert df["total_net_pnl"].is_monotonic_decreasing
+    best = df.iloc[0]
+    _, _, statistics = backtest(EventCrossover, AB_SYMBOLS, False, setting={"fast": best.fast, "slow": best.slow})
+    assert statistics["total_net_pnl"] == pytest.approx(best.total_net_pnl)
+
+
+def test_parallel_search_and_cache(tmp_path):
+    cache_path = str(tmp_path / "cache.pkl")
+    serial = optimizer(VectorCrossover).run_grid_search(crossover_setting())
+    parallel = optimizer(VectorCrossover, processes=2, cache_path=cache_path).run_grid_search(crossover_setting())
+    assert parallel[["fast", "slow", "total_net_pnl"]].equals(serial[["fast", "slow", "total_net_pnl"]])
+
+    cached = optimizer(VectorCrossover, cache_path=cache_path)
+    assert len(cached.cache) == 6
+    cached.load_history = None
+    assert cached.run_random_search(crossover_setting(), 4, seed=1)["total_net_pnl"].isin(
+        serial["total_net_pnl"]).all()
+
+
+def test_genetic_search():
+    setting = OptimizationSetting()
+    setting.add_parameter("fast", 2, 12, 1)
+    setting.add_parameter("slow", 15, 40, 5)
+    setting.set_target("sharpe_ratio")
+    search = optimizer(VectorCrossover)
+    df = search.run_genetic_search(setting, population_size=8, generations=4, seed=3)
+
+    assert 8 <= len(df) <= 32
+    assert not df.duplicated(["fast", "slow"]).any()
+    assert df["sharpe_ratio"].is_monotonic_decreasing
+    grid = StrategyOptimizer.result_table(
+        setting.generate_settings(), search.evaluate(setting.generate_settings()), setting)
+    assert df.iloc[0].sharpe_ratio <= grid.iloc[0].sharpe_ratio
+    with pytest.raises(ValueError):
+        setting.add_parameter("unknown", 1)
+        search.run_genetic_search(setting)
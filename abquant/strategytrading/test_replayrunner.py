@@ -0,0 +1,120 @@
+from datetime import timedelta
+from typing import List
+
+import pandas as pd
+
+from abquant.strategytrading import StrategyTemplate
+from abquant.strategytrading.replayrunner import ReplayRunner
+from abquant.strategytrading.test_history import END, START, RandomWalkLoader, backtest_parameter
+from abquant.strategytrading.test_vectorrunner import EventCrossover
+from abquant.trader.common import Interval
+
+
+AB_SYMBOL = "BTCUSDT.BINANCE"
+
+
+class TimerStrategy(StrategyTemplate):
+    """
+    timers scheduled at on_start, the datetime of the bar replayed recorded when fired.
+    """
+
+    def __init__(self, strategy_runner, strategy_name, ab_symbols, setting):
+        super().__init__(strategy_runner, strategy_name, ab_symbols, setting)
+        self.hourly = []
+        self.once = []
+        self.warmup = []
+        self.bars = []
+
+    def on_init(self):
+        self.load_bars(1)
+        # due during the warm up, skipped until inited, then every 12 hours from 00:00 of the first day.
+        self.schedule_timer(0, lambda: self.warmup.append(self.strategy_runner.datetime), interval=12 * 3600)
+
+    def on_start(self):
+        self.schedule_timer(90, lambda: self.hourly.append(self.strategy_runner.datetime), interval=3600)
+        self.schedule_timer(600, lambda: self.once.append(self.strategy_runner.datetime))
+        cancelled = self.schedule_timer(7200, lambda: self.once.append(None))
+        self.cancel_timer(cancelled)
+
+    def on_stop(self):
+        pass
+
+    def on_tick(self, tick):
+        pass
+
+    def on_exception(self, exception):
+        pass
+
+    def on_bars(self, bars):
+        if self.trading:
+            self.bars.append(bars[AB_SYMBOL].datetime)
+
+    def update_order(self, order):
+        super().update_order(order)
+
+    def update_trade(self, trade):
+        super().update_trade(trade)
+
+
+def test_timers_fired_by_bar_time():
+    parameter = backtest_parameter([AB_SYMBOL])
+    runner = ReplayRunner(**parameter.runner_kwargs([AB_SYMBOL]))
+    runner.output = lambda msg: None
+    runner.set_data_loader(RandomWalkLoader([AB_SYMBOL]))
+    strategy = TimerStrategy(runner, "timer", [AB_SYMBOL], {})
+    runner.set_strategy(strategy)
+    runner.load_data(START, END)
+    runner.run_backtesting()
+
+    # started after the bar of 23:59 of the first day, timers fired right before on_bars of the first bar at or after
+    # the deadline, 00:00:30 + n hours for the periodic one.
+    started = START + timedelta(days=1) - timedelta(minutes=1)
+    assert strategy.bars[0] == started + timedelta(minutes=1)
+    assert strategy.once == [started + timedelta(minutes=10)]
+    assert strategy.hourly == [started + timedelta(minutes=2, hours=hour) for hour in range(48)]
+    assert strategy.hourly[-1] < END
+    assert strategy.warmup == [START + timedelta(days=1, hours=12 * n) for n in range(4)]
+
+
+class RecordingLoader(RandomWalkLoader):
+    """
+    ranges of every load_data recorded.
+    """
+
+    def __init__(self, ab_symbols: List[str]):
+        super().__init__(ab_symbols)
+        self.calls = []
+
+    def load_data(self, ab_symbol, start, end, interval=Interval.MINUTE):
+        self.calls.append((ab_symbol, start, end))
+        return super().load_data(ab_symbol, start, end, interval)
+
+
+def replay(ab_symbols: List[str], streaming: bool):
+    loader = RecordingLoader(ab_symbols)
+    runner = ReplayRunner(**backtest_parameter(ab_symbols, streaming=streaming).runner_kwargs(ab_symbols))
+    runner.output = lambda msg: None
+    runner.set_data_loader(loader)
+    runner.set_strategy(EventCrossover(runner, "crossover", ab_symbols, {"fast": 5, "slow": 20}))
+    runner.load_data(START, END)
+    loaded = list(loader.calls)
+    runner.run_backtesting()
+    return runner, loader.calls, loaded
+
+
+def test_streaming_matches_loaded_history():
+    ab_symbols = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"]
+    runner, _, _ = replay(ab_symbols, streaming=False)
+    streamed, calls, loaded = replay(ab_symbols, streaming=True)
+
+    # nothing loaded up front, day chunks of each symbol pulled along the replay.
+    assert loaded == []
+    assert sorted(calls) == sorted((ab_symbol, START + timedelta(days=day), START + timedelta(days=day + 1))
+                                   for ab_symbol in ab_symbols for day in range(3))
+
+    trades = [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume)
+              for trade in runner.trades.values()]
+    assert len(trades) > 50
+    assert [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume)
+            for trade in streamed.trades.values()] == trades
+    pd.testing.assert_frame_equal(streamed.calculate_result(), runner.calculate_result())
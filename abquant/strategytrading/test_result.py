@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from abquant.strategytrading.result import ContractsDailyResult, DailyPnl
+from abquant.trader.common import Direction, Offset
+from abquant.trader.msg import TradeData
+from abquant.trader.utility import extract_ab_symbol
+
+
+def random_days(ab_symbols, seed: int = 0):
+    """
+    close prices of each day, the second symbol starting on the third day, and trades of each day.
+    """
+    rng = np.random.default_rng(seed)
+    days = []
+    tradeid = 0
+    for day in range(10):
+        d = date(2022, 1, 1) + timedelta(days=day)
+        closes = {ab_symbol: round(float(rng.uniform(90, 110)) * (i + 1), 2)
+                  for i, ab_symbol in enumerate(ab_symbols) if i == 0 or day >= 2}
+        trades = []
+        for _ in range(rng.integers(0, 20)):
+            ab_symbol = list(closes)[rng.integers(len(closes))]
+            symbol, exchange = extract_ab_symbol(ab_symbol)
+            tradeid += 1
+            trades.append(TradeData(
+                gateway_name="BACKTESTING", symbol=symbol, exchange=exchange, orderid=str(tradeid),
+                tradeid=str(tradeid), direction=Direction.LONG if rng.random() < 0.5 else Direction.SHORT,
+                offset=Offset.NONE, price=closes[ab_symbol] * float(rng.uniform(0.98, 1.02)),
+                volume=float(rng.integers(1, 5)), datetime=datetime.combine(d, datetime.min.time())))
+        days.append((d, closes, trades))
+    return days
+
+
+@pytest.mark.parametrize("ab_symbols, inverse", [
+    (["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"], False),
+    (["BTCUSD.BINANCE"], True),
+])
+def test_daily_pnl_matches_contract_daily_result(ab_symbols, inverse):
+    sizes = {ab_symbol: 10 for ab_symbol in ab_symbols}
+    rates = {ab_symbol: 0.0004 for ab_symbol in ab_symbols}
+    slippages = {ab_symbol: 0.0001 for ab_symbol in ab_symbols}
+    inverses = {ab_symbol: inverse for ab_symbol in ab_symbols}
+    days = random_days(ab_symbols)
+
+    daily_pnl = DailyPnl(ab_symbols, sizes, rates, slippages, inverses, capacity=4)
+    bulk = DailyPnl(ab_symbols, sizes, rates, slippages, inverses)
+    expected = []
+    pre_closes, start_poses = {}, {}
+    for d, closes, trades in days:
+        daily_pnl.update_close_prices(d, closes)
+        for trade in trades:
+            daily_pnl.add_trade(trade)
+        result = ContractsDailyResult(d, dict(closes))
+        for trade in trades:
+            result.add_trade(trade)
+        result.calculate_pnl(pre_closes, start_poses, sizes, rates, slippages, inverses)
+        pre_closes, start_poses = result.close_prices, result.end_poses
+        expected.append(result)
+    # trades before their closes, out of order
+    bulk.add_trades([trade for _, _, trades in reversed(days) for trade in trades])
+    for d, closes, _ in days:
+        bulk.update_close_prices(d, closes)
+
+    for df in (daily_pnl.daily_df(), bulk.daily_df()):
+        assert list(df.index) == [result.date for result in expected]
+        for field in DailyPnl.FIELDS:
+            assert list(df[field]) == pytest.approx([getattr(result, field) for result in expected]), field
+
+    for result, expected_result in zip(daily_pnl.daily_results(), expected):
+        assert result.end_poses == expected_result.end_poses
+        for ab_symbol, contract_result in expected_result.contract_results.items():
+            assert result.contract_results[ab_symbol].net_pnl == pytest.approx(contract_result.net_pnl)
+
+
+def test_multiple_inverse_contracts_not_supported():
+    ab_symbols = ["BTCUSD.BINANCE", "ETHUSD.BINANCE"]
+    daily_pnl = DailyPnl(ab_symbols, {ab_symbol: 1 for ab_symbol in ab_symbols}, {ab_symbol: 0 for ab_symbol in ab_symbols},
+                         {ab_symbol: 0 for ab_symbol in ab_symbols}, {ab_symbol: True for ab_symbol in ab_symbols})
+    with pytest.raises(NotImplementedError):
+        daily_pnl.daily_df()
@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from abquant.strategytrading import statistics as stats
+
+
+def rolling_drawdowns(balance: np.ndarray):
+    """
+    drawdown statistics as ReplayRunner computed them with a rolling window and Series scans.
+    """
+    df = pd.DataFrame({"balance": balance}, index=[date(2022, 1, 1) + timedelta(days=i) for i in range(len(balance))])
+    df["highlevel"] = df["balance"].rolling(min_periods=1, window=len(df), center=False).max()
+    df["drawdown"] = df["balance"] - df["highlevel"]
+    df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+    highlevel_idx = pd.Series(np.append(np.where(df["drawdown"] == 0)[0], len(df)))
+    longest_drawdown_duration = (highlevel_idx - highlevel_idx.shift(1)).fillna(0).max()
+    max_drawdown_end = df["drawdown"].idxmin()
+    max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+    return (df["drawdown"].min(), df["ddpercent"].min(), (max_drawdown_end - max_drawdown_start).days,
+            longest_drawdown_duration)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_rolling_window(seed):
+    rng = np.random.default_rng(seed)
+    # plateaus make equal highs
+    balance = 1000 + np.cumsum(np.round(rng.normal(0, 5, 300)) * (rng.random(300) < 0.7))
+    max_drawdown, max_ddpercent, max_drawdown_duration, longest_drawdown_duration = rolling_drawdowns(balance)
+
+    statistics = stats.equity_statistics(balance)
+    assert statistics["max_drawdown"] == pytest.approx(max_drawdown)
+    assert statistics["max_ddpercent"] == pytest.approx(max_ddpercent)
+    assert statistics["max_drawdown_duration"] == max_drawdown_duration
+    assert statistics["longest_drawdown_duration"] == longest_drawdown_duration
+
+
+def test_underwater_periods():
+    balance = np.array([10, 11, 9, 10, 12, 12, 11, 13, 12.5])
+    assert stats.underwater_periods(balance).tolist() == [[2, 4], [6, 7], [8, 9]]
+    assert stats.max_drawdown_range(balance) == (1, 2)
+    assert stats.longest_drawdown_duration(balance) == 3
+    assert len(stats.underwater_periods(np.arange(5.0))) == 0
+
+
+def test_ratios():
+    returns = np.array([0.01, -0.02, 0.03, -0.01, 0.02])
+    assert stats.sharpe_ratio(returns, 0, 365) == pytest.approx(returns.mean() / returns.std(ddof=1) * np.sqrt(365))
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2))
+    assert stats.sortino_ratio(returns, 0, 365) == pytest.approx(returns.mean() / downside * np.sqrt(365))
+    assert stats.sortino_ratio(np.abs(returns), 0, 365) == 0
+    assert stats.calmar_ratio(30, -10) == 3
+    assert stats.calmar_ratio(30, 0) == 0
+    assert stats.return_drawdown_ratio(3000, -1000) == 3
+    assert stats.return_drawdown_ratio(3000, 0) == 0
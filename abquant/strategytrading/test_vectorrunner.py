@@ -0,0 +1,147 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from abquant.strategytrading import (
+    BacktestStrategyRunner, BarArrays, StrategyTemplate, VectorReplayRunner, VectorStrategyTemplate,
+    signals_to_positions)
+from abquant.strategytrading.replayrunner import ReplayRunner
+from abquant.trader.common import Direction, Offset, OrderType
+
+from .test_history import END, START, RandomWalkLoader, backtest_parameter
+
+
+def crossover_targets(closes: np.ndarray, fast: int, slow: int) -> np.ndarray:
+    """
+    long 1 while the fast moving average is above the slow one, short 1 below, flat while warming up.
+    """
+    cumsum = np.cumsum(np.insert(closes, 0, 0))
+    index = np.arange(1, len(closes) + 1)
+    fast_ma = (cumsum[index] - cumsum[np.maximum(index - fast, 0)]) / fast
+    slow_ma = (cumsum[index] - cumsum[np.maximum(index - slow, 0)]) / slow
+    return np.where(index < slow, 0, signals_to_positions(fast_ma > slow_ma, np.zeros(len(closes)), 1,
+                                                          fast_ma < slow_ma, np.zeros(len(closes))))
+
+
+class EventCrossover(StrategyTemplate):
+    fast = 10
+    slow = 30
+    parameters = ["fast", "slow"]
+
+    def __init__(self, strategy_runner, strategy_name, ab_symbols, setting):
+        super().__init__(strategy_runner, strategy_name, ab_symbols, setting)
+        self.closes = {ab_symbol: [] for ab_symbol in ab_symbols}
+
+    def on_init(self):
+        self.load_bars(1)
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+    def on_tick(self, tick):
+        pass
+
+    def on_exception(self, exception):
+        pass
+
+    def on_bars(self, bars):
+        for ab_symbol in self.ab_symbols:
+            bar = bars[ab_symbol]
+            closes = self.closes[ab_symbol]
+            closes.append(bar.close_price)
+            # the whole history, for the same rounding of moving averages as the vectorized one.
+            target = crossover_targets(np.array(closes), self.fast, self.slow)[-1]
+            change = target - self.get_pos(ab_symbol)
+            if change > 0:
+                self.send_order(ab_symbol, Direction.LONG, bar.close_price * 1.5, change, Offset.NONE, OrderType.LIMIT)
+            elif change < 0:
+                self.send_order(ab_symbol, Direction.SHORT, bar.close_price * 0.5, -change, Offset.NONE, OrderType.LIMIT)
+
+    def update_order(self, order):
+        super().update_order(order)
+
+    def update_trade(self, trade):
+        super().update_trade(trade)
+
+
+class VectorCrossover(VectorStrategyTemplate):
+    fast = 10
+    slow = 30
+    parameters = ["fast", "slow"]
+
+    def on_init(self):
+        self.load_bars(1)
+
+    def target_positions(self, bars: BarArrays):
+        return {ab_symbol: crossover_targets(bars.close[:, bars.column(ab_symbol)], self.fast, self.slow)
+                for ab_symbol in self.ab_symbols}
+
+
+def backtest(strategy_class, ab_symbols: List[str], inverse: bool, setting: dict = None):
+    runner = BacktestStrategyRunner()
+    runner.set_data_loader(RandomWalkLoader(ab_symbols))
+    runner.set_parameter(backtest_parameter(ab_symbols, inverses={ab_symbol: inverse for ab_symbol in ab_symbols}))
+    runner.add_strategy(strategy_class, "crossover", ab_symbols, setting or {"fast": 5, "slow": 20})
+    trades, daily_results, statistics = runner.run_backtest(START, END)
+    runner_df = pd.DataFrame([{
+        "date": result.date, "trade_count": result.trade_count, "turnover": result.turnover,
+        "commission": result.commission, "slippage": result.slippage, "trading_pnl": result.trading_pnl,
+        "holding_pnl": result.holding_pnl, "net_pnl": result.net_pnl} for result in daily_results["crossover"]])
+    return trades["crossover"], runner_df, statistics["crossover"]
+
+
+@pytest.mark.parametrize("ab_symbols, inverse", [
+    (["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"], False),
+    (["BTCUSD.BINANCE"], True),
+])
+def test_vectorized_matches_event_driven(ab_symbols, inverse):
+    event_trades, event_df, event_statistics = backtest(EventCrossover, ab_symbols, inverse)
+    vector_trades, vector_df, vector_statistics = backtest(VectorCrossover, ab_symbols, inverse)
+
+    assert len(event_trades) > 50
+    assert [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume) for trade in event_trades] \
+        == [(trade.ab_symbol, trade.datetime, trade.direction, trade.price, trade.volume) for trade in vector_trades]
+    pd.testing.assert_frame_equal(event_df, vector_df)
+    assert event_statistics.keys() == vector_statistics.keys()
+    for key, value in event_statistics.items():
+        assert vector_statistics[key] == pytest.approx(value), key
+
+
+def test_signals_to_positions():
+    entries = np.array([0, 1, 0, 0, 0, 0, 0, 1], dtype=bool)
+    exits = np.array([0, 0, 0, 1, 0, 0, 0, 1], dtype=bool)
+    short_entries = np.array([0, 0, 0, 0, 0, 1, 0, 0], dtype=bool)
+    positions = signals_to_positions(entries, exits, 2, short_entries)
+    assert positions.tolist() == [0, 2, 2, 0, 0, -2, -2, 2]
+
+
+@pytest.mark.parametrize("strategy_class", [EventCrossover, VectorCrossover])
+@pytest.mark.parametrize("ab_symbols, inverse", [
+    (["BTCUSDT.BINANCE", "ETHUSDT.BINANCE"], False),
+    (["BTCUSD.BINANCE"], True),
+])
+def test_minute_equity(strategy_class, ab_symbols, inverse):
+    parameter = backtest_parameter(
+        ab_symbols, inverses={ab_symbol: inverse for ab_symbol in ab_symbols}, minute_equity=True)
+    runner_class = VectorReplayRunner if strategy_class is VectorCrossover else ReplayRunner
+    runner = runner_class(**parameter.runner_kwargs(ab_symbols))
+    runner.output = lambda msg: None
+    runner.set_data_loader(RandomWalkLoader(ab_symbols))
+    runner.set_strategy(strategy_class(runner, "crossover", ab_symbols, {"fast": 5, "slow": 20}))
+    runner.load_data(START, END)
+    runner.run_backtesting()
+    df = runner.calculate_result()
+    statistics = runner.calculate_statistics(df, output=False)
+
+    curve = runner.equity_curve.series()
+    assert len(curve) == len(runner.history)
+    # the balance at the last minute of each day is the daily balance
+    closes = curve.groupby(curve.index.date).last()
+    np.testing.assert_allclose(closes.to_numpy(), 100000 + df["net_pnl"].cumsum().to_numpy())
+    assert statistics["intraday_max_drawdown"] <= statistics["max_drawdown"] < 0
+    assert statistics["intraday_underwater_periods"] > 0
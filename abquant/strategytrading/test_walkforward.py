@@ -0,0 +1,95 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from abquant.strategytrading import BacktestStrategyRunner, OptimizationSetting, WalkForwardRunner, optimizer, walkforward
+
+from .test_history import RandomWalkLoader, backtest_parameter
+from .test_vectorrunner import VectorCrossover
+
+
+START = datetime(2022, 1, 1)
+END = datetime(2022, 1, 9)
+AB_SYMBOLS = ["BTCUSDT.BINANCE"]
+
+
+def walk_forward(processes: int = 0, warmup_days: int = 1, **kwargs) -> WalkForwardRunner:
+    setting = OptimizationSetting()
+    setting.add_parameter("fast", [5, 10])
+    setting.add_parameter("slow", [20, 40])
+    setting.set_target("sharpe_ratio")
+    return WalkForwardRunner(
+        VectorCrossover, AB_SYMBOLS, RandomWalkLoader(AB_SYMBOLS, start=START, end=END), backtest_parameter(AB_SYMBOLS),
+        setting, START, END, train_days=2, test_days=2, warmup_days=warmup_days, processes=processes, **kwargs)
+
+
+def test_windows_are_views():
+    runner = walk_forward()
+    windows = runner.windows()
+    assert [window["out_of_sample_days"][1] - window["out_of_sample_days"][0] for window in windows] == [2, 2, 1]
+    window = windows[1]
+    bars = runner.history.slice(*window["out_of_sample"])
+    assert np.shares_memory(bars.close, runner.history.close)
+    assert bars.datetime(0) == datetime(2022, 1, 5)
+
+
+def test_walk_forward_matches_backtests(monkeypatch):
+    equity, statistics = walk_forward().run()
+
+    assert list(statistics["out_of_sample_start"]) == [date(2022, 1, 4), date(2022, 1, 6), date(2022, 1, 8)]
+    assert list(equity.index) == [date(2022, 1, d) for d in range(4, 9)]
+    assert equity["balance"].iloc[-1] == pytest.approx(100000 + statistics["total_net_pnl"].sum())
+
+    # an out of sample window is the backtest of its best setting with a warm up day before it
+    row = statistics.iloc[1]
+    runner = BacktestStrategyRunner()
+    runner.set_data_loader(RandomWalkLoader(AB_SYMBOLS, start=START, end=END))
+    runner.set_parameter(backtest_parameter(AB_SYMBOLS))
+    runner.add_strategy(VectorCrossover, "crossover", AB_SYMBOLS, {"fast": row.fast, "slow": row.slow})
+    _, daily_results, backtest_statistics = runner.run_backtest(datetime(2022, 1, 5), datetime(2022, 1, 8))
+    assert backtest_statistics["crossover"]["total_net_pnl"] == pytest.approx(row.total_net_pnl)
+    assert [result.net_pnl for result in daily_results["crossover"]][1:] == pytest.approx(
+        list(equity.loc[equity["window"] == 1, "net_pnl"]))
+
+    # out of sample windows replayed by the workers as well
+    def replay_window(*args):
+        raise AssertionError("out of sample window replayed in the parent process")
+
+    monkeypatch.setattr(walkforward, "replay_window", replay_window)
+    parallel_equity, parallel_statistics = walk_forward(processes=2).run()
+    assert parallel_equity.equals(equity)
+    assert parallel_statistics.equals(statistics)
+
+
+def test_warmup_days_checked():
+    with pytest.raises(ValueError):
+        walk_forward(warmup_days=2).run()
+
+
+def test_random_search_and_cache_shared_across_runs(tmp_path, monkeypatch):
+    equity, statistics = walk_forward().run()
+
+    # drawing the whole grid picks the same settings as the grid search
+    cache_path = str(tmp_path / "cache.pkl")
+    runner = walk_forward(search="random", search_kwargs={"count": 4, "seed": 0}, cache_path=cache_path)
+    random_equity, random_statistics = runner.run()
+    assert random_equity.equals(equity)
+    assert random_statistics.equals(statistics)
+    assert len(runner.optimizer.cache) == 4 * len(runner.windows())
+
+    # in sample results of every window taken from the cache of the previous run
+    def run_setting(*args):
+        raise AssertionError("in sample setting backtested again")
+
+    monkeypatch.setattr(optimizer, "run_setting", run_setting)
+    cached = walk_forward(search="genetic", search_kwargs={"population_size": 4, "generations": 2, "seed": 0},
+                          cache_path=cache_path)
+    _, cached_statistics = cached.run()
+    assert len(cached_statistics) == len(statistics)
+    assert len(cached.optimizer.cache) == 4 * len(cached.windows())
+
+
+def test_unknown_search():
+    with pytest.raises(ValueError):
+        walk_forward(search="bayesian")
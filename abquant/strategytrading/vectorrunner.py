@@ -0,0 +1,188 @@
+from abc import ABC, abstractmethod
+from copy import copy
+from datetime import datetime
+import time
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from abquant.trader.common import Direction, Interval, Offset
+from abquant.trader.msg import TradeData
+from abquant.trader.utility import extract_ab_symbol
+
+from .history import BarArrays
+from .replayrunner import ReplayRunner
+from .strategyrunner import StrategyRunner
+
+
+def signals_to_positions(
+        entries: np.ndarray,
+        exits: np.ndarray,
+        volume: float = 1,
+        short_entries: Optional[np.ndarray] = None,
+        short_exits: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    target positions from entry/exit signals, boolean arrays along the first axis.
+    a position is held from its entry until an exit or an entry of the other side, entries win over exits at the same bar.
+    """
+    entries = np.asarray(entries, dtype=bool)
+    exits = np.asarray(exits, dtype=bool)
+    state = np.full(entries.shape, np.nan)
+    state[exits] = 0
+    if short_exits is not None:
+        state[np.asarray(short_exits, dtype=bool)] = 0
+    if short_entries is not None:
+        state[np.asarray(short_entries, dtype=bool)] = -volume
+    state[entries] = volume
+
+    valid = ~np.isnan(state)
+    index = np.where(valid, np.arange(len(state)).reshape((-1,) + (1,) * (state.ndim - 1)), 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    positions = np.take_along_axis(state, index, axis=0)
+    return np.nan_to_num(positions, nan=0)
+
+
+class VectorStrategyTemplate(ABC):
+    """
+    a strategy which is a function of bar history only: target positions of the whole history in one call.
+    backtested by VectorReplayRunner, without any per bar callback.
+    """
+
+    parameters = []
+    variables = []
+
+    def __init__(
+        self,
+        strategy_runner: StrategyRunner,
+        strategy_name: str,
+        ab_symbols: List[str],
+        setting: dict,
+    ):
+        self.strategy_runner = strategy_runner
+        self.strategy_name: str = strategy_name
+        self.ab_symbols: List[str] = ab_symbols
+
+        self.run_id = "{}-{}".format(strategy_name, int(time.time()))
+
+        self.variables: List = copy(self.variables)
+
+        self.update_setting(setting)
+
+    def update_setting(self, setting: dict) -> None:
+        for name in self.parameters:
+            if name in setting:
+                setattr(self, name, setting[name])
+        self.strategy_runner.monitor.send_parameter(self.run_id, self.get_parameters())
+
+    @classmethod
+    def get_class_parameters(cls) -> Dict:
+        return {name: getattr(cls, name) for name in cls.parameters}
+
+    def get_parameters(self) -> Dict:
+        return {name: getattr(self, name) for name in self.parameters}
+
+    def on_init(self) -> None:
+        """
+        warm up days are declared here by self.load_bars(n), as in StrategyTemplate.
+        """
+        pass
+
+    def load_bars(self, days: int, interval: Interval = Interval.MINUTE) -> None:
+        self.strategy_runner.load_bars(self, days, interval)
+
+    @abstractmethod
+    def target_positions(self, bars: BarArrays) -> Union[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        target position of each symbol decided at the close of each bar, shape (len(bars), len(ab_symbols)),
+        or a dict of 1d arrays by ab_symbol. it is reached at the open of the next bar.
+        targets before trading starts (the warm up) are ignored.
+        """
+        pass
+
+
+class VectorReplayRunner(ReplayRunner):
+    """
+    vectorized backtest of a VectorStrategyTemplate.
+    the same data, warm up and fill semantics as ReplayRunner with a strategy trading toward its target by
+    marketable limit orders: a change of target at bar i fills at the open of bar i + 1.
+    trades and daily results are those ReplayRunner gives, so calculate_result and calculate_statistics are shared.
+    """
+
+    def set_strategy(self, strategy: VectorStrategyTemplate) -> None:
+        self.strategy = strategy
+
+    def load_data(self, start_dt: datetime, end_dt: datetime) -> None:
+        if self.streaming:
+            raise ValueError("vectorized backtest needs the whole history, streaming replay is not supported.")
+        super().load_data(start_dt, end_dt)
+
+    def bar_arrays(self) -> BarArrays:
+        bars = self.history
+        if len(bars) and np.isnan(bars.close[0]).any():
+            raise ValueError("There is a bar data of {} at {} missed.".format(
+                [ab_symbol for ab_symbol, missed in zip(bars.ab_symbols, np.isnan(bars.close[0])) if missed],
+                bars.datetime(0)))
+        return bars
+
+    def trading_start(self, bars: BarArrays) -> int:
+        """
+        index of the first bar on which the strategy trades, after self.days of warm up, as in run_backtesting.
+        """
+        day_starts = np.flatnonzero(np.diff(bars.days)) + 1
+        warmup = max(self.days, 1)
+        return int(day_starts[warmup - 1]) if len(day_starts) >= warmup else len(bars)
+
+    def run_backtesting(self, log=False) -> None:
+        self.strategy.on_init()
+        bars = self.bar_arrays()
+        if not len(bars):
+            return
+
+        targets = self.strategy.target_positions(bars)
+        if isinstance(targets, dict):
+            targets = np.column_stack([
+                np.asarray(targets.get(ab_symbol, np.zeros(len(bars))), dtype=float) for ab_symbol in self.ab_symbols])
+        targets = np.asarray(targets, dtype=float).reshape(len(bars), len(self.ab_symbols))
+        targets = np.nan_to_num(targets, nan=0)
+        targets[:self.trading_start(bars)] = 0
+        self.output("策略初始化完成")
+
+        # position change decided at bar i is filled at bar i + 1
+        changes = np.diff(targets[:-1], axis=0, prepend=0)
+        for row, column in zip(*np.nonzero(changes)):
+            self.add_trade(self.ab_symbols[column], changes[row, column], bars.open[row + 1, column],
+                           bars.datetime(row + 1))
+        if self.minute_equity:
+            self.equity_curve = self.new_equity_curve()
+            fills = np.zeros(targets.shape)
+            fills[1:] = changes
+            self.equity_curve.record_arrays(bars.minutes, bars.close, fills, bars.open)
+
+        self.update_daily_closes(bars)
+        self.output("历史数据回放结束")
+
+    def add_trade(self, ab_symbol: str, change: float, price: float, dt: datetime) -> None:
+        symbol, exchange = extract_ab_symbol(ab_symbol)
+        self.limit_order_count += 1
+        trade = TradeData(
+            symbol=symbol,
+            exchange=exchange,
+            orderid=str(self.limit_order_count),
+            tradeid=str(self.limit_order_count),
+            direction=Direction.LONG if change > 0 else Direction.SHORT,
+            offset=Offset.NONE,
+            price=float(price),
+            volume=float(abs(change)),
+            datetime=dt,
+            gateway_name=self.gateway_name,
+        )
+        self.trades[trade.ab_tradeid] = trade
+        self.daily_pnl.add_trade(trade)
+
+    def update_daily_closes(self, bars: BarArrays) -> None:
+        days = bars.days
+        # last bar of each date
+        for i in np.flatnonzero(np.append(np.diff(days) != 0, True)):
+            d = bars.datetime(i).date()
+            close_prices = {ab_symbol: float(close) for ab_symbol, close in zip(bars.ab_symbols, bars.close[i])}
+            self.daily_pnl.update_close_prices(d, close_prices)
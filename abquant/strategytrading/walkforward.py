@@ -0,0 +1,211 @@
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from abquant.dataloader import DataLoader
+from . import BacktestParameter
+from .history import DAY_MINUTES, BarArrays, attached_bars, from_minute
+from .optimizer import OptimizationSetting, StrategyOptimizer, replay_setting
+
+
+SEARCHES = ("grid", "random", "genetic")
+
+
+class WalkForwardRunner:
+    """
+    walk forward analysis: the parameters optimized on an in-sample window of train_days,
+    then backtested on the next test_days out of sample, rolled forward by step_days.
+    the history is loaded once, every window replays a slice of it (views, no copy) with warmup_days before it,
+    the days the strategy declares by load_bars in on_init.
+    the in-sample search is the grid, random or genetic search of a StrategyOptimizer narrowed to the window,
+    search_kwargs are passed to it, e.g. {"count": 20, "seed": 1} for random. with processes > 0 the settings are
+    backtested by its pool of workers attaching the history in shared memory, results are cached in cache_path if given.
+    the windows are searched one after another, each search parallel over settings, while the out of sample replay
+    of a window is submitted to the same pool and runs along the searches of the next windows.
+    """
+
+    def __init__(
+        self,
+        strategy_class: Type,
+        ab_symbols: List[str],
+        data_loader: DataLoader,
+        parameter: BacktestParameter,
+        optimization_setting: OptimizationSetting,
+        start_dt: datetime,
+        end_dt: datetime,
+        train_days: int,
+        test_days: int,
+        step_days: int = None,
+        warmup_days: int = 1,
+        processes: int = 0,
+        start_method: str = "spawn",
+        search: str = "grid",
+        search_kwargs: Dict = None,
+        cache_path: str = None,
+    ):
+        if train_days <= 0 or test_days <= 0 or warmup_days <= 0:
+            raise ValueError("train_days, test_days and warmup_days must be positive")
+        if step_days is not None and step_days < test_days:
+            raise ValueError("step_days less than test_days overlaps out of sample windows")
+        if search not in SEARCHES:
+            raise ValueError("search {} is not supported, use one of {}".format(search, ", ".join(SEARCHES)))
+
+        self.optimizer: StrategyOptimizer = StrategyOptimizer(
+            strategy_class, ab_symbols, data_loader, parameter, start_dt, end_dt, processes, start_method, cache_path)
+        self.optimizer.check_setting(optimization_setting)
+
+        self.strategy_class: Type = strategy_class
+        self.ab_symbols: List[str] = ab_symbols
+        self.runner_kwargs: Dict = self.optimizer.runner_kwargs
+        self.optimization_setting: OptimizationSetting = optimization_setting
+        self.start: datetime = self.optimizer.start
+        self.end: datetime = self.optimizer.end
+        self.train_days: int = train_days
+        self.test_days: int = test_days
+        self.step_days: int = step_days or test_days
+        self.warmup_days: int = warmup_days
+        self.search: str = search
+        self.search_kwargs: Dict = search_kwargs or {}
+
+        self.history: BarArrays = None
+
+    def load_history(self) -> BarArrays:
+        if self.history is None:
+            self.history = self.optimizer.load_history()
+        return self.history
+
+    def windows(self) -> List[Dict]:
+        """
+        rows of the history replayed for each window, warm up included, and the days traded.
+        the last out of sample window may be shorter than test_days.
+        """
+        history = self.load_history()
+        days = np.unique(history.days)
+        # first row of each day, and the end
+        day_rows = np.append(np.searchsorted(history.days, days), len(history))
+
+        windows = []
+        start = self.warmup_days
+        while start + self.train_days < len(days):
+            test_start = start + self.train_days
+            test_end = min(test_start + self.test_days, len(days))
+            windows.append({
+                "window": len(windows),
+                "in_sample": (int(day_rows[start - self.warmup_days]), int(day_rows[test_start])),
+                "out_of_sample": (int(day_rows[test_start - self.warmup_days]), int(day_rows[test_end])),
+                "in_sample_days": (int(days[start]), int(days[test_start - 1]) + 1),
+                "out_of_sample_days": (int(days[test_start]), int(days[test_end - 1]) + 1),
+            })
+            start += self.step_days
+        return windows
+
+    def run(self) -> Tuple[DataFrame, DataFrame]:
+        """
+        :return: the out of sample equity stitched over windows, by date: window, net_pnl and balance from capital.
+            statistics of each window: the days, the best parameters and their in sample target,
+            then the out of sample statistics.
+        a window starts flat, positions held at its end are only marked to market until then.
+        """
+        windows = self.windows()
+        if not windows:
+            raise ValueError("history of {} days is too short for a walk forward of {} warm up, {} train days".format(
+                len(np.unique(self.history.days)), self.warmup_days, self.train_days))
+        target_name = self.optimization_setting.target_name
+        search = getattr(self.optimizer, self.search + "_search")
+        try:
+            searched = [self.run_window(search, window) for window in windows]
+            results = [(setting, target, replay.result() if isinstance(replay, Future) else replay)
+                       for setting, target, replay in searched]
+        finally:
+            self.optimizer.close()
+
+        rows = []
+        pnls = []
+        for window, (setting, target, (warmup_days, statistic, net_pnl)) in zip(windows, results):
+            if warmup_days != self.warmup_days:
+                raise ValueError("{} warms up {} days, walk forward is set to {} warmup_days".format(
+                    self.strategy_class.__name__, warmup_days, self.warmup_days))
+            out_of_sample_start, out_of_sample_end = window["out_of_sample_days"]
+            dates = [day_date(day) for day in range(out_of_sample_start, out_of_sample_end)]
+            rows.append({
+                "window": window["window"],
+                "in_sample_start": day_date(window["in_sample_days"][0]),
+                "in_sample_end": day_date(window["in_sample_days"][1] - 1),
+                "out_of_sample_start": day_date(out_of_sample_start),
+                "out_of_sample_end": day_date(out_of_sample_end - 1),
+                **setting,
+                "in_sample_" + target_name: target,
+                **statistic,
+            })
+            pnls.append(DataFrame({"window": window["window"], "net_pnl": net_pnl.reindex(dates, fill_value=0.0)}))
+        statistics = DataFrame(rows)
+
+        equity = pd.concat(pnls)
+        equity.index.name = "date"
+        equity["balance"] = self.runner_kwargs["capital"] + equity["net_pnl"].cumsum()
+        return equity, statistics
+
+    def run_window(self, search, window: Dict) -> Tuple[dict, float, Any]:
+        """
+        search on the in sample slice of history, then replay the best setting on the out of sample slice.
+        with processes > 0 the replay is submitted to the pool of the optimizer, running along the searches of
+        the next windows.
+        :return: best setting, its in sample target and the result of replay_window, a Future of it with processes > 0.
+        """
+        target_name = self.optimization_setting.target_name
+        in_sample_days = self.history.slice(*window["in_sample"]).days
+        self.optimizer.set_window(window["in_sample"], from_minute(in_sample_days[0] * DAY_MINUTES),
+                                  from_minute(window["in_sample_days"][1] * DAY_MINUTES))
+        settings, statistics = search(self.optimization_setting, **self.search_kwargs)
+
+        best_setting, best_target = None, None
+        for setting, statistic in zip(settings, statistics):
+            target = statistic[target_name]
+            if best_target is None or target > best_target:
+                best_setting, best_target = setting, target
+
+        bars = self.history.slice(*window["out_of_sample"])
+        start_dt = from_minute(bars.days[0] * DAY_MINUTES)
+        end_dt = from_minute(window["out_of_sample_days"][1] * DAY_MINUTES)
+        if self.optimizer.processes:
+            spec = self.optimizer.start_pool()
+            replay = self.optimizer.pool.submit(
+                backtest_window, self.strategy_class, self.ab_symbols, best_setting, self.runner_kwargs, spec,
+                window["out_of_sample"], start_dt, end_dt)
+        else:
+            replay = replay_window(
+                self.strategy_class, self.ab_symbols, best_setting, self.runner_kwargs, bars, start_dt, end_dt)
+        return best_setting, float(best_target), replay
+
+
+def replay_window(
+        strategy_class: Type, ab_symbols: List[str], setting: dict, runner_kwargs: Dict, history: BarArrays,
+        start_dt: datetime, end_dt: datetime) -> Tuple[int, Dict, pd.Series]:
+    """
+    out of sample backtest of a window.
+    :return: days warmed up, statistics and daily net_pnl.
+    """
+    replay_runner = replay_setting(strategy_class, ab_symbols, setting, runner_kwargs, history, start_dt, end_dt)
+    df = replay_runner.calculate_result()
+    statistic = replay_runner.calculate_statistics(df, output=False)
+    net_pnl = df["net_pnl"] if df is not None else pd.Series(dtype=float)
+    return max(replay_runner.days, 1), statistic, net_pnl
+
+
+def backtest_window(
+        strategy_class: Type, ab_symbols: List[str], setting: dict, runner_kwargs: Dict, spec: dict,
+        rows: Tuple[int, int], start_dt: datetime, end_dt: datetime) -> Tuple[int, Dict, pd.Series]:
+    """
+    replay_window in a worker process of the optimizer, on rows of the shared history.
+    """
+    return replay_window(
+        strategy_class, ab_symbols, setting, runner_kwargs, attached_bars(spec).slice(*rows), start_dt, end_dt)
+
+
+def day_date(day: int):
+    return from_minute(day * DAY_MINUTES).date()
+
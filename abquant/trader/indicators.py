@@ -0,0 +1,617 @@
+"""
+stateful streaming indicators, O(1) per update instead of recomputing talib over the whole window on every bar.
+
+every indicator:
+    update(*inputs) -> value(s) of the latest input, nan until inited.
+    update_bar(bar) -> update with the fields of bar in inputs, usable as (part of) a BarGenerator on_bar callback,
+                       or attached to an ArrayCache by ArrayCache.add_indicator.
+    seed(*arrays)   -> vectorized batch update with history, returns the values over history like talib does.
+    inited          -> whether the window is filled and values are valid.
+
+values follow talib: same lookback (nan before), same seeding of EMA / wilder smoothing and the same population
+standard deviation, so that strategies may switch between them. MACD seeds its fast EMA at the bar where the slow EMA
+is seeded, as talib does, so its values differ from EMA(fast) - EMA(slow) in the first few hundred bars.
+"""
+
+from abc import ABC, abstractmethod
+from collections import deque
+import math
+from typing import Deque, List, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .msg import BarData
+
+
+NAN = float("nan")
+# variance below is treated as 0 as talib does (TA_IS_ZERO_OR_NEG).
+EPSILON = 1e-8
+
+
+def ema_recursive(values: np.ndarray, alpha: float, start: float) -> np.ndarray:
+    """
+    y[i] = y[i - 1] + alpha * (x[i] - y[i - 1]) with y[-1] = start, vectorized.
+    y[j] = decay^(j + 1) * (start + alpha * cumsum(x[i] / decay^(i + 1))), done in chunks short enough
+    that decay^-(i + 1) does not overflow.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty(len(values))
+    decay = 1 - alpha
+    if decay <= 0:
+        out[:] = values
+        return out
+    chunk = max(1, int(150 / -math.log10(decay)))
+    previous = start
+    for begin in range(0, len(values), chunk):
+        x = values[begin: begin + chunk]
+        powers = decay ** np.arange(1, len(x) + 1)
+        y = powers * (previous + alpha * np.cumsum(x / powers))
+        out[begin: begin + len(x)] = y
+        previous = y[-1]
+    return out
+
+
+def rolling_moments(values: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    mean and population variance of every window of n values, by differences of cumulative sums.
+    cumulated by short blocks, each shifted by its mean, so that the error is bounded by the range of values in a block
+    instead of growing with the price level and the length of values.
+    """
+    count = len(values) - n + 1
+    mean = np.empty(count)
+    variance = np.empty(count)
+    block = max(n, 64)
+    for begin in range(0, count, block):
+        end = min(begin + block, count)
+        x = values[begin: end + n - 1]
+        shift = x.mean()
+        x = x - shift
+        sums = np.concatenate(([0.0], np.cumsum(x)))
+        square_sums = np.concatenate(([0.0], np.cumsum(x * x)))
+        shifted_mean = (sums[n:] - sums[:-n]) / n
+        mean[begin: end] = shifted_mean + shift
+        variance[begin: end] = (square_sums[n:] - square_sums[:-n]) / n - shifted_mean * shifted_mean
+    return mean, variance
+
+
+class RollingWindow:
+    """
+    the latest n values in a ring.
+    """
+
+    def __init__(self, n: int):
+        self.n: int = n
+        self.values: List[float] = [0.0] * n
+        self.pos: int = 0
+        self.count: int = 0
+
+    def push(self, value: float) -> float:
+        """
+        :return: the value dropped out of the window, 0 if it is not full yet.
+        """
+        pos = self.pos
+        dropped = self.values[pos]
+        self.values[pos] = value
+        pos += 1
+        self.pos = 0 if pos == self.n else pos
+        self.count += 1
+        return dropped
+
+    def history(self) -> np.ndarray:
+        """
+        values in window, oldest first.
+        """
+        values = self.values[self.pos:] + self.values[:self.pos]
+        return np.array(values[self.n - min(self.count, self.n):], dtype=float)
+
+    def extend(self, values: np.ndarray) -> None:
+        tail = np.concatenate((self.history(), values))[-self.n:]
+        self.values = tail.tolist() + [0.0] * (self.n - len(tail))
+        self.pos = len(tail) % self.n
+        self.count += len(values)
+
+
+class Indicator(ABC):
+    """
+    base of streaming indicators, see module doc.
+    """
+    # fields of ArrayCache.FIELDS taken by update, in order.
+    inputs: Tuple[str, ...] = ("close",)
+    # names of values returned by update, in order.
+    outputs: Tuple[str, ...] = ("value",)
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("window of {} should be positive, got {}".format(self.__class__.__name__, window))
+        self.window: int = window
+        self.count: int = 0
+        self.value: float = NAN
+
+    @property
+    def lookback(self) -> int:
+        """
+        number of inputs before the first valid value.
+        """
+        return self.window - 1
+
+    @property
+    def inited(self) -> bool:
+        return self.count > self.lookback
+
+    @abstractmethod
+    def update(self, value: float) -> Union[float, Tuple[float, ...]]:
+        pass
+
+    def update_bar(self, bar: BarData) -> Union[float, Tuple[float, ...]]:
+        return self.update(bar.close_price)
+
+    def seed(self, *inputs: np.ndarray) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+        """
+        update with arrays of history in chronological order, one array for each of inputs.
+        """
+        inputs = [np.asarray(values, dtype=float) for values in inputs]
+        n = len(inputs[0])
+        out = np.full((len(self.outputs), n), np.nan)
+        i = 0
+        # fill the window one by one, then vectorized.
+        while i < n and not self.inited:
+            out[:, i] = self.update(*[values[i] for values in inputs])
+            i += 1
+        if i < n:
+            out[:, i:] = self._batch(*[values[i:] for values in inputs])
+        return out[0] if len(self.outputs) == 1 else tuple(out)
+
+    @abstractmethod
+    def _batch(self, *inputs: np.ndarray) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+        """
+        vectorized update of an inited indicator.
+        """
+        pass
+
+    def __repr__(self) -> str:
+        return "{}({})".format(self.__class__.__name__, self.window)
+
+
+class SMA(Indicator):
+
+    def __init__(self, window: int):
+        super(SMA, self).__init__(window)
+        self._window: RollingWindow = RollingWindow(window)
+        self._total: float = 0
+
+    def update(self, value: float) -> float:
+        window = self._window
+        self._total += value - window.push(value)
+        self.count += 1
+        if window.pos == 0:
+            # sum again every window updates, not to drift over a long run.
+            self._total = math.fsum(window.values)
+        if self.count >= self.window:
+            self.value = self._total / self.window
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        full = np.concatenate((self._window.history()[1:], values))
+        out, _ = rolling_moments(full, self.window)
+        self._window.extend(values)
+        self._total = float(self._window.history().sum())
+        self.count += len(values)
+        self.value = float(out[-1])
+        return out
+
+
+class EMA(Indicator):
+    """
+    seeded with the SMA of the first window values.
+    """
+
+    def __init__(self, window: int):
+        super(EMA, self).__init__(window)
+        self.alpha: float = 2 / (window + 1)
+        self._total: float = 0
+
+    def update(self, value: float) -> float:
+        self.count += 1
+        if self.count > self.window:
+            self.value += self.alpha * (value - self.value)
+        else:
+            self._total += value
+            if self.count == self.window:
+                self.value = self._total / self.window
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        out = ema_recursive(values, self.alpha, self.value)
+        self.count += len(values)
+        self.value = float(out[-1])
+        return out
+
+
+class WMA(Indicator):
+    """
+    linearly weighted, the latest value has weight window.
+    """
+
+    def __init__(self, window: int):
+        super(WMA, self).__init__(window)
+        self._window: RollingWindow = RollingWindow(window)
+        self._total: float = 0
+        self._weighted: float = 0
+        self._divider: float = window * (window + 1) / 2
+
+    def update(self, value: float) -> float:
+        self.count += 1
+        if self.count > self.window:
+            self._weighted += self.window * value - self._total
+        else:
+            self._weighted += self.count * value
+        self._total += value - self._window.push(value)
+        if self.count >= self.window:
+            self.value = self._weighted / self._divider
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        n = self.window
+        full = np.concatenate((self._window.history()[1:], values))
+        out = np.convolve(full, np.arange(n, 0, -1, dtype=float), "valid") / self._divider
+        self._window.extend(values)
+        history = self._window.history()
+        self._total = float(history.sum())
+        self._weighted = float(history @ np.arange(1, n + 1))
+        self.count += len(values)
+        self.value = float(out[-1])
+        return out
+
+
+class StdDev(Indicator):
+    """
+    rolling population standard deviation, times nbdev. also keeps the rolling mean.
+    """
+
+    def __init__(self, window: int, nbdev: float = 1):
+        super(StdDev, self).__init__(window)
+        self.nbdev: float = nbdev
+        self.mean: float = NAN
+        self.std: float = NAN
+        self._window: RollingWindow = RollingWindow(window)
+        # sums of value - shift, shift is reset to the latest value every window updates,
+        # so that the sums do not lose precision to large prices nor drift over a long run.
+        self._shift: float = 0
+        self._total: float = 0
+        self._total_square: float = 0
+
+    def _reset_sums(self) -> None:
+        history = self._window.history()
+        self._shift = float(history[-1])
+        deviations = history - self._shift
+        self._total = float(deviations.sum())
+        self._total_square = float(deviations @ deviations)
+
+    def _update_moments(self, value: float) -> bool:
+        window = self._window
+        full = self.count >= self.window
+        dropped = window.push(value)
+        self.count += 1
+        if window.pos == 0:
+            self._reset_sums()
+        else:
+            if self.count == 1:
+                self._shift = value
+            deviation = value - self._shift
+            self._total += deviation
+            self._total_square += deviation * deviation
+            if full:
+                deviation = dropped - self._shift
+                self._total -= deviation
+                self._total_square -= deviation * deviation
+        if self.count < self.window:
+            return False
+        shifted_mean = self._total / self.window
+        self.mean = self._shift + shifted_mean
+        variance = self._total_square / self.window - shifted_mean * shifted_mean
+        self.std = math.sqrt(variance) if variance >= EPSILON else 0.0
+        return True
+
+    def _batch_moments(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        full = np.concatenate((self._window.history()[1:], values))
+        mean, variance = rolling_moments(full, self.window)
+        std = np.sqrt(np.where(variance >= EPSILON, variance, 0.0))
+
+        self._window.extend(values)
+        self._reset_sums()
+        self.count += len(values)
+        self.mean = float(mean[-1])
+        self.std = float(std[-1])
+        return mean, std
+
+    def update(self, value: float) -> float:
+        if self._update_moments(value):
+            self.value = self.std * self.nbdev
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        _, std = self._batch_moments(values)
+        out = std * self.nbdev
+        self.value = float(out[-1])
+        return out
+
+
+class ZScore(StdDev):
+    """
+    (value - rolling mean) / rolling std, nan when std is 0.
+    """
+
+    def __init__(self, window: int):
+        super(ZScore, self).__init__(window)
+
+    def update(self, value: float) -> float:
+        if self._update_moments(value):
+            self.value = (value - self.mean) / self.std if self.std else NAN
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        mean, std = self._batch_moments(values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.where(std > 0, (values - mean) / std, np.nan)
+        self.value = float(out[-1])
+        return out
+
+
+class Bollinger(StdDev):
+    """
+    (upper, middle, lower) of SMA -+ nbdev * population std.
+    """
+    outputs = ("upper", "middle", "lower")
+
+    def __init__(self, window: int, nbdev_up: float = 2, nbdev_down: float = 2):
+        super(Bollinger, self).__init__(window)
+        self.nbdev_up: float = nbdev_up
+        self.nbdev_down: float = nbdev_down
+        self.upper: float = NAN
+        self.middle: float = NAN
+        self.lower: float = NAN
+
+    def update(self, value: float) -> Tuple[float, float, float]:
+        if self._update_moments(value):
+            self.value = self.middle = self.mean
+            self.upper = self.mean + self.nbdev_up * self.std
+            self.lower = self.mean - self.nbdev_down * self.std
+        return self.upper, self.middle, self.lower
+
+    def _batch(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        mean, std = self._batch_moments(values)
+        self.value = self.middle = self.mean
+        self.upper = self.mean + self.nbdev_up * self.std
+        self.lower = self.mean - self.nbdev_down * self.std
+        return mean + self.nbdev_up * std, mean, mean - self.nbdev_down * std
+
+
+class RSI(Indicator):
+    """
+    wilder's RSI, first value after window + 1 inputs.
+    """
+
+    def __init__(self, window: int):
+        super(RSI, self).__init__(window)
+        self._last: float = NAN
+        self._gain: float = 0
+        self._loss: float = 0
+
+    @property
+    def lookback(self) -> int:
+        return self.window
+
+    def _rsi(self) -> float:
+        total = self._gain + self._loss
+        return 100 * self._gain / total if total >= EPSILON else 0.0
+
+    def update(self, value: float) -> float:
+        self.count += 1
+        if self.count > 1:
+            change = value - self._last
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if self.count > self.window + 1:
+                self._gain += (gain - self._gain) / self.window
+                self._loss += (loss - self._loss) / self.window
+                self.value = self._rsi()
+            else:
+                self._gain += gain
+                self._loss += loss
+                if self.count == self.window + 1:
+                    self._gain /= self.window
+                    self._loss /= self.window
+                    self.value = self._rsi()
+        self._last = value
+        return self.value
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        changes = np.diff(values, prepend=self._last)
+        gain = ema_recursive(np.maximum(changes, 0), 1 / self.window, self._gain)
+        loss = ema_recursive(np.maximum(-changes, 0), 1 / self.window, self._loss)
+        total = gain + loss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.where(total >= EPSILON, 100 * gain / total, 0.0)
+        self.count += len(values)
+        self._last = float(values[-1])
+        self._gain = float(gain[-1])
+        self._loss = float(loss[-1])
+        self.value = float(out[-1])
+        return out
+
+
+class ATR(Indicator):
+    """
+    wilder's average true range, first value after window + 1 bars.
+    """
+    inputs = ("high", "low", "close")
+
+    def __init__(self, window: int):
+        super(ATR, self).__init__(window)
+        self._last_close: float = NAN
+        self._total: float = 0
+
+    @property
+    def lookback(self) -> int:
+        return self.window
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self.count += 1
+        if self.count > 1:
+            last_close = self._last_close
+            true_range = max(high, last_close) - min(low, last_close)
+            if self.count > self.window + 1:
+                self.value += (true_range - self.value) / self.window
+            else:
+                self._total += true_range
+                if self.count == self.window + 1:
+                    self.value = self._total / self.window
+        self._last_close = close
+        return self.value
+
+    def update_bar(self, bar: BarData) -> float:
+        return self.update(bar.high_price, bar.low_price, bar.close_price)
+
+    def _batch(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        last_close = np.concatenate(([self._last_close], close[:-1]))
+        true_range = np.maximum(high, last_close) - np.minimum(low, last_close)
+        out = ema_recursive(true_range, 1 / self.window, self.value)
+        self.count += len(close)
+        self._last_close = float(close[-1])
+        self.value = float(out[-1])
+        return out
+
+
+class MACD(Indicator):
+    """
+    (macd, signal, hist) as talib MACD, the fast EMA is seeded at the bar where the slow one is.
+    """
+    outputs = ("macd", "signal", "hist")
+
+    def __init__(self, fast_window: int = 12, slow_window: int = 26, signal_window: int = 9):
+        if slow_window < fast_window:
+            fast_window, slow_window = slow_window, fast_window
+        super(MACD, self).__init__(slow_window)
+        self.fast_window: int = fast_window
+        self.slow_window: int = slow_window
+        self.signal_window: int = signal_window
+        self.macd: float = NAN
+        self.signal: float = NAN
+        self.hist: float = NAN
+
+        self._fast_alpha: float = 2 / (fast_window + 1)
+        self._slow_alpha: float = 2 / (slow_window + 1)
+        self._signal_alpha: float = 2 / (signal_window + 1)
+        self._recent: RollingWindow = RollingWindow(fast_window)
+        self._total: float = 0
+        self._fast: float = NAN
+        self._slow: float = NAN
+        self._signal_total: float = 0
+
+    @property
+    def lookback(self) -> int:
+        return self.slow_window + self.signal_window - 2
+
+    def update(self, value: float) -> Tuple[float, float, float]:
+        self.count += 1
+        if self.count > self.slow_window:
+            self._fast += self._fast_alpha * (value - self._fast)
+            self._slow += self._slow_alpha * (value - self._slow)
+        else:
+            self._total += value
+            self._recent.push(value)
+            if self.count < self.slow_window:
+                return self.macd, self.signal, self.hist
+            self._slow = self._total / self.slow_window
+            self._fast = float(self._recent.history().mean())
+
+        macd = self._fast - self._slow
+        signal_count = self.count - self.slow_window + 1
+        if signal_count > self.signal_window:
+            self.signal += self._signal_alpha * (macd - self.signal)
+        else:
+            self._signal_total += macd
+            if signal_count < self.signal_window:
+                return self.macd, self.signal, self.hist
+            self.signal = self._signal_total / self.signal_window
+        self.value = self.macd = macd
+        self.hist = macd - self.signal
+        return self.macd, self.signal, self.hist
+
+    def _batch(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        fast = ema_recursive(values, self._fast_alpha, self._fast)
+        slow = ema_recursive(values, self._slow_alpha, self._slow)
+        macd = fast - slow
+        signal = ema_recursive(macd, self._signal_alpha, self.signal)
+        hist = macd - signal
+        self.count += len(values)
+        self._fast = float(fast[-1])
+        self._slow = float(slow[-1])
+        self.value = self.macd = float(macd[-1])
+        self.signal = float(signal[-1])
+        self.hist = float(hist[-1])
+        return macd, signal, hist
+
+    def __repr__(self) -> str:
+        return "MACD({}, {}, {})".format(self.fast_window, self.slow_window, self.signal_window)
+
+
+class RollingMax(Indicator):
+    """
+    max of the latest window values by monotonic deque, amortized O(1).
+    """
+
+    def __init__(self, window: int):
+        super(RollingMax, self).__init__(window)
+        self._window: RollingWindow = RollingWindow(window)
+        # (count, value), values strictly decreasing from left for max
+        self._candidates: Deque[Tuple[int, float]] = deque()
+
+    @staticmethod
+    def _dominates(new: float, old: float) -> bool:
+        return new >= old
+
+    def update(self, value: float) -> float:
+        self.count += 1
+        self._window.push(value)
+        candidates = self._candidates
+        dominates = self._dominates
+        while candidates and dominates(value, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.count, value))
+        if candidates[0][0] <= self.count - self.window:
+            candidates.popleft()
+        if self.count >= self.window:
+            self.value = candidates[0][1]
+        return self.value
+
+    def _reduce(self, windows: np.ndarray) -> np.ndarray:
+        return windows.max(axis=1)
+
+    def _batch(self, values: np.ndarray) -> np.ndarray:
+        full = np.concatenate((self._window.history()[1:], values))
+        out = self._reduce(sliding_window_view(full, self.window))
+        self._window.extend(values)
+        self.count += len(values)
+        self._candidates.clear()
+        history = self._window.history()
+        for i, value in enumerate(history.tolist()):
+            while self._candidates and self._dominates(value, self._candidates[-1][1]):
+                self._candidates.pop()
+            self._candidates.append((self.count - len(history) + 1 + i, value))
+        self.value = float(out[-1])
+        return out
+
+
+class RollingMin(RollingMax):
+    """
+    min of the latest window values by monotonic deque, amortized O(1).
+    """
+
+    @staticmethod
+    def _dominates(new: float, old: float) -> bool:
+        return new <= old
+
+    def _reduce(self, windows: np.ndarray) -> np.ndarray:
+        return windows.min(axis=1)
@@ -6,6 +6,7 @@ from time import localtime
 from typing import List, Optional
 
 from .common import Direction, Exchange, Interval, Offset, Status, Product, OptionType, OrderType
+from .utility import symbol_registry
 
 ACTIVE_STATUSES = {Status.SUBMITTING, Status.NOTTRADED, Status.PARTTRADED}
 
@@ -14,6 +15,12 @@ ACTIVE_STATUSES = {Status.SUBMITTING, Status.NOTTRADED, Status.PARTTRADED}
 class BaseData:
     gateway_name: str
 
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        # symbol_id is process local, resolve it again when unpickled in another process.
+        if "symbol_id" in state:
+            self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
+
 
 @dataclass
 class TickData(BaseData):
@@ -77,7 +84,7 @@ class TickData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 @dataclass
@@ -99,15 +106,18 @@ class BarData(BaseData):
 
     interval: Interval = None
     volume: float = 0
-    # open_interest: float = 0
+    open_interest: float = 0
     open_price: float = 0
     high_price: float = 0
     low_price: float = 0
     close_price: float = 0
+    # filled by BarGenerator
+    vwap: float = 0
+    trade_count: int = 0
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 @dataclass
@@ -140,7 +150,7 @@ class TransactionData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 # Not Supproted yet
@@ -170,7 +180,7 @@ class EntrustData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         raise NotImplemented(' for now this type {} is not support yet.'.format(self.__class__))
 
 
@@ -196,7 +206,7 @@ class DepthData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 
@@ -234,7 +244,7 @@ class OrderData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         self.ab_orderid = f"{self.gateway_name}.{self.orderid}"
 
     def is_active(self) -> bool:
@@ -281,7 +291,7 @@ class TradeData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         self.ab_orderid = f"{self.gateway_name}.{self.orderid}"
         self.ab_tradeid = f"{self.gateway_name}.{self.tradeid}"
 
@@ -5,6 +5,7 @@ from logging import INFO
 
 from .common import Direction, Exchange, Interval, Offset, Status, Product, OptionType, OrderType
 from .msg import BaseData, OrderData
+from .utility import symbol_registry
 
 @dataclass
 class PositionData(BaseData):
@@ -26,7 +27,7 @@ class PositionData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         self.ab_positionid = f"{self.ab_symbol}.{self.direction.name}"
 
 
@@ -90,7 +91,7 @@ class ContractData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 # NOT SUPPORT YET 
@@ -117,7 +118,7 @@ class QuoteData(BaseData):
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         self.ab_quoteid = f"{self.gateway_name}.{self.quoteid}"
         raise NotImplemented(' for now this type {} is not support yet.'.format(self.__class__))
 
@@ -143,7 +144,7 @@ class SubscribeRequest:
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 @dataclass
@@ -163,7 +164,7 @@ class OrderRequest:
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
     def create_order_data(self, orderid: str, gateway_name: str) -> OrderData:
         """
@@ -196,7 +197,7 @@ class CancelRequest:
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 
 @dataclass
@@ -225,7 +226,7 @@ class HistoryRequest:
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
 
 # NOT SUPPORT YET 暂不支持！！
 @dataclass
@@ -246,7 +247,7 @@ class QuoteRequest:
 
     def __post_init__(self):
         """"""
-        self.ab_symbol = f"{self.symbol}.{self.exchange.value}"
+        self.ab_symbol, self.symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
         raise NotImplemented(' for now this type {} is not support yet.'.format(self.__class__))
 
     def create_quote_data(self, quoteid: str, gateway_name: str) -> QuoteData:
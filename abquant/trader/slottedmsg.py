@@ -0,0 +1,283 @@
+"""
+__slots__ based variants of the message dataclasses in msg.py.
+attribute-level compatible with the dataclass: same constructor signature, fields, ab_symbol/ab_orderid/ab_tradeid and methods,
+test_slottedmsg.py checks that they stay in sync with the dataclasses.
+differences:
+1. no per-instance __dict__, roughly half of the memory of a TickData.
+2. ab_symbol, symbol_id (ab_orderid, ab_tradeid) are built lazily on first access and cached, copied along with copy(),
+   reassigning symbol/exchange after that does not refresh them. pickled without them, as symbol_id is process local.
+3. __init__ assigns every field directly, faster than the dataclass with its __post_init__.
+4. not a subclass of the dataclass, isinstance(tick, TickData) is False, use to_data/from_data to convert.
+"""
+
+from datetime import datetime
+from typing import Tuple
+
+from .common import Direction, Exchange, Offset, OrderType, Status
+from .msg import DepthData, OrderData, TickData, TradeData, TransactionData
+from .utility import symbol_registry
+
+
+class SlottedData:
+    """
+    base of the slotted messages, subclasses declare data_class, field_names and __slots__ of their fields.
+    """
+    __slots__ = ("_ab_symbol", "_symbol_id")
+    __hash__ = None
+
+    data_class: type = None
+    field_names: Tuple[str, ...] = ()
+
+    @property
+    def ab_symbol(self) -> str:
+        if self._ab_symbol is None:
+            self._ab_symbol, self._symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
+        return self._ab_symbol
+
+    @ab_symbol.setter
+    def ab_symbol(self, value: str) -> None:
+        self._ab_symbol = value
+
+    @property
+    def symbol_id(self) -> int:
+        if self._symbol_id is None:
+            self._ab_symbol, self._symbol_id = symbol_registry.lookup(self.symbol, self.exchange)
+        return self._symbol_id
+
+    @symbol_id.setter
+    def symbol_id(self, value: int) -> None:
+        self._symbol_id = value
+
+    def __copy__(self) -> "SlottedData":
+        new = object.__new__(self.__class__)
+        for attr in SlottedData.__slots__ + self.__slots__:
+            setattr(new, attr, getattr(self, attr))
+        return new
+
+    def _values(self) -> tuple:
+        return tuple([getattr(self, field) for field in self.field_names])
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        return "{}({})".format(self.__class__.__name__, ", ".join(
+            "{}={!r}".format(field, getattr(self, field)) for field in self.field_names))
+
+    def __reduce__(self):
+        return self.__class__, self._values()
+
+    @classmethod
+    def from_data(cls, data) -> "SlottedData":
+        return cls(*[getattr(data, field) for field in cls.field_names])
+
+    def to_data(self):
+        return self.data_class(*self._values())
+
+
+class SlottedTickData(SlottedData):
+    """
+    __slots__ variant of TickData, see module doc of slottedmsg.
+    """
+    data_class = TickData
+    field_names = (
+        "gateway_name", "symbol", "exchange", "datetime",
+        "trade_price", "trade_volume",
+        "best_ask_price", "best_ask_volume", "best_bid_price", "best_bid_volume",
+        "bid_price_1", "bid_price_2", "bid_price_3", "bid_price_4", "bid_price_5",
+        "ask_price_1", "ask_price_2", "ask_price_3", "ask_price_4", "ask_price_5",
+        "bid_volume_1", "bid_volume_2", "bid_volume_3", "bid_volume_4", "bid_volume_5",
+        "ask_volume_1", "ask_volume_2", "ask_volume_3", "ask_volume_4", "ask_volume_5",
+        "localtime",
+    )
+    __slots__ = field_names
+
+    def __init__(self, gateway_name: str, symbol: str, exchange: Exchange, datetime: datetime,
+                 trade_price: float = 0, trade_volume: float = 0,
+                 best_ask_price: float = 0, best_ask_volume: float = 0,
+                 best_bid_price: float = 0, best_bid_volume: float = 0,
+                 bid_price_1: float = 0, bid_price_2: float = 0, bid_price_3: float = 0,
+                 bid_price_4: float = 0, bid_price_5: float = 0,
+                 ask_price_1: float = 0, ask_price_2: float = 0, ask_price_3: float = 0,
+                 ask_price_4: float = 0, ask_price_5: float = 0,
+                 bid_volume_1: float = 0, bid_volume_2: float = 0, bid_volume_3: float = 0,
+                 bid_volume_4: float = 0, bid_volume_5: float = 0,
+                 ask_volume_1: float = 0, ask_volume_2: float = 0, ask_volume_3: float = 0,
+                 ask_volume_4: float = 0, ask_volume_5: float = 0,
+                 localtime: datetime = None):
+        self.gateway_name = gateway_name
+        self.symbol = symbol
+        self.exchange = exchange
+        self.datetime = datetime
+        self.trade_price = trade_price
+        self.trade_volume = trade_volume
+        self.best_ask_price = best_ask_price
+        self.best_ask_volume = best_ask_volume
+        self.best_bid_price = best_bid_price
+        self.best_bid_volume = best_bid_volume
+        self.bid_price_1 = bid_price_1
+        self.bid_price_2 = bid_price_2
+        self.bid_price_3 = bid_price_3
+        self.bid_price_4 = bid_price_4
+        self.bid_price_5 = bid_price_5
+        self.ask_price_1 = ask_price_1
+        self.ask_price_2 = ask_price_2
+        self.ask_price_3 = ask_price_3
+        self.ask_price_4 = ask_price_4
+        self.ask_price_5 = ask_price_5
+        self.bid_volume_1 = bid_volume_1
+        self.bid_volume_2 = bid_volume_2
+        self.bid_volume_3 = bid_volume_3
+        self.bid_volume_4 = bid_volume_4
+        self.bid_volume_5 = bid_volume_5
+        self.ask_volume_1 = ask_volume_1
+        self.ask_volume_2 = ask_volume_2
+        self.ask_volume_3 = ask_volume_3
+        self.ask_volume_4 = ask_volume_4
+        self.ask_volume_5 = ask_volume_5
+        self.localtime = localtime
+        self._ab_symbol = None
+        self._symbol_id = None
+
+
+class SlottedTransactionData(SlottedData):
+    """
+    __slots__ variant of TransactionData, see module doc of slottedmsg.
+    """
+    data_class = TransactionData
+    field_names = ("gateway_name", "symbol", "exchange", "datetime", "volume", "price",
+                   "bid_no", "ask_no", "times", "direction", "localtime")
+    __slots__ = field_names
+
+    def __init__(self, gateway_name: str, symbol: str, exchange: Exchange, datetime: datetime,
+                 volume: float = 0, price: float = 0, bid_no: int = 0, ask_no: int = 0, times: int = 0,
+                 direction: Direction = None, localtime: datetime = None):
+        self.gateway_name = gateway_name
+        self.symbol = symbol
+        self.exchange = exchange
+        self.datetime = datetime
+        self.volume = volume
+        self.price = price
+        self.bid_no = bid_no
+        self.ask_no = ask_no
+        self.times = times
+        self.direction = direction
+        self.localtime = localtime
+        self._ab_symbol = None
+        self._symbol_id = None
+
+
+class SlottedDepthData(SlottedData):
+    """
+    __slots__ variant of DepthData, see module doc of slottedmsg.
+    """
+    data_class = DepthData
+    field_names = ("gateway_name", "symbol", "exchange", "datetime", "volume", "price", "direction", "localtime")
+    __slots__ = field_names
+
+    def __init__(self, gateway_name: str, symbol: str, exchange: Exchange, datetime: datetime,
+                 volume: float = 0, price: float = 0, direction: Direction = None, localtime: datetime = None):
+        self.gateway_name = gateway_name
+        self.symbol = symbol
+        self.exchange = exchange
+        self.datetime = datetime
+        self.volume = volume
+        self.price = price
+        self.direction = direction
+        self.localtime = localtime
+        self._ab_symbol = None
+        self._symbol_id = None
+
+
+class SlottedOrderData(SlottedData):
+    """
+    __slots__ variant of OrderData, see module doc of slottedmsg.
+    """
+    data_class = OrderData
+    field_names = ("gateway_name", "symbol", "exchange", "orderid", "type", "direction", "offset",
+                   "price", "volume", "traded", "status", "datetime", "reference")
+    __slots__ = field_names + ("_ab_orderid",)
+
+    def __init__(self, gateway_name: str, symbol: str, exchange: Exchange, orderid: str,
+                 type: OrderType = OrderType.LIMIT, direction: Direction = None, offset: Offset = Offset.NONE,
+                 price: float = 0, volume: float = 0, traded: float = 0, status: Status = Status.SUBMITTING,
+                 datetime: datetime = None, reference: str = ""):
+        self.gateway_name = gateway_name
+        self.symbol = symbol
+        self.exchange = exchange
+        self.orderid = orderid
+        self.type = type
+        self.direction = direction
+        self.offset = offset
+        self.price = price
+        self.volume = volume
+        self.traded = traded
+        self.status = status
+        self.datetime = datetime
+        self.reference = reference
+        self._ab_symbol = None
+        self._symbol_id = None
+        self._ab_orderid = None
+
+    @property
+    def ab_orderid(self) -> str:
+        if self._ab_orderid is None:
+            self._ab_orderid = f"{self.gateway_name}.{self.orderid}"
+        return self._ab_orderid
+
+    @ab_orderid.setter
+    def ab_orderid(self, value: str) -> None:
+        self._ab_orderid = value
+
+    is_active = OrderData.is_active
+    create_cancel_request = OrderData.create_cancel_request
+
+
+class SlottedTradeData(SlottedData):
+    """
+    __slots__ variant of TradeData, see module doc of slottedmsg.
+    """
+    data_class = TradeData
+    field_names = ("gateway_name", "symbol", "exchange", "orderid", "tradeid", "direction", "offset",
+                   "price", "volume", "datetime")
+    __slots__ = field_names + ("_ab_orderid", "_ab_tradeid")
+
+    def __init__(self, gateway_name: str, symbol: str, exchange: Exchange, orderid: str, tradeid: str,
+                 direction: Direction = None, offset: Offset = Offset.NONE,
+                 price: float = 0, volume: float = 0, datetime: datetime = None):
+        self.gateway_name = gateway_name
+        self.symbol = symbol
+        self.exchange = exchange
+        self.orderid = orderid
+        self.tradeid = tradeid
+        self.direction = direction
+        self.offset = offset
+        self.price = price
+        self.volume = volume
+        self.datetime = datetime
+        self._ab_symbol = None
+        self._symbol_id = None
+        self._ab_orderid = None
+        self._ab_tradeid = None
+
+    @property
+    def ab_orderid(self) -> str:
+        if self._ab_orderid is None:
+            self._ab_orderid = f"{self.gateway_name}.{self.orderid}"
+        return self._ab_orderid
+
+    @ab_orderid.setter
+    def ab_orderid(self, value: str) -> None:
+        self._ab_orderid = value
+
+    @property
+    def ab_tradeid(self) -> str:
+        if self._ab_tradeid is None:
+            self._ab_tradeid = f"{self.gateway_name}.{self.tradeid}"
+        return self._ab_tradeid
+
+    @ab_tradeid.setter
+    def ab_tradeid(self, value: str) -> None:
+        self._ab_tradeid = value
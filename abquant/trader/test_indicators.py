@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from abquant.trader.indicators import ATR, EMA, MACD, RSI, SMA, WMA, Bollinger, Indicator, RollingMax, RollingMin, StdDev, ZScore
+
+talib = pytest.importorskip("talib")
+
+
+def make_bars(n: int = 3000, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    high = close * (1 + rng.uniform(0, 0.003, n))
+    low = close * (1 - rng.uniform(0, 0.003, n))
+    # flat stretch, for zero variance / zero change paths.
+    close[1000:1100] = close[999]
+    high[1000:1100] = close[999]
+    low[1000:1100] = close[999]
+    return high, low, close
+
+
+def streamed(indicator, *inputs):
+    values = [indicator.update(*row) for row in zip(*inputs)]
+    if len(indicator.outputs) == 1:
+        return np.array(values)
+    return tuple(np.array(output) for output in zip(*values))
+
+
+def seeded(make, *inputs, split: int = 0):
+    """
+    update one by one up to split, then seed the rest in two batches.
+    """
+    indicator = make()
+    head = streamed(indicator, *[values[:split] for values in inputs]) if split else None
+    middle = (split + len(inputs[0])) // 2
+    first = indicator.seed(*[values[split:middle] for values in inputs])
+    second = indicator.seed(*[values[middle:] for values in inputs])
+    if len(indicator.outputs) == 1:
+        parts = [part for part in (head, first, second) if part is not None]
+        return np.concatenate(parts), indicator
+    parts = [part for part in (head, first, second) if part is not None]
+    return tuple(np.concatenate(output) for output in zip(*parts)), indicator
+
+
+def assert_close(actual, expected):
+    if isinstance(expected, tuple):
+        for a, e in zip(actual, expected):
+            assert_close(a, e)
+        return
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-7, atol=1e-7)
+
+
+CASES = [
+    (lambda: SMA(30), lambda h, l, c: talib.SMA(c, 30)),
+    (lambda: SMA(1), lambda h, l, c: talib.SMA(c, 1)),
+    (lambda: EMA(20), lambda h, l, c: talib.EMA(c, 20)),
+    (lambda: WMA(15), lambda h, l, c: talib.WMA(c, 15)),
+    (lambda: RSI(14), lambda h, l, c: talib.RSI(c, 14)),
+    (lambda: StdDev(20, 1.5), lambda h, l, c: talib.STDDEV(c, 20, 1.5)),
+    (lambda: Bollinger(20, 2, 1.5), lambda h, l, c: talib.BBANDS(c, 20, 2, 1.5)),
+    (lambda: MACD(12, 26, 9), lambda h, l, c: talib.MACD(c, 12, 26, 9)),
+    (lambda: RollingMax(25), lambda h, l, c: talib.MAX(c, 25)),
+    (lambda: RollingMin(25), lambda h, l, c: talib.MIN(c, 25)),
+]
+
+
+@pytest.mark.parametrize("make, reference", CASES)
+def test_streaming_matches_talib(make, reference):
+    high, low, close = make_bars()
+    expected = reference(high, low, close)
+    assert_close(streamed(make(), close), expected)
+
+
+@pytest.mark.parametrize("make, reference", CASES)
+@pytest.mark.parametrize("split", [0, 5, 200])
+def test_seed_matches_talib(make, reference, split):
+    high, low, close = make_bars()
+    expected = reference(high, low, close)
+    actual, indicator = seeded(make, close, split=split)
+    assert_close(actual, expected)
+    # streaming goes on from the seeded state.
+    assert indicator.inited
+    assert indicator.count == len(close)
+
+
+def test_atr_matches_talib():
+    high, low, close = make_bars()
+    expected = talib.ATR(high, low, close, 14)
+    assert_close(streamed(ATR(14), high, low, close), expected)
+    for split in (0, 3, 500):
+        actual, _ = seeded(lambda: ATR(14), high, low, close, split=split)
+        assert_close(actual, expected)
+
+
+def test_zscore():
+    _, _, close = make_bars()
+    mean = talib.SMA(close, 30)
+    std = talib.STDDEV(close, 30)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.where(std > 0, (close - mean) / std, np.nan)
+    expected[:29] = np.nan
+    actual = streamed(ZScore(30), close)
+    np.testing.assert_allclose(actual[29:], expected[29:], rtol=1e-6, atol=1e-6)
+    assert np.isnan(actual[:29]).all()
+    seeded_values, _ = seeded(lambda: ZScore(30), close, split=100)
+    np.testing.assert_allclose(seeded_values[29:], expected[29:], rtol=1e-6, atol=1e-6)
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        SMA(0)
+
+
+def test_incomplete_indicator_rejected():
+    class StreamingOnly(Indicator):
+        def update(self, value):
+            return value
+
+    with pytest.raises(TypeError):
+        StreamingOnly(1)
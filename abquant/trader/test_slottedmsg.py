@@ -0,0 +1,87 @@
+from copy import copy
+from dataclasses import MISSING, fields
+from datetime import datetime
+import inspect
+import pickle
+
+import pytest
+
+from abquant.trader.common import Direction, Exchange, Status
+from abquant.trader.slottedmsg import (
+    SlottedDepthData, SlottedOrderData, SlottedTickData, SlottedTradeData, SlottedTransactionData)
+
+
+NOW = datetime(2022, 1, 1, 8, 30)
+ARGUMENTS = {
+    SlottedTickData: dict(datetime=NOW, best_ask_price=40000.5, best_bid_price=40000.0, ask_volume_5=3, localtime=NOW),
+    SlottedDepthData: dict(datetime=NOW, volume=1.5, price=40000.0, direction=Direction.LONG),
+    SlottedTransactionData: dict(datetime=NOW, volume=0.1, price=40000.0, times=2, direction=Direction.SHORT),
+    SlottedOrderData: dict(orderid="123", direction=Direction.LONG, price=40000.0, volume=1, status=Status.NOTTRADED),
+    SlottedTradeData: dict(orderid="123", tradeid="456", direction=Direction.LONG, price=40000.0, volume=1),
+}
+SLOTTED_CLASSES = list(ARGUMENTS)
+
+
+def make(cls: type):
+    """
+    instance of a slotted class or its dataclass with the same arguments.
+    """
+    arguments = ARGUMENTS[cls] if cls in ARGUMENTS else ARGUMENTS[next(
+        slotted for slotted in SLOTTED_CLASSES if slotted.data_class is cls)]
+    return cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, **arguments)
+
+
+@pytest.mark.parametrize("cls", SLOTTED_CLASSES)
+def test_fields_and_defaults(cls):
+    parameters = list(inspect.signature(cls.__init__).parameters.values())[1:]
+    assert [parameter.name for parameter in parameters] == [field.name for field in fields(cls.data_class)]
+    assert list(cls.field_names) == [field.name for field in fields(cls.data_class)]
+    for parameter, field in zip(parameters, fields(cls.data_class)):
+        default = inspect.Parameter.empty if field.default is MISSING else field.default
+        assert parameter.default == default, field.name
+
+    slotted = make(cls)
+    assert not hasattr(slotted, "__dict__")
+    assert slotted.to_data() == make(cls.data_class)
+    assert cls.from_data(make(cls.data_class)) == slotted
+
+
+@pytest.mark.parametrize("cls", SLOTTED_CLASSES)
+def test_derived_attributes(cls):
+    slotted, data = make(cls), make(cls.data_class)
+    for attr in ("ab_symbol", "symbol_id", "ab_orderid", "ab_tradeid"):
+        assert getattr(slotted, attr, None) == getattr(data, attr, None), attr
+    # cached on first access.
+    slotted.symbol = "ETHUSDT"
+    assert slotted.ab_symbol == data.ab_symbol
+
+
+@pytest.mark.parametrize("cls", SLOTTED_CLASSES)
+def test_copy_and_eq(cls):
+    slotted, data = make(cls), make(cls.data_class)
+    slotted.ab_symbol
+    copied = copy(slotted)
+    assert copied == slotted and copy(data) == data
+    assert copied is not slotted
+    assert copied._ab_symbol == slotted.ab_symbol
+
+    copied.gateway_name = "BITMEX"
+    assert copied != slotted
+    assert slotted != data and data != slotted
+
+
+@pytest.mark.parametrize("cls", SLOTTED_CLASSES)
+def test_pickle(cls):
+    slotted = make(cls)
+    slotted.ab_symbol
+    unpickled = pickle.loads(pickle.dumps(slotted))
+    assert unpickled == slotted
+    assert unpickled._ab_symbol is None and unpickled._symbol_id is None
+    assert (unpickled.ab_symbol, unpickled.symbol_id) == (slotted.ab_symbol, slotted.symbol_id)
+    assert pickle.loads(pickle.dumps(make(cls.data_class))) == make(cls.data_class)
+
+
+def test_order_methods():
+    order, data = make(SlottedOrderData), make(SlottedOrderData.data_class)
+    assert order.is_active() == data.is_active()
+    assert order.create_cancel_request() == data.create_cancel_request()
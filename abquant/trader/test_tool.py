@@ -0,0 +1,404 @@
+from copy import copy, deepcopy
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+import pytest
+
+from abquant.trader.common import Direction, Exchange, Interval
+from abquant.trader.msg import BarData, TickData, TransactionData
+from abquant.trader.tool import ArrayCache, BarAccumulater, BarGenerator, PortfolioBarAccumulater
+
+
+START = datetime(2022, 1, 1)
+
+
+def make_bars(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    return [BarData(gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, interval=Interval.MINUTE,
+                    datetime=START + timedelta(minutes=i), open_price=float(close[i]) - 0.1,
+                    high_price=float(close[i]) + 0.2, low_price=float(close[i]) - 0.2, close_price=float(close[i]),
+                    volume=float(i % 7), open_interest=float(1000 + i)) for i in range(n)]
+
+
+class ShiftArrayCache:
+    """
+    ArrayCache before the ring buffer: every array shifted by one on each bar. reference of the arrays.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.arrays = {field: np.zeros(size) for field in ArrayCache.FIELDS}
+
+    def update_bar(self, bar: BarData) -> None:
+        values = (bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume, bar.open_interest)
+        for field, value in zip(ArrayCache.FIELDS, values):
+            array = self.arrays[field]
+            array[:-1] = array[1:]
+            array[-1] = value
+
+
+def assert_same(cache: ArrayCache, reference: ShiftArrayCache) -> None:
+    for field in ArrayCache.FIELDS:
+        array = getattr(cache, field)
+        assert array.flags.c_contiguous
+        np.testing.assert_array_equal(array, reference.arrays[field], err_msg=field)
+
+
+def test_ring_matches_shift_across_wraparound():
+    size = 7
+    cache, reference = ArrayCache(size), ShiftArrayCache(size)
+    for i, bar in enumerate(make_bars(3 * size + 2)):
+        cache.update_bar(bar)
+        reference.update_bar(bar)
+        assert_same(cache, reference)
+        assert cache.inited == (i + 1 >= size)
+    assert cache.open_interest[-1] == 1000 + 3 * size + 1
+
+
+@pytest.mark.parametrize("head, batch", [(0, 3), (5, 4), (3, 20), (0, 0)])
+def test_update_bars_matches_shift(head, batch):
+    size = 7
+    bars = make_bars(head + batch + size + 3, seed=1)
+    cache, reference = ArrayCache(size), ShiftArrayCache(size)
+    for bar in bars[:head]:
+        cache.update_bar(bar)
+    cache.update_bars(bars[head: head + batch])
+    for bar in bars[:head + batch]:
+        reference.update_bar(bar)
+    assert_same(cache, reference)
+    assert cache.count == head + batch
+
+    for bar in bars[head + batch:]:
+        cache.update_bar(bar)
+        reference.update_bar(bar)
+        assert_same(cache, reference)
+
+
+def test_update_bars_from_array_leaves_missing_fields_zero():
+    size = 4
+    bars = make_bars(6)
+    cache = ArrayCache(size)
+    cache.update_bars(np.array([(bar.open_price, bar.high_price, bar.low_price, bar.close_price) for bar in bars]))
+    np.testing.assert_array_equal(cache.close, [bar.close_price for bar in bars[-size:]])
+    assert not cache.volume.any() and not cache.open_interest.any()
+    with pytest.raises(ValueError):
+        cache.update_bars(np.zeros((2, 7)))
+
+
+def test_kept_arrays_are_valid_until_next_update():
+    """
+    the arrays are views of the ring: a caller keeping am.close across bars must read it again, or copy it.
+    """
+    size = 5
+    bars = make_bars(2 * size + 3)
+    cache, reference = ArrayCache(size), ShiftArrayCache(size)
+    for bar in bars[:size + 1]:
+        cache.update_bar(bar)
+        reference.update_bar(bar)
+    kept = cache.close
+    copied = cache.close.copy()
+    np.testing.assert_array_equal(kept, reference.arrays["close"])
+
+    for bar in bars[size + 1:]:
+        cache.update_bar(bar)
+        reference.update_bar(bar)
+        np.testing.assert_array_equal(cache.close, reference.arrays["close"])
+    np.testing.assert_array_equal(copied, [bar.close_price for bar in bars[1:size + 1]])
+    assert kept is not cache.close
+
+
+class LegacyBarGenerator:
+    """
+    1 minute bars from ticks, as BarGenerator was before timeframes. reference of BarGenerator and its benchmark.
+    volume of the very first tick is not counted.
+    """
+
+    def __init__(self, on_bar):
+        self.bar: BarData = None
+        self.on_bar = on_bar
+        self.last_tick: TickData = None
+        self.last_bar: BarData = None
+
+    def update_tick(self, tick: TickData) -> None:
+        new_minute = False
+        if not tick.trade_price:
+            return
+        if self.last_tick and tick.datetime < self.last_tick.datetime:
+            return
+
+        if not self.bar:
+            new_minute = True
+        elif (
+            (self.bar.datetime.minute != tick.datetime.minute)
+            or (self.bar.datetime.hour != tick.datetime.hour)
+        ):
+            self.bar.datetime = self.bar.datetime.replace(
+                second=0, microsecond=0
+            )
+            self.last_bar = deepcopy(self.bar)
+            self.on_bar(self.bar)
+            new_minute = True
+
+        if new_minute:
+            self.bar = BarData(
+                symbol=tick.symbol,
+                exchange=tick.exchange,
+                interval=Interval.MINUTE,
+                datetime=tick.datetime,
+                gateway_name=tick.gateway_name,
+                open_price=tick.trade_price,
+                high_price=tick.trade_price,
+                low_price=tick.trade_price,
+                close_price=tick.trade_price,
+            )
+        else:
+            self.bar.high_price = max(self.bar.high_price, tick.trade_price)
+            self.bar.low_price = min(self.bar.low_price, tick.trade_price)
+            self.bar.close_price = tick.trade_price
+            self.bar.datetime = tick.datetime
+
+        if self.last_tick:
+            self.bar.volume += tick.trade_volume
+
+        self.last_tick = tick
+
+
+def make_ticks(n: int, rate: float = 2, seed: int = 0) -> List[TickData]:
+    """
+    trades of a random walk, with quote only ticks, ticks out of order and a quiet half hour.
+    """
+    rng = np.random.default_rng(seed)
+    offsets = np.cumsum(rng.exponential(1 / rate, n))
+    offsets[n // 2:] += 1800
+    prices = np.round(40000 * np.exp(np.cumsum(rng.normal(0, 0.0005, n))), 1)
+    volumes = np.round(rng.exponential(0.1, n), 3)
+    ticks = []
+    for i in range(n):
+        dt = START + timedelta(seconds=float(offsets[i]))
+        if i % 97 == 5:
+            dt -= timedelta(seconds=90)
+        ticks.append(TickData(gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=dt,
+                              trade_price=0 if i % 13 == 7 else float(prices[i]), trade_volume=float(volumes[i])))
+    return ticks
+
+
+def ohlcv(bars: List[BarData]) -> list:
+    return [(bar.datetime, bar.open_price, bar.high_price, bar.low_price, bar.close_price, round(bar.volume, 6))
+            for bar in bars]
+
+
+def legacy_bars(ticks: List[TickData]) -> List[BarData]:
+    bars = []
+    legacy = LegacyBarGenerator(lambda bar: bars.append(copy(bar)))
+    for tick in ticks:
+        legacy.update_tick(tick)
+    first = next(tick for tick in ticks if tick.trade_price)
+    bars[0].volume += first.trade_volume
+    return bars
+
+
+def window_bars(bars: List[BarData], minutes: int) -> List[BarData]:
+    """
+    x minute bars of 1 minute bars by start of the window.
+    """
+    windows = {}
+    for bar in bars:
+        start = bar.datetime.replace(minute=bar.datetime.minute - bar.datetime.minute % minutes) \
+            if minutes < 60 else bar.datetime.replace(minute=0)
+        window = windows.get(start)
+        if window is None:
+            windows[start] = BarData(gateway_name="TEST", symbol=bar.symbol, exchange=bar.exchange, datetime=start,
+                                     open_price=bar.open_price, high_price=bar.high_price, low_price=bar.low_price,
+                                     close_price=bar.close_price, volume=bar.volume)
+        else:
+            window.high_price = max(window.high_price, bar.high_price)
+            window.low_price = min(window.low_price, bar.low_price)
+            window.close_price = bar.close_price
+            window.volume += bar.volume
+    return list(windows.values())
+
+
+def test_minute_bars_match_legacy():
+    ticks = make_ticks(20000)
+    bars = []
+    generator = BarGenerator(lambda bar: bars.append(copy(bar)))
+    for tick in ticks:
+        generator.update_tick(tick)
+
+    expected = legacy_bars(ticks)
+    assert len(expected) > 100
+    assert ohlcv(bars) == ohlcv(expected)
+    assert all(bar.interval == Interval.MINUTE for bar in bars)
+
+
+@pytest.mark.parametrize("minutes", [3, 5, 15, 60])
+def test_window_bars_match_legacy(minutes):
+    ticks = make_ticks(20000)
+    minute_bars, window, timeframe, aggregated = [], [], [], []
+    generator = BarGenerator(lambda bar: minute_bars.append(copy(bar)), window=minutes,
+                             on_window_bar=lambda bar: window.append(copy(bar)))
+    generator.add_timeframe(timedelta(minutes=minutes), lambda bar: timeframe.append(copy(bar)))
+    for tick in ticks:
+        generator.update_tick(tick)
+
+    # the window of the last tick is still open.
+    expected = window_bars(legacy_bars(ticks), minutes)
+    assert len(window) in (len(expected) - 1, len(expected))
+    assert ohlcv(window) == ohlcv(timeframe) == ohlcv(expected[:len(window)])
+
+    # the same windows aggregated from the minute bars, finished by the minute bar at the end of window.
+    from_bars = BarGenerator(lambda bar: aggregated.append(copy(bar)), interval=minutes)
+    for bar in minute_bars:
+        from_bars.update_bar(bar)
+    assert len(aggregated) >= len(window)
+    assert ohlcv(aggregated) == ohlcv(expected[:len(aggregated)])
+
+
+def test_transactions_match_ticks():
+    ticks = make_ticks(5000)
+    tick_bars, transaction_bars = [], []
+    by_tick = BarGenerator(lambda bar: tick_bars.append(copy(bar)), interval=timedelta(seconds=15))
+    by_transaction = BarGenerator(lambda bar: transaction_bars.append(copy(bar)), interval=timedelta(seconds=15))
+    last = None
+    for tick in ticks:
+        by_tick.update_tick(tick)
+        if tick.trade_price and (last is None or tick.datetime >= last):
+            last = tick.datetime
+            by_transaction.update_transaction(TransactionData(
+                gateway_name="TEST", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=tick.datetime,
+                price=tick.trade_price, volume=tick.trade_volume, direction=Direction.LONG))
+    assert ohlcv(tick_bars) == ohlcv(transaction_bars)
+    assert [(bar.vwap, bar.trade_count) for bar in tick_bars] == [(bar.vwap, bar.trade_count) for bar in transaction_bars]
+
+
+def test_bar_reused_after_next_bar_finished():
+    """
+    the bar passed to on_bar is valid until the next bar of the same period is finished.
+    """
+    ticks = make_ticks(3000)
+    received = []
+
+    def on_bar(bar: BarData):
+        if received:
+            previous, snapshot = received[-1]
+            # the previous bar is not touched while building this one.
+            assert ohlcv([previous]) == ohlcv([snapshot])
+        received.append((bar, copy(bar)))
+
+    generator = BarGenerator(on_bar)
+    for tick in ticks:
+        generator.update_tick(tick)
+    assert len(received) > 10
+    # two BarData used in turn.
+    assert len({id(bar) for bar, _ in received}) == 2
+    assert ohlcv([snapshot for _, snapshot in received]) == ohlcv(legacy_bars(ticks))
+
+    # generate finishes the bar being built, then flat bars of the last close follow.
+    finished = generator.generate()
+    assert finished is received[-1][0] and finished is not received[-2][0]
+    start, close = finished.datetime, finished.close_price
+    for minutes in (1, 2):
+        flat = generator.generate()
+        assert flat is received[-1][0] and flat is not received[-2][0]
+        assert ohlcv([flat]) == [(start + timedelta(minutes=minutes),) + (close,) * 4 + (0,)]
+
+
+PORTFOLIO = ["BTCUSDT.BINANCE", "ETHUSDT.BINANCE", "BNBUSDT.BINANCE"]
+
+
+def make_portfolio_minutes(n: int, seed: int = 0) -> List[dict]:
+    """
+    bars of each minute, ETHUSDT misses some minutes, BNBUSDT starts in the middle of the third window of 5.
+    """
+    rng = np.random.default_rng(seed)
+    minutes = []
+    for i in range(n):
+        bars = {}
+        for j, ab_symbol in enumerate(PORTFOLIO):
+            if (j == 1 and i and rng.random() < 0.25) or (j == 2 and (i < 12 or rng.random() < 0.1)):
+                continue
+            close = float(np.round(100 * (j + 1) + rng.normal(0, 1), 2))
+            open_price = float(np.round(close + rng.normal(0, 0.5), 2))
+            symbol, exchange = ab_symbol.split(".")
+            bars[ab_symbol] = BarData(
+                gateway_name="TEST", symbol=symbol, exchange=Exchange(exchange), interval=Interval.MINUTE,
+                datetime=START + timedelta(minutes=i), open_price=open_price, close_price=close,
+                high_price=max(open_price, close) + 0.5, low_price=min(open_price, close) - 0.5,
+                volume=float(rng.integers(0, 10)))
+        minutes.append(bars)
+    return minutes
+
+
+def accumulated_by_bar(minutes: List[dict], window: int) -> List[dict]:
+    """
+    windows of BarAccumulater fed like the replay does, missing minutes forward filled by flat bars of the last close.
+    """
+    windows = []
+    accumulater = BarAccumulater(window, lambda bars: windows.append({
+        ab_symbol: (bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume)
+        for ab_symbol, bar in bars.items()}))
+    last = {}
+    for bars in minutes:
+        filled = {}
+        for ab_symbol in PORTFOLIO:
+            bar = bars.get(ab_symbol)
+            if bar is not None:
+                filled[ab_symbol] = last[ab_symbol] = copy(bar)
+            elif ab_symbol in last:
+                close = last[ab_symbol].close_price
+                filled[ab_symbol] = BarData(
+                    gateway_name="TEST", symbol=last[ab_symbol].symbol, exchange=last[ab_symbol].exchange,
+                    datetime=bars[PORTFOLIO[0]].datetime, open_price=close, high_price=close, low_price=close,
+                    close_price=close)
+        accumulater.update_bars(filled)
+    return windows
+
+
+def block_windows(blocks: List[np.ndarray]) -> List[dict]:
+    return [{ab_symbol: tuple(row) for ab_symbol, row in zip(PORTFOLIO, block.tolist()) if not np.isnan(row[3])}
+            for block in blocks]
+
+
+@pytest.mark.parametrize("window", [1, 5, 7])
+def test_portfolio_accumulater_matches_bar_accumulater(window):
+    minutes = make_portfolio_minutes(60)
+    expected = accumulated_by_bar(minutes, window)
+    assert len(expected) == 60 // window
+
+    blocks = []
+    accumulater = PortfolioBarAccumulater(PORTFOLIO, window, lambda block: blocks.append(block.copy()))
+    for bars in minutes:
+        accumulater.update_bars(bars)
+    assert block_windows(blocks) == expected
+    # BNBUSDT not started in the first windows.
+    assert "BNBUSDT.BINANCE" not in expected[0] and "BNBUSDT.BINANCE" in expected[-1]
+
+    # the same from rows of all symbols.
+    blocks = []
+    accumulater = PortfolioBarAccumulater(PORTFOLIO, window, lambda block: blocks.append(block.copy()))
+    for bars in minutes:
+        row = np.full((len(PORTFOLIO), len(PortfolioBarAccumulater.FIELDS)), np.nan)
+        for i, ab_symbol in enumerate(PORTFOLIO):
+            bar = bars.get(ab_symbol)
+            if bar is not None:
+                row[i] = (bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume)
+        accumulater.update_array(row, bars[PORTFOLIO[0]].datetime)
+    assert block_windows(blocks) == expected
+
+
+def test_portfolio_accumulater_as_dict():
+    minutes = make_portfolio_minutes(30)
+    expected = accumulated_by_bar(minutes, 5)
+    windows = []
+
+    def on_window(bars):
+        windows.append({ab_symbol: (bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume)
+                        for ab_symbol, bar in bars.items()})
+        assert all(bar.datetime == START + timedelta(minutes=5 * len(windows) - 1) for bar in bars.values())
+
+    accumulater = PortfolioBarAccumulater(PORTFOLIO, 5, on_window, as_dict=True)
+    for bars in minutes:
+        accumulater.update_bars(bars)
+    assert windows == expected
@@ -0,0 +1,68 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import pickle
+
+from abquant.trader.common import Exchange
+from abquant.trader.msg import TickData
+from abquant.trader.utility import SymbolRegistry, SymbolTable, extract_ab_symbol, symbol_registry
+
+
+def test_ids_are_compact_and_stable():
+    registry = SymbolRegistry()
+    assert registry.lookup("BTCUSDT", Exchange.BINANCE) == ("BTCUSDT.BINANCE", 0)
+    assert registry.lookup("ETHUSDT", Exchange.BINANCE) == ("ETHUSDT.BINANCE", 1)
+    assert registry.lookup("BTCUSDT", Exchange.BITMEX) == ("BTCUSDT.BITMEX", 2)
+    assert registry.lookup("BTCUSDT", Exchange.BINANCE) == ("BTCUSDT.BINANCE", 0)
+    assert registry.id_of("ETHUSDT.BINANCE") == 1
+    assert registry.ab_symbol_of(2) == "BTCUSDT.BITMEX"
+    assert registry.extract("BTCUSDT.BITMEX") == ("BTCUSDT", Exchange.BITMEX)
+    assert len(registry) == 3
+
+
+def test_id_of_unseen_registers_it():
+    registry = SymbolRegistry()
+    registry.lookup("BTCUSDT", Exchange.BINANCE)
+    assert registry.find("SOLUSDT.BINANCE") is None
+    assert "SOLUSDT.BINANCE" not in registry
+    assert registry.id_of("SOLUSDT.BINANCE") == 1
+    assert registry.find("SOLUSDT.BINANCE") == 1
+    assert registry.extract("SOLUSDT.BINANCE") == ("SOLUSDT", Exchange.BINANCE)
+
+
+def test_ab_symbols_are_interned():
+    first = symbol_registry.lookup("BTC" + "USDT", Exchange.BINANCE)[0]
+    second = symbol_registry.ab_symbol_of(symbol_registry.id_of("".join(["BTCUSDT", ".", "BINANCE"])))
+    assert first is second
+    assert extract_ab_symbol(first) == ("BTCUSDT", Exchange.BINANCE)
+
+
+def test_symbol_table():
+    table = SymbolTable(default=())
+    symbol_id = symbol_registry.id_of("BTCUSDT.BINANCE")
+    table[symbol_id + 3] = [1]
+    assert table[symbol_id + 3] == [1]
+    assert table[symbol_id] == ()
+    assert table[symbol_id + 100] == ()
+    assert table.get("NOTREGISTERED.BINANCE") == ()
+    assert symbol_registry.find("NOTREGISTERED.BINANCE") is None
+
+
+def unpickled_tick(payload: bytes, padding: int):
+    """
+    in a fresh process, padding other symbols registered first so that ids differ from the parent.
+    """
+    for i in range(padding):
+        symbol_registry.lookup("PAD{}".format(i), Exchange.BINANCE)
+    tick = pickle.loads(payload)
+    return tick.ab_symbol, tick.symbol_id, symbol_registry.id_of(tick.ab_symbol)
+
+
+def test_symbol_id_resolved_again_in_other_process():
+    tick = TickData(gateway_name="TEST", symbol="XYZUSDT", exchange=Exchange.BINANCE, datetime=datetime(2022, 1, 1))
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        ab_symbol, symbol_id, registered_id = pool.submit(
+            unpickled_tick, pickle.dumps(tick), tick.symbol_id + 1).result()
+    assert ab_symbol == "XYZUSDT.BINANCE"
+    assert symbol_id == registered_id
+    assert symbol_id != tick.symbol_id
@@ -1,11 +1,11 @@
 from dataclasses import dataclass
-from datetime import timedelta
+from datetime import datetime, timedelta
 import numpy as np
-from copy import deepcopy
-from typing import Callable, Dict, Optional, Type, Union
+from typing import Callable, Dict, Iterable, List, Optional, Type, Union
 
 from abquant.trader.common import Interval
-from abquant.trader.msg import BarData, TickData, TransactionData
+from abquant.trader.indicators import Indicator
+from abquant.trader.msg import BarData, BaseData, TickData, TransactionData
 from abquant.trader.utility import extract_ab_symbol
 
 
@@ -45,6 +45,7 @@ class BarAccumulater:
                               datetime=bar.datetime,
                               interval=Interval.CUSTOM,
                               volume=bar.volume,
+                              open_interest=bar.open_interest,
                               open_price=bar.open_price,
                               high_price=bar.high_price,
                               low_price=bar.low_price,
@@ -59,6 +60,7 @@ class BarAccumulater:
                 accumulated_bar.low_price = min(
                     bar.low_price, accumulated_bar.low_price)
                 accumulated_bar.volume += bar.volume
+                accumulated_bar.open_interest = bar.open_interest
 
         if self._update_times >= self.window:
             self.on_window(self.bars)
@@ -68,39 +70,241 @@ class BarAccumulater:
             self._update_times = 0
 
 
+class PortfolioBarAccumulater:
+    """
+    windowed bars of a fixed universe of symbols, kept as one 2d block of symbols x FIELDS for cross-sectional strategies.
+
+    update_bars takes a dict of bars like BarAccumulater, update_array takes a row of bars of all symbols directly.
+    a symbol missing in an update is forward filled with a flat bar of its last close and 0 volume,
+    a symbol never updated stays nan.
+
+    every window updates on_window_bars is called with the block, a view valid until the next update, or with a dict of
+    ab_symbol -> BarData if as_dict, the BarData are reused by every window.
+    """
+    FIELDS = ("open", "high", "low", "close", "volume")
+    OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+    def __init__(
+        self,
+        ab_symbols: Iterable[str],
+        window: int,
+        on_window_bars: Callable[[Union[np.ndarray, Dict[str, BarData]]], None],
+        as_dict: bool = False
+    ):
+        self.ab_symbols: List[str] = list(ab_symbols)
+        self.rows: Dict[str, int] = {ab_symbol: row for row, ab_symbol in enumerate(self.ab_symbols)}
+        self.window: int = window
+        self.on_window: Callable = on_window_bars
+        self.as_dict: bool = as_dict
+
+        n = len(self.ab_symbols)
+        self.block: np.ndarray = np.full((n, len(self.FIELDS)), np.nan)
+        self.last_close: np.ndarray = np.full(n, np.nan)
+        self.datetime: Optional[datetime] = None
+        self.bars: Dict[str, BarData] = {}
+
+        self._row: np.ndarray = np.empty((n, len(self.FIELDS)))
+        self._update_times = 0
+
+    def update_bars(self, bars: Dict[str, BarData]) -> None:
+        """
+        not thread-safe
+        """
+        rows = self.rows
+        indexes = []
+        values = []
+        bar_time = None
+        for ab_symbol, bar in bars.items():
+            if bar is None:
+                continue
+            i = rows.get(ab_symbol, None)
+            if i is None:
+                continue
+            indexes.append(i)
+            values.append((bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume))
+            if bar_time is None or bar.datetime > bar_time:
+                bar_time = bar.datetime
+
+        row = self._row
+        row.fill(np.nan)
+        if indexes:
+            row[indexes] = values
+        self.update_array(row, bar_time)
+
+    def update_array(self, row: np.ndarray, dt: datetime = None) -> None:
+        """
+        row of shape (symbols, FIELDS) in order of ab_symbols, nan for missing symbols.
+        """
+        missing = np.isnan(row[:, self.CLOSE])
+        if missing.any():
+            row = row.copy()
+            row[missing, :self.VOLUME] = self.last_close[missing, None]
+            row[missing, self.VOLUME] = 0
+        self.last_close = np.where(missing, self.last_close, row[:, self.CLOSE])
+        if dt is not None:
+            self.datetime = dt
+
+        block = self.block
+        if self._update_times == 0:
+            block[:] = row
+        else:
+            np.fmax(block[:, self.HIGH], row[:, self.HIGH], out=block[:, self.HIGH])
+            np.fmin(block[:, self.LOW], row[:, self.LOW], out=block[:, self.LOW])
+            block[:, self.CLOSE] = row[:, self.CLOSE]
+            # nan open of a symbol appearing in the middle of window is its first open.
+            opening = np.isnan(block[:, self.OPEN])
+            block[opening, self.OPEN] = row[opening, self.OPEN]
+            block[:, self.VOLUME] = np.nansum((block[:, self.VOLUME], row[:, self.VOLUME]), axis=0)
+        self._update_times += 1
+
+        if self._update_times >= self.window:
+            self._update_times = 0
+            self.on_window(self.to_bars() if self.as_dict else block)
+
+    def to_bars(self) -> Dict[str, BarData]:
+        """
+        dict view of the block, symbols never updated are left out.
+        """
+        bars = self.bars
+        for ab_symbol, values in zip(self.ab_symbols, self.block.tolist()):
+            if values[self.CLOSE] != values[self.CLOSE]:
+                bars.pop(ab_symbol, None)
+                continue
+            bar = bars.get(ab_symbol, None)
+            if bar is None:
+                symbol, exchange = extract_ab_symbol(ab_symbol)
+                bar = BarData(gateway_name="GENERATED", symbol=symbol, exchange=exchange,
+                              datetime=self.datetime, interval=Interval.CUSTOM)
+                bars[ab_symbol] = bar
+            bar.datetime = self.datetime
+            bar.open_price, bar.high_price, bar.low_price, bar.close_price, bar.volume = values
+        return bars
+
+
+# interval of bars of period seconds, CUSTOM for others.
+PERIOD_INTERVALS: Dict[int, Interval] = {60: Interval.MINUTE, 3600: Interval.HOUR, 86400: Interval.DAILY}
+INTERVAL_PERIODS: Dict[Interval, int] = {interval: period for period, interval in PERIOD_INTERVALS.items()}
+DAY_SECONDS = 86400
+
+
+class Timeframe:
+    """
+    state of bars of one period in BarGenerator, bars are aligned to the start of day.
+    two BarData are used in turn, one being built and the other one last finished, no copy or allocation per bar.
+    """
+    __slots__ = ("period", "on_bar", "interval", "bar", "last_bar", "spare", "start", "end", "turnover")
+
+    def __init__(self, period: timedelta, on_bar: Callable[[BarData], None]):
+        seconds = period.total_seconds()
+        if seconds < 1 or seconds != int(seconds) or DAY_SECONDS % seconds:
+            raise ValueError("period of bar should be whole seconds dividing a day, got {}".format(period))
+        self.period: timedelta = period
+        self.on_bar: Callable[[BarData], None] = on_bar
+        self.interval: Interval = PERIOD_INTERVALS.get(int(seconds), Interval.CUSTOM)
+        self.bar: Optional[BarData] = None
+        self.last_bar: Optional[BarData] = None
+        # finished before last_bar, reused by next open
+        self.spare: Optional[BarData] = None
+        self.start: Optional[datetime] = None
+        self.end: Optional[datetime] = None
+        self.turnover: float = 0
+
+    def open(self, template: BaseData, dt: datetime) -> BarData:
+        seconds = int(self.period.total_seconds())
+        day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = (dt - day).seconds
+        self.start = day + timedelta(seconds=elapsed - elapsed % seconds)
+        self.end = self.start + self.period
+        self.turnover = 0
+
+        bar = self.spare
+        self.spare = None
+        if bar is None or bar.ab_symbol != template.ab_symbol:
+            bar = BarData(
+                gateway_name=template.gateway_name,
+                symbol=template.symbol,
+                exchange=template.exchange,
+                datetime=self.start,
+                interval=self.interval
+            )
+        bar.datetime = self.start
+        bar.open_price = 0
+        bar.volume = 0
+        bar.open_interest = 0
+        bar.vwap = 0
+        bar.trade_count = 0
+        self.bar = bar
+        return bar
+
+    def finish(self) -> Optional[BarData]:
+        bar = self.bar
+        if bar is None:
+            return None
+        if bar.volume:
+            bar.vwap = self.turnover / bar.volume
+        self.spare = self.last_bar
+        self.last_bar = bar
+        self.bar = None
+        self.on_bar(bar)
+        return bar
+
+
 class BarGenerator:
     """
     For:
-    1. generating 1 minute bar data from tick data
-    2. generateing x minute bar/ bar data from 1 minute data NOT SUPPORT YET.
+    generating bars of one or more periods in a single pass over TickData (trade_price, trade_volume) or
+    TransactionData (aggTrade), or over finer BarData by update_bar.
+    1. on_bar: bars of interval minutes (1 minute by default), or of the period of an Interval / timedelta.
+    2. on_window_bar: bars of window * interval, as in vnpy.
+    3. add_timeframe(period, on_bar): any more periods, e.g. timedelta(seconds=5), timedelta(hours=1).
+    a bar is finished when data of the next period arrives, or by generate() for the first one.
 
     Notice:
-    1. for x minute bar, x must be able to divide 60: 2, 3, 5, 6, 10, 15, 20, 30
-    2. for x hour bar, x can be any number
+    1. periods are whole seconds dividing a day, bars are aligned to the start of day:
+       x minute bar, x divides 1440; 4 hour bar starts at 0, 4, 8 ... o'clock.
+    2. the bar passed to on_bar is reused after the next bar of the same period is finished,
+       copy it if kept longer than that.
+    3. vwap and trade_count are set on finish. volume of ticks is the sum of trade_volume.
     """
 
     def __init__(
         self,
         on_bar: Callable[[BarData], None],
-        # 后面这仨参数都没用了。但是为了向后兼容留着占位。
         window: int = 0,
         on_window_bar: Callable = None,
-        interval:int = 1
+        interval: Union[int, Interval, timedelta] = 1
     ):
-        self.bar: BarData = None
-        self.on_bar: Callable = on_bar
-
-        # self.interval: Interval = interval
-        # self.interval_count: int = 0
+        if isinstance(interval, Interval):
+            if interval not in INTERVAL_PERIODS:
+                raise ValueError("interval {} is not supported by BarGenerator".format(interval))
+            period = timedelta(seconds=INTERVAL_PERIODS[interval])
+        elif isinstance(interval, timedelta):
+            period = interval
+        else:
+            period = timedelta(minutes=interval)
 
-        # self.window: int = window
-        # self.window_bar: BarData = None
-        # self.on_window_bar: Callable = on_window_bar
+        self.timeframes: List[Timeframe] = [Timeframe(period, on_bar)]
+        if window and on_window_bar:
+            self.add_timeframe(period * window, on_window_bar)
 
         self.last_tick: TickData = None
-        self.last_bar: BarData = None
         self.last_transaction: TransactionData = None
 
+    @property
+    def bar(self) -> Optional[BarData]:
+        return self.timeframes[0].bar
+
+    @property
+    def last_bar(self) -> Optional[BarData]:
+        return self.timeframes[0].last_bar
+
+    @property
+    def on_bar(self) -> Callable[[BarData], None]:
+        return self.timeframes[0].on_bar
+
+    def add_timeframe(self, period: timedelta, on_bar: Callable[[BarData], None]) -> None:
+        self.timeframes.append(Timeframe(period, on_bar))
+
     def update(self, data: Union[TickData, TransactionData]):
         if isinstance(data, TickData):
             self.update_tick(data)
@@ -110,6 +314,26 @@ class BarGenerator:
             raise TypeError(
                 "type of data is {}, neither TickData nor Transaction.".format(type(data)))
 
+    def _update_trade(self, data: BaseData, dt: datetime, price: float, volume: float) -> None:
+        for timeframe in self.timeframes:
+            bar = timeframe.bar
+            if bar is None or dt >= timeframe.end:
+                if bar is not None:
+                    timeframe.finish()
+                bar = timeframe.open(data, dt)
+                bar.open_price = bar.high_price = bar.low_price = price
+            elif dt < timeframe.start:
+                # late data of a finished bar.
+                continue
+            elif price > bar.high_price:
+                bar.high_price = price
+            elif price < bar.low_price:
+                bar.low_price = price
+            bar.close_price = price
+            bar.volume += volume
+            bar.trade_count += 1
+            timeframe.turnover += price * volume
+
     def update_tick(self, tick: TickData) -> None:
         """
         either update_tick or update_transaction. use both at same time is not allowed. 
@@ -117,7 +341,6 @@ class BarGenerator:
         if self.last_transaction:
             raise TypeError(
                 "BarGenerator should be updated by either TickData or Transaction to generate BarData, updated by both of them at the same time is not allowed.")
-        new_minute = False
 
         # Filter tick data with 0 last price
         if not tick.trade_price:
@@ -127,108 +350,189 @@ class BarGenerator:
         if self.last_tick and tick.datetime < self.last_tick.datetime:
             return
 
-        if not self.bar:
-            new_minute = True
-        elif (
-            (self.bar.datetime.minute != tick.datetime.minute)
-            or (self.bar.datetime.hour != tick.datetime.hour)
-        ):
-            self.bar.datetime = self.bar.datetime.replace(
-                second=0, microsecond=0
-            )
-            self.last_bar = deepcopy(self.bar)
-            self.on_bar(self.bar)
-
-            new_minute = True
-
-        if new_minute:
-            self.bar = BarData(
-                symbol=tick.symbol,
-                exchange=tick.exchange,
-                interval=Interval.MINUTE,
-                datetime=tick.datetime,
-                gateway_name=tick.gateway_name,
-                open_price=tick.trade_price,
-                high_price=tick.trade_price,
-                low_price=tick.trade_price,
-                close_price=tick.trade_price,
-            )
-        else:
-            self.bar.high_price = max(self.bar.high_price, tick.trade_price)
-            self.bar.low_price = min(self.bar.low_price, tick.trade_price)
-            self.bar.close_price = tick.trade_price
-            self.bar.datetime = tick.datetime
-
-        if self.last_tick:
-            # volume_change = tick.volume - self.last_tick.volume
-            self.bar.volume += tick.trade_volume
-
+        self._update_trade(tick, tick.datetime, tick.trade_price, tick.trade_volume)
         self.last_tick = tick
 
-    def update_transaction(self, tick: TransactionData) -> None:
+    def update_transaction(self, transaction: TransactionData) -> None:
         if self.last_tick:
             raise TypeError(
                 "BarGenerator should be updated by either TickData or Transaction to generate BarData, updated by both of them at the same time is not allowed.")
-        pass
+        if not transaction.price:
+            return
+
+        self._update_trade(transaction, transaction.datetime, transaction.price, transaction.volume)
+        self.last_transaction = transaction
 
     def update_bar(self, bar: BarData) -> None:
-        pass
+        """
+        aggregate finer bars, e.g. 1 minute bars of history into 5 minute and 1 hour bars.
+        a bar is finished as soon as the finer bar at its end is updated if interval of the finer bar is known.
+        """
+        length = INTERVAL_PERIODS.get(bar.interval, None)
+        bar_end = bar.datetime + timedelta(seconds=length) if length else None
+        turnover = (bar.vwap or bar.close_price) * bar.volume
+        for timeframe in self.timeframes:
+            window_bar = timeframe.bar
+            if window_bar is None or bar.datetime >= timeframe.end:
+                if window_bar is not None:
+                    timeframe.finish()
+                window_bar = timeframe.open(bar, bar.datetime)
+                window_bar.open_price = bar.open_price
+                window_bar.high_price = bar.high_price
+                window_bar.low_price = bar.low_price
+            elif bar.datetime < timeframe.start:
+                continue
+            else:
+                window_bar.high_price = max(window_bar.high_price, bar.high_price)
+                window_bar.low_price = min(window_bar.low_price, bar.low_price)
+            window_bar.close_price = bar.close_price
+            window_bar.open_interest = bar.open_interest
+            window_bar.volume += bar.volume
+            window_bar.trade_count += bar.trade_count
+            timeframe.turnover += turnover
+            if bar_end is not None and bar_end >= timeframe.end:
+                timeframe.finish()
 
     def generate(self) -> Optional[BarData]:
         """
-        Generate the bar data and call callback immediately.
+        Generate the bar data of the first period and call callback immediately.
+        if nothing is updated since the last bar, a flat bar of the last close price is generated.
         """
-        bar = self.bar
+        timeframe = self.timeframes[0]
+        if timeframe.bar is not None:
+            return timeframe.finish()
 
-        if self.bar is None and self.last_bar:
-
-            bar = self.last_bar
-            # TODO 
-            bar.datetime += timedelta(minutes=1)
-            bar.high_price = bar.close_price
-            bar.low_price = bar.close_price
-            bar.open_price = bar.close_price
-            bar.volume = 0
-
-        if bar:
-            bar.datetime = bar.datetime.replace(second=0, microsecond=0)
-            self.on_bar(bar)
-            self.last_bar = bar
-        self.bar = None
+        last_bar = timeframe.last_bar
+        if last_bar is None:
+            return None
         # TODO None may not a proper choice. but every time call generate, self.bar.datetime.minut += 1 look ambigious.
-        return bar
+        # built in the spare bar, the last bar stays valid until this one is finished.
+        bar = timeframe.open(last_bar, last_bar.datetime + timeframe.period)
+        bar.open_price = bar.high_price = bar.low_price = bar.close_price = last_bar.close_price
+        bar.open_interest = last_bar.open_interest
+        return timeframe.finish()
 
 
 class ArrayCache:
+    """
+    the latest size bars as numpy arrays in chronological order, oldest first. zero filled before size bars updated.
+
+    backed by a ring buffer whose every slot is written twice, at i and i + size, so that the latest size bars are
+    always a contiguous slice of the buffer: update_bar is O(1) and open/high/.../close are views without copy,
+    ready for talib. the views are only valid until the next update, copy them if kept across bars.
+    open_interest_array is filled from BarData.open_interest, given by kline data with an open_interest column.
+
+    streaming indicators attached by add_indicator are updated along with the cache, and seeded by update_bars.
+    """
+    FIELDS = ("open", "high", "low", "close", "volume", "open_interest")
+
     def __init__(self, size: int = 100):
         """Constructor"""
         self.count: int = 0
         self.size: int = size
         self.inited: bool = False
 
-        self.open_array: np.ndarray = np.zeros(size)
-        self.high_array: np.ndarray = np.zeros(size)
-        self.low_array: np.ndarray = np.zeros(size)
-        self.close_array: np.ndarray = np.zeros(size)
-        self.volume_array: np.ndarray = np.zeros(size)
-        self.open_interest_array: np.ndarray = np.zeros(size)
+        # one row per field of FIELDS
+        self._buffer: np.ndarray = np.zeros((len(self.FIELDS), 2 * size))
+        # index of the latest bar in [0, size)
+        self._index: int = size - 1
+        self.indicators: List[Indicator] = []
+
+    def add_indicator(self, indicator: Indicator) -> Indicator:
+        """
+        e.g. self.sma = array_cache.add_indicator(SMA(20)), then read self.sma.value on bar.
+        """
+        self.indicators.append(indicator)
+        return indicator
 
     def update_bar(self, bar: BarData) -> None:
         self.count += 1
         if not self.inited and self.count >= self.size:
             self.inited = True
 
-        self.open_array[:-1] = self.open_array[1:]
-        self.high_array[:-1] = self.high_array[1:]
-        self.low_array[:-1] = self.low_array[1:]
-        self.close_array[:-1] = self.close_array[1:]
-        self.volume_array[:-1] = self.volume_array[1:]
+        index = self._index + 1
+        if index == self.size:
+            index = 0
+        self._index = index
+        values = (
+            bar.open_price,
+            bar.high_price,
+            bar.low_price,
+            bar.close_price,
+            bar.volume,
+            bar.open_interest
+        )
+        buffer = self._buffer
+        buffer[:, index] = values
+        buffer[:, index + self.size] = values
+        for indicator in self.indicators:
+            indicator.update_bar(bar)
+
+    def update_bars(self, bars: Union[Iterable[BarData], np.ndarray]) -> None:
+        """
+        batch update for warm up, bars in chronological order.
+        bars is a list of BarData or a 2d array of shape (n, k), k columns in order of FIELDS, k < 6 leaves the rest 0.
+        """
+        width = len(self.FIELDS)
+        if not isinstance(bars, np.ndarray):
+            bars = np.array([
+                (
+                    bar.open_price,
+                    bar.high_price,
+                    bar.low_price,
+                    bar.close_price,
+                    bar.volume,
+                    bar.open_interest
+                ) for bar in bars
+            ], dtype=float).reshape(-1, width)
+        elif bars.ndim != 2 or bars.shape[1] > width:
+            raise ValueError("bars of shape {} is not (n, k <= {})".format(bars.shape, width))
+        elif bars.shape[1] < width:
+            bars = np.hstack((bars, np.zeros((len(bars), width - bars.shape[1]))))
+
+        n = len(bars)
+        if not n:
+            return
+        self.count += n
+        if not self.inited and self.count >= self.size:
+            self.inited = True
+
+        values = bars[-self.size:].T
+        slots = (self._index + 1 + np.arange(values.shape[1])) % self.size
+        buffer = self._buffer
+        buffer[:, slots] = values
+        buffer[:, slots + self.size] = values
+        self._index = int(slots[-1])
+        for indicator in self.indicators:
+            indicator.seed(*[bars[:, self.FIELDS.index(field)] for field in indicator.inputs])
+
+    def _field(self, row: int) -> np.ndarray:
+        start = self._index + 1
+        return self._buffer[row, start: start + self.size]
 
-        self.open_array[-1] = bar.open_price
-        self.high_array[-1] = bar.high_price
-        self.low_array[-1] = bar.low_price
-        self.close_array[-1] = bar.close_price
-        self.volume_array[-1] = bar.volume
+    @property
+    def open_array(self) -> np.ndarray:
+        return self._field(0)
+
+    @property
+    def high_array(self) -> np.ndarray:
+        return self._field(1)
+
+    @property
+    def low_array(self) -> np.ndarray:
+        return self._field(2)
+
+    @property
+    def close_array(self) -> np.ndarray:
+        return self._field(3)
+
+    @property
+    def volume_array(self) -> np.ndarray:
+        return self._field(4)
+
+    @property
+    def open_interest_array(self) -> np.ndarray:
+        return self._field(5)
 
     @property
     def open(self) -> np.ndarray:
@@ -249,7 +553,11 @@ class ArrayCache:
     @property
     def volume(self) -> np.ndarray:
         return self.volume_array
-    
+
+    @property
+    def open_interest(self) -> np.ndarray:
+        return self.open_interest_array
+
     @staticmethod
     def pct_change(arr: np.ndarray, shift: int):
         shifted_arr = np.roll(arr, shift)
@@ -1,18 +1,22 @@
+from __future__ import annotations
+
 from collections import defaultdict
 from datetime import datetime
 from enum import Enum
 import re
-from typing import Iterable, List, Tuple, Dict
+import sys
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Dict, TYPE_CHECKING
 import logging
 from threading import Lock
 from decimal import Decimal
 import math
 import inspect
 
-from abquant.trader.msg import OrderData
-
 from .common import Exchange
 
+if TYPE_CHECKING:
+    from abquant.trader.msg import OrderData
+
 ab_symbol_parrtern = re.compile(r'(.*)\.(.*)')
 
 
@@ -35,19 +39,114 @@ def check_ab_symbol(ab_symbol: str) -> bool:
         return False
 
 
+class SymbolRegistry:
+    """
+    process-wide registry assigning compact integer ids (0, 1, 2 ...) to ab_symbols in order of registration, never recycled.
+    ab_symbol strings are interned, so their hash is computed once rather than for every message used as dict key,
+    and parsed (symbol, Exchange) are cached. messages in msg.py get ab_symbol and symbol_id from lookup.
+
+    ids are process local, do not persist them or send them to other processes.
+    lookup is lock free once registered, registration takes a lock.
+    """
+
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._ids: Dict[str, int] = {}
+        self._entries: Dict[Exchange, Dict[str, Tuple[str, int]]] = defaultdict(dict)
+        self.ab_symbols: List[str] = []
+        self.symbols: List[Tuple[str, Exchange]] = []
+
+    def __len__(self) -> int:
+        return len(self.ab_symbols)
+
+    def __contains__(self, ab_symbol: str) -> bool:
+        return ab_symbol in self._ids
+
+    def lookup(self, symbol: str, exchange: Exchange) -> Tuple[str, int]:
+        """
+        :return: (ab_symbol, symbol_id), registered if new.
+        """
+        entry = self._entries[exchange].get(symbol, None)
+        if entry is None:
+            entry = self._register(symbol, exchange)
+        return entry
+
+    def _register(self, symbol: str, exchange: Exchange) -> Tuple[str, int]:
+        with self._lock:
+            entry = self._entries[exchange].get(symbol, None)
+            if entry is None:
+                ab_symbol = sys.intern(f"{symbol}.{exchange.value}")
+                entry = (ab_symbol, len(self.ab_symbols))
+                self.symbols.append((symbol, exchange))
+                self.ab_symbols.append(ab_symbol)
+                self._ids[ab_symbol] = entry[1]
+                self._entries[exchange][symbol] = entry
+            return entry
+
+    def id_of(self, ab_symbol: str) -> int:
+        symbol_id = self._ids.get(ab_symbol, None)
+        if symbol_id is None:
+            symbol, exchange_name = ab_symbol.split(".")
+            symbol_id = self.lookup(symbol, Exchange(exchange_name))[1]
+        return symbol_id
+
+    def find(self, ab_symbol: str) -> Optional[int]:
+        """
+        id of ab_symbol, None if not registered.
+        """
+        return self._ids.get(ab_symbol, None)
+
+    def ab_symbol_of(self, symbol_id: int) -> str:
+        return self.ab_symbols[symbol_id]
+
+    def extract(self, ab_symbol: str) -> Tuple[str, Exchange]:
+        return self.symbols[self.id_of(ab_symbol)]
+
+
+symbol_registry = SymbolRegistry()
+
+
+class SymbolTable:
+    """
+    list of objects indexed by symbol id, the id-indexed replacement of Dict[ab_symbol, object] on hot path.
+    """
+
+    def __init__(self, default: Any = None):
+        self.default: Any = default
+        self.items: List[Any] = []
+
+    def __getitem__(self, symbol_id: int) -> Any:
+        items = self.items
+        if symbol_id < len(items):
+            return items[symbol_id]
+        return self.default
+
+    def __setitem__(self, symbol_id: int, value: Any) -> None:
+        items = self.items
+        if symbol_id >= len(items):
+            items.extend([self.default] * (symbol_id + 1 - len(items)))
+        items[symbol_id] = value
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, ab_symbol: str) -> Any:
+        symbol_id = symbol_registry.find(ab_symbol)
+        return self.default if symbol_id is None else self[symbol_id]
+
+
 def extract_ab_symbol(ab_symbol: str) -> Tuple[str, Exchange]:
     """
     :return: (symbol, exchange)
     """
-    symbol, exchange_name = ab_symbol.split(".")
-    return symbol, Exchange(exchange_name)
+    return symbol_registry.extract(ab_symbol)
 
 
 def generate_ab_symbol(symbol: str, exchange: Exchange) -> str:
     """
     return ab_symbol
     """
-    return f"{symbol}.{exchange.value}"
+    return symbol_registry.lookup(symbol, exchange)[0]
 
 
 file_handlers: Dict[str, logging.FileHandler] = {}
@@ -133,6 +232,8 @@ class OrderGrouper:
 
 
 if __name__ == '__main__':
+    from abquant.trader.msg import OrderData
+
     ab_test = 'syx'
     print(ab_test)
     check_ab_symbol(ab_test)
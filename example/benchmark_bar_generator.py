@@ -0,0 +1,81 @@
+import argparse
+from datetime import datetime, timedelta
+import time
+
+import numpy as np
+
+from abquant.trader.common import Direction, Exchange
+from abquant.trader.msg import BarData, TickData, TransactionData
+from abquant.trader.test_tool import LegacyBarGenerator
+from abquant.trader.tool import BarGenerator
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=500000,
+                        help='number of ticks / transactions')
+    parser.add_argument('-r', '--rate', type=float, default=20,
+                        help='trades per second of the generated stream')
+    args = parser.parse_args()
+    return args
+
+
+def make_stream(n: int, rate: float):
+    rng = np.random.default_rng(1)
+    start = datetime(2022, 1, 1)
+    offsets = np.cumsum(rng.exponential(1 / rate, n))
+    prices = 40000 * np.exp(np.cumsum(rng.normal(0, 0.0001, n)))
+    volumes = rng.exponential(0.1, n)
+    datetimes = [start + timedelta(seconds=float(offset)) for offset in offsets]
+    ticks = [
+        TickData(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=dt,
+                 trade_price=float(price), trade_volume=float(volume))
+        for dt, price, volume in zip(datetimes, prices, volumes)
+    ]
+    transactions = [
+        TransactionData(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=dt,
+                        price=float(price), volume=float(volume), direction=Direction.LONG)
+        for dt, price, volume in zip(datetimes, prices, volumes)
+    ]
+    return ticks, transactions
+
+
+def measure(name: str, update, stream, counter: list) -> None:
+    begin = time.perf_counter()
+    for data in stream:
+        update(data)
+    elapsed = time.perf_counter() - begin
+    print("{:<44} {:>12,.0f} updates/s {:>8} bars".format(name, len(stream) / elapsed, counter[0]))
+
+
+def main():
+    args = parse()
+    ticks, transactions = make_stream(args.number, args.rate)
+    print("{} trades over {:.1f} hours".format(
+        args.number, (ticks[-1].datetime - ticks[0].datetime).total_seconds() / 3600))
+
+    counter = [0]
+
+    def on_bar(bar: BarData):
+        counter[0] += 1
+
+    legacy = LegacyBarGenerator(on_bar)
+    measure("legacy, ticks, 1m", legacy.update_tick, ticks, counter)
+
+    counter[0] = 0
+    generator = BarGenerator(on_bar)
+    measure("BarGenerator, ticks, 1m", generator.update_tick, ticks, counter)
+
+    counter[0] = 0
+    generator = BarGenerator(on_bar)
+    measure("BarGenerator, transactions, 1m", generator.update_transaction, transactions, counter)
+
+    counter[0] = 0
+    generator = BarGenerator(on_bar, interval=timedelta(seconds=1))
+    for period in (timedelta(seconds=5), timedelta(minutes=1), timedelta(minutes=5), timedelta(hours=1)):
+        generator.add_timeframe(period, on_bar)
+    measure("BarGenerator, transactions, 1s/5s/1m/5m/1h", generator.update_transaction, transactions, counter)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+from datetime import datetime, timedelta
+import time
+
+import numpy as np
+
+from abquant.strategytrading import VectorReplayRunner, VectorStrategyTemplate
+from abquant.trader.common import Interval
+
+from benchmark_replay_history import GeneratedDataLoader
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--symbols', type=int, default=20,
+                        help='number of symbols')
+    parser.add_argument('-d', '--days', type=int, default=30,
+                        help='days of minute bars')
+    parser.add_argument('-e', '--every', type=int, default=1,
+                        help='position flipped every n minutes')
+    args = parser.parse_args()
+    return args
+
+
+class FlipStrategy(VectorStrategyTemplate):
+    """
+    long and short flipped every n bars, a trade of each symbol every n minutes.
+    """
+    every = 1
+    parameters = ["every"]
+
+    def target_positions(self, bars):
+        flips = np.where(np.arange(len(bars)) // self.every % 2, 1.0, -1.0)
+        return np.repeat(flips[:, None], len(self.ab_symbols), axis=1)
+
+
+def main():
+    args = parse()
+    ab_symbols = ["S{}USDT.BINANCE".format(i) for i in range(args.symbols)]
+    runner = VectorReplayRunner(
+        ab_symbols=ab_symbols,
+        interval=Interval.MINUTE,
+        rates={ab_symbol: 0.0004 for ab_symbol in ab_symbols},
+        slippages={ab_symbol: 0.0001 for ab_symbol in ab_symbols},
+        sizes={ab_symbol: 1 for ab_symbol in ab_symbols},
+        priceticks={ab_symbol: 0.01 for ab_symbol in ab_symbols},
+        capital=1000000,
+    )
+    runner.output = lambda msg: None
+    runner.set_data_loader(GeneratedDataLoader(0))
+    runner.set_strategy(FlipStrategy(runner, "flip", ab_symbols, {"every": args.every}))
+
+    start = datetime(2022, 1, 1)
+    runner.load_data(start, start + timedelta(days=args.days))
+    begin = time.perf_counter()
+    runner.run_backtesting()
+    replayed = time.perf_counter()
+    df = runner.calculate_result()
+    calculated = time.perf_counter()
+    runner.calculate_statistics(df, output=False)
+    runner.sorted_daily_results()
+    done = time.perf_counter()
+
+    print("{} trades of {} symbols over {} days".format(len(runner.trades), args.symbols, args.days))
+    print("run_backtesting        {:8.2f} s".format(replayed - begin))
+    print("calculate_result       {:8.2f} s".format(calculated - replayed))
+    print("statistics, results    {:8.2f} s".format(done - calculated))
+    print("net_pnl {:.6f}".format(df["net_pnl"].sum()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+from datetime import datetime, timedelta
+import time
+
+import numpy as np
+
+from abquant.orderbook.depthorderbook import DepthOrderBook
+from abquant.trader.common import Direction, Exchange, OrderType
+from abquant.trader.msg import OrderData, TransactionData
+
+
+DAY_BATCHES = 24 * 3600 * 10
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=50000,
+                        help='number of 100ms depth batches')
+    parser.add_argument('-l', '--levels', type=int, default=20,
+                        help='level updates per side per batch')
+    parser.add_argument('-o', '--orders', type=int, default=10,
+                        help='resting orders kept on each side')
+    args = parser.parse_args()
+    return args
+
+
+def make_stream(n: int, levels: int, tick_size: float):
+    """
+    a random walk mid price, level updates around it and a few trades at the touch per batch.
+    """
+    rng = np.random.default_rng(1)
+    mids = np.round(40000 / tick_size + np.cumsum(rng.integers(-2, 3, n)))
+    distances = rng.integers(1, 200, (n, 2, levels))
+    distances[:, :, 0] = 1
+    volumes = rng.exponential(1, (n, 2, levels)).round(3)
+    trades = rng.poisson(2, n)
+    return mids, distances, volumes, trades, rng
+
+
+def main():
+    args = parse()
+    tick_size = 0.1
+    mids, distances, volumes, trades, rng = make_stream(args.number, args.levels, tick_size)
+    book = DepthOrderBook(tick_size=tick_size)
+    ab_symbol = "BTCUSDT.BINANCE"
+    start = datetime(2022, 1, 1)
+    count = 0
+    fills = 0
+
+    def send(direction: Direction, price: float):
+        nonlocal count
+        count += 1
+        order = OrderData(gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE,
+                          orderid=str(count), type=OrderType.LIMIT, direction=direction,
+                          price=round(price, 1), volume=0.5)
+        book.insert_order(order)
+
+    begin = time.perf_counter()
+    for i in range(args.number):
+        mid = mids[i]
+        book.update_levels(ab_symbol, Direction.LONG, (mid - distances[i, 0]) * tick_size, volumes[i, 0])
+        book.update_levels(ab_symbol, Direction.SHORT, (mid + distances[i, 1]) * tick_size, volumes[i, 1])
+        dt = start + timedelta(milliseconds=100 * i)
+        for _ in range(trades[i]):
+            buy = rng.random() < 0.5
+            price = (mid + 1 if buy else mid - 1) * tick_size
+            book.update_transaction(TransactionData(
+                gateway_name="BACKTESTING", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=dt,
+                price=price, volume=float(rng.exponential(0.3)), direction=Direction.LONG if buy else Direction.SHORT))
+
+        long_count = sum(1 for order in book.active_limit_orders.values() if order.direction == Direction.LONG)
+        for _ in range(args.orders - long_count):
+            send(Direction.LONG, (mid - rng.integers(1, 20)) * tick_size)
+        for _ in range(args.orders - (len(book.active_limit_orders) - long_count)):
+            send(Direction.SHORT, (mid + rng.integers(1, 20)) * tick_size)
+        list(book.accept_submitting_orders())
+        fills += sum(1 for _ in book.match_orders())
+    elapsed = time.perf_counter() - begin
+
+    print("{:,} batches of {} levels per side, {:,} trades, {:,} orders, {:,} fills".format(
+        args.number, args.levels, int(trades.sum()), count, fills))
+    print("{:.1f} us per batch, a day of 100ms depth in {:.1f} minutes".format(
+        elapsed / args.number * 1e6, elapsed / args.number * DAY_BATCHES / 60))
+
+
+if __name__ == '__main__':
+    main()
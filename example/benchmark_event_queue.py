@@ -0,0 +1,76 @@
+import argparse
+from threading import Thread
+import time
+
+import numpy as np
+
+from abquant.event import EventDispatcher, Event, EventType
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--events', type=int, default=200000,
+                        help='number of events put by each producer')
+    parser.add_argument('-p', '--producers', type=int, default=2,
+                        help='number of producer threads, like websocket listeners of several gateways')
+    parser.add_argument('-r', '--rate', type=int, default=0,
+                        help='events/s of each producer, 0 for as fast as possible')
+    parser.add_argument('-b', '--batch_size', type=int, default=256,
+                        help='batch size of Ring queue mode')
+    args = parser.parse_args()
+    return args
+
+
+def produce(dispatcher: EventDispatcher, n: int, rate: int):
+    put = dispatcher.put
+    perf_counter = time.perf_counter
+    if not rate:
+        for _ in range(n):
+            put(Event(EventType.EVENT_RAW, perf_counter()))
+        return
+    period = 1 / rate
+    start = perf_counter()
+    for i in range(n):
+        # sleep instead of spinning, a spinning producer holds GIL and inflates the latency of consumer.
+        ahead = start + i * period - perf_counter()
+        if ahead > 0:
+            time.sleep(ahead)
+        put(Event(EventType.EVENT_RAW, perf_counter()))
+
+
+def run(queue_mode: str, args) -> None:
+    dispatcher = EventDispatcher(event_threshold=args.events * args.producers, queue_mode=queue_mode, batch_size=args.batch_size)
+    total = args.events * args.producers
+    latencies = np.zeros(total)
+    processed = [0, 0.0]
+
+    def on_raw(event: Event):
+        now = time.perf_counter()
+        latencies[processed[0]] = now - event.data
+        processed[0] += 1
+        processed[1] = now
+
+    dispatcher.register(EventType.EVENT_RAW, on_raw)
+    producers = [Thread(target=produce, args=(dispatcher, args.events, args.rate)) for _ in range(args.producers)]
+    start = time.perf_counter()
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    while processed[0] < total:
+        time.sleep(0.001)
+    elapsed = processed[1] - start
+    dispatcher.stop()
+
+    print("{:<6} {:>12,.0f} events/s   p50 {:>9.1f}us   p99 {:>9.1f}us".format(
+        queue_mode, total / elapsed, np.percentile(latencies, 50) * 1e6, np.percentile(latencies, 99) * 1e6))
+
+
+def main():
+    args = parse()
+    for queue_mode in ('Fifo', 'Ring'):
+        run(queue_mode, args)
+
+
+if __name__ == '__main__':
+    main()
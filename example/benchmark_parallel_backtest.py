@@ -0,0 +1,102 @@
+import argparse
+from datetime import datetime, timedelta
+import time
+
+from abquant.strategytrading import BacktestParameter, BacktestStrategyRunner, StrategyTemplate
+from abquant.trader.common import Direction, Interval, Offset, OrderType
+
+from benchmark_replay_history import GeneratedDataLoader
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--symbols', type=int, default=8,
+                        help='number of symbols')
+    parser.add_argument('-n', '--strategies', type=int, default=4,
+                        help='number of strategies, each on symbols/strategies symbols')
+    parser.add_argument('-d', '--days', type=int, default=10,
+                        help='days of minute bars')
+    parser.add_argument('-p', '--processes', type=int, default=4,
+                        help='worker processes, 0 for the serial backtest')
+    args = parser.parse_args()
+    return args
+
+
+class MomentumStrategy(StrategyTemplate):
+    """
+    long 1 after a close above the one window minutes ago, short 1 below.
+    """
+    window = 30
+    parameters = ["window"]
+
+    def __init__(self, strategy_runner, strategy_name, ab_symbols, setting):
+        super().__init__(strategy_runner, strategy_name, ab_symbols, setting)
+        self.closes = {ab_symbol: [] for ab_symbol in ab_symbols}
+
+    def on_init(self):
+        self.load_bars(1)
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+    def on_tick(self, tick):
+        pass
+
+    def on_exception(self, exception):
+        pass
+
+    def on_bars(self, bars):
+        for ab_symbol, bar in bars.items():
+            closes = self.closes[ab_symbol]
+            closes.append(bar.close_price)
+            if len(closes) <= self.window:
+                continue
+            target = 1 if closes[-1] > closes[-1 - self.window] else -1
+            change = target - self.get_pos(ab_symbol)
+            if change > 0:
+                self.send_order(ab_symbol, Direction.LONG, bar.close_price * 1.01, change, Offset.NONE, OrderType.LIMIT)
+            elif change < 0:
+                self.send_order(ab_symbol, Direction.SHORT, bar.close_price * 0.99, -change, Offset.NONE, OrderType.LIMIT)
+
+    def update_order(self, order):
+        super().update_order(order)
+
+    def update_trade(self, trade):
+        super().update_trade(trade)
+
+
+def main():
+    args = parse()
+    ab_symbols = ["S{}USDT.BINANCE".format(i) for i in range(args.symbols)]
+    runner = BacktestStrategyRunner()
+    runner.set_data_loader(GeneratedDataLoader(0.01))
+    runner.set_parameter(BacktestParameter(
+        ab_symbols=ab_symbols,
+        interval=Interval.MINUTE,
+        rates={ab_symbol: 0.0004 for ab_symbol in ab_symbols},
+        slippages={ab_symbol: 0 for ab_symbol in ab_symbols},
+        sizes={ab_symbol: 1 for ab_symbol in ab_symbols},
+        priceticks={ab_symbol: 0.01 for ab_symbol in ab_symbols},
+        capital=100000,
+    ))
+    per_strategy = max(args.symbols // args.strategies, 1)
+    for i in range(args.strategies):
+        symbols = ab_symbols[i * per_strategy % args.symbols:][:per_strategy]
+        runner.add_strategy(MomentumStrategy, "momentum{}".format(i), symbols, {"window": 10 + i})
+
+    start = datetime(2022, 1, 1)
+    begin = time.perf_counter()
+    trades, daily_results, statistics = runner.run_backtest(start, start + timedelta(days=args.days),
+                                                            processes=args.processes)
+    elapsed = time.perf_counter() - begin
+
+    print("{} strategies on {} symbols x {} days of minute bars, {} processes".format(
+        args.strategies, args.symbols, args.days, args.processes))
+    print("run_backtest {:8.1f} s, {} trades".format(elapsed, sum(len(trade) for trade in trades.values())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+from datetime import datetime, timedelta
+import resource
+import time
+import zlib
+
+import numpy as np
+
+from abquant.dataloader.dataloader import DataLoader, Dataset
+from abquant.strategytrading.replayrunner import ReplayRunner
+from abquant.strategytrading.template import DummyStrategy
+from abquant.trader.common import Interval
+from abquant.trader.msg import BarData
+from abquant.trader.utility import extract_ab_symbol
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--symbols', type=int, default=20,
+                        help='number of symbols')
+    parser.add_argument('-d', '--days', type=int, default=30,
+                        help='days of minute bars')
+    parser.add_argument('-m', '--missing', type=float, default=0.01,
+                        help='ratio of minutes missed')
+    parser.add_argument('--streaming', action='store_true',
+                        help='replay day chunks merged on the fly')
+    parser.add_argument('--minute-equity', action='store_true',
+                        help='record the balance of every minute')
+    args = parser.parse_args()
+    return args
+
+
+class GeneratedDataset(Dataset):
+    def __init__(self, bars, start, end, ab_symbol):
+        super().__init__(start, end, ab_symbol, Interval.MINUTE)
+        self.bars = bars
+
+    def __iter__(self):
+        return iter(self.bars)
+
+    def __next__(self):
+        raise StopIteration
+
+    def __len__(self):
+        return len(self.bars)
+
+    def copy(self):
+        return GeneratedDataset(self.bars, self.start, self.end, self.ab_symbol)
+
+
+class GeneratedDataLoader(DataLoader):
+    """
+    random walk minute bars generated for each requested range, so that only the runner holds history.
+    """
+
+    def __init__(self, missing: float):
+        super().__init__({})
+        self.missing = missing
+
+    def set_config(self, setting):
+        self._config = setting
+
+    def load_data(self, ab_symbol, start, end, interval=Interval.MINUTE):
+        symbol, exchange = extract_ab_symbol(ab_symbol)
+        rng = np.random.default_rng(zlib.crc32("{} {}".format(ab_symbol, start).encode()))
+        minutes = int((end - start).total_seconds() // 60)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, minutes)))
+        kept = rng.random(minutes) >= self.missing
+        # every symbol has the first bar
+        kept[0] = True
+        bars = [
+            BarData(gateway_name="BACKTESTING", symbol=symbol, exchange=exchange, interval=Interval.MINUTE,
+                    datetime=start + timedelta(minutes=minute), volume=1.0, open_price=float(close),
+                    high_price=float(close) + 0.1, low_price=float(close) - 0.1, close_price=float(close))
+            for minute, close in enumerate(closes) if kept[minute]
+        ]
+        return GeneratedDataset(bars, start, end, ab_symbol)
+
+
+def main():
+    args = parse()
+    ab_symbols = ["S{}USDT.BINANCE".format(i) for i in range(args.symbols)]
+    runner = ReplayRunner(
+        ab_symbols=ab_symbols,
+        interval=Interval.MINUTE,
+        rates={ab_symbol: 0 for ab_symbol in ab_symbols},
+        slippages={ab_symbol: 0 for ab_symbol in ab_symbols},
+        sizes={ab_symbol: 1 for ab_symbol in ab_symbols},
+        priceticks={ab_symbol: 0.01 for ab_symbol in ab_symbols},
+        capital=100000,
+        streaming=args.streaming,
+        minute_equity=args.minute_equity,
+    )
+    runner.output = lambda msg: None
+    runner.set_data_loader(GeneratedDataLoader(args.missing))
+    runner.set_strategy(DummyStrategy(runner, "dummy", ab_symbols, {}))
+
+    start = datetime(2022, 1, 1)
+    begin = time.perf_counter()
+    runner.load_data(start, start + timedelta(days=args.days))
+    loaded = time.perf_counter()
+    load_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    runner.run_backtesting()
+    replayed = time.perf_counter()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print("{} symbols x {} days of minute bars{}".format(args.symbols, args.days, ", streaming" if args.streaming else ""))
+    print("load_data        {:8.1f} s   peak RSS {:8.0f} MB".format(loaded - begin, load_rss))
+    print("run_backtesting  {:8.1f} s   peak RSS {:8.0f} MB".format(replayed - loaded, peak_rss))
+
+
+if __name__ == '__main__':
+    main()
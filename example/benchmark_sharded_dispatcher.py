@@ -0,0 +1,71 @@
+import argparse
+from datetime import datetime
+import time
+
+import numpy as np
+
+from abquant.event import EventDispatcher, ShardedEventDispatcher, Event, EventType
+from abquant.trader.common import Exchange
+from abquant.trader.msg import TickData
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--events', type=int, default=20000,
+                        help='number of tick events')
+    parser.add_argument('-s', '--symbols', type=int, default=40,
+                        help='number of symbols')
+    parser.add_argument('-l', '--max_lanes', type=int, default=8,
+                        help='benchmark lanes from 1 to max_lanes')
+    parser.add_argument('-w', '--work', type=str, default='sleep', choices=['sleep', 'numpy', 'none'],
+                        help='simulated on_tick work. sleep: io-like, numpy: gil-releasing computation, none: pure dispatch')
+    args = parser.parse_args()
+    return args
+
+
+def make_handler(work: str, processed: list):
+    data = np.random.random(20000)
+
+    def on_tick(event: Event):
+        if work == 'sleep':
+            time.sleep(0.0002)
+        elif work == 'numpy':
+            np.sort(data)
+        # list.append is atomic, safe to be called by several lanes.
+        processed.append(1)
+    return on_tick
+
+
+def run(dispatcher: EventDispatcher, ticks, work: str) -> float:
+    processed = []
+    dispatcher.register(EventType.EVENT_TICK, make_handler(work, processed))
+    start = time.perf_counter()
+    for tick in ticks:
+        dispatcher.put(Event(EventType.EVENT_TICK, tick))
+    while len(processed) < len(ticks):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    dispatcher.stop()
+    return len(ticks) / elapsed
+
+
+def main():
+    args = parse()
+    now = datetime.now()
+    ticks = [
+        TickData(gateway_name='BENCH', symbol='SYMBOL{}'.format(i % args.symbols), exchange=Exchange.BINANCE,
+                 datetime=now, trade_price=1, trade_volume=1)
+        for i in range(args.events)
+    ]
+
+    baseline = run(EventDispatcher(event_threshold=args.events), ticks, args.work)
+    print("EventDispatcher          : {:>10,.0f} events/s".format(baseline))
+    lanes = 1
+    while lanes <= args.max_lanes:
+        throughput = run(ShardedEventDispatcher(event_threshold=args.events, lanes=lanes), ticks, args.work)
+        print("ShardedEventDispatcher {:>2}: {:>10,.0f} events/s, x{:.2f}".format(lanes, throughput, throughput / baseline))
+        lanes *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+from copy import copy
+from datetime import datetime
+import timeit
+import tracemalloc
+
+from abquant.trader.common import Direction, Exchange
+from abquant.trader.msg import DepthData, OrderData, TickData, TradeData, TransactionData
+from abquant.trader.slottedmsg import SlottedDepthData, SlottedOrderData, SlottedTickData, SlottedTradeData, SlottedTransactionData
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='number of objects constructed and copied per measurement')
+    args = parser.parse_args()
+    return args
+
+
+NOW = datetime.now()
+FACTORIES = {
+    "TickData": lambda cls: cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                                best_ask_price=40000.5, best_ask_volume=1.2, best_bid_price=40000.0, best_bid_volume=0.8,
+                                bid_price_1=40000.0, ask_price_1=40000.5, localtime=NOW),
+    "DepthData": lambda cls: cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                                 volume=1.5, price=40000.0, direction=Direction.LONG, localtime=NOW),
+    "TransactionData": lambda cls: cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, datetime=NOW,
+                                       volume=0.1, price=40000.0, direction=Direction.SHORT, localtime=NOW),
+    "OrderData": lambda cls: cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid="123456789",
+                                 direction=Direction.LONG, price=40000.0, volume=1, datetime=NOW),
+    "TradeData": lambda cls: cls(gateway_name="BINANCEC", symbol="BTCUSDT", exchange=Exchange.BINANCE, orderid="123456789",
+                                 tradeid="987654321", direction=Direction.LONG, price=40000.0, volume=1, datetime=NOW),
+}
+PAIRS = [
+    (TickData, SlottedTickData),
+    (DepthData, SlottedDepthData),
+    (TransactionData, SlottedTransactionData),
+    (OrderData, SlottedOrderData),
+    (TradeData, SlottedTradeData),
+]
+
+
+def memory_per_object(cls, n: int) -> float:
+    factory = FACTORIES[cls.__name__.replace("Slotted", "")]
+    tracemalloc.start()
+    objects = [factory(cls) for _ in range(n)]
+    # make sure derived attributes exist on both, as a listener would use them.
+    for obj in objects:
+        obj.ab_symbol
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # list itself takes 8 bytes per object.
+    return size / n - 8
+
+
+def construct_copy_time(cls, n: int) -> float:
+    factory = FACTORIES[cls.__name__.replace("Slotted", "")]
+
+    def run():
+        obj = factory(cls)
+        copy(obj).ab_symbol
+    return min(timeit.repeat(run, number=n, repeat=3)) / n
+
+
+def main():
+    args = parse()
+    print("{:<24}{:>14}{:>22}".format("class", "bytes/object", "construct+copy (us)"))
+    for data_class, slotted_class in PAIRS:
+        for cls in (data_class, slotted_class):
+            print("{:<24}{:>14.0f}{:>22.2f}".format(
+                cls.__name__, memory_per_object(cls, args.number), construct_copy_time(cls, args.number) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
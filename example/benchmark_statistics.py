@@ -0,0 +1,53 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from abquant.strategytrading import statistics as stats
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--points', type=int, default=5000000,
+                        help='points of the balance curve, e.g. minutes')
+    args = parser.parse_args()
+    return args
+
+
+def rolling_drawdowns(balance: np.ndarray):
+    """
+    the rolling window construction and Series scans ReplayRunner used on daily balances.
+    """
+    df = pd.DataFrame({"balance": balance})
+    df["highlevel"] = df["balance"].rolling(min_periods=1, window=len(df), center=False).max()
+    df["drawdown"] = df["balance"] - df["highlevel"]
+    df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+    highlevel_idx = pd.Series(np.append(np.where(df["drawdown"] == 0)[0], len(df)))
+    longest_drawdown_duration = (highlevel_idx - highlevel_idx.shift(1)).fillna(0).max()
+    max_drawdown_end = df["drawdown"].idxmin()
+    max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
+    return df["drawdown"].min(), df["ddpercent"].min(), max_drawdown_end - max_drawdown_start, longest_drawdown_duration
+
+
+def main():
+    args = parse()
+    rng = np.random.default_rng(0)
+    balance = 1e6 + np.cumsum(rng.normal(0, 50, args.points))
+
+    begin = time.perf_counter()
+    before = rolling_drawdowns(balance)
+    rolled = time.perf_counter()
+    after = stats.equity_statistics(balance)
+    vectorized = time.perf_counter()
+
+    print("{} points".format(args.points))
+    print("rolling window   {:8.3f} s".format(rolled - begin))
+    print("equity_statistics {:7.3f} s".format(vectorized - rolled))
+    print("max_drawdown {:.2f} {:.2f}, duration {} {}, longest {} {}".format(
+        before[0], after["max_drawdown"], before[2], after["max_drawdown_duration"],
+        before[3], after["longest_drawdown_duration"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import argparse
+from datetime import datetime, timedelta
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from abquant.orderbook.orderbook import OrderBook
+from abquant.orderbook.tickorderbook import INFINITY, TickOrderBook
+from abquant.trader.common import Direction, Exchange, OrderType, Status
+from abquant.trader.msg import OrderData, TickData, TradeData
+
+
+def parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--orders', type=int, default=10000,
+                        help='number of resting orders')
+    parser.add_argument('-t', '--ticks', type=int, default=20000,
+                        help='number of ticks')
+    parser.add_argument('-s', '--symbols', type=int, default=4,
+                        help='number of symbols')
+    args = parser.parse_args()
+    return args
+
+
+class ScanTickOrderBook(OrderBook):
+    """
+    same matching rules as TickOrderBook by scanning and sorting every resting order on each tick, for comparison.
+    """
+
+    def __init__(self):
+        super(ScanTickOrderBook, self).__init__()
+        self.ticks: Dict[str, TickData] = {}
+        self.updated = set()
+        self.trade_count = 0
+
+    def update_tick(self, tick: TickData) -> None:
+        self.ticks[tick.ab_symbol] = tick
+        self.updated.add(tick.ab_symbol)
+
+    def insert_order(self, order: OrderData) -> str:
+        return super().insert_order(order)
+
+    def cancel_order(self, ab_orderid: str) -> Optional[OrderData]:
+        return super().cancel_order(ab_orderid)
+
+    def match_orders(self) -> Iterable[Tuple[OrderData, TradeData]]:
+        while self.updated:
+            tick = self.ticks[self.updated.pop()]
+            ask, bid, trade_price = tick.best_ask_price, tick.best_bid_price, tick.trade_price
+            limits = [order for order in self.active_limit_orders.values() if order.ab_symbol == tick.ab_symbol]
+            longs = sorted((o for o in limits if o.direction == Direction.LONG), key=lambda o: -o.price)
+            shorts = sorted((o for o in limits if o.direction == Direction.SHORT), key=lambda o: o.price)
+            long_bound = ask if ask > 0 else INFINITY
+            short_bound = bid if bid > 0 else -INFINITY
+            long_filled = short_filled = 0
+            if ask > 0:
+                long_filled = yield from self._fill(longs, tick, lambda o: o.price >= ask, lambda o: min(o.price, ask), tick.best_ask_volume or INFINITY)
+            if bid > 0:
+                short_filled = yield from self._fill(shorts, tick, lambda o: o.price <= bid, lambda o: max(o.price, bid), tick.best_bid_volume or INFINITY)
+            if trade_price > 0 and tick.trade_volume > 0:
+                yield from self._fill(longs, tick, lambda o: trade_price < o.price < long_bound, lambda o: o.price, tick.trade_volume - long_filled)
+                yield from self._fill(shorts, tick, lambda o: short_bound < o.price < trade_price, lambda o: o.price, tick.trade_volume - short_filled)
+
+            stops = [order for order in self.stop_market_orders.values() if order.ab_symbol == tick.ab_symbol]
+            long_trigger = trade_price or ask
+            short_trigger = trade_price or bid
+            for order in sorted((o for o in stops if o.direction == Direction.LONG), key=lambda o: o.price):
+                if long_trigger > 0 and order.price <= long_trigger:
+                    yield self._stop(order, max(order.price, long_trigger), tick)
+            for order in sorted((o for o in stops if o.direction == Direction.SHORT), key=lambda o: -o.price):
+                if short_trigger > 0 and order.price >= short_trigger:
+                    yield self._stop(order, min(order.price, short_trigger), tick)
+
+    def _fill(self, orders, tick, crossed, fill_price, available):
+        filled = 0
+        for order in orders:
+            if order.status == Status.ALLTRADED:
+                continue
+            if available <= 0 or not crossed(order):
+                break
+            volume = min(order.volume - order.traded, available)
+            available -= volume
+            filled += volume
+            order.traded += volume
+            if order.traded >= order.volume:
+                order.status = Status.ALLTRADED
+                self.active_limit_orders.pop(order.ab_orderid)
+            else:
+                order.status = Status.PARTTRADED
+            yield order, self._trade(order, fill_price(order), volume, tick)
+        return filled
+
+    def _stop(self, order, price, tick):
+        volume = order.volume - order.traded
+        order.traded = order.volume
+        order.status = Status.ALLTRADED
+        self.stop_market_orders.pop(order.ab_orderid)
+        return order, self._trade(order, price, volume, tick)
+
+    def _trade(self, order, price, volume, tick) -> TradeData:
+        self.trade_count += 1
+        return TradeData(symbol=order.symbol, exchange=order.exchange, orderid=order.orderid,
+                         tradeid=str(self.trade_count), direction=order.direction, offset=order.offset,
+                         price=price, volume=volume, datetime=tick.datetime, gateway_name=order.gateway_name)
+
+
+def make_orders(n: int, symbols, rng):
+    orders = []
+    for i in range(n):
+        symbol = symbols[i % len(symbols)]
+        direction = Direction.LONG if rng.random() < 0.5 else Direction.SHORT
+        order_type = OrderType.LIMIT if rng.random() < 0.8 else OrderType.STOP_MARKET
+        # limits rest away from the market, stops beyond it.
+        distance = round(float(rng.exponential(40)) + 1)
+        below = (direction == Direction.LONG) == (order_type == OrderType.LIMIT)
+        price = 1000.0 - distance if below else 1000.0 + distance
+        orders.append(OrderData(gateway_name="BACKTEST", symbol=symbol, exchange=Exchange.BINANCE, orderid=str(i),
+                                type=order_type, direction=direction, price=price,
+                                volume=float(rng.integers(1, 5))))
+    return orders
+
+
+def make_ticks(n: int, symbols, rng):
+    start = datetime(2022, 1, 1)
+    mids = {symbol: 1000.0 for symbol in symbols}
+    ticks = []
+    for i in range(n):
+        symbol = symbols[i % len(symbols)]
+        mid = mids[symbol] = mids[symbol] + float(rng.choice((-1.0, 0.0, 1.0)))
+        traded = rng.random() < 0.3
+        ticks.append(TickData(gateway_name="BACKTEST", symbol=symbol, exchange=Exchange.BINANCE,
+                              datetime=start + timedelta(milliseconds=100 * i),
+                              best_bid_price=mid - 0.5, best_ask_price=mid + 0.5,
+                              best_bid_volume=float(rng.integers(1, 10)), best_ask_volume=float(rng.integers(1, 10)),
+                              trade_price=mid + float(rng.choice((-0.5, 0.5))) if traded else 0,
+                              trade_volume=float(rng.integers(1, 10)) if traded else 0))
+    return ticks
+
+
+def run(book, orders, ticks):
+    for order in orders:
+        book.insert_order(order)
+    fills = []
+    begin = time.perf_counter()
+    for tick in ticks:
+        book.update_tick(tick)
+        for order, trade in book.match_orders():
+            fills.append((order.ab_orderid, trade.price, trade.volume, trade.datetime))
+    return time.perf_counter() - begin, fills
+
+
+def main():
+    args = parse()
+    symbols = ["SYM{}".format(i) for i in range(args.symbols)]
+
+    results = {}
+    for name, book_class in (("TickOrderBook", TickOrderBook), ("scan", ScanTickOrderBook)):
+        rng = np.random.default_rng(3)
+        orders = make_orders(args.orders, symbols, rng)
+        ticks = make_ticks(args.ticks, symbols, rng)
+        elapsed, fills = run(book_class(), orders, ticks)
+        results[name] = fills
+        print("{:<14} {:>10,.0f} ticks/s {:>8.2f} us/tick {:>7} fills".format(
+            name, len(ticks) / elapsed, elapsed / len(ticks) * 1e6, len(fills)))
+    print("same fills: {}".format(results["TickOrderBook"] == results["scan"]))
+
+
+if __name__ == '__main__':
+    main()
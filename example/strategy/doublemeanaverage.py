@@ -3,10 +3,10 @@
 
 from typing import Dict, List
 import numpy as np
-import talib
 
 from abquant.strategytrading import StrategyTemplate, LiveStrategyRunner
 from abquant.trader.tool import ArrayCache, BarGenerator,  BarAccumulater 
+from abquant.trader.indicators import SMA
 from abquant.trader.common import Direction, OrderType, Status
 from abquant.trader.msg import TickData, BarData, TradeData, OrderData, EntrustData, TransactionData, DepthData
 
@@ -55,6 +55,9 @@ class DoubleMAStrategy(StrategyTemplate):
         for ab_symbol in self.ab_symbols:
             self.bgs[ab_symbol] = BarGenerator(lambda bar: None, interval=1)
         self.array_cache = ArrayCache(self.long_window * 2)
+        # 增量计算的均线，每根bar O(1)，随array_cache一同更新。
+        self.short_sma = self.array_cache.add_indicator(SMA(self.short_window))
+        self.long_sma = self.array_cache.add_indicator(SMA(self.long_window))
 
         # init时 从交易所获取过去n 天的1 分钟k线。生成 60 * 24 个供 strategy.on_bars 调用的 bars: Dict[str, BarData], 字典的key是 ab_symbol, value是BarData.
         # 从交易所获取后，顺序调用on_bars 60 * 24 次，再返回。
@@ -97,6 +100,8 @@ class DoubleMAStrategy(StrategyTemplate):
 
     def on_bars(self, bars: Dict[str, BarData]):
         ab_symbol = self.ab_symbols[0]
+        self.last_short_ma = self.short_sma.value
+        self.last_long_ma = self.long_sma.value
         self.array_cache.update_bar(bars[ab_symbol])
         close_price = bars[ab_symbol].close_price
         if not self.array_cache.inited:
@@ -104,13 +109,8 @@ class DoubleMAStrategy(StrategyTemplate):
 
         self.cancel_all()
         
-        short_ma = talib.SMA(self.array_cache.close, self.short_window)
-        self.last_short_ma = short_ma[-2]
-        self.short_ma = short_ma[-1]
-        
-        long_ma = talib.SMA(self.array_cache.close, self.long_window)
-        self.last_long_ma = long_ma[-2]
-        self.long_ma = long_ma[-1]
+        self.short_ma = self.short_sma.value
+        self.long_ma = self.long_sma.value
 
         cross_over = self.short_ma > self.long_ma and self.short_ma < self.last_long_ma
         cross_below = self.short_ma < self.long_ma and self.short_ma > self.last_long_ma